@@ -18,11 +18,13 @@
 from fastapi import FastAPI
 
 import settings
-from api.rest.utils import TergiteCORSMiddleware
+from api.rest.utils import CompressionMiddleware, TergiteCORSMiddleware
 from services.auth.utils import TooManyListQueryParams
 from utils.api import to_http_error
 from utils.exc import (
     DbValidationError,
+    InvalidCursorError,
+    InvalidQueryError,
     NotFoundError,
     ServiceUnavailableError,
     UnknownBccError,
@@ -54,6 +56,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(
+    CompressionMiddleware,
+    encodings=settings.CONFIG.responses.compression_encodings,
+    min_bytes=settings.CONFIG.responses.compression_min_bytes,
+)
+
 # exception handlers
 app.add_exception_handler(NotFoundError, to_http_error(404))
 app.add_exception_handler(ValueError, to_http_error(500, "Unexpected server error"))
@@ -65,6 +73,8 @@ app.add_exception_handler(
 app.add_exception_handler(ServiceUnavailableError, to_http_error(503))
 app.add_exception_handler(UnknownBccError, to_http_error(400))
 app.add_exception_handler(TooManyListQueryParams, to_http_error(400))
+app.add_exception_handler(InvalidCursorError, to_http_error(400))
+app.add_exception_handler(InvalidQueryError, to_http_error(400))
 
 # routes
 include_auth_router(app, is_enabled=settings.CONFIG.auth.is_enabled)
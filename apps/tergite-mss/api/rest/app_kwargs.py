@@ -21,9 +21,12 @@ from typing import Any, Dict
 from fastapi import FastAPI
 
 import settings
-from services import calibration as calib_service
 from services.auth import service as auth_service
+from services.calibration import metrics as calibration_metrics
 from services.external import bcc, puhuri
+from services.jobs import archive as job_archive
+from services.jobs import events as job_events
+from utils.indexes import reconcile_indexes
 
 from .dependencies import get_default_mongodb
 
@@ -52,9 +55,20 @@ async def lifespan(_app: FastAPI):
     await bcc.create_clients(configs=settings.CONFIG.backends)
     db = await get_default_mongodb()
     await auth_service.on_startup(db)
-    await calib_service.on_startup(db)
     await puhuri.initialize_db(db)
+    await job_archive.create_collection(db)
+    await calibration_metrics.create_collection(db)
+    await reconcile_indexes(db)
+    await job_events.start_watcher(db)
+    await job_archive.start_archiver(
+        db,
+        archive_after_days=settings.CONFIG.jobs.archive_after_days,
+        interval_secs=settings.CONFIG.jobs.archive_interval_secs,
+        batch_size=settings.CONFIG.jobs.archive_batch_size,
+    )
 
     yield
     # on shutdown
+    await job_archive.stop_archiver()
+    await job_events.stop_watcher()
     await bcc.close_clients()
@@ -15,56 +15,238 @@
 # Any modifications or derivative works of this code must retain this
 # copyright notice, and modified files need to carry a notice indicating
 # that they have been altered from the originals.
-from typing import List, Optional
+from datetime import datetime
+from typing import List, Literal, Optional
 
 from fastapi import APIRouter, Depends, Query
+from fastapi.requests import Request
 
+import settings
 from api.rest.dependencies import CurrentSystemUserProjectDep, MongoDbDep
 from services import calibration as calibration_service
+from services.calibration import metrics as calibration_metrics
 from services.calibration.dtos import (
+    CalibrationHistoryAggregate,
+    CalibrationHistoryInterval,
     DeviceCalibrationCreate,
     DeviceCalibrationQuery,
 )
-from utils.api import PaginatedListResponse
+from utils.api import (
+    PaginatedListResponse,
+    get_revision_headers,
+    is_conditional_request,
+    is_ndjson_requested,
+    is_not_modified,
+    to_json_list_response,
+    to_ndjson_response,
+    to_negotiated_response,
+    to_not_modified_response,
+    to_page_response,
+)
 
 router = APIRouter(prefix="/calibrations", tags=["calibrations"])
 
 
 @router.get("/")
 async def get_many(
+    request: Request,
     db: MongoDbDep,
     query: DeviceCalibrationQuery = Depends(),
     skip: int = 0,
     limit: Optional[int] = None,
     sort: List[str] = Query(("-last_calibrated",)),
+    cursor: Optional[str] = None,
 ):
     """Gets a paginated list of calibration result sets that fulfill a given set of filters
 
+    If the 'Accept' header is 'application/x-ndjson', the calibration result sets are streamed as newline-delimited JSON,
+    one per line, without the pagination envelope. 'cursor' is ignored in that case.
+    If it is 'application/msgpack', the page is sent as MessagePack instead of JSON.
+
     Args:
+        request: the request object from FastAPI
         db: the mongo db database from which to get the calibration results
         query: the query params for getting the calibration result sets
         skip: the number of records to skip
         limit: the maximum number of records to return
         sort: the fields to sort by, prefixing any with a '-' means descending; default = ("-last_calibrated",)
             To add multiple fields to sort by, repeat the same query parameter in the url e.g. "query=tom&q=dick&q=harry"
+        cursor: the 'next_cursor' of the previous page when using cursor-based pagination.
+            An empty value e.g. "?cursor=" returns the first page. 'skip' is ignored if cursor is passed.
 
     Returns:
-        the paginated result of the matched device calibration results
+        the paginated result of the matched device calibration results.
+        Without 'cursor' and 'application/x-ndjson', it has the 'ETag' and 'Last-Modified' headers
+        of the revisions of the calibration results, and a '304 Not Modified' response without a body
+        is returned if the 'If-None-Match' or 'If-Modified-Since' headers of the request match them.
     """
     filters = query.model_dump()
 
+    if is_ndjson_requested(request):
+        records = calibration_service.iter_latest_many(
+            db,
+            filters=filters,
+            limit=limit,
+            skip=skip,
+            sort=sort,
+            batch_size=settings.CONFIG.database.stream_batch_size,
+        )
+        return to_ndjson_response(records, exclude_data_none_fields=False)
+
+    if cursor is not None:
+        data, next_cursor = await calibration_service.get_latest_page(
+            db, cursor=cursor, filters=filters, limit=limit, sort=sort
+        )
+        page = PaginatedListResponse(
+            limit=limit, data=data, cursor=cursor, next_cursor=next_cursor
+        )
+        return to_page_response(request, page, exclude_data_none_fields=False)
+
+    if is_conditional_request(request):
+        revisions = await calibration_service.get_latest_revisions(
+            db, filters=filters, limit=limit, skip=skip, sort=sort
+        )
+        headers = get_revision_headers(revisions)
+        if is_not_modified(request, headers):
+            return to_not_modified_response(headers)
+
     data = await calibration_service.get_latest_many(
         db, filters=filters, limit=limit, skip=skip, sort=sort
     )
-    return PaginatedListResponse(skip=skip, limit=limit, data=data).model_dump(
-        mode="json", exclude_data_none_fields=False
+    page = PaginatedListResponse(skip=skip, limit=limit, data=data)
+    return to_page_response(
+        request,
+        page,
+        exclude_data_none_fields=False,
+        headers=get_revision_headers(data),
+    )
+
+
+@router.get("/{name}/history")
+async def read_history(
+    request: Request,
+    db: MongoDbDep,
+    name: str,
+    since: Optional[datetime] = Query(None, alias="from"),
+    until: Optional[datetime] = Query(None, alias="to"),
+    qubits: List[int] = Query(()),
+    fields: List[str] = Query(()),
+    every: int = Query(1, ge=1),
+    interval: Optional[CalibrationHistoryInterval] = None,
+    aggregate: CalibrationHistoryAggregate = CalibrationHistoryAggregate.MEAN,
+):
+    """Streams the historical calibration results of the device of the given name, oldest first
+
+    The snapshots are streamed as a JSON list, or as newline-delimited JSON, one per line,
+    if the 'Accept' header is 'application/x-ndjson'.
+
+    Args:
+        request: the request object from FastAPI
+        db: the mongo db database from which to get the calibration results
+        name: the name of the device
+        since: the earliest (inclusive) 'last_calibrated' of the snapshots e.g. "from=2024-05-01T00:00:00Z"
+        until: the latest (inclusive) 'last_calibrated' of the snapshots e.g. "to=2024-05-31T23:59:59Z"
+        qubits: the ids of the only qubits to return e.g. "qubits=0&qubits=3"; default = all qubits
+        fields: the only fields of the snapshots to return, besides 'name' and 'last_calibrated',
+            e.g. "fields=qubits.id&fields=qubits.t1_decoherence"; default = all fields
+        every: return only every Nth snapshot; default = 1 meaning all snapshots
+        interval: the length of the time buckets i.e. 'hour', 'day', 'week' or 'month' into which
+            the snapshots are combined, after applying 'every'; default = no combining
+        aggregate: the function i.e. 'min', 'max' or 'mean' that combines the numeric calibration
+            values in each time bucket; default = 'mean'
+
+    Raises:
+        utils.exc.InvalidQueryError: unknown field '{path}'
+    """
+    snapshots = calibration_service.iter_history(
+        db,
+        name=name,
+        since=since,
+        until=until,
+        qubits=qubits,
+        fields=fields,
+        every=every,
+        interval=interval,
+        aggregate=aggregate,
+        batch_size=settings.CONFIG.database.stream_batch_size,
+    )
+    if is_ndjson_requested(request):
+        return to_ndjson_response(snapshots, exclude_unset=True)
+    return to_json_list_response(snapshots, exclude_unset=True)
+
+
+@router.get("/{name}/metrics/{metric}")
+async def read_metric_series(
+    db: MongoDbDep,
+    name: str,
+    metric: str,
+    component: Literal["qubits", "resonators", "couplers"] = "qubits",
+    index: List[int] = Query(()),
+    since: Optional[datetime] = Query(None, alias="from"),
+    until: Optional[datetime] = Query(None, alias="to"),
+    interval: Optional[CalibrationHistoryInterval] = None,
+    aggregate: CalibrationHistoryAggregate = CalibrationHistoryAggregate.MEAN,
+):
+    """Gets the time series of one calibration value of the components of the device of the given name
+
+    The points are read from the per-component metric time series, so whole
+    calibration snapshots are never loaded.
+
+    Args:
+        db: the mongo db database from which to get the calibration metrics
+        name: the name of the device
+        metric: the name of the calibration value e.g. 't1_decoherence'
+        component: the kind of component i.e. 'qubits', 'resonators' or 'couplers'; default = 'qubits'
+        index: the ids of the only components to return e.g. "index=0&index=3"; default = all components
+        since: the earliest (inclusive) time of the points e.g. "from=2024-05-01T00:00:00Z"
+        until: the latest (inclusive) time of the points e.g. "to=2024-05-31T23:59:59Z"
+        interval: the length of the time buckets i.e. 'hour', 'day', 'week' or 'month' into which
+            the points are aggregated on the database server; default = the raw points
+        aggregate: the function i.e. 'min', 'max' or 'mean' that combines the values
+            in each time bucket; default = 'mean'
+
+    Returns:
+        the list of points, ordered by component index and then by time
+    """
+    data = await calibration_metrics.get_series(
+        db,
+        device=name,
+        metric=metric,
+        component=component,
+        indexes=index,
+        since=since,
+        until=until,
+        interval=interval,
+        aggregate=aggregate,
     )
+    return PaginatedListResponse(data=data).model_dump(mode="json")
 
 
 @router.get("/{name}")
-async def read_one(db: MongoDbDep, name: str):
+async def read_one(request: Request, db: MongoDbDep, name: str):
+    """Gets the current calibration results of the device of the given name
+
+    The response has the 'ETag' and 'Last-Modified' headers of the current revision of the calibration.
+    If the 'If-None-Match' or 'If-Modified-Since' headers of the request match them,
+    a '304 Not Modified' response without a body is returned after only checking the revision.
+
+    It is sent as MessagePack instead of JSON if the 'Accept' header is 'application/msgpack'.
+
+    Args:
+        request: the request object from FastAPI
+        db: the mongo db database from which to get the calibration results
+        name: the name of the device
+    """
+    if is_conditional_request(request):
+        revision = await calibration_service.get_revision(db, name)
+        headers = get_revision_headers([revision])
+        if is_not_modified(request, headers):
+            return to_not_modified_response(headers)
+
     record = await calibration_service.get_one(db, name)
-    return record.model_dump(mode="json")
+    return to_negotiated_response(
+        request, record.model_dump(mode="json"), headers=get_revision_headers([record])
+    )
 
 
 @router.post("/")
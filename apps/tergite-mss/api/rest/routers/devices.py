@@ -18,51 +18,123 @@
 from typing import List, Optional
 
 from fastapi import APIRouter, Depends, Query
+from fastapi.requests import Request
 
+import settings
 from api.rest.dependencies import CurrentSystemUserProjectDep, MongoDbDep
 from services import devices
 from services.devices.dtos import DeviceQuery
-from utils.api import PaginatedListResponse
+from utils.api import (
+    PaginatedListResponse,
+    get_revision_headers,
+    is_conditional_request,
+    is_ndjson_requested,
+    is_not_modified,
+    to_ndjson_response,
+    to_negotiated_response,
+    to_not_modified_response,
+    to_page_response,
+)
 
 router = APIRouter(prefix="/devices", tags=["devices"])
 
 
 @router.get("/")
 async def read_many(
+    request: Request,
     db: MongoDbDep,
     query: DeviceQuery = Depends(),
     skip: int = 0,
     limit: Optional[int] = None,
     sort: List[str] = Query(("-created_at",)),
+    cursor: Optional[str] = None,
 ):
     """Gets a paginated list of devices that fulfill a given set of filters
 
+    If the 'Accept' header is 'application/x-ndjson', the devices are streamed as newline-delimited JSON,
+    one per line, without the pagination envelope. 'cursor' is ignored in that case.
+    If it is 'application/msgpack', the page is sent as MessagePack instead of JSON.
+
     Args:
+        request: the request object from FastAPI
         db: the mongo db database from which to get the device data
         query: the query params for getting the device data
         skip: the number of records to skip
         limit: the maximum number of records to return
         sort: the fields to sort by, prefixing any with a '-' means descending; default = ("-created_at",)
             To add multiple fields to sort by, repeat the same query parameter in the url e.g. "query=tom&q=dick&q=harry"
+        cursor: the 'next_cursor' of the previous page when using cursor-based pagination.
+            An empty value e.g. "?cursor=" returns the first page. 'skip' is ignored if cursor is passed.
 
     Returns:
-        the paginated result of the matched device data
+        the paginated result of the matched device data.
+        Without 'cursor' and 'application/x-ndjson', it has the 'ETag' and 'Last-Modified' headers
+        of the revisions of the devices, and a '304 Not Modified' response without a body
+        is returned if the 'If-None-Match' or 'If-Modified-Since' headers of the request match them.
     """
     filters = query.model_dump()
 
+    if is_ndjson_requested(request):
+        records = devices.iter_all_devices(
+            db,
+            filters=filters,
+            skip=skip,
+            limit=limit,
+            sort=sort,
+            batch_size=settings.CONFIG.database.stream_batch_size,
+        )
+        return to_ndjson_response(records, exclude_data_none_fields=False)
+
+    if cursor is not None:
+        data, next_cursor = await devices.get_devices_page(
+            db, cursor=cursor, filters=filters, limit=limit, sort=sort
+        )
+        page = PaginatedListResponse(
+            limit=limit, data=data, cursor=cursor, next_cursor=next_cursor
+        )
+        return to_page_response(request, page)
+
+    if is_conditional_request(request):
+        revisions = await devices.get_all_device_revisions(
+            db, filters=filters, skip=skip, limit=limit, sort=sort
+        )
+        headers = get_revision_headers(revisions)
+        if is_not_modified(request, headers):
+            return to_not_modified_response(headers)
+
     data = await devices.get_all_devices(
         db, filters=filters, skip=skip, limit=limit, sort=sort
     )
 
-    return PaginatedListResponse(skip=skip, limit=limit, data=data).model_dump(
-        mode="json", exclude_data_none_fields=False
-    )
+    page = PaginatedListResponse(skip=skip, limit=limit, data=data)
+    return to_page_response(request, page, headers=get_revision_headers(data))
 
 
 @router.get("/{name}")
-async def read_one(db: MongoDbDep, name: str):
+async def read_one(request: Request, db: MongoDbDep, name: str):
+    """Gets the device of the given name
+
+    The response has the 'ETag' and 'Last-Modified' headers of the current revision of the device.
+    If the 'If-None-Match' or 'If-Modified-Since' headers of the request match them,
+    a '304 Not Modified' response without a body is returned after only checking the revision.
+
+    It is sent as MessagePack instead of JSON if the 'Accept' header is 'application/msgpack'.
+
+    Args:
+        request: the request object from FastAPI
+        db: the mongo db database from which to get the device
+        name: the name of the device
+    """
+    if is_conditional_request(request):
+        revision = await devices.get_device_revision(db, name=name)
+        headers = get_revision_headers([revision])
+        if is_not_modified(request, headers):
+            return to_not_modified_response(headers)
+
     record = await devices.get_one_device(db, name=name)
-    return record.model_dump(mode="json")
+    return to_negotiated_response(
+        request, record.model_dump(mode="json"), headers=get_revision_headers([record])
+    )
 
 
 @router.put("/")
@@ -15,11 +15,13 @@
 # Any modifications or derivative works of this code must retain this
 # copyright notice, and modified files need to carry a notice indicating
 # that they have been altered from the originals.
-from typing import List, Optional
+from datetime import datetime
+from typing import List, Literal, Optional
 from uuid import UUID
 
 from fastapi import APIRouter, Depends, Query
 from fastapi.requests import Request
+from fastapi.responses import JSONResponse, StreamingResponse
 
 import settings
 from api.rest.dependencies import (
@@ -28,18 +30,35 @@ from api.rest.dependencies import (
     CurrentStrictProjectDep,
     CurrentStrictProjectUserIds,
     MongoDbDep,
-    ProjectDbDep,
 )
 from services import jobs as jobs_service
-from services.external import puhuri as puhuri_service
+from services.auth.utils import TooManyListQueryParams, validate_list_query_params
+from services.jobs import cache as job_cache
+from services.jobs import events as job_events
+from services.jobs import latency as job_latency
+from services.jobs import stats as job_stats
 from services.jobs.dtos import (
     Job,
+    JobBulkCreate,
+    JobBulkUpdate,
     JobCreate,
     JobQuery,
+    JobStatsInterval,
+    JobStatusBatchRequest,
     JobStatusResponse,
     JobUpdate,
 )
-from utils.api import PaginatedListResponse, get_bearer_token
+from utils.api import (
+    PaginatedListResponse,
+    compute_etag,
+    get_bearer_token,
+    is_msgpack_requested,
+    is_ndjson_requested,
+    to_etag_response,
+    to_ndjson_response,
+    to_negotiated_response,
+    to_page_response,
+)
 from utils.exc import UnknownBccError
 
 router = APIRouter(prefix="/jobs", tags=["jobs"])
@@ -47,16 +66,26 @@ router = APIRouter(prefix="/jobs", tags=["jobs"])
 
 @router.get("/")
 async def get_many(
+    request: Request,
     db: MongoDbDep,
     project: CurrentLaxProjectDep,
     query: JobQuery = Depends(),
     skip: int = 0,
     limit: Optional[int] = None,
     sort: List[str] = Query(("-created_at",)),
+    cursor: Optional[str] = None,
+    fields: List[str] = Query(()),
+    exclude: List[str] = Query(()),
+    include_archived: bool = False,
 ):
     """Gets a paginated list of jobs that fulfill a given set of filters
 
+    If the 'Accept' header is 'application/x-ndjson', the jobs are streamed as newline-delimited JSON,
+    one per line, without the pagination envelope. 'cursor' is ignored in that case.
+    If it is 'application/msgpack', the page is sent as MessagePack instead of JSON.
+
     Args:
+        request: the request object from FastAPI
         db: the mongo db database from which to get the job
         project: the current project that the associated API token is associated with
         query: the query params for getting the jobs
@@ -64,30 +93,347 @@ async def get_many(
         limit: the maximum number of records to return
         sort: the fields to sort by, prefixing any with a '-' means descending; default = ("-created_at",)
             To add multiple fields to sort by, repeat the same query parameter in the url e.g. "query=tom&q=dick&q=harry"
+        cursor: the 'next_cursor' of the previous page when using cursor-based pagination.
+            An empty value e.g. "?cursor=" returns the first page. 'skip' is ignored if cursor is passed.
+        fields: the only fields of each job to return e.g. "fields=status&fields=created_at"; default = all fields
+        exclude: the fields of each job to leave out e.g. "exclude=result.memory".
+            It cannot be used together with 'fields'
+        include_archived: whether to also return the finished jobs that were moved to the archive; default = False
     """
     filters = query.model_dump()
+    validate_list_query_params(filters)
+    projection = dict(fields=tuple(fields), exclude=tuple(exclude))
+    # leave out the fields that were not fetched, instead of returning their defaults
+    is_projected = len(fields) + len(exclude) > 0
+    if is_ndjson_requested(request):
+        records = jobs_service.iter_latest_many(
+            db,
+            filters=filters,
+            limit=limit,
+            sort=sort,
+            skip=skip,
+            batch_size=settings.CONFIG.database.stream_batch_size,
+            include_archived=include_archived,
+            **projection,
+        )
+        return to_ndjson_response(records, exclude_unset=is_projected)
+
+    if cursor is not None:
+        data, next_cursor = await jobs_service.get_latest_page(
+            db,
+            cursor=cursor,
+            filters=filters,
+            limit=limit,
+            sort=sort,
+            include_archived=include_archived,
+            **projection,
+        )
+        page = PaginatedListResponse(
+            limit=limit, data=data, cursor=cursor, next_cursor=next_cursor
+        )
+        return to_page_response(request, page, exclude_unset=is_projected)
+
     data = await jobs_service.get_latest_many(
         db,
         filters=filters,
         limit=limit,
         sort=sort,
         skip=skip,
+        include_archived=include_archived,
+        **projection,
+    )
+    page = PaginatedListResponse(skip=skip, limit=limit, data=data)
+    return to_page_response(request, page, exclude_unset=is_projected)
+
+
+@router.post("/status:batch")
+async def get_many_statuses(
+    db: MongoDbDep, project: CurrentLaxProjectDep, payload: JobStatusBatchRequest
+):
+    """Gets the statuses of many jobs at once, in a single database query
+
+    Args:
+        db: the mongo database to get the job data from
+        project: the project associated to the API token that is passed during requests
+        payload: the body containing the 'job_ids' of the jobs
+
+    Returns:
+        a map of job_id to status e.g. {"<job_id>": "pending"}. Unknown job ids are left out.
+
+    Raises:
+        TooManyListQueryParams: too many items passed to query job_ids; expected {expected}, got {got}
+    """
+    max_size = settings.CONFIG.jobs.max_status_batch_size
+    if len(payload.job_ids) > max_size:
+        raise TooManyListQueryParams(
+            "job_ids", expected=max_size, got=len(payload.job_ids)
+        )
+
+    statuses = await jobs_service.get_statuses(db, job_ids=payload.job_ids)
+    return JSONResponse(statuses)
+
+
+@router.get("/stats")
+async def get_stats(
+    db: MongoDbDep,
+    project: CurrentLaxProjectDep,
+    interval: JobStatsInterval = JobStatsInterval.DAY,
+    group_by: List[Literal["device", "project_id"]] = Query(("device", "project_id")),
+    device: Optional[str] = None,
+    project_id: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+):
+    """Gets the number of jobs per status and their total QPU seconds per time bucket
+
+    The statistics are read from rollups that are kept up to date as jobs are created and updated,
+    so the time taken does not depend on the number of jobs.
+
+    Args:
+        db: the mongo database to get the statistics from
+        project: the project associated to the API token that is passed during requests
+        interval: the length of the time buckets i.e. 'day', 'month' or 'year'; default = 'day'
+        group_by: the fields to group the statistics by, out of 'device' and 'project_id';
+            default = both. Repeat the query parameter for many fields e.g. "group_by=device&group_by=project_id"
+        device: the only device to get the statistics for
+        project_id: the only project to get the statistics for
+        since: the earliest day (inclusive) on which the jobs were created e.g. '2024-05-01'
+        until: the latest day (inclusive) on which the jobs were created e.g. '2024-05-31'
+
+    Returns:
+        the paginated list of statistics, sorted by period
+    """
+    data = await job_stats.get_stats(
+        db,
+        interval=interval,
+        group_by=group_by,
+        filters={"device": device, "project_id": project_id},
+        since=since,
+        until=until,
     )
-    return PaginatedListResponse(skip=skip, limit=limit, data=data).model_dump(
-        mode="json"
+    return PaginatedListResponse(data=data).model_dump(mode="json")
+
+
+@router.get("/stats/latency")
+async def get_latency_stats(
+    db: MongoDbDep,
+    project: CurrentLaxProjectDep,
+    device: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+):
+    """Gets the p50, p90 and p99 of the queue wait, execution and end-to-end latencies of jobs per device
+
+    The results are cached for `latency_cache_ttl_secs` in the `[jobs]` section of the config.
+
+    Args:
+        db: the mongo database to get the jobs from
+        project: the project associated to the API token that is passed during requests
+        device: the only device to get the latencies for; default = all devices
+        since: the earliest timestamp (inclusive) of creation of the jobs e.g. '2024-05-01T00:00:00.000Z'
+        until: the latest timestamp (exclusive) of creation of the jobs
+
+    Returns:
+        the paginated list of latency percentiles in seconds, one item per device
+    """
+    data = await job_latency.get_latency_stats(
+        db,
+        device=device,
+        since=since,
+        until=until,
+        ttl_secs=settings.CONFIG.jobs.latency_cache_ttl_secs,
+        batch_size=settings.CONFIG.database.stream_batch_size,
     )
+    return PaginatedListResponse(data=data).model_dump(mode="json")
 
 
 @router.get("/{job_id}")
-async def get_one(db: MongoDbDep, project: CurrentLaxProjectDep, job_id: UUID):
+async def get_one(
+    db: MongoDbDep,
+    project: CurrentLaxProjectDep,
+    request: Request,
+    job_id: UUID,
+    fields: List[str] = Query(()),
+    exclude: List[str] = Query(()),
+):
     """Gets the job of the given job_id
 
+    The full JSON responses of finished jobs are cached in memory.
+    If the 'Accept' header is 'application/msgpack', the job is sent as MessagePack instead of JSON.
+    The response has a strong 'ETag' header; if it matches the 'If-None-Match' header
+    of the request, a '304 Not Modified' response without a body is returned instead.
+
     Args:
         db: the mongo db database from which to get the job
         project: the current project that the associated API token is associated with
+        request: the request object from FastAPI
         job_id: the job_id of the job
+        fields: the only fields of the job to return e.g. "fields=status&fields=created_at"; default = all fields
+        exclude: the fields of the job to leave out e.g. "exclude=result.memory".
+            It cannot be used together with 'fields'
+    """
+    is_projected = len(fields) + len(exclude) > 0
+    max_cache_bytes = settings.CONFIG.jobs.response_cache_max_bytes
+    is_cacheable = (
+        not is_projected and max_cache_bytes > 0 and not is_msgpack_requested(request)
+    )
+    cached = job_cache.get(str(job_id)) if is_cacheable else None
+    if cached is not None:
+        return to_etag_response(
+            request, body=cached.body, etag=cached.etag, headers={"Vary": "Accept"}
+        )
+
+    job = await jobs_service.get_one(
+        db, job_id=job_id, fields=tuple(fields), exclude=tuple(exclude)
+    )
+    data = job.model_dump(mode="json", exclude_none=True, exclude_unset=is_projected)
+    response = to_negotiated_response(request, data)
+    body = response.body
+    etag = compute_etag(body)
+    if is_cacheable and job.status in job_events.TERMINAL_STATUSES:
+        job_cache.put(
+            str(job_id),
+            job_cache.CachedResponse(body=body, etag=etag),
+            max_bytes=max_cache_bytes,
+        )
+    return to_etag_response(
+        request,
+        body=body,
+        etag=etag,
+        media_type=response.media_type,
+        headers={"Vary": "Accept"},
+    )
+
+
+@router.get("/{job_id}/result/memory")
+async def get_result_memory(
+    db: MongoDbDep,
+    project: CurrentLaxProjectDep,
+    request: Request,
+    job_id: UUID,
+    experiment: Optional[int] = Query(None, ge=0),
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1),
+):
+    """Streams the result memory of the job of the given job_id as a JSON list of lists
+
+    This avoids loading large results, stored outside the job document, fully into memory.
+    If 'experiment' is passed, only a slice of the shots of that experiment is returned,
+    reading only those shots from the database, so that huge results can be paged through
+    using the 'next_offset' of each slice.
+
+    Args:
+        db: the mongo database to get the job data from
+        project: the project associated to the API token that is passed during requests
+        request: the request object from FastAPI
+        job_id: the ID of the job
+        experiment: the index of the experiment whose shots are to be sliced; default = None
+            meaning the whole memory is streamed
+        offset: the number of shots of the experiment to skip; default = 0
+        limit: the maximum number of shots in the slice; default = `max_result_slice_size`
+            in the `[jobs]` section of the config
+
+    Raises:
+        utils.exc.NotFoundError: no matches for '{search_filter}'.
+        utils.exc.InvalidQueryError: limit cannot be greater than {max_result_slice_size}
+    """
+    if experiment is not None:
+        memory_slice = await jobs_service.get_result_memory_slice(
+            db, job_id=job_id, experiment=experiment, offset=offset, limit=limit
+        )
+        return to_negotiated_response(request, memory_slice.model_dump(mode="json"))
+
+    stream = await jobs_service.get_result_memory_stream(db, job_id=job_id)
+    return StreamingResponse(stream, media_type="application/json")
+
+
+@router.get("/{job_id}/result/counts")
+async def get_result_counts(
+    db: MongoDbDep,
+    project: CurrentLaxProjectDep,
+    request: Request,
+    job_id: UUID,
+    clbits: List[int] = Query(()),
+):
+    """Gets the number of occurrences of each shot in the result memory of the job of the given job_id
+
+    The shots are counted on the server so that clients need not download the whole memory.
+    The counts of finished jobs are cached in memory, per set of classical bits.
+    If the 'Accept' header is 'application/msgpack', the counts are sent as MessagePack instead of JSON.
+    The response has a strong 'ETag' header; if it matches the 'If-None-Match' header
+    of the request, a '304 Not Modified' response without a body is returned instead.
+
+    Args:
+        db: the mongo database to get the job data from
+        project: the project associated to the API token that is passed during requests
+        request: the request object from FastAPI
+        job_id: the ID of the job
+        clbits: the classical bits to marginalize the shots over e.g. "clbits=0&clbits=2",
+            the i-th of them becoming bit i of the counted shots; default = all classical bits
+
+    Raises:
+        utils.exc.NotFoundError: no matches for '{search_filter}'.
+        utils.exc.InvalidQueryError: classical bit '{clbit}' is out of range
+    """
+    variant = "counts:" + ",".join(str(clbit) for clbit in clbits)
+    max_cache_bytes = settings.CONFIG.jobs.response_cache_max_bytes
+    is_cacheable = max_cache_bytes > 0 and not is_msgpack_requested(request)
+    cached = job_cache.get(str(job_id), variant=variant) if is_cacheable else None
+    if cached is not None:
+        return to_etag_response(
+            request, body=cached.body, etag=cached.etag, headers={"Vary": "Accept"}
+        )
+
+    result_counts = await jobs_service.get_result_counts(
+        db, job_id=job_id, clbits=tuple(clbits)
+    )
+    response = to_negotiated_response(request, result_counts.model_dump(mode="json"))
+    body = response.body
+    etag = compute_etag(body)
+    if is_cacheable and result_counts.status in job_events.TERMINAL_STATUSES:
+        job_cache.put(
+            str(job_id),
+            job_cache.CachedResponse(body=body, etag=etag),
+            max_bytes=max_cache_bytes,
+            variant=variant,
+        )
+    return to_etag_response(
+        request,
+        body=body,
+        etag=etag,
+        media_type=response.media_type,
+        headers={"Vary": "Accept"},
+    )
+
+
+@router.get("/{job_id}/events")
+async def get_job_events(db: MongoDbDep, project: CurrentLaxProjectDep, job_id: UUID):
+    """Streams the status changes of the job of the given job_id as server-sent events
+
+    The current status is sent first as a 'status' event. The stream is closed
+    after the job reaches a final status i.e. 'successful', 'failed' or 'cancelled'.
+    This replaces polling GET `/jobs/{job_id}/status`.
+
+    Args:
+        db: the mongo database to get the job data from
+        project: the project associated to the API token that is passed during requests
+        job_id: the ID of the job
+
+    Raises:
+        utils.exc.NotFoundError: no matches for '{search_filter}'.
     """
-    return await jobs_service.get_one(db, job_id=job_id)
+    # raise a 404 error before starting the stream if the job does not exist
+    await jobs_service.get_one(db, job_id=job_id, fields=("status",))
+    events = job_events.stream_status_events(
+        db,
+        job_id=str(job_id),
+        keepalive_secs=settings.CONFIG.jobs.events_keepalive_secs,
+    )
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.get("/{job_id}/status")
@@ -106,7 +452,8 @@ async def get_job_status(db: MongoDbDep, project: CurrentLaxProjectDep, job_id:
         utils.exc.NotFoundError: no matches for '{search_filter}'.
         ValidationError: the document does not satisfy the schema passed
     """
-    job = await jobs_service.get_one(db, job_id=job_id)
+    # only the status is read, so that the result memory is never loaded
+    job = await jobs_service.get_one(db, job_id=job_id, fields=("status",))
     return JobStatusResponse.from_job(job)
 
 
@@ -134,10 +481,81 @@ async def create_one(
     )
 
 
+@router.post(":bulk")
+async def create_many(
+    request: Request,
+    db: MongoDbDep,
+    bcc_clients_map: BccClientsMapDep,
+    project_user_id_pair: CurrentStrictProjectUserIds,
+    payload: JobBulkCreate,
+):
+    """Creates 'count' jobs in the given backend and given calibration_date in the body
+
+    This is useful for parameter sweeps, where many jobs are submitted at once.
+
+    Returns:
+        the list of jobs, each with its 'job_id' and either its 'upload_url' if it was created,
+        or the 'error' if it could not be saved
+
+    Raises:
+        TooManyListQueryParams: too many items passed to query count; expected {expected}, got {got}
+    """
+    max_size = settings.CONFIG.jobs.max_bulk_size
+    if payload.count > max_size:
+        raise TooManyListQueryParams("count", expected=max_size, got=payload.count)
+
+    app_token = get_bearer_token(
+        request, raise_if_error=settings.CONFIG.auth.is_enabled
+    )
+    try:
+        bcc_client = bcc_clients_map[payload.device]
+    except KeyError:
+        raise UnknownBccError(f"Unknown backend '{payload.device}'")
+
+    project_id, user_id = project_user_id_pair
+    job_props = payload.model_dump(exclude={"count"})
+    jobs = [
+        Job(**job_props, project_id=project_id, user_id=user_id)
+        for _ in range(payload.count)
+    ]
+    return await jobs_service.create_many_jobs(
+        db, bcc_client=bcc_client, jobs=jobs, app_token=app_token
+    )
+
+
+@router.put(":bulk")
+async def update_many(
+    db: MongoDbDep,
+    project: CurrentStrictProjectDep,
+    payload: JobBulkUpdate,
+):
+    """Updates many jobs at once, each with its own payload
+
+    This is useful for BCC to report many job transitions in one request.
+    The jobs are written in one bulk write and the QPU usage is charged in one update per project.
+
+    Returns:
+        the list of outcomes, one per update in the same order, each with its 'job_id',
+        'outcome' i.e. 'updated', 'not_found', 'conflict' or 'failed', and, for failures, a 'detail'
+
+    Raises:
+        TooManyListQueryParams: too many items passed to query updates; expected {expected}, got {got}
+    """
+    max_size = settings.CONFIG.jobs.max_bulk_size
+    if len(payload.updates) > max_size:
+        raise TooManyListQueryParams(
+            "updates", expected=max_size, got=len(payload.updates)
+        )
+
+    results = await jobs_service.complete_many_jobs(
+        db, updates=payload.updates, save_usage=settings.CONFIG.puhuri.is_enabled
+    )
+    return [item.model_dump(mode="json", exclude_none=True) for item in results]
+
+
 @router.put("/{job_id}")
 async def update_one(
     db: MongoDbDep,
-    project_db: ProjectDbDep,
     project: CurrentStrictProjectDep,
     job_id: UUID,
     payload: JobUpdate,
@@ -150,16 +568,9 @@ async def update_one(
     Returns:
         the updated job
     """
-    old_job = await jobs_service.update_job(db, job_id=job_id, payload=payload)
-
-    qpu_usage = getattr(payload.timestamps, "resource_usage", None)
-    if old_job.duration_in_secs is None and qpu_usage is not None:
-        project = await jobs_service.update_qpu_usage(
-            db, project_db=project_db, job_id=job_id, qpu_usage=qpu_usage
-        )
-
-        if settings.CONFIG.puhuri.is_enabled:
-            await puhuri_service.save_qpu_usage(
-                db, job_id=job_id, project=project, qpu_usage=qpu_usage
-            )
-    return await jobs_service.get_one(db, job_id=job_id)
+    return await jobs_service.complete_job(
+        db,
+        job_id=job_id,
+        payload=payload,
+        save_usage=settings.CONFIG.puhuri.is_enabled,
+    )
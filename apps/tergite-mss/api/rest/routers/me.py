@@ -14,12 +14,20 @@
 from typing import List, Optional
 
 from fastapi import APIRouter, Depends, Query
+from fastapi.requests import Request
 
+import settings
 from api.rest.dependencies import CurrentUserDep, CurrentUserIdDep, MongoDbDep
 from services.auth import APP_TOKEN_AUTH, APP_TOKEN_BACKEND, User, UserRead
-from services.jobs import get_latest_many
+from services.auth.utils import validate_list_query_params
+from services.jobs import get_latest_many, get_latest_page, iter_latest_many
 from services.jobs.dtos import JobQuery
-from utils.api import PaginatedListResponse
+from utils.api import (
+    PaginatedListResponse,
+    is_ndjson_requested,
+    to_ndjson_response,
+    to_page_response,
+)
 
 router = APIRouter(prefix="/me")
 
@@ -38,16 +46,26 @@ router.include_router(
 
 @router.get("/jobs/", tags=["jobs"])
 async def get_my_jobs(
+    request: Request,
     db: MongoDbDep,
     user_id: str = CurrentUserIdDep,
     query: JobQuery = Depends(),
     skip: int = 0,
     limit: Optional[int] = None,
     sort: List[str] = Query(("-created_at",)),
+    cursor: Optional[str] = None,
+    fields: List[str] = Query(()),
+    exclude: List[str] = Query(()),
+    include_archived: bool = False,
 ):
     """Gets a paginated list of jobs for the current user that fulfill a given set of filters
 
+    If the 'Accept' header is 'application/x-ndjson', the jobs are streamed as newline-delimited JSON,
+    one per line, without the pagination envelope. 'cursor' is ignored in that case.
+    If it is 'application/msgpack', the page is sent as MessagePack instead of JSON.
+
     Args:
+        request: the request object from FastAPI
         db: the mongo db database from which to get the job
         user_id: the id of the current user
         query: the query params for getting the jobs
@@ -55,13 +73,51 @@ async def get_my_jobs(
         limit: the maximum number of records to return
         sort: the fields to sort by, prefixing any with a '-' means descending; default = ("-created_at",)
             To add multiple fields to sort by, repeat the same query parameter in the url e.g. "query=tom&q=dick&q=harry
+        cursor: the 'next_cursor' of the previous page when using cursor-based pagination.
+            An empty value e.g. "?cursor=" returns the first page. 'skip' is ignored if cursor is passed.
+        fields: the only fields of each job to return e.g. "fields=status&fields=created_at"; default = all fields
+        exclude: the fields of each job to leave out e.g. "exclude=result.memory".
+            It cannot be used together with 'fields'
+        include_archived: whether to also return the finished jobs that were moved to the archive; default = False
 
     Returns:
         Paginated list of jobs
     """
     filters = query.model_dump()
+    validate_list_query_params(filters)
     # ensure that only jobs for the current user are considered
     filters["user_id"] = user_id
+    projection = dict(fields=tuple(fields), exclude=tuple(exclude))
+    # leave out the fields that were not fetched, instead of returning their defaults
+    is_projected = len(fields) + len(exclude) > 0
+
+    if is_ndjson_requested(request):
+        records = iter_latest_many(
+            db,
+            filters=filters,
+            limit=limit,
+            sort=sort,
+            skip=skip,
+            batch_size=settings.CONFIG.database.stream_batch_size,
+            include_archived=include_archived,
+            **projection,
+        )
+        return to_ndjson_response(records, exclude_unset=is_projected)
+
+    if cursor is not None:
+        data, next_cursor = await get_latest_page(
+            db,
+            cursor=cursor,
+            filters=filters,
+            limit=limit,
+            sort=sort,
+            include_archived=include_archived,
+            **projection,
+        )
+        page = PaginatedListResponse(
+            limit=limit, data=data, cursor=cursor, next_cursor=next_cursor
+        )
+        return to_page_response(request, page, exclude_unset=is_projected)
 
     data = await get_latest_many(
         db,
@@ -69,10 +125,11 @@ async def get_my_jobs(
         limit=limit,
         sort=sort,
         skip=skip,
+        include_archived=include_archived,
+        **projection,
     )
-    return PaginatedListResponse(skip=skip, limit=limit, data=data).model_dump(
-        mode="json"
-    )
+    page = PaginatedListResponse(skip=skip, limit=limit, data=data)
+    return to_page_response(request, page, exclude_unset=is_projected)
 
 
 @router.get("", tags=["users"], response_model=UserRead)
@@ -11,9 +11,13 @@
 # that they have been altered from the originals.
 
 """Some utility functions for the routers"""
+from typing import Optional, Sequence
+
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.datastructures import Headers, MutableHeaders
-from starlette.types import Message, Send
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from utils import compression
 
 
 class TergiteCORSMiddleware(CORSMiddleware):
@@ -41,3 +45,74 @@ class TergiteCORSMiddleware(CORSMiddleware):
             self.allow_explicit_origin(headers, origin)
 
         await send(message)
+
+
+class CompressionMiddleware:
+    """Middleware that compresses the response bodies with the best content coding the client accepts
+
+    Only complete bodies of at least `min_bytes` bytes are compressed; streamed responses
+    e.g. newline-delimited JSON or server-sent events, and already encoded ones are sent as they are.
+    If the client accepts any of the content codings, strong ETags are made weak, even on
+    '304 Not Modified' responses, as the bytes sent may not be the ones the ETag was computed for.
+    Weak ETags still match in 'If-None-Match'.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        encodings: Sequence[str] = ("zstd", "br", "gzip"),
+        min_bytes: int = 1024,
+    ) -> None:
+        self.app = app
+        self.encodings = encodings
+        self.min_bytes = min_bytes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = compression.select_encoding(
+            Headers(scope=scope).get("accept-encoding"), preferred=self.encodings
+        )
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message: Optional[Message] = None
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+
+            if start_message is None:
+                # the start message was already sent, along with the first body
+                await send(message)
+                return
+
+            headers = MutableHeaders(scope=start_message)
+            body = message.get("body", b"")
+            is_compressible = (
+                message["type"] == "http.response.body"
+                and not message.get("more_body", False)
+                and len(body) >= self.min_bytes
+                and "content-encoding" not in headers
+                and not headers.get("content-type", "").startswith("text/event-stream")
+            )
+            if is_compressible:
+                body = compression.compress(body, encoding=encoding)
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(body))
+                message = {**message, "body": body}
+
+            etag = headers.get("etag")
+            if etag is not None and not etag.startswith("W/"):
+                headers["ETag"] = f"W/{etag}"
+            headers.add_vary_header("Accept-Encoding")
+            await send(start_message)
+            start_message = None
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
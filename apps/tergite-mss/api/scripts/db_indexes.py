@@ -0,0 +1,75 @@
+# This code is part of Tergite
+#
+# (C) Copyright Chalmers Next Labs 2025
+#
+# This code is licensed under the Apache License, Version 2.0. You may
+# obtain a copy of this license in the LICENSE.txt file in the root directory
+# of this source tree or at http://www.apache.org/licenses/LICENSE-2.0.
+#
+# Any modifications or derivative works of this code must retain this
+# copyright notice, and modified files need to carry a notice indicating
+# that they have been altered from the originals.
+"""A script for reporting missing, redundant and unused mongodb indexes"""
+import argparse
+import asyncio
+import sys
+from typing import Optional, Sequence
+
+# the services register their indexes when imported
+import services.auth  # noqa: F401
+import services.calibration  # noqa: F401
+import services.devices  # noqa: F401
+import services.external.puhuri  # noqa: F401
+import services.jobs  # noqa: F401
+import settings
+from utils.indexes import IndexReport, get_index_report, reconcile_indexes
+from utils.mongodb import get_mongodb
+
+
+def main(args: Optional[Sequence[str]]) -> IndexReport:
+    """The main routine for reporting on the indexes in the database
+
+    Args:
+        args: the commandline arguments to parse
+
+    Returns:
+        the report of missing, redundant and unused indexes
+    """
+    parser = argparse.ArgumentParser(
+        description="report missing, redundant and unused mongodb indexes"
+    )
+
+    parser.add_argument(
+        "-c",
+        "--create-missing",
+        action="store_true",
+        help="create the registered indexes that are missing before reporting",
+    )
+    parsed_args = parser.parse_args(args)
+
+    report = asyncio.run(_run(create_missing=parsed_args.create_missing))
+    print(report.model_dump_json(indent=2))
+    return report
+
+
+async def _run(create_missing: bool = False) -> IndexReport:
+    """Generates the index report, optionally creating missing indexes first
+
+    Args:
+        create_missing: whether to create the missing registered indexes first
+
+    Returns:
+        the report of missing, redundant and unused indexes
+    """
+    db = get_mongodb(
+        url=f"{settings.CONFIG.database.url}", name=settings.CONFIG.database.name
+    )
+    if create_missing:
+        await reconcile_indexes(db)
+
+    return await get_index_report(db)
+
+
+if __name__ == "__main__":
+    # if this script is run directly
+    main(sys.argv[1:])
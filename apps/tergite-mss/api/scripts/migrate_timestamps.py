@@ -0,0 +1,161 @@
+# This code is part of Tergite
+#
+# (C) Copyright Chalmers Next Labs 2025
+#
+# This code is licensed under the Apache License, Version 2.0. You may
+# obtain a copy of this license in the LICENSE.txt file in the root directory
+# of this source tree or at http://www.apache.org/licenses/LICENSE-2.0.
+#
+# Any modifications or derivative works of this code must retain this
+# copyright notice, and modified files need to carry a notice indicating
+# that they have been altered from the originals.
+"""A script for converting the ISO string timestamps of jobs, devices and calibrations into BSON dates
+
+The documents are converted in batches, in the order of their '_id'.
+Only the timestamps that are still strings are looked up, so the script can be stopped
+and run again at any time; it carries on from where it stopped.
+"""
+import argparse
+import asyncio
+import logging
+import sys
+from typing import Dict, Optional, Sequence, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ASCENDING, UpdateOne
+
+import settings
+from utils.date_time import as_utc, to_datetime
+from utils.mongodb import get_mongodb
+
+# map of collection name to its timestamp fields
+TIMESTAMP_FIELDS: Dict[str, Tuple[str, ...]] = {
+    "jobs": ("created_at", "updated_at"),
+    "jobs_archive": ("created_at", "updated_at"),
+    "devices": ("created_at", "updated_at"),
+    "calibrations": ("last_calibrated", "updated_at"),
+    "calibrations_logs": ("last_calibrated", "updated_at"),
+}
+
+
+def main(args: Optional[Sequence[str]]) -> Dict[str, int]:
+    """The main routine for migrating the string timestamps to BSON dates
+
+    Args:
+        args: the commandline arguments to parse
+
+    Returns:
+        map of collection name to the number of documents that were converted
+    """
+    parser = argparse.ArgumentParser(
+        description="convert the string timestamps of jobs, devices and calibrations into BSON dates"
+    )
+    parser.add_argument(
+        "-c",
+        "--collection",
+        action="append",
+        choices=list(TIMESTAMP_FIELDS),
+        help="a collection to migrate; repeat for many; default = all of them",
+    )
+    parser.add_argument(
+        "-b",
+        "--batch-size",
+        type=int,
+        default=500,
+        help="the maximum number of documents converted at once",
+    )
+    parsed_args = parser.parse_args(args)
+
+    result = asyncio.run(
+        _run(
+            collections=parsed_args.collection or list(TIMESTAMP_FIELDS),
+            batch_size=parsed_args.batch_size,
+        )
+    )
+    for name, total in result.items():
+        print(f"converted the timestamps of {total} documents in '{name}'")
+    return result
+
+
+async def _run(collections: Sequence[str], batch_size: int) -> Dict[str, int]:
+    """Migrates the timestamps of the given collections
+
+    Args:
+        collections: the names of the collections to migrate
+        batch_size: the maximum number of documents converted at once
+
+    Returns:
+        map of collection name to the number of documents that were converted
+    """
+    db = get_mongodb(
+        url=f"{settings.CONFIG.database.url}", name=settings.CONFIG.database.name
+    )
+    return {
+        name: await migrate_collection(
+            db[name], fields=TIMESTAMP_FIELDS[name], batch_size=batch_size
+        )
+        for name in collections
+    }
+
+
+async def migrate_collection(
+    collection: AsyncIOMotorCollection, fields: Sequence[str], batch_size: int = 500
+) -> int:
+    """Converts the given string timestamp fields of the documents in the collection into BSON dates
+
+    Each value is only replaced if it is unchanged since it was read, so documents updated
+    by the app in the meantime are not overwritten. Strings that are not valid timestamps
+    are left as they are and logged.
+
+    Args:
+        collection: the collection to migrate
+        fields: the timestamp fields to convert
+        batch_size: the maximum number of documents converted at once
+
+    Returns:
+        the number of documents that were converted
+    """
+    filters = {"$or": [{field: {"$type": "string"}} for field in fields]}
+    projection = {field: 1 for field in fields}
+    last_id = None
+    total = 0
+
+    while True:
+        query = filters if last_id is None else {**filters, "_id": {"$gt": last_id}}
+        documents = (
+            await collection.find(query, projection)
+            .sort("_id", ASCENDING)
+            .to_list(length=batch_size)
+        )
+        if len(documents) == 0:
+            return total
+
+        operations = []
+        for document in documents:
+            _filter = {"_id": document["_id"]}
+            update = {}
+            for field in fields:
+                value = document.get(field)
+                if not isinstance(value, str):
+                    continue
+                try:
+                    update[field] = as_utc(to_datetime(value))
+                    _filter[field] = value
+                except ValueError:
+                    logging.warning(
+                        f"'{field}' of {document['_id']} in '{collection.name}' "
+                        f"is not a timestamp: '{value}'"
+                    )
+
+            if update:
+                operations.append(UpdateOne(_filter, {"$set": update}))
+
+        if operations:
+            result = await collection.bulk_write(operations, ordered=False)
+            total += result.modified_count
+        last_id = documents[-1]["_id"]
+
+
+if __name__ == "__main__":
+    # if this script is run directly
+    main(sys.argv[1:])
@@ -0,0 +1,65 @@
+# This code is part of Tergite
+#
+# (C) Copyright Chalmers Next Labs 2025
+#
+# This code is licensed under the Apache License, Version 2.0. You may
+# obtain a copy of this license in the LICENSE.txt file in the root directory
+# of this source tree or at http://www.apache.org/licenses/LICENSE-2.0.
+#
+# Any modifications or derivative works of this code must retain this
+# copyright notice, and modified files need to carry a notice indicating
+# that they have been altered from the originals.
+"""A script for recomputing the calibration metric time series from the calibrations_logs collection"""
+import argparse
+import asyncio
+import sys
+from typing import Optional, Sequence
+
+import settings
+from services import calibration as calibration_service
+from utils.mongodb import get_mongodb
+
+
+def main(args: Optional[Sequence[str]]) -> int:
+    """The main routine for rebuilding the calibration metric time series
+
+    Args:
+        args: the commandline arguments to parse
+
+    Returns:
+        the number of points after the rebuild
+    """
+    parser = argparse.ArgumentParser(
+        description="recompute the calibration metric time series from the calibrations_logs collection"
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=100,
+        help="the number of calibration snapshots read in one round trip",
+    )
+    parsed_args = parser.parse_args(args)
+
+    total = asyncio.run(_run(batch_size=parsed_args.batch_size))
+    print(f"rebuilt {total} calibration metric points")
+    return total
+
+
+async def _run(batch_size: int) -> int:
+    """Rebuilds the calibration metric time series
+
+    Args:
+        batch_size: the number of calibration snapshots read in one round trip
+
+    Returns:
+        the number of points after the rebuild
+    """
+    db = get_mongodb(
+        url=f"{settings.CONFIG.database.url}", name=settings.CONFIG.database.name
+    )
+    return await calibration_service.rebuild_metrics(db, batch_size=batch_size)
+
+
+if __name__ == "__main__":
+    # if this script is run directly
+    main(sys.argv[1:])
@@ -0,0 +1,56 @@
+# This code is part of Tergite
+#
+# (C) Copyright Chalmers Next Labs 2025
+#
+# This code is licensed under the Apache License, Version 2.0. You may
+# obtain a copy of this license in the LICENSE.txt file in the root directory
+# of this source tree or at http://www.apache.org/licenses/LICENSE-2.0.
+#
+# Any modifications or derivative works of this code must retain this
+# copyright notice, and modified files need to carry a notice indicating
+# that they have been altered from the originals.
+"""A script for recomputing the job statistics rollups from the jobs collection"""
+import argparse
+import asyncio
+import sys
+from typing import Optional, Sequence
+
+import settings
+from services.jobs import stats as job_stats
+from utils.mongodb import get_mongodb
+
+
+def main(args: Optional[Sequence[str]]) -> int:
+    """The main routine for rebuilding the job statistics
+
+    Args:
+        args: the commandline arguments to parse
+
+    Returns:
+        the number of statistics documents after the rebuild
+    """
+    parser = argparse.ArgumentParser(
+        description="recompute the job statistics rollups from the jobs collection"
+    )
+    parser.parse_args(args)
+
+    total = asyncio.run(_run())
+    print(f"rebuilt {total} job statistics documents")
+    return total
+
+
+async def _run() -> int:
+    """Rebuilds the job statistics
+
+    Returns:
+        the number of statistics documents after the rebuild
+    """
+    db = get_mongodb(
+        url=f"{settings.CONFIG.database.url}", name=settings.CONFIG.database.name
+    )
+    return await job_stats.rebuild(db)
+
+
+if __name__ == "__main__":
+    # if this script is run directly
+    main(sys.argv[1:])
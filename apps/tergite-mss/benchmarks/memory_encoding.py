@@ -0,0 +1,126 @@
+# This code is part of Tergite
+#
+# (C) Copyright Chalmers Next Labs 2025
+#
+# This code is licensed under the Apache License, Version 2.0. You may
+# obtain a copy of this license in the LICENSE.txt file in the root directory
+# of this source tree or at http://www.apache.org/licenses/LICENSE-2.0.
+#
+# Any modifications or derivative works of this code must retain this
+# copyright notice, and modified files need to carry a notice indicating
+# that they have been altered from the originals.
+"""A benchmark comparing the bit-packed measurement memory to the list of strings
+
+Run it with `python -m benchmarks.memory_encoding --shots 100000 --clbits 5`
+"""
+import argparse
+import random
+import sys
+import timeit
+from typing import Dict, List, Optional, Sequence
+
+import bson
+
+from services.jobs.dtos import PackedMemory
+
+
+def main(args: Optional[Sequence[str]]) -> Dict[str, Dict[str, float]]:
+    """The main routine for benchmarking the encodings of the measurement memory
+
+    Args:
+        args: the commandline arguments to parse
+
+    Returns:
+        map of encoding to its 'size_in_bytes', 'encode_secs' and 'decode_secs'
+    """
+    parser = argparse.ArgumentParser(
+        description="compare the bit-packed measurement memory to the list of strings"
+    )
+    parser.add_argument(
+        "--shots", type=int, default=10_000, help="shots per experiment"
+    )
+    parser.add_argument("--experiments", type=int, default=1, help="experiments")
+    parser.add_argument("--clbits", type=int, default=5, help="classical bits per shot")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per measurement")
+    parsed_args = parser.parse_args(args)
+
+    memory = _random_memory(
+        shots=parsed_args.shots,
+        experiments=parsed_args.experiments,
+        clbits=parsed_args.clbits,
+    )
+    results = _run(memory, repeat=parsed_args.repeat)
+
+    print(f"{'encoding':<10}{'size (bytes)':>15}{'encode (s)':>15}{'decode (s)':>15}")
+    for name, stats in results.items():
+        print(
+            f"{name:<10}{stats['size_in_bytes']:>15}"
+            f"{stats['encode_secs']:>15.6f}{stats['decode_secs']:>15.6f}"
+        )
+    return results
+
+
+def _run(memory: List[List[str]], repeat: int) -> Dict[str, Dict[str, float]]:
+    """Measures the BSON size and the encode/decode time of each encoding of the memory
+
+    Args:
+        memory: the measurement memory as a list of shots for each experiment
+        repeat: the number of runs per measurement, of which the fastest is reported
+
+    Returns:
+        map of encoding to its 'size_in_bytes', 'encode_secs' and 'decode_secs'
+    """
+    strings_doc = bson.encode({"memory": memory})
+    packed_doc = bson.encode(
+        {"memory_packed": PackedMemory.from_memory(memory).model_dump()}
+    )
+
+    def encode_packed():
+        return bson.encode(
+            {"memory_packed": PackedMemory.from_memory(memory).model_dump()}
+        )
+
+    def decode_packed():
+        return PackedMemory.model_validate(
+            bson.decode(packed_doc)["memory_packed"]
+        ).to_memory()
+
+    return {
+        "strings": {
+            "size_in_bytes": len(strings_doc),
+            "encode_secs": _best_of(lambda: bson.encode({"memory": memory}), repeat),
+            "decode_secs": _best_of(lambda: bson.decode(strings_doc), repeat),
+        },
+        "packed": {
+            "size_in_bytes": len(packed_doc),
+            "encode_secs": _best_of(encode_packed, repeat),
+            "decode_secs": _best_of(decode_packed, repeat),
+        },
+    }
+
+
+def _best_of(func, repeat: int) -> float:
+    """Gets the shortest time in seconds of `repeat` single runs of the given function"""
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def _random_memory(shots: int, experiments: int, clbits: int) -> List[List[str]]:
+    """Generates a random measurement memory of hex strings
+
+    Args:
+        shots: the number of shots per experiment
+        experiments: the number of experiments
+        clbits: the number of classical bits per shot
+
+    Returns:
+        the measurement memory as a list of shots for each experiment
+    """
+    return [
+        [hex(random.getrandbits(clbits)) for _ in range(shots)]
+        for _ in range(experiments)
+    ]
+
+
+if __name__ == "__main__":
+    # if this script is run directly
+    main(sys.argv[1:])
@@ -0,0 +1,132 @@
+# This code is part of Tergite
+#
+# (C) Copyright Chalmers Next Labs 2025
+#
+# This code is licensed under the Apache License, Version 2.0. You may
+# obtain a copy of this license in the LICENSE.txt file in the root directory
+# of this source tree or at http://www.apache.org/licenses/LICENSE-2.0.
+#
+# Any modifications or derivative works of this code must retain this
+# copyright notice, and modified files need to carry a notice indicating
+# that they have been altered from the originals.
+"""A benchmark comparing the serialization of a page of jobs via per-item model_dump to the TypeAdapter
+
+Run it with `python -m benchmarks.page_serialization --jobs 1000`
+"""
+import argparse
+import json
+import random
+import sys
+import timeit
+from typing import Dict, Optional, Sequence
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from services.jobs.dtos import Job
+from utils.api import PaginatedListResponse
+
+
+def main(args: Optional[Sequence[str]]) -> Dict[str, Dict[str, float]]:
+    """The main routine for benchmarking the serialization of a page of jobs
+
+    Args:
+        args: the commandline arguments to parse
+
+    Returns:
+        map of serialization path to its 'size_in_bytes' and 'serialize_secs'
+    """
+    parser = argparse.ArgumentParser(
+        description="compare the serialization of a page of jobs via model_dump to the TypeAdapter"
+    )
+    parser.add_argument("--jobs", type=int, default=1000, help="jobs in the page")
+    parser.add_argument(
+        "--shots", type=int, default=0, help="shots in the result memory of each job"
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="runs per measurement")
+    parsed_args = parser.parse_args(args)
+
+    page = _random_page(jobs=parsed_args.jobs, shots=parsed_args.shots)
+    results = _run(page, repeat=parsed_args.repeat)
+
+    print(f"{'path':<16}{'size (bytes)':>15}{'serialize (s)':>15}")
+    for name, stats in results.items():
+        print(f"{name:<16}{stats['size_in_bytes']:>15}{stats['serialize_secs']:>15.6f}")
+    return results
+
+
+def _run(page: PaginatedListResponse, repeat: int) -> Dict[str, Dict[str, float]]:
+    """Measures the size and the serialization time of the page via each path
+
+    Args:
+        page: the page of jobs to serialize
+        repeat: the number of runs per measurement, of which the fastest is reported
+
+    Returns:
+        map of serialization path to its 'size_in_bytes' and 'serialize_secs'
+
+    Raises:
+        AssertionError: the paths serialize the page into different JSON
+    """
+    paths = {
+        # returning the dict from the router, as FastAPI re-encodes it
+        "fastapi": lambda: JSONResponse(
+            jsonable_encoder(page.model_dump(mode="json"))
+        ).body,
+        "model_dump": lambda: JSONResponse(page.model_dump(mode="json")).body,
+        "type_adapter": lambda: page.dump_json_bytes(),
+    }
+
+    bodies = {name: serialize() for name, serialize in paths.items()}
+    expected = json.loads(bodies["model_dump"])
+    for name, body in bodies.items():
+        assert json.loads(body) == expected, f"{name} serializes a different page"
+
+    return {
+        name: {
+            "size_in_bytes": len(bodies[name]),
+            "serialize_secs": _best_of(serialize, repeat),
+        }
+        for name, serialize in paths.items()
+    }
+
+
+def _best_of(func, repeat: int) -> float:
+    """Gets the shortest time in seconds of `repeat` single runs of the given function"""
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def _random_page(jobs: int, shots: int) -> PaginatedListResponse:
+    """Generates a page of successful jobs with timestamps and result memories
+
+    Args:
+        jobs: the number of jobs in the page
+        shots: the number of shots in the result memory of each job
+
+    Returns:
+        the page of jobs
+    """
+    data = [
+        Job(
+            device=random.choice(["loke", "thor", "pegu"]),
+            calibration_date="2024-05-23T09:12:00.733Z",
+            project_id=f"project-{random.randrange(10)}",
+            user_id=f"user-{random.randrange(100)}",
+            status="successful",
+            download_url="http://127.0.0.1:8002/logfiles/job.hdf5",
+            timestamps={
+                "execution": {
+                    "started": "2024-05-23T09:12:00.733Z",
+                    "finished": "2024-05-23T09:12:03.733Z",
+                }
+            },
+            result={"memory": [[hex(random.getrandbits(5)) for _ in range(shots)]]},
+        )
+        for _ in range(jobs)
+    ]
+    return PaginatedListResponse(limit=jobs, data=data)
+
+
+if __name__ == "__main__":
+    # if this script is run directly
+    main(sys.argv[1:])
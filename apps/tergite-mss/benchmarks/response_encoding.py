@@ -0,0 +1,222 @@
+# This code is part of Tergite
+#
+# (C) Copyright Chalmers Next Labs 2025
+#
+# This code is licensed under the Apache License, Version 2.0. You may
+# obtain a copy of this license in the LICENSE.txt file in the root directory
+# of this source tree or at http://www.apache.org/licenses/LICENSE-2.0.
+#
+# Any modifications or derivative works of this code must retain this
+# copyright notice, and modified files need to carry a notice indicating
+# that they have been altered from the originals.
+"""A benchmark comparing the bytes on the wire and the CPU time of the response encodings
+
+Each payload is serialized as JSON and, if msgpack is installed, as MessagePack,
+and then compressed with each of the available content codings.
+
+Run it with `python -m benchmarks.response_encoding --shots 10000 --qubits 20 --page-size 100`
+"""
+import argparse
+import random
+import sys
+import timeit
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from fastapi.responses import JSONResponse
+
+from services.calibration.dtos import DeviceCalibration
+from services.jobs.dtos import Job
+from utils import compression
+from utils.api import MsgpackResponse, PaginatedListResponse, msgpack
+
+_IDENTITY = "identity"
+
+
+def main(args: Optional[Sequence[str]]) -> Dict[str, Dict[str, Dict[str, float]]]:
+    """The main routine for benchmarking the encodings of the responses
+
+    Args:
+        args: the commandline arguments to parse
+
+    Returns:
+        map of payload to map of '{media type}+{content coding}' to its
+        'size_in_bytes', 'serialize_secs' and 'compress_secs'
+    """
+    parser = argparse.ArgumentParser(
+        description="compare the bytes on the wire and the CPU time of the response encodings"
+    )
+    parser.add_argument(
+        "--shots", type=int, default=10_000, help="shots of the job with memory"
+    )
+    parser.add_argument("--clbits", type=int, default=5, help="classical bits per shot")
+    parser.add_argument("--qubits", type=int, default=20, help="qubits calibrated")
+    parser.add_argument(
+        "--page-size", type=int, default=100, help="jobs in the page of jobs"
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="runs per measurement")
+    parsed_args = parser.parse_args(args)
+
+    payloads = {
+        "job": _random_job(shots=parsed_args.shots, clbits=parsed_args.clbits),
+        "calibration": _random_calibration(qubits=parsed_args.qubits),
+        "jobs_page": _random_jobs_page(size=parsed_args.page_size),
+    }
+    results = {
+        name: _run(content, repeat=parsed_args.repeat)
+        for name, content in payloads.items()
+    }
+
+    print(
+        f"{'payload':<14}{'encoding':<18}{'size (bytes)':>15}"
+        f"{'serialize (s)':>15}{'compress (s)':>15}"
+    )
+    for name, encodings in results.items():
+        for encoding, stats in encodings.items():
+            print(
+                f"{name:<14}{encoding:<18}{stats['size_in_bytes']:>15}"
+                f"{stats['serialize_secs']:>15.6f}{stats['compress_secs']:>15.6f}"
+            )
+    return results
+
+
+def _run(content: Any, repeat: int) -> Dict[str, Dict[str, float]]:
+    """Measures the size and the serialize/compress time of each encoding of the content
+
+    Args:
+        content: the JSON-compatible content of the response
+        repeat: the number of runs per measurement, of which the fastest is reported
+
+    Returns:
+        map of '{media type}+{content coding}' to its 'size_in_bytes', 'serialize_secs' and 'compress_secs'
+    """
+    serializers: Dict[str, Callable[[], bytes]] = {
+        "json": lambda: JSONResponse(content).body
+    }
+    if msgpack is not None:
+        serializers["msgpack"] = lambda: MsgpackResponse(content).body
+
+    results = {}
+    for media_type, serialize in serializers.items():
+        body = serialize()
+        serialize_secs = _best_of(serialize, repeat)
+        results[f"{media_type}+{_IDENTITY}"] = {
+            "size_in_bytes": len(body),
+            "serialize_secs": serialize_secs,
+            "compress_secs": 0.0,
+        }
+
+        for encoding in compression.COMPRESSORS:
+            results[f"{media_type}+{encoding}"] = {
+                "size_in_bytes": len(compression.compress(body, encoding=encoding)),
+                "serialize_secs": serialize_secs,
+                "compress_secs": _best_of(
+                    lambda: compression.compress(body, encoding=encoding), repeat
+                ),
+            }
+
+    return results
+
+
+def _best_of(func, repeat: int) -> float:
+    """Gets the shortest time in seconds of `repeat` single runs of the given function"""
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def _random_job(shots: int, clbits: int) -> Dict[str, Any]:
+    """Generates the response content of a successful job with a measurement memory of hex strings
+
+    Args:
+        shots: the number of shots
+        clbits: the number of classical bits per shot
+
+    Returns:
+        the job as it is sent in the response
+    """
+    memory = [[hex(random.getrandbits(clbits)) for _ in range(shots)]]
+    job = Job(
+        device="loke",
+        calibration_date="2024-05-23T09:12:00.733Z",
+        project_id="benchmark",
+        user_id="benchmark",
+        status="successful",
+        download_url="http://127.0.0.1:8002/logfiles/job.hdf5",
+        result={"memory": memory},
+    )
+    return job.model_dump(mode="json", exclude_none=True)
+
+
+def _random_calibration(qubits: int) -> Dict[str, Any]:
+    """Generates the response content of the calibration results of a device
+
+    Args:
+        qubits: the number of qubits, each with a resonator
+
+    Returns:
+        the calibration results as they are sent in the response
+    """
+    date = datetime.now(timezone.utc).isoformat()
+
+    def _value(unit: str, value: Any) -> Dict[str, Any]:
+        return {"unit": unit, "value": value, "date": date}
+
+    calibration = DeviceCalibration(
+        _id="66a0e2d9e9b4c2a1f0d3b2a1",
+        name="loke",
+        version="2024.04.1",
+        qubits=[
+            {
+                "id": idx,
+                "t1_decoherence": _value("us", random.uniform(50, 350)),
+                "t2_decoherence": _value("us", random.uniform(50, 350)),
+                "frequency": _value("GHz", random.uniform(4, 6)),
+                "anharmonicity": _value("GHz", random.uniform(-0.35, -0.25)),
+                "readout_assignment_error": _value("", random.uniform(0, 0.05)),
+                "pi_pulse_amplitude": _value("", random.uniform(0, 0.1)),
+                "pi_pulse_duration": _value("ns", 56),
+                "pulse_type": _value("", "Gaussian"),
+                "pulse_sigma": _value("ns", 7),
+            }
+            for idx in range(qubits)
+        ],
+        resonators=[
+            {
+                "id": idx,
+                "acq_delay": _value("ns", 200),
+                "acq_integration_time": _value("us", 1),
+                "frequency": _value("GHz", random.uniform(6, 7)),
+                "pulse_amplitude": _value("", random.uniform(0, 0.1)),
+                "pulse_delay": _value("ns", 0),
+                "pulse_duration": _value("us", 3),
+                "pulse_type": _value("", "Square"),
+            }
+            for idx in range(qubits)
+        ],
+    )
+    return calibration.model_dump(mode="json")
+
+
+def _random_jobs_page(size: int) -> Dict[str, Any]:
+    """Generates the response content of a page of pending jobs, without results
+
+    Args:
+        size: the number of jobs in the page
+
+    Returns:
+        the page of jobs as it is sent in the response
+    """
+    data: List[Job] = [
+        Job(
+            device=random.choice(["loke", "thor", "pegu"]),
+            calibration_date="2024-05-23T09:12:00.733Z",
+            project_id=f"project-{random.randrange(10)}",
+            user_id=f"user-{random.randrange(100)}",
+        )
+        for _ in range(size)
+    ]
+    return PaginatedListResponse(limit=size, data=data).model_dump(mode="json")
+
+
+if __name__ == "__main__":
+    # if this script is run directly
+    main(sys.argv[1:])
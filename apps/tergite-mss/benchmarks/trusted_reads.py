@@ -0,0 +1,197 @@
+# This code is part of Tergite
+#
+# (C) Copyright Chalmers Next Labs 2025
+#
+# This code is licensed under the Apache License, Version 2.0. You may
+# obtain a copy of this license in the LICENSE.txt file in the root directory
+# of this source tree or at http://www.apache.org/licenses/LICENSE-2.0.
+#
+# Any modifications or derivative works of this code must retain this
+# copyright notice, and modified files need to carry a notice indicating
+# that they have been altered from the originals.
+"""A benchmark comparing the CPU time of parsing pages of database records with and without trusted reads
+
+Run it with `python -m benchmarks.trusted_reads --jobs 100 --shots 1000`
+"""
+import argparse
+import random
+import sys
+import timeit
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Type
+
+from bson import ObjectId
+from pydantic import BaseModel
+
+from services.calibration.dtos import DeviceCalibration
+from services.jobs.dtos import Job
+from utils.models import parse_record, parse_trusted_record
+
+
+def main(args: Optional[Sequence[str]]) -> Dict[str, Dict[str, float]]:
+    """The main routine for benchmarking the trusted reads
+
+    Args:
+        args: the commandline arguments to parse
+
+    Returns:
+        map of page to its 'validated_secs' and 'trusted_secs'
+    """
+    parser = argparse.ArgumentParser(
+        description="compare parsing pages of records with and without trusted reads"
+    )
+    parser.add_argument("--jobs", type=int, default=100, help="jobs per page")
+    parser.add_argument(
+        "--shots", type=int, default=1000, help="shots in the memory of each job"
+    )
+    parser.add_argument(
+        "--calibrations", type=int, default=20, help="calibrations per page"
+    )
+    parser.add_argument("--qubits", type=int, default=20, help="qubits calibrated")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per measurement")
+    parsed_args = parser.parse_args(args)
+
+    pages = {
+        "jobs": (Job, _random_jobs(parsed_args.jobs, shots=parsed_args.shots)),
+        "jobs_no_memory": (Job, _random_jobs(parsed_args.jobs, shots=0)),
+        "calibrations": (
+            DeviceCalibration,
+            _random_calibrations(parsed_args.calibrations, qubits=parsed_args.qubits),
+        ),
+    }
+    results = {
+        name: _run(schema, records, repeat=parsed_args.repeat)
+        for name, (schema, records) in pages.items()
+    }
+
+    print(f"{'page':<16}{'validated (s)':>15}{'trusted (s)':>15}")
+    for name, stats in results.items():
+        print(
+            f"{name:<16}{stats['validated_secs']:>15.6f}{stats['trusted_secs']:>15.6f}"
+        )
+    return results
+
+
+def _run(
+    schema: Type[BaseModel], records: List[Dict[str, Any]], repeat: int
+) -> Dict[str, float]:
+    """Measures the time to parse the page of records with full validation and as trusted records
+
+    Args:
+        schema: the schema of the records
+        records: the raw records, as got from the database
+        repeat: the number of runs per measurement, of which the fastest is reported
+
+    Returns:
+        map of 'validated_secs' and 'trusted_secs' to the time taken to parse the page
+
+    Raises:
+        AssertionError: the trusted records are different from the validated ones
+    """
+    validated = [parse_record(schema, item) for item in records]
+    trusted = [parse_trusted_record(schema, item) for item in records]
+    assert validated == trusted, "trusted records are different from validated ones"
+
+    return {
+        "validated_secs": _best_of(
+            lambda: [parse_record(schema, item) for item in records], repeat
+        ),
+        "trusted_secs": _best_of(
+            lambda: [parse_trusted_record(schema, item) for item in records], repeat
+        ),
+    }
+
+
+def _best_of(func, repeat: int) -> float:
+    """Gets the shortest time in seconds of `repeat` single runs of the given function"""
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def _random_jobs(size: int, shots: int) -> List[Dict[str, Any]]:
+    """Generates the raw records of successful jobs with measurement memories of hex strings
+
+    Args:
+        size: the number of jobs
+        shots: the number of shots in the memory of each job; 0 means no result
+
+    Returns:
+        the raw job records
+    """
+    now = datetime.now(timezone.utc)
+    return [
+        {
+            "_id": ObjectId(),
+            "job_id": f"{idx}",
+            "device": random.choice(["loke", "thor", "pegu"]),
+            "calibration_date": "2024-05-23T09:12:00.733Z",
+            "project_id": f"project-{random.randrange(10)}",
+            "user_id": f"user-{random.randrange(100)}",
+            "status": "successful",
+            "download_url": "http://127.0.0.1:8002/logfiles/job.hdf5",
+            "created_at": now,
+            "updated_at": now,
+            **(
+                {
+                    "result": {
+                        "memory": [[hex(random.getrandbits(5)) for _ in range(shots)]]
+                    }
+                }
+                if shots
+                else {}
+            ),
+        }
+        for idx in range(size)
+    ]
+
+
+def _random_calibrations(size: int, qubits: int) -> List[Dict[str, Any]]:
+    """Generates the raw records of the calibration results of devices
+
+    Args:
+        size: the number of calibration results
+        qubits: the number of qubits of each, each with a resonator
+
+    Returns:
+        the raw calibration records
+    """
+    now = datetime.now(timezone.utc)
+
+    def _value(unit: str, value: Any) -> Dict[str, Any]:
+        return {"unit": unit, "value": value, "date": "2024-07-08T06:42:01.000Z"}
+
+    return [
+        {
+            "_id": ObjectId(),
+            "name": f"device-{idx}",
+            "version": "2024.04.1",
+            "last_calibrated": now,
+            "updated_at": now,
+            "qubits": [
+                {
+                    "id": qubit,
+                    "t1_decoherence": _value("us", random.uniform(50, 350)),
+                    "frequency": _value("GHz", random.uniform(4, 6)),
+                    "anharmonicity": _value("GHz", random.uniform(-0.35, -0.25)),
+                    "readout_assignment_error": _value("", random.uniform(0, 0.05)),
+                    "pi_pulse_amplitude": _value("", random.uniform(0, 0.1)),
+                    "pulse_type": _value("", "Gaussian"),
+                }
+                for qubit in range(qubits)
+            ],
+            "resonators": [
+                {
+                    "id": qubit,
+                    "frequency": _value("GHz", random.uniform(6, 7)),
+                    "pulse_amplitude": _value("", random.uniform(0, 0.1)),
+                    "pulse_type": _value("", "Square"),
+                }
+                for qubit in range(qubits)
+            ],
+        }
+        for idx in range(size)
+    ]
+
+
+if __name__ == "__main__":
+    # if this script is run directly
+    main(sys.argv[1:])
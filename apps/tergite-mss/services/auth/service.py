@@ -21,6 +21,7 @@ from fastapi_users.authentication import AuthenticationBackend
 
 import settings
 from utils.config import Oauth2ClientConfig, UserRole
+from utils.indexes import register_document_indexes
 
 from . import app_tokens, projects, user_requests, users
 from .utils import get_oauth2_client
@@ -68,18 +69,19 @@ GET_CURRENT_SYSTEM_USER_PROJECT = APP_TOKEN_AUTH.current_project(
 )
 
 
+_DOCUMENT_MODELS = [
+    users.dtos.User,
+    app_tokens.dtos.AppToken,
+    projects.dtos.Project,
+    projects.dtos.DeletedProject,
+    user_requests.dtos.UserRequest,
+]
+register_document_indexes(*_DOCUMENT_MODELS)
+
+
 async def on_startup(db: motor.motor_asyncio.AsyncIOMotorDatabase):
     """Runs init operations when the application is starting up"""
-    await init_beanie(
-        database=db,
-        document_models=[
-            users.dtos.User,
-            app_tokens.dtos.AppToken,
-            projects.dtos.Project,
-            projects.dtos.DeletedProject,
-            user_requests.dtos.UserRequest,
-        ],
-    )
+    await init_beanie(database=db, document_models=_DOCUMENT_MODELS)
 
 
 def register_oauth2_client(
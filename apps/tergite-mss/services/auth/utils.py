@@ -11,7 +11,7 @@
 # that they have been altered from the originals.
 
 """Common utility functions for the auth service"""
-from typing import Any, Dict, Optional, Type
+from typing import Any, Dict, Mapping, Optional, Type
 
 from fastapi import HTTPException, status
 from httpx_oauth.clients.github import GitHubOAuth2
@@ -57,6 +57,22 @@ class TooManyListQueryParams(HTTPException):
         )
 
 
+def validate_list_query_params(params: Mapping[str, Any]):
+    """Checks that none of the list query params has more than MAX_LIST_QUERY_LEN items
+
+    Args:
+        params: map of query param to its value
+
+    Raises:
+        TooManyListQueryParams: too many items passed to query {query_param}; expected {expected}, got {got}
+    """
+    for key, value in params.items():
+        if isinstance(value, list) and len(value) > MAX_LIST_QUERY_LEN:
+            raise TooManyListQueryParams(
+                key, expected=MAX_LIST_QUERY_LEN, got=len(value)
+            )
+
+
 def get_oauth2_client(conf: Oauth2ClientConfig):
     """Gets the Oauth2 client from this configuration"""
     client_constructor = _OAUTH2_CLIENT_CLASS_MAP[conf.client_type]
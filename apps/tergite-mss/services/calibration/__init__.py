@@ -16,33 +16,48 @@
 #
 # Refactored by Martin Ahindura on 2023-11-08
 """Service that handles calibration functionality"""
-from typing import Any, Dict, List, Optional, Tuple
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
 
 import pymongo
-from motor.motor_asyncio import AsyncIOMotorCollection, AsyncIOMotorDatabase
-from pymongo import ReturnDocument
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import IndexModel, ReturnDocument
 
 from utils import mongodb as mongodb_utils
+from utils.indexes import reconcile_indexes, register_indexes
+from utils.models import parse_record, validate_field_paths
 
-from .dtos import DeviceCalibration, DeviceCalibrationCreate
+from . import history, metrics
+from .dtos import (
+    CalibrationHistoryAggregate,
+    CalibrationHistoryInterval,
+    DeviceCalibration,
+    DeviceCalibrationCreate,
+    DeviceCalibrationSnapshot,
+)
 
 _LOGS_COLLECTION = "calibrations_logs"
 _MAIN_COLLECTION = "calibrations"
+_REVISION_FIELDS = (mongodb_utils.REVISION_FIELD, "updated_at")
 
-
-async def on_startup(db: AsyncIOMotorDatabase):
-    """Initializes the collections for the calibrations service
-
-    Args:
-        db: the mongodb database instance
-    """
-    calibrations: AsyncIOMotorCollection = db[_MAIN_COLLECTION]
-    calibrations_log: AsyncIOMotorCollection = db[_LOGS_COLLECTION]
-
-    await calibrations.create_index([("name", pymongo.ASCENDING)])
-    await calibrations_log.create_index(
-        [("name", pymongo.ASCENDING), ("last_calibrated", pymongo.DESCENDING)]
-    )
+register_indexes(
+    _MAIN_COLLECTION,
+    [
+        IndexModel([("name", pymongo.ASCENDING)]),
+        # paged queries sort by "_id" after the given fields, as a tie-breaker
+        IndexModel(
+            [("last_calibrated", pymongo.DESCENDING), ("_id", pymongo.DESCENDING)]
+        ),
+    ],
+)
+register_indexes(
+    _LOGS_COLLECTION,
+    [
+        IndexModel(
+            [("name", pymongo.ASCENDING), ("last_calibrated", pymongo.DESCENDING)]
+        )
+    ],
+)
 
 
 async def insert_one(
@@ -50,6 +65,10 @@ async def insert_one(
 ) -> DeviceCalibration:
     """Inserts into the database a new calibration result set
 
+    The revision of the current calibration of the device is incremented.
+    The calibration values of a new snapshot are also saved as points of the
+    per-component metric time series.
+
     Args:
         db: the mongo database
         record: the data to be inserted
@@ -61,11 +80,14 @@ async def insert_one(
 
     # Save historical calibrations
     # We use insert_one_if_not_exists to ensure idempotency
-    await mongodb_utils.insert_one_if_not_exists(
+    log = await mongodb_utils.insert_one_if_not_exists(
         collection=db[_LOGS_COLLECTION],
         document={**document},
         unique_fields=("name", "last_calibrated"),
     )
+    # the metrics of a snapshot are saved only once, together with the snapshot
+    if log is not None:
+        await metrics.insert_points(db, record)
 
     # Save current calibration
     record = await mongodb_utils.update_one(
@@ -74,6 +96,7 @@ async def insert_one(
         payload=document,
         return_document=ReturnDocument.AFTER,
         upsert=True,
+        increments={mongodb_utils.REVISION_FIELD: 1},
     )
 
     return DeviceCalibration.model_validate(record)
@@ -108,6 +131,98 @@ async def get_latest_many(
     )
 
 
+def iter_latest_many(
+    db: AsyncIOMotorDatabase,
+    filters: Optional[Dict[str, Any]] = None,
+    limit: Optional[int] = None,
+    skip: int = 0,
+    sort: List[str] = (),
+    batch_size: int = 0,
+) -> AsyncIterator[DeviceCalibration]:
+    """Iterates over the current calibration results, without loading them all into memory
+
+    Args:
+        db: the mongo database
+        filters: the mongodb-like filters to use to extract the calibrations
+        limit: the number of results to return: default = None meaning all of them
+        skip: the number of records to skip; default = 0
+        sort: the fields to sort by, prefixing any with a '-' means descending; default = ()
+        batch_size: the maximum number of results got from the database in one round trip;
+            default = 0 meaning the database's default
+
+    Returns:
+        an async iterator of the calibration results
+    """
+    return mongodb_utils.iter_many(
+        db[_MAIN_COLLECTION],
+        filters=filters,
+        limit=limit,
+        skip=skip,
+        sort=sort,
+        schema=DeviceCalibration,
+        batch_size=batch_size,
+    )
+
+
+async def get_latest_page(
+    db: AsyncIOMotorDatabase,
+    cursor: str = "",
+    filters: Optional[Dict[str, Any]] = None,
+    limit: Optional[int] = None,
+    sort: List[str] = (),
+) -> Tuple[List[DeviceCalibration], Optional[str]]:
+    """Gets the page of current calibration results that come after the given cursor
+
+    Args:
+        db: the mongo database
+        cursor: the cursor got from the previous page; default = "" meaning the first page
+        filters: the mongodb-like filters to use to extract the calibrations
+        limit: the number of results to return: default = None meaning all of them
+        sort: the fields to sort by, prefixing any with a '-' means descending; default = ()
+
+    Returns:
+        tuple of the list of calibration results and the cursor for the next page or None if there are no more pages
+    """
+    return await mongodb_utils.find_page(
+        db[_MAIN_COLLECTION],
+        cursor=cursor,
+        filters=filters,
+        limit=limit,
+        sort=sort,
+        schema=DeviceCalibration,
+    )
+
+
+async def get_latest_revisions(
+    db: AsyncIOMotorDatabase,
+    filters: Optional[Dict[str, Any]] = None,
+    limit: Optional[int] = None,
+    skip: int = 0,
+    sort: List[str] = (),
+) -> List[mongodb_utils.Revision]:
+    """Gets the revisions of the calibration results that `get_latest_many` would return, without the results
+
+    Args:
+        db: the mongo database
+        filters: the mongodb-like filters to use to extract the calibrations
+        limit: the number of results to return: default = None meaning all of them
+        skip: the number of records to skip; default = 0
+        sort: the fields to sort by, prefixing any with a '-' means descending; default = ()
+
+    Returns:
+        the list of the id, revision and updated_at of each calibration result set
+    """
+    return await mongodb_utils.find(
+        db[_MAIN_COLLECTION],
+        filters=filters,
+        limit=limit,
+        skip=skip,
+        sort=sort,
+        include=_REVISION_FIELDS,
+        schema=mongodb_utils.Revision,
+    )
+
+
 async def get_historical_many(
     db: AsyncIOMotorDatabase,
     filters: Optional[Dict[str, Any]] = None,
@@ -137,6 +252,133 @@ async def get_historical_many(
     )
 
 
+def iter_history(
+    db: AsyncIOMotorDatabase,
+    name: str,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    qubits: Sequence[int] = (),
+    fields: Sequence[str] = (),
+    every: int = 1,
+    interval: Optional[CalibrationHistoryInterval] = None,
+    aggregate: CalibrationHistoryAggregate = CalibrationHistoryAggregate.MEAN,
+    batch_size: int = 0,
+) -> AsyncIterator[DeviceCalibrationSnapshot]:
+    """Iterates over the historical calibration results of the given device, oldest first
+
+    The snapshots are read with the (name, last_calibrated) index of the 'calibrations_logs' collection,
+    one batch at a time, so they never all have to be in memory at once.
+    The query is checked when this is called, before any snapshot is fetched.
+
+    Args:
+        db: the mongo database
+        name: the name of the device
+        since: the earliest (inclusive) `last_calibrated` of the snapshots; default = None meaning no bound
+        until: the latest (inclusive) `last_calibrated` of the snapshots; default = None meaning no bound
+        qubits: the ids of the only qubits to return; default = () meaning all of them
+        fields: the only fields of the snapshots to return, besides the name and `last_calibrated`,
+            in dot-notation e.g. "qubits.t1_decoherence"; default = () meaning all of them
+        every: the number of snapshots of which only the first is returned i.e. every Nth snapshot;
+            default = 1 meaning all snapshots
+        interval: the length of the time buckets into which the snapshots are combined;
+            default = None meaning the snapshots are not combined
+        aggregate: the function that combines the numeric calibration values in each time bucket;
+            default = 'mean'
+        batch_size: the maximum number of snapshots got from the database in one round trip;
+            default = 0 meaning the database's default
+
+    Returns:
+        an async iterator of the calibration snapshots
+
+    Raises:
+        InvalidQueryError: unknown field '{path}'
+    """
+    validate_field_paths(DeviceCalibrationCreate, paths=fields)
+
+    _filter: Dict[str, Any] = {"name": name}
+    date_filter = {
+        op: value for op, value in (("$gte", since), ("$lte", until)) if value
+    }
+    if date_filter:
+        _filter["last_calibrated"] = date_filter
+
+    pipeline: List[Dict[str, Any]] = [
+        {"$match": _filter},
+        {"$sort": {"last_calibrated": pymongo.ASCENDING}},
+    ]
+    if every > 1:
+        pipeline += [
+            {
+                "$setWindowFields": {
+                    "sortBy": {"last_calibrated": pymongo.ASCENDING},
+                    "output": {"_position": {"$documentNumber": {}}},
+                }
+            },
+            {
+                "$match": {
+                    "$expr": {
+                        "$eq": [{"$mod": [{"$subtract": ["$_position", 1]}, every]}, 0]
+                    }
+                }
+            },
+        ]
+    if qubits:
+        pipeline.append(
+            {
+                "$set": {
+                    "qubits": {
+                        "$filter": {
+                            "input": "$qubits",
+                            "cond": {"$in": ["$$this.id", list(qubits)]},
+                        }
+                    }
+                }
+            }
+        )
+    if fields:
+        projection = {"_id": 0, "name": 1, "last_calibrated": 1}
+        projection.update({field: 1 for field in fields})
+    else:
+        projection = {"_id": 0, "_position": 0}
+    pipeline.append({"$project": projection})
+
+    kwargs = {"batchSize": batch_size} if batch_size > 0 else {}
+    snapshots = db[_LOGS_COLLECTION].aggregate(pipeline, **kwargs)
+    if interval is not None:
+        snapshots = history.iter_buckets(
+            snapshots, interval=interval, aggregate=aggregate
+        )
+    return _iter_snapshots(snapshots)
+
+
+async def rebuild_metrics(db: AsyncIOMotorDatabase, batch_size: int = 100) -> int:
+    """Recreates the metric time series from the snapshots in the 'calibrations_logs' collection
+
+    Points of snapshots saved while it runs may be left out.
+
+    Args:
+        db: the mongo database
+        batch_size: the maximum number of snapshots got from the database in one round trip
+
+    Returns:
+        the number of points saved
+    """
+    await db[metrics.COLLECTION].drop()
+    await metrics.create_collection(db)
+    # dropping the collection dropped its indexes too
+    await reconcile_indexes(db, collections=[metrics.COLLECTION])
+
+    total = 0
+    records = mongodb_utils.iter_many(
+        db[_LOGS_COLLECTION],
+        schema=DeviceCalibrationCreate,
+        batch_size=batch_size,
+    )
+    async for record in records:
+        total += await metrics.insert_points(db, record)
+    return total
+
+
 async def get_one(db: AsyncIOMotorDatabase, name: str) -> DeviceCalibration:
     """Gets the current calibration results of the given device
 
@@ -152,3 +394,36 @@ async def get_one(db: AsyncIOMotorDatabase, name: str) -> DeviceCalibration:
         {"name": name},
         schema=DeviceCalibration,
     )
+
+
+async def get_revision(db: AsyncIOMotorDatabase, name: str) -> mongodb_utils.Revision:
+    """Gets the revision of the current calibration results of the given device, without the results
+
+    Args:
+        db: the mongo database
+        name: the name of the device
+
+    Returns:
+        the id, revision and updated_at of the calibration results
+    """
+    return await mongodb_utils.find_one(
+        db[_MAIN_COLLECTION],
+        {"name": name},
+        included_fields=_REVISION_FIELDS,
+        schema=mongodb_utils.Revision,
+    )
+
+
+async def _iter_snapshots(
+    records: AsyncIterator[Dict[str, Any]],
+) -> AsyncIterator[DeviceCalibrationSnapshot]:
+    """Parses the given raw calibration snapshots one at a time
+
+    Args:
+        records: the raw calibration snapshots
+
+    Returns:
+        an async iterator of the parsed calibration snapshots
+    """
+    async for record in records:
+        yield parse_record(DeviceCalibrationSnapshot, record)
@@ -17,7 +17,7 @@ from beanie import PydanticObjectId
 from fastapi import Query
 from pydantic import BaseModel, ConfigDict, Field, field_serializer
 
-from utils.date_time import get_current_timestamp
+from utils.date_time import ZuluDatetime, get_current_datetime
 from utils.models import create_partial_model
 
 
@@ -108,7 +108,9 @@ class DeviceCalibrationCreate(BaseModel):
     resonators: Optional[List[ResonatorCalibration]] = None
     couplers: Optional[List[CouplersCalibration]] = None
     discriminators: Optional[Dict[str, Any]] = None
-    last_calibrated: Optional[str] = Field(default_factory=get_current_timestamp)
+    last_calibrated: Optional[ZuluDatetime] = Field(
+        default_factory=get_current_datetime
+    )
 
 
 class DeviceCalibration(DeviceCalibrationCreate):
@@ -117,7 +119,9 @@ class DeviceCalibration(DeviceCalibrationCreate):
     model_config = ConfigDict(from_attributes=True)
 
     id: PydanticObjectId = Field(alias="_id")
-    updated_at: Optional[str] = Field(default_factory=get_current_timestamp)
+    updated_at: Optional[ZuluDatetime] = Field(default_factory=get_current_datetime)
+    # incremented on every write; it is sent as the 'ETag' header, not in the body
+    revision: Optional[int] = Field(default=None, exclude=True)
 
     @field_serializer("id", when_used="json")
     def serialize_id(self, _id: PydanticObjectId):
@@ -125,10 +129,48 @@ class DeviceCalibration(DeviceCalibrationCreate):
         return str(_id)
 
 
+class CalibrationHistoryInterval(str, enum.Enum):
+    """The length of the time buckets into which the calibration history is downsampled"""
+
+    HOUR = "hour"
+    DAY = "day"
+    WEEK = "week"
+    MONTH = "month"
+
+
+class CalibrationHistoryAggregate(str, enum.Enum):
+    """The function that combines the numeric calibration values in each time bucket"""
+
+    MIN = "min"
+    MAX = "max"
+    MEAN = "mean"
+
+
+class CalibrationMetricPoint(BaseModel):
+    """A calibration value of a component of a device at a given time"""
+
+    device: str
+    # the kind of component i.e. 'qubits', 'resonators' or 'couplers'
+    component: str
+    # the id of the component, or its position if it has no id
+    index: int
+    # the name of the calibration value e.g. 't1_decoherence'
+    metric: str
+    value: float
+    unit: CalibrationUnit
+    ts: ZuluDatetime
+    # the number of values combined into this one, if it is the aggregate of a time bucket
+    count: Optional[int] = None
+
+
 # derived models
+DeviceCalibrationSnapshot = create_partial_model(
+    "DeviceCalibrationSnapshot", original=DeviceCalibrationCreate
+)
+
 DeviceCalibrationQuery = create_partial_model(
     "DeviceCalibrationQuery",
     original=DeviceCalibration,
     default=Query(None),
-    exclude=("qubits", "resonators", "couplers", "discriminators"),
+    exclude=("qubits", "resonators", "couplers", "discriminators", "revision"),
 )
@@ -0,0 +1,158 @@
+# This code is part of Tergite
+#
+# (C) Copyright Chalmers Next Labs 2025
+#
+# This code is licensed under the Apache License, Version 2.0. You may
+# obtain a copy of this license in the LICENSE.txt file in the root directory
+# of this source tree or at http://www.apache.org/licenses/LICENSE-2.0.
+#
+# Any modifications or derivative works of this code must retain this
+# copyright notice, and modified files need to carry a notice indicating
+# that they have been altered from the originals.
+"""Downsampling of the history of the calibration results of a device
+
+Snapshots are combined into one per time bucket as they stream in, in order of
+`last_calibrated`, so only the running statistics of the current bucket are kept in memory.
+The combined snapshot has the shape of the last snapshot in the bucket, with each numeric
+calibration value replaced by the minimum, maximum or mean of that value in the bucket.
+"""
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from utils.date_time import as_utc
+
+from .dtos import CalibrationHistoryAggregate, CalibrationHistoryInterval
+from .utils import COMPONENTS, get_element_id, iter_numeric_values
+
+# (component, id of the element, name of the calibration value)
+_ValueKey = Tuple[str, Any, str]
+
+
+def get_bucket_start(date: datetime, interval: CalibrationHistoryInterval) -> datetime:
+    """Gets the start of the time bucket that the given date falls in
+
+    Args:
+        date: the date
+        interval: the length of the time buckets; weeks start on Monday
+
+    Returns:
+        the start of the time bucket, in UTC
+    """
+    date = as_utc(date).replace(minute=0, second=0, microsecond=0)
+    if interval == CalibrationHistoryInterval.HOUR:
+        return date
+
+    date = date.replace(hour=0)
+    if interval == CalibrationHistoryInterval.WEEK:
+        return date - timedelta(days=date.weekday())
+    if interval == CalibrationHistoryInterval.MONTH:
+        return date.replace(day=1)
+    return date
+
+
+async def iter_buckets(
+    snapshots: AsyncIterator[Dict[str, Any]],
+    interval: CalibrationHistoryInterval,
+    aggregate: CalibrationHistoryAggregate,
+) -> AsyncIterator[Dict[str, Any]]:
+    """Combines the given snapshots into one per time bucket
+
+    Args:
+        snapshots: the calibration snapshots, in ascending order of `last_calibrated`
+        interval: the length of the time buckets
+        aggregate: the function that combines the numeric calibration values in each bucket
+
+    Returns:
+        an async iterator of one snapshot per bucket with at least one snapshot,
+        whose `last_calibrated` is the start of the bucket
+    """
+    bucket_start: Optional[datetime] = None
+    last: Optional[Dict[str, Any]] = None
+    stats: Dict[_ValueKey, List[float]] = {}
+
+    async for snapshot in snapshots:
+        start = get_bucket_start(snapshot["last_calibrated"], interval)
+        if last is not None and start != bucket_start:
+            yield _combine(last, bucket_start, stats=stats, aggregate=aggregate)
+            stats = {}
+
+        bucket_start = start
+        last = snapshot
+        for component, element_id, name, calibration_value in iter_numeric_values(
+            snapshot
+        ):
+            _update_stats(
+                stats,
+                key=(component, element_id, name),
+                value=calibration_value["value"],
+            )
+
+    if last is not None:
+        yield _combine(last, bucket_start, stats=stats, aggregate=aggregate)
+
+
+def _update_stats(stats: Dict[_ValueKey, List[float]], key: _ValueKey, value: float):
+    """Adds the given value to the running [min, max, sum, count] of its key
+
+    Args:
+        stats: the running statistics of the current bucket
+        key: the (component, element id, value name) of the value
+        value: the numeric calibration value
+    """
+    item = stats.get(key)
+    if item is None:
+        stats[key] = [value, value, value, 1]
+        return
+
+    item[0] = min(item[0], value)
+    item[1] = max(item[1], value)
+    item[2] += value
+    item[3] += 1
+
+
+def _combine(
+    last: Dict[str, Any],
+    bucket_start: datetime,
+    stats: Dict[_ValueKey, List[float]],
+    aggregate: CalibrationHistoryAggregate,
+) -> Dict[str, Any]:
+    """Builds the snapshot of a bucket from its last snapshot and the statistics of its values
+
+    Args:
+        last: the last snapshot in the bucket
+        bucket_start: the start of the bucket
+        stats: the [min, max, sum, count] of each numeric value in the bucket
+        aggregate: the function that combines the numeric calibration values
+
+    Returns:
+        the combined snapshot
+    """
+    combined = {**last, "last_calibrated": bucket_start}
+    for component in COMPONENTS:
+        elements = last.get(component)
+        if not elements:
+            continue
+
+        combined[component] = []
+        for position, element in enumerate(elements):
+            element_id = get_element_id(element, position)
+            element = {**element}
+            for name, calibration_value in element.items():
+                item = stats.get((component, element_id, name))
+                if item is not None and isinstance(calibration_value, dict):
+                    element[name] = {
+                        **calibration_value,
+                        "value": _aggregate(item, aggregate),
+                    }
+            combined[component].append(element)
+
+    return combined
+
+
+def _aggregate(item: List[float], aggregate: CalibrationHistoryAggregate) -> float:
+    """Gets the aggregate of the given running [min, max, sum, count] statistics"""
+    if aggregate == CalibrationHistoryAggregate.MIN:
+        return item[0]
+    if aggregate == CalibrationHistoryAggregate.MAX:
+        return item[1]
+    return item[2] / item[3]
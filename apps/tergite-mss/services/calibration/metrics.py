@@ -0,0 +1,203 @@
+# This code is part of Tergite
+#
+# (C) Copyright Chalmers Next Labs 2025
+#
+# This code is licensed under the Apache License, Version 2.0. You may
+# obtain a copy of this license in the LICENSE.txt file in the root directory
+# of this source tree or at http://www.apache.org/licenses/LICENSE-2.0.
+#
+# Any modifications or derivative works of this code must retain this
+# copyright notice, and modified files need to carry a notice indicating
+# that they have been altered from the originals.
+"""Time series of the individual calibration values of the components of devices
+
+Each calibration snapshot is fanned out into one point per numeric calibration value
+of each qubit, resonator and coupler, stored in the 'calibration_metrics' time-series
+collection with its (device, component, index, metric) as the metadata. Trends of one
+metric can then be read, and aggregated per time bucket on the database server,
+without loading whole snapshots.
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+import pymongo
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import IndexModel
+from pymongo.errors import CollectionInvalid
+
+from utils.indexes import register_indexes
+
+from .dtos import (
+    CalibrationHistoryAggregate,
+    CalibrationHistoryInterval,
+    CalibrationMetricPoint,
+    DeviceCalibrationCreate,
+)
+from .utils import COMPONENTS, iter_numeric_values
+
+COLLECTION = "calibration_metrics"
+
+register_indexes(
+    COLLECTION,
+    [
+        IndexModel(
+            [
+                ("meta.device", pymongo.ASCENDING),
+                ("meta.metric", pymongo.ASCENDING),
+                ("meta.component", pymongo.ASCENDING),
+                ("meta.index", pymongo.ASCENDING),
+                ("ts", pymongo.ASCENDING),
+            ]
+        )
+    ],
+)
+
+_AGGREGATE_OPERATORS = {
+    CalibrationHistoryAggregate.MIN: "$min",
+    CalibrationHistoryAggregate.MAX: "$max",
+    CalibrationHistoryAggregate.MEAN: "$avg",
+}
+
+
+async def create_collection(db: AsyncIOMotorDatabase):
+    """Creates the time-series collection of calibration metrics if it does not exist yet
+
+    This should be called before any index is created on it, or any point inserted into it,
+    as that would create it as an ordinary collection.
+
+    Args:
+        db: the mongo database
+    """
+    try:
+        await db.create_collection(
+            COLLECTION,
+            timeseries={"timeField": "ts", "metaField": "meta", "granularity": "hours"},
+        )
+    except CollectionInvalid:
+        # the collection already exists
+        pass
+
+
+def to_points(record: DeviceCalibrationCreate) -> List[Dict[str, Any]]:
+    """Fans out the given calibration snapshot into one point per numeric calibration value
+
+    Args:
+        record: the calibration snapshot of a device
+
+    Returns:
+        the points, each with its (device, component, index, metric) metadata, value, unit and timestamp.
+        The index of a component is its id, or its position in the list if it has no id.
+    """
+    document = record.model_dump(mode="json", include=set(COMPONENTS))
+    return [
+        {
+            "meta": {
+                "device": record.name,
+                "component": component,
+                "index": index,
+                "metric": metric,
+            },
+            "value": calibration_value["value"],
+            "unit": calibration_value.get("unit", ""),
+            "ts": record.last_calibrated,
+        }
+        for component, index, metric, calibration_value in iter_numeric_values(document)
+    ]
+
+
+async def insert_points(
+    db: AsyncIOMotorDatabase, record: DeviceCalibrationCreate
+) -> int:
+    """Inserts the points of the given calibration snapshot
+
+    Args:
+        db: the mongo database
+        record: the calibration snapshot of a device
+
+    Returns:
+        the number of points inserted
+    """
+    points = to_points(record)
+    if len(points) > 0:
+        await db[COLLECTION].insert_many(points, ordered=False)
+    return len(points)
+
+
+async def get_series(
+    db: AsyncIOMotorDatabase,
+    device: str,
+    metric: str,
+    component: str = "qubits",
+    indexes: Sequence[int] = (),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    interval: Optional[CalibrationHistoryInterval] = None,
+    aggregate: CalibrationHistoryAggregate = CalibrationHistoryAggregate.MEAN,
+) -> List[CalibrationMetricPoint]:
+    """Gets the time series of the given calibration metric of the components of a device
+
+    Args:
+        db: the mongo database
+        device: the name of the device
+        metric: the name of the calibration value e.g. 't1_decoherence'
+        component: the kind of component i.e. 'qubits', 'resonators' or 'couplers'; default = 'qubits'
+        indexes: the indexes of the only components to return; default = () meaning all of them
+        since: the earliest (inclusive) timestamp of the points; default = None meaning no bound
+        until: the latest (inclusive) timestamp of the points; default = None meaning no bound
+        interval: the length of the time buckets into which the points are aggregated
+            on the database server; default = None meaning the raw points are returned
+        aggregate: the function that combines the values in each time bucket; default = 'mean'
+
+    Returns:
+        the points, ordered by component index and then by time.
+        Aggregated points have the start of their bucket as timestamp and the number of raw points as count.
+    """
+    _filter: Dict[str, Any] = {
+        "meta.device": device,
+        "meta.metric": metric,
+        "meta.component": component,
+    }
+    if indexes:
+        _filter["meta.index"] = {"$in": list(indexes)}
+    date_filter = {
+        op: value for op, value in (("$gte", since), ("$lte", until)) if value
+    }
+    if date_filter:
+        _filter["ts"] = date_filter
+
+    pipeline: List[Dict[str, Any]] = [{"$match": _filter}]
+    if interval is None:
+        pipeline.append(
+            {"$project": {"_id": 0, "meta": 1, "value": 1, "unit": 1, "ts": 1}}
+        )
+    else:
+        pipeline += [
+            {
+                "$group": {
+                    "_id": {
+                        "index": "$meta.index",
+                        "ts": {
+                            "$dateTrunc": {
+                                "date": "$ts",
+                                "unit": interval.value,
+                                "startOfWeek": "monday",
+                            }
+                        },
+                    },
+                    "meta": {"$first": "$meta"},
+                    "value": {_AGGREGATE_OPERATORS[aggregate]: "$value"},
+                    "unit": {"$first": "$unit"},
+                    "count": {"$sum": 1},
+                }
+            },
+            {"$set": {"ts": "$_id.ts"}},
+            {"$unset": "_id"},
+        ]
+    pipeline.append(
+        {"$sort": {"meta.index": pymongo.ASCENDING, "ts": pymongo.ASCENDING}}
+    )
+
+    return [
+        CalibrationMetricPoint.model_validate({**item.pop("meta"), **item})
+        async for item in db[COLLECTION].aggregate(pipeline)
+    ]
@@ -0,0 +1,54 @@
+# This code is part of Tergite
+#
+# (C) Copyright Chalmers Next Labs 2025
+#
+# This code is licensed under the Apache License, Version 2.0. You may
+# obtain a copy of this license in the LICENSE.txt file in the root directory
+# of this source tree or at http://www.apache.org/licenses/LICENSE-2.0.
+#
+# Any modifications or derivative works of this code must retain this
+# copyright notice, and modified files need to carry a notice indicating
+# that they have been altered from the originals.
+"""Utility functions for the calibration values of the components of devices"""
+from typing import Any, Dict, Iterator, Mapping, Tuple
+
+# the lists of components whose numeric calibration values are read
+COMPONENTS = ("qubits", "resonators", "couplers")
+
+
+def get_element_id(element: Mapping[str, Any], position: int) -> Any:
+    """Gets the id of a component, or its position in the list if it has no id
+
+    Args:
+        element: the component e.g. a qubit
+        position: the position of the component in its list
+
+    Returns:
+        the id of the component
+    """
+    element_id = element.get("id")
+    return position if element_id is None else element_id
+
+
+def iter_numeric_values(
+    snapshot: Mapping[str, Any]
+) -> Iterator[Tuple[str, Any, str, Dict[str, Any]]]:
+    """Iterates over the numeric calibration values of the components in the given snapshot
+
+    Args:
+        snapshot: the calibration snapshot as a dict
+
+    Returns:
+        an iterator of (component, element id, value name, calibration value) tuples,
+        where the calibration value is the dict whose 'value' is a number.
+        Elements are identified as in `get_element_id`.
+    """
+    for component in COMPONENTS:
+        for position, element in enumerate(snapshot.get(component) or []):
+            element_id = get_element_id(element, position)
+            for name, calibration_value in element.items():
+                if not isinstance(calibration_value, dict):
+                    continue
+                value = calibration_value.get("value")
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    yield component, element_id, name, calibration_value
@@ -1,2 +1,11 @@
 from .dtos import Device, DeviceUpsert
-from .service import get_all_devices, get_one_device, patch_device, upsert_device
+from .service import (
+    get_all_device_revisions,
+    get_all_devices,
+    get_device_revision,
+    get_devices_page,
+    get_one_device,
+    iter_all_devices,
+    patch_device,
+    upsert_device,
+)
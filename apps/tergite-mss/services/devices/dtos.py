@@ -31,6 +31,7 @@ from fastapi import Query
 from pydantic import BaseModel, ConfigDict, Field
 from pydantic.main import IncEx
 
+from utils.date_time import ZuluDatetime
 from utils.models import create_partial_model
 
 if TYPE_CHECKING:
@@ -111,8 +112,10 @@ class Device(DeviceUpsert):
     )
 
     id: PydanticObjectId = Field(alias="_id")
-    created_at: Optional[str] = None
-    updated_at: Optional[str] = None
+    created_at: Optional[ZuluDatetime] = None
+    updated_at: Optional[ZuluDatetime] = None
+    # incremented on every write; it is sent as the 'ETag' header, not in the body
+    revision: Optional[int] = Field(default=None, exclude=True)
 
 
 # derived models
@@ -131,5 +134,6 @@ DeviceQuery = create_partial_model(
         "qubit_lo_freq",
         "gates",
         "qubit_ids_coupler_map",
+        "revision",
     ),
 )
@@ -13,17 +13,30 @@
 # copyright notice, and modified files need to carry a notice indicating
 # that they have been altered from the originals.
 
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
 import pymongo
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import IndexModel
 
 from utils import mongodb as mongodb_utils
-from utils.date_time import get_current_timestamp
+from utils.date_time import get_current_datetime
 from utils.exc import NotFoundError
+from utils.indexes import register_indexes
 
 from .dtos import Device, DeviceUpsert
 
+register_indexes(
+    "devices",
+    [
+        IndexModel("name", unique=True),
+        # paged queries sort by "_id" after the given fields, as a tie-breaker
+        IndexModel([("created_at", pymongo.DESCENDING), ("_id", pymongo.DESCENDING)]),
+    ],
+)
+
+_REVISION_FIELDS = (mongodb_utils.REVISION_FIELD, "updated_at")
+
 
 async def get_all_devices(
     db: AsyncIOMotorDatabase,
@@ -52,6 +65,74 @@ async def get_all_devices(
     )
 
 
+def iter_all_devices(
+    db: AsyncIOMotorDatabase,
+    filters: Optional[Dict[str, Any]] = None,
+    limit: Optional[int] = None,
+    skip: int = 0,
+    sort: List[str] = (),
+    batch_size: int = 0,
+) -> AsyncIterator[Device]:
+    """Iterates over the devices in the devices collection, without loading them all into memory
+
+    Args:
+        db: the mongo database from which to get the databases
+        filters: the mongodb-like filters to use to extract the devices
+        limit: the number of results to return: default = None meaning all of them
+        skip: the number of records to skip; default = 0
+        sort: the fields to sort by, prefixing any with a '-' means descending; default = ()
+        batch_size: the maximum number of devices got from the database in one round trip;
+            default = 0 meaning the database's default
+
+    Returns:
+        an async iterator of the devices found in the devices collection
+
+    Raises:
+        ValidationError: results are not valid Device objects
+    """
+    return mongodb_utils.iter_many(
+        db.devices,
+        filters=filters,
+        limit=limit,
+        skip=skip,
+        sort=sort,
+        schema=Device,
+        batch_size=batch_size,
+    )
+
+
+async def get_devices_page(
+    db: AsyncIOMotorDatabase,
+    cursor: str = "",
+    filters: Optional[Dict[str, Any]] = None,
+    limit: Optional[int] = None,
+    sort: List[str] = (),
+) -> Tuple[List[Device], Optional[str]]:
+    """Gets the page of devices that come after the given cursor
+
+    Args:
+        db: the mongo database from which to get the databases
+        cursor: the cursor got from the previous page; default = "" meaning the first page
+        filters: the mongodb-like filters to use to extract the devices
+        limit: the number of results to return: default = None meaning all of them
+        sort: the fields to sort by, prefixing any with a '-' means descending; default = ()
+
+    Returns:
+        tuple of the list of devices and the cursor for the next page or None if there are no more pages
+
+    Raises:
+        ValidationError: final results are not valid Device objects
+    """
+    return await mongodb_utils.find_page(
+        db.devices,
+        cursor=cursor,
+        filters=filters,
+        limit=limit,
+        sort=sort,
+        schema=Device,
+    )
+
+
 async def get_one_device(db: AsyncIOMotorDatabase, name: str) -> Device:
     """Gets the device of the given name
 
@@ -69,9 +150,64 @@ async def get_one_device(db: AsyncIOMotorDatabase, name: str) -> Device:
     return await mongodb_utils.find_one(db.devices, {"name": name}, schema=Device)
 
 
+async def get_device_revision(
+    db: AsyncIOMotorDatabase, name: str
+) -> mongodb_utils.Revision:
+    """Gets the revision of the device of the given name, without the rest of the device
+
+    Args:
+        db: the mongo database where the device information is stored
+        name: the name of the device
+
+    Returns:
+        the id, revision and updated_at of the device
+
+    Raises:
+        NotFoundError: no matches for {name: '<name>'}
+    """
+    return await mongodb_utils.find_one(
+        db.devices,
+        {"name": name},
+        included_fields=_REVISION_FIELDS,
+        schema=mongodb_utils.Revision,
+    )
+
+
+async def get_all_device_revisions(
+    db: AsyncIOMotorDatabase,
+    filters: Optional[Dict[str, Any]] = None,
+    limit: Optional[int] = None,
+    skip: int = 0,
+    sort: List[str] = (),
+) -> List[mongodb_utils.Revision]:
+    """Gets the revisions of the devices that `get_all_devices` would return, without the rest of the devices
+
+    Args:
+        db: the mongo database from which to get the databases
+        filters: the mongodb-like filters to use to extract the devices
+        limit: the number of results to return: default = None meaning all of them
+        skip: the number of records to skip; default = 0
+        sort: the fields to sort by, prefixing any with a '-' means descending; default = ()
+
+    Returns:
+        the list of the id, revision and updated_at of each device
+    """
+    return await mongodb_utils.find(
+        db.devices,
+        filters=filters,
+        limit=limit,
+        skip=skip,
+        sort=sort,
+        include=_REVISION_FIELDS,
+        schema=mongodb_utils.Revision,
+    )
+
+
 async def upsert_device(db: AsyncIOMotorDatabase, payload: DeviceUpsert) -> Device:
     """Creates a new device or updates it if it exists
 
+    The revision of the device is incremented.
+
     Args:
         db: the mongo database where the device information is stored
         payload: the device
@@ -83,12 +219,16 @@ async def upsert_device(db: AsyncIOMotorDatabase, payload: DeviceUpsert) -> Devi
         ValueError: could not insert '{payload['name']}' document
         ValidationError: if the final object could not be validated
     """
-    timestamp = get_current_timestamp()
+    timestamp = get_current_datetime()
     payload.updated_at = timestamp
 
     device = await db.devices.find_one_and_update(
         {"name": payload.name},
-        {"$set": payload.model_dump(), "$setOnInsert": {"created_at": timestamp}},
+        {
+            "$set": payload.model_dump(exclude={mongodb_utils.REVISION_FIELD}),
+            "$setOnInsert": {"created_at": timestamp},
+            "$inc": {mongodb_utils.REVISION_FIELD: 1},
+        },
         upsert=True,
         return_document=pymongo.ReturnDocument.AFTER,
     )
@@ -106,6 +246,8 @@ async def patch_device(
 ) -> Device:
     """Patches the devices data for the device of the given name
 
+    The revision of the device is incremented.
+
     Args:
         db: the mongo database from where to get the job
         name: the name of the device
@@ -119,9 +261,13 @@ async def patch_device(
         NotFoundError: device {name} not found
         ValidationError: if the final object is not validated
     """
+    update = {k: v for k, v in payload.items() if k != mongodb_utils.REVISION_FIELD}
     device = await db.devices.find_one_and_update(
         {"name": name},
-        {"$set": {**payload, "updated_at": get_current_timestamp()}},
+        {
+            "$set": {**update, "updated_at": get_current_datetime()},
+            "$inc": {mongodb_utils.REVISION_FIELD: 1},
+        },
         return_document=pymongo.ReturnDocument.AFTER,
     )
 
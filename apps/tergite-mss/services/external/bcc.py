@@ -10,9 +10,10 @@
 # copyright notice, and modified files need to carry a notice indicating
 # that they have been altered from the originals.
 """Clients for accessing certain HTTP services"""
+import asyncio
 import logging
 from json import JSONDecodeError
-from typing import Dict, List
+from typing import Dict, List, Sequence
 
 import httpx
 
@@ -20,6 +21,8 @@ from utils.config import BccConfig
 from utils.exc import ServiceUnavailableError
 
 _BCC_CLIENTS: Dict[str, "BccClient"] = {}
+# the default maximum number of requests sent to a BCC instance at the same time
+_MAX_CONCURRENT_REQUESTS = 10
 
 
 async def create_clients(configs: List[BccConfig]):
@@ -84,6 +87,31 @@ class BccClient:
             logging.error(exp)
             raise ServiceUnavailableError("device is currently unavailable")
 
+    async def save_many_credentials(
+        self,
+        job_ids: Sequence[str],
+        app_token: str,
+        max_concurrency: int = _MAX_CONCURRENT_REQUESTS,
+    ):
+        """Registers the given jobs with BCC, with at most `max_concurrency` requests at a time
+
+        Args:
+            job_ids: the ids of the jobs
+            app_token: the app token associated with all the job ids
+            max_concurrency: the maximum number of requests sent to BCC at the same time
+
+        Raises:
+            ValueError: job id '{job_id}' already exists
+            ServiceUnavailableError: device is currently unavailable
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def _save(job_id: str):
+            async with semaphore:
+                await self.save_credentials(job_id=job_id, app_token=app_token)
+
+        await asyncio.gather(*(_save(job_id) for job_id in job_ids))
+
     async def close(self):
         """Closes the client"""
         await self._client.aclose()
@@ -29,12 +29,17 @@ from typing import Dict, List, Optional, Tuple
 from uuid import UUID
 
 from beanie import init_beanie
-from motor.motor_asyncio import AsyncIOMotorCollection, AsyncIOMotorDatabase
+from motor.motor_asyncio import (
+    AsyncIOMotorClientSession,
+    AsyncIOMotorCollection,
+    AsyncIOMotorDatabase,
+)
 from pymongo import UpdateOne
 from pymongo.errors import DuplicateKeyError
 from waldur_client import ComponentUsage, WaldurClient
 
 import settings
+from utils.indexes import register_document_indexes
 from utils.logging import err_logger, log_if_err
 from utils.mongodb import get_mongodb
 
@@ -61,6 +66,14 @@ from .utils import (
     send_component_usages,
 )
 
+_DOCUMENT_MODELS = [
+    Project,
+    PuhuriFailedRequest,
+    PuhuriJobResourceUsage,
+    InternalJobResourceUsage,
+]
+register_document_indexes(*_DOCUMENT_MODELS)
+
 # FIXME: To handle usage-based projects, we might need to add a flag like is_prepaid
 #   on the project model in the database such that authentication does not fail for
 #   projects that have is_prepaid as False
@@ -427,6 +440,7 @@ async def save_qpu_usage(
     project: Optional[Project],
     qpu_usage: Optional[float],
     db_collection: str = INTERNAL_USAGE_COLLECTION,
+    session: Optional[AsyncIOMotorClientSession] = None,
 ):
     """Saves the given job resource usage
 
@@ -434,6 +448,7 @@ async def save_qpu_usage(
     by BCC.
 
     It may be later sent to an external resource monitoring service.
+    Any usage already saved for the job is left untouched.
 
     Args:
         db: the mongodb client to the database where job resource usages are stored
@@ -441,6 +456,7 @@ async def save_qpu_usage(
         project: the project whose usage is to be reported
         qpu_usage: the qpu seconds used
         db_collection: the name of the collection where the job resource usages are stored
+        session: the session in which to save the usage, if any e.g. in a transaction
     """
     if project is None or qpu_usage is None:
         # only save resource usage if the project and qpu_seconds are defined
@@ -453,7 +469,13 @@ async def save_qpu_usage(
         qpu_seconds=qpu_usage,
     )
     try:
-        await db[db_collection].insert_one(usage.model_dump())
+        # an upsert, unlike an insert, does not abort the transaction when the usage exists
+        await db[db_collection].update_one(
+            {"job_id": usage.job_id},
+            {"$setOnInsert": usage.model_dump()},
+            upsert=True,
+            session=session,
+        )
     except DuplicateKeyError:
         # ignore duplicate entries
         pass
@@ -564,15 +586,7 @@ async def initialize_db(db: AsyncIOMotorDatabase):
     Args:
         db: the mongo database to initialize
     """
-    await init_beanie(
-        database=db,
-        document_models=[
-            Project,
-            PuhuriFailedRequest,
-            PuhuriJobResourceUsage,
-            InternalJobResourceUsage,
-        ],
-    )
+    await init_beanie(database=db, document_models=_DOCUMENT_MODELS)
 
 
 async def _prepare_resource_usages(
@@ -16,42 +16,314 @@
 # copyright notice, and modified files need to carry a notice indicating
 # that they have been altered from the originals.
 import logging
-from typing import TYPE_CHECKING, List, Mapping, Optional, Tuple
+from typing import (
+    Any,
+    AsyncIterator,
+    Dict,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+    Union,
+)
 from uuid import UUID
 
-from motor.motor_asyncio import AsyncIOMotorDatabase
-from pymongo import ReturnDocument
+import pymongo
+from beanie import PydanticObjectId
+from motor.motor_asyncio import AsyncIOMotorClientSession, AsyncIOMotorDatabase
+from pymongo import IndexModel, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
 
+import settings
+from services.external import puhuri as puhuri_service
 from services.external.bcc import BccClient
 from utils import mongodb as mongodb_utils
-from utils.exc import NotFoundError
+from utils.date_time import get_current_datetime
+from utils.exc import InvalidQueryError, NotFoundError
+from utils.indexes import register_indexes
+from utils.models import validate_field_paths
 
 from ..auth import Project
-from .dtos import CreatedJobResponse, Job, JobCreate, JobTimestamps, JobUpdate
+from ..auth.projects.dtos import PROJECT_DB_COLLECTION
+from . import archive as job_archive
+from . import cache as job_cache
+from . import counts as job_counts
+from . import events as job_events
+from . import results as results_store
+from . import stats as job_stats
+from .dtos import (
+    JOB_QUERY_OPERATORS,
+    CreatedJobResponse,
+    FailedJobResponse,
+    Job,
+    JobBulkUpdateItem,
+    JobBulkUpdateOutcome,
+    JobBulkUpdateResult,
+    JobCreate,
+    JobPartial,
+    JobResult,
+    JobResultCounts,
+    JobResultMemorySlice,
+    JobTimestamps,
+    JobUpdate,
+    PackedMemory,
+)
 
-if TYPE_CHECKING:
-    from ..auth.projects.database import ProjectDatabase
+# the code of the error raised by the database server when a unique index is violated
+_DUPLICATE_KEY_ERROR_CODE = 11000
 
+register_indexes(
+    "jobs",
+    [
+        IndexModel("job_id", unique=True),
+        # paged queries sort by "_id" after the given fields, as a tie-breaker
+        IndexModel([("created_at", pymongo.DESCENDING), ("_id", pymongo.DESCENDING)]),
+        IndexModel(
+            [
+                ("user_id", pymongo.ASCENDING),
+                ("created_at", pymongo.DESCENDING),
+                ("_id", pymongo.DESCENDING),
+            ]
+        ),
+        IndexModel(
+            [
+                ("project_id", pymongo.ASCENDING),
+                ("created_at", pymongo.DESCENDING),
+                ("_id", pymongo.DESCENDING),
+            ]
+        ),
+        IndexModel(
+            [
+                ("device", pymongo.ASCENDING),
+                ("created_at", pymongo.DESCENDING),
+                ("_id", pymongo.DESCENDING),
+            ]
+        ),
+        IndexModel(
+            [
+                ("status", pymongo.ASCENDING),
+                ("created_at", pymongo.DESCENDING),
+                ("_id", pymongo.DESCENDING),
+            ]
+        ),
+        IndexModel([("status", pymongo.ASCENDING), ("updated_at", pymongo.ASCENDING)]),
+    ],
+)
 
-async def get_one(db: AsyncIOMotorDatabase, job_id: UUID) -> Job:
+
+async def get_one(
+    db: AsyncIOMotorDatabase,
+    job_id: UUID,
+    fields: Tuple[str, ...] = (),
+    exclude: Tuple[str, ...] = (),
+) -> Union[Job, JobPartial]:
     """Gets a job by job_id
 
     Args:
         db: the mongo database from where to get the job
         job_id: the `job_id` of the job to be returned
+        fields: the only fields of the job to return; default = () meaning all of them
+        exclude: the fields of the job to leave out; it cannot be used together with `fields`
 
     Raises:
         utils.exc.NotFoundError: no matches for '{search_filter}'.
+        utils.exc.InvalidQueryError: unknown field '{path}'
+        utils.exc.InvalidQueryError: fields cannot be both included and excluded
         ValidationError: the document does not satisfy the schema passed
 
     Returns:
-        the job as a dict
+        the job, or a partial job if `fields` or `exclude` are passed.
+        The result memory is included even if it is stored outside the job document.
+        The job is looked up in the archive if it is not in the 'jobs' collection.
+    """
+    projected_fields, projected_exclude = _with_memory_fields(fields, exclude)
+    query = dict(
+        _filter={"job_id": str(job_id)},
+        schema=_get_schema(fields=fields, exclude=exclude),
+        dropped_fields=("_id", *projected_exclude),
+        included_fields=projected_fields,
+        trusted_sample_rate=settings.CONFIG.database.trusted_sample_rate,
+    )
+    try:
+        job = await mongodb_utils.find_one(db.jobs, **query)
+    except NotFoundError:
+        job = await mongodb_utils.find_one(db[job_archive.COLLECTION], **query)
+
+    # inline the memory that is stored outside the job document unless it was left out
+    is_memory_requested = "result.memory" not in exclude and (
+        not fields or "result" in fields or "result.memory" in fields
+    )
+    if is_memory_requested and getattr(job.result, "memory_ref", None) is not None:
+        job.result.memory = await results_store.get_memory(
+            db, job_id=str(job_id), memory_ref=job.result.memory_ref
+        )
+
+    return job
+
+
+async def get_result_memory_stream(
+    db: AsyncIOMotorDatabase, job_id: UUID
+) -> AsyncIterator[bytes]:
+    """Gets a stream of the result memory of the given job as a JSON list of lists
+
+    The memory is read chunk by chunk if it is stored outside the job document
+    so that it is never fully loaded into memory
+
+    Args:
+        db: the mongo database from where to get the job
+        job_id: the `job_id` of the job whose memory is to be returned
+
+    Raises:
+        utils.exc.NotFoundError: no matches for '{search_filter}'.
+
+    Returns:
+        an async iterator of the bytes of the JSON document.
+        The job is looked up in the archive if it is not in the 'jobs' collection.
+    """
+    query = dict(
+        _filter={"job_id": str(job_id)},
+        schema=JobPartial,
+        dropped_fields=("_id",),
+        included_fields=("job_id", "result"),
+        trusted_sample_rate=settings.CONFIG.database.trusted_sample_rate,
+    )
+    try:
+        job = await mongodb_utils.find_one(db.jobs, **query)
+    except NotFoundError:
+        job = await mongodb_utils.find_one(db[job_archive.COLLECTION], **query)
+    return results_store.stream_memory_json(db, job=job)
+
+
+async def get_result_memory_slice(
+    db: AsyncIOMotorDatabase,
+    job_id: UUID,
+    experiment: int,
+    offset: int = 0,
+    limit: Optional[int] = None,
+) -> JobResultMemorySlice:
+    """Gets a slice of the shots of an experiment in the result memory of the given job
+
+    Only the shots in the slice are read from the database, whether the memory is
+    inline in the job document, bit-packed or stored in chunks.
+
+    Args:
+        db: the mongo database from where to get the job
+        job_id: the `job_id` of the job whose memory is to be returned
+        experiment: the index of the experiment
+        offset: the number of shots to skip; default = 0
+        limit: the maximum number of shots to return; default = None meaning
+            `max_result_slice_size` in the `[jobs]` section of the config
+
+    Raises:
+        utils.exc.NotFoundError: no matches for '{search_filter}'.
+        utils.exc.InvalidQueryError: limit cannot be greater than {max_result_slice_size}
+
+    Returns:
+        the slice of the shots, the total number of shots of the experiment and the offset of the next slice
     """
-    return await mongodb_utils.find_one(
-        db.jobs, {"job_id": str(job_id)}, schema=Job, dropped_fields=("_id",)
+    max_limit = settings.CONFIG.jobs.max_result_slice_size
+    if limit is None:
+        limit = max_limit
+    if limit > max_limit:
+        raise InvalidQueryError(f"limit cannot be greater than {max_limit}")
+
+    _filter = {"job_id": str(job_id)}
+    pipeline = [
+        {"$match": _filter},
+        {"$limit": 1},
+        {
+            "$project": results_store.get_slice_projection(
+                experiment, offset=offset, limit=limit
+            )
+        },
+    ]
+    document = None
+    for collection in (db.jobs, db[job_archive.COLLECTION]):
+        async for item in collection.aggregate(pipeline):
+            document = item
+        if document is not None:
+            break
+    if document is None:
+        raise NotFoundError(f"no matches for '{_filter}'")
+
+    shots, num_shots = await results_store.get_memory_slice(
+        db,
+        job_id=str(job_id),
+        document=document,
+        experiment=experiment,
+        offset=offset,
+        limit=limit,
+    )
+    next_offset = offset + len(shots)
+    return JobResultMemorySlice(
+        experiment=experiment,
+        offset=offset,
+        limit=limit,
+        num_shots=num_shots,
+        shots=shots,
+        next_offset=next_offset if next_offset < num_shots else None,
     )
 
 
+async def get_result_counts(
+    db: AsyncIOMotorDatabase, job_id: UUID, clbits: Sequence[int] = ()
+) -> JobResultCounts:
+    """Gets the number of occurrences of each shot in the result memory of the given job
+
+    Args:
+        db: the mongo database from where to get the job
+        job_id: the `job_id` of the job whose shots are to be counted
+        clbits: the classical bits to marginalize the shots over; default = () meaning all of them
+
+    Raises:
+        utils.exc.NotFoundError: no matches for '{search_filter}'.
+        utils.exc.InvalidQueryError: classical bits cannot be repeated
+        utils.exc.InvalidQueryError: classical bit '{clbit}' is out of range
+        utils.exc.InvalidQueryError: the memory cannot be marginalized
+
+    Returns:
+        the counts of the shots of each experiment of the job
+    """
+    job = await get_one(db, job_id=job_id, fields=("job_id", "status", "result"))
+    counts = job_counts.count_memory(job.result or JobResult(), clbits=clbits)
+    return JobResultCounts(
+        job_id=job.job_id, status=job.status, clbits=list(clbits), counts=counts
+    )
+
+
+async def get_statuses(
+    db: AsyncIOMotorDatabase, job_ids: Sequence[UUID]
+) -> Dict[str, str]:
+    """Gets the statuses of the jobs of the given job_ids in a single query
+
+    Only the 'job_id' and 'status' of each job are fetched, and they are not validated.
+    The jobs that are not in the 'jobs' collection are looked up in the archive, in a second query.
+
+    Args:
+        db: the mongo database from where to get the jobs
+        job_ids: the `job_id`s of the jobs whose statuses are to be returned
+
+    Returns:
+        a map of job_id to status; job_ids that were not found are left out
+    """
+    statuses: Dict[str, str] = {}
+    missing_ids = {str(job_id) for job_id in job_ids}
+    for collection in (db.jobs, db[job_archive.COLLECTION]):
+        if len(missing_ids) == 0:
+            break
+
+        db_cursor = collection.find(
+            {"job_id": {"$in": list(missing_ids)}},
+            {"_id": 0, "job_id": 1, "status": 1},
+        )
+        async for item in db_cursor:
+            statuses[item["job_id"]] = item.get("status")
+        missing_ids -= statuses.keys()
+    return statuses
+
+
 async def create_job(
     db: AsyncIOMotorDatabase,
     bcc_client: BccClient,
@@ -78,6 +350,7 @@ async def create_job(
     logging.info(f"Creating new job with id: {job.job_id}")
     await bcc_client.save_credentials(job_id=job.job_id, app_token=f"{app_token}")
     await mongodb_utils.insert_one(collection=db.jobs, document=job.model_dump())
+    await job_stats.record_created(db, jobs=[job])
 
     upload_url = _without_special_docker_host_domain(f"{bcc_client.base_url}/jobs")
 
@@ -87,6 +360,66 @@ async def create_job(
     }
 
 
+async def create_many_jobs(
+    db: AsyncIOMotorDatabase,
+    bcc_client: BccClient,
+    jobs: List[Job],
+    app_token: Optional[str] = None,
+) -> List[Union[CreatedJobResponse, FailedJobResponse]]:
+    """Creates many new jobs for the given backend at once
+
+    The credentials of all the jobs are registered with BCC concurrently, then the jobs
+    are saved in one unordered bulk insert. If some of the jobs fail to be saved,
+    the rest are still saved, and added to the job statistics.
+
+    Args:
+        db: the mongo database from where to create the jobs
+        bcc_client: the HTTP client for accessing BCC
+        jobs: the job objects to create
+        app_token: the app token associated with these new jobs. It is None if no auth is required
+
+    Returns:
+        the details of each job, in the same order as `jobs`; the 'upload_url' if it was created
+        or the 'error' if it could not be saved, so that it can be retried
+
+    Raises:
+        ValueError: job id '{job_id}' already exists
+            See :meth:`utils.http_clients.BccClient.save_many_credentials`
+        ServiceUnavailableError: device is currently unavailable.
+            See :meth:`utils.http_clients.BccClient.save_many_credentials`
+    """
+    job_ids = [job.job_id for job in jobs]
+    logging.info(f"Creating {len(jobs)} new jobs")
+    await bcc_client.save_many_credentials(job_ids=job_ids, app_token=f"{app_token}")
+
+    errors: Dict[int, str] = {}
+    try:
+        await db.jobs.insert_many([job.model_dump() for job in jobs], ordered=False)
+    except BulkWriteError as exp:
+        for item in exp.details.get("writeErrors", []):
+            job_id = job_ids[item["index"]]
+            errors[item["index"]] = (
+                f"job id '{job_id}' already exists"
+                if item.get("code") == _DUPLICATE_KEY_ERROR_CODE
+                else f"server failed to insert job '{job_id}'"
+            )
+        logging.error(f"failed to insert {len(errors)} of {len(jobs)} new jobs")
+
+    await job_stats.record_created(
+        db, jobs=[job for idx, job in enumerate(jobs) if idx not in errors]
+    )
+
+    upload_url = _without_special_docker_host_domain(f"{bcc_client.base_url}/jobs")
+    return [
+        (
+            {"job_id": job_id, "error": errors[idx]}
+            if idx in errors
+            else {"job_id": job_id, "upload_url": upload_url}
+        )
+        for idx, job_id in enumerate(job_ids)
+    ]
+
+
 async def get_latest_many(
     db: AsyncIOMotorDatabase,
     filters: Optional[dict] = None,
@@ -94,7 +427,9 @@ async def get_latest_many(
     skip: int = 0,
     exclude: Tuple[str] = (),
     sort: List[str] = (),
-) -> List[Job]:
+    fields: Tuple[str] = (),
+    include_archived: bool = False,
+) -> List[Union[Job, JobPartial]]:
     """Retrieves the latest jobs up to the given limit
 
     Args:
@@ -104,16 +439,123 @@ async def get_latest_many(
         skip: the number of records to skip; default = 0
         exclude: the fields to exclude
         sort: the fields to sort by, prefixing any with a '-' means descending; default = ()
+        fields: the only fields of the jobs to return; it cannot be used together with `exclude`
+        include_archived: whether to include the jobs in the archive; default = False
+
+    Raises:
+        utils.exc.InvalidQueryError: unknown field '{path}'
+        utils.exc.InvalidQueryError: fields cannot be both included and excluded
+        utils.exc.InvalidQueryError: operator '{op}' is not allowed on field '{field}'
     """
+    projected_fields, projected_exclude = _with_memory_fields(fields, exclude)
     return await mongodb_utils.find(
         db.jobs,
         filters=filters,
-        exclude=exclude,
+        exclude=projected_exclude,
+        include=projected_fields,
+        limit=limit,
+        skip=skip,
+        sort=sort,
+        schema=_get_schema(fields=fields, exclude=exclude),
+        skip_validation=True,
+        union_with=_get_archive_union(include_archived),
+        operators=JOB_QUERY_OPERATORS,
+        trusted_sample_rate=settings.CONFIG.database.trusted_sample_rate,
+    )
+
+
+def iter_latest_many(
+    db: AsyncIOMotorDatabase,
+    filters: Optional[dict] = None,
+    limit: Optional[int] = None,
+    skip: int = 0,
+    exclude: Tuple[str] = (),
+    sort: List[str] = (),
+    fields: Tuple[str] = (),
+    include_archived: bool = False,
+    batch_size: int = 0,
+) -> AsyncIterator[Union[Job, JobPartial]]:
+    """Iterates over the latest jobs up to the given limit, without loading them all into memory
+
+    Args:
+        db: the mongo database from where to get the jobs
+        filters: the mongodb like filters which all returned records should satisfy
+        limit: maximum number of records to return; default = None meaning all of them
+        skip: the number of records to skip; default = 0
+        exclude: the fields to exclude
+        sort: the fields to sort by, prefixing any with a '-' means descending; default = ()
+        fields: the only fields of the jobs to return; it cannot be used together with `exclude`
+        batch_size: the maximum number of jobs got from the database in one round trip;
+            default = 0 meaning the database's default
+        include_archived: whether to include the jobs in the archive; default = False
+
+    Raises:
+        utils.exc.InvalidQueryError: unknown field '{path}'
+        utils.exc.InvalidQueryError: fields cannot be both included and excluded
+        utils.exc.InvalidQueryError: operator '{op}' is not allowed on field '{field}'
+    """
+    projected_fields, projected_exclude = _with_memory_fields(fields, exclude)
+    return mongodb_utils.iter_many(
+        db.jobs,
+        filters=filters,
+        exclude=projected_exclude,
+        include=projected_fields,
         limit=limit,
         skip=skip,
         sort=sort,
-        schema=Job,
+        schema=_get_schema(fields=fields, exclude=exclude),
+        skip_validation=True,
+        batch_size=batch_size,
+        union_with=_get_archive_union(include_archived),
+        operators=JOB_QUERY_OPERATORS,
+        trusted_sample_rate=settings.CONFIG.database.trusted_sample_rate,
+    )
+
+
+async def get_latest_page(
+    db: AsyncIOMotorDatabase,
+    cursor: str = "",
+    filters: Optional[dict] = None,
+    limit: Optional[int] = None,
+    exclude: Tuple[str] = (),
+    sort: List[str] = (),
+    fields: Tuple[str] = (),
+    include_archived: bool = False,
+) -> Tuple[List[Union[Job, JobPartial]], Optional[str]]:
+    """Retrieves the page of latest jobs that come after the given cursor
+
+    Args:
+        db: the mongo database from where to get the jobs
+        cursor: the cursor got from the previous page; default = "" meaning the first page
+        filters: the mongodb like filters which all returned records should satisfy
+        limit: maximum number of records to return; default = None meaning all of them
+        exclude: the fields to exclude
+        sort: the fields to sort by, prefixing any with a '-' means descending; default = ()
+        fields: the only fields of the jobs to return; it cannot be used together with `exclude`
+        include_archived: whether to include the jobs in the archive; default = False
+
+    Returns:
+        tuple of the list of jobs and the cursor for the next page, or None if there are no more pages
+
+    Raises:
+        utils.exc.InvalidQueryError: unknown field '{path}'
+        utils.exc.InvalidQueryError: fields cannot be both included and excluded
+        utils.exc.InvalidQueryError: operator '{op}' is not allowed on field '{field}'
+    """
+    projected_fields, projected_exclude = _with_memory_fields(fields, exclude)
+    return await mongodb_utils.find_page(
+        db.jobs,
+        cursor=cursor,
+        filters=filters,
+        exclude=projected_exclude,
+        include=projected_fields,
+        limit=limit,
+        sort=sort,
+        schema=_get_schema(fields=fields, exclude=exclude),
         skip_validation=True,
+        union_with=_get_archive_union(include_archived),
+        operators=JOB_QUERY_OPERATORS,
+        trusted_sample_rate=settings.CONFIG.database.trusted_sample_rate,
     )
 
 
@@ -125,51 +567,466 @@ async def update_job(db: AsyncIOMotorDatabase, job_id: UUID, payload: JobUpdate)
         job_id: the job id of the job
         payload: the new payload to update in job
 
+    If `pack_result_memory` is set in the config, the result memory in the payload is
+    stored bit-packed, if it can be packed losslessly.
+    Otherwise, if it is larger than `max_inline_result_bytes` in the config,
+    it is stored in chunks in the 'job_results' collection and only a reference to it
+    is saved in the job document.
+
     Returns:
         the job before it was modified
 
     Raises:
         NotFoundError: no documents matching {"job_id": job_id} were found
     """
-    document = await mongodb_utils.update_one(
-        db.jobs,
-        _filter={"job_id": str(job_id)},
-        payload=payload.model_dump(),
-        return_document=ReturnDocument.BEFORE,
-    )
+    document, _ = await _update_job_document(db, job_id=job_id, payload=payload)
+    await _delete_replaced_memory(db, old_document=document, payload=payload)
     return Job.model_validate(document)
 
 
-async def update_qpu_usage(
+async def complete_job(
     db: AsyncIOMotorDatabase,
-    project_db: "ProjectDatabase",
     job_id: UUID,
-    qpu_usage: float,
-) -> Optional[Project]:
-    """Updates the resource usage for the job of the given job_id
+    payload: JobUpdate,
+    save_usage: bool = False,
+) -> Job:
+    """Updates the job of the given job_id and charges its project for the QPU usage, if reported
+
+    The job update, the debit of the project's QPU seconds and the resource usage record
+    are done in a single transaction if the database supports it. The project is only
+    charged the first time the QPU usage of the job is reported.
+
+    The updated job is built from the job before the update and the payload
+    so that it is not read back from the database. This makes it one round trip to
+    the database for the job, plus one for the job statistics if they change, and one for the project
+    and one for the resource usage record when charging.
+
+    Subscribers to the status of the job are notified if it changes.
+
+    Args:
+        db: the mongo database from where to get the job
+        job_id: the job id of the job
+        payload: the new payload to update in job
+        save_usage: whether to save the resource usage record for reporting to puhuri
+
+    Returns:
+        the updated job
+
+    Raises:
+        NotFoundError: no documents matching {"job_id": job_id} were found
+        NotFoundError: project '{project_id}' for job '{job_id}' not found
+    """
+    qpu_usage = getattr(payload.timestamps, "resource_usage", None)
+
+    async with mongodb_utils.transaction(db) as session:
+        document, update = await _update_job_document(
+            db, job_id=job_id, payload=payload, session=session
+        )
+        old_job = Job.model_validate(document)
+
+        if old_job.duration_in_secs is None and qpu_usage is not None:
+            project = await _debit_qpu_usage(
+                db, job=old_job, qpu_usage=qpu_usage, session=session
+            )
+            if save_usage:
+                await puhuri_service.save_qpu_usage(
+                    db,
+                    job_id=job_id,
+                    project=project,
+                    qpu_usage=qpu_usage,
+                    session=session,
+                )
+
+    # a cached response read while the transaction was still open would be stale
+    job_cache.invalidate(str(job_id))
+    await _delete_replaced_memory(db, old_document=document, payload=payload)
+    job = Job.model_validate({**document, **update})
+    memory = getattr(payload.result, "memory", None)
+    if getattr(job.result, "memory_ref", None) is not None and memory is not None:
+        job.result.memory = memory
+
+    if job.status != old_job.status:
+        job_events.notify(job)
+    return job
+
+
+async def complete_many_jobs(
+    db: AsyncIOMotorDatabase,
+    updates: Sequence[JobBulkUpdateItem],
+    save_usage: bool = False,
+) -> List[JobBulkUpdateResult]:
+    """Updates many jobs at once, charging their projects for the QPU usage, if reported
+
+    This does the same as calling `complete_job` for each update, but the jobs are read in one query,
+    and the QPU usage is debited in one update per project.
+    It is all done in a single transaction if the database supports it.
+
+    A job is only written if it has not been changed since it was read, so that the QPU usage
+    is charged only once even if the job is updated concurrently by another request.
+    Each job is written with its own guarded update so that whether it was applied is known
+    from the write itself, even if another request updates the job right after it.
+    Jobs whose project does not exist are not updated.
+
+    Args:
+        db: the mongo database from where to get the jobs
+        updates: the updates, each with the job_id of the job and the payload to update in it
+        save_usage: whether to save the resource usage records for reporting to puhuri
+
+    Returns:
+        the outcome of the update of each job, in the order of `updates`
+    """
+    job_ids = [str(item.job_id) for item in updates]
+    results = {
+        job_id: JobBulkUpdateResult(job_id=job_id, outcome=JobBulkUpdateOutcome.UPDATED)
+        for job_id in job_ids
+    }
+    changes: List[Tuple[Mapping[str, Any], Dict[str, Any], JobBulkUpdateItem]] = []
+    updated_at = get_current_datetime()
+
+    async with mongodb_utils.transaction(db) as session:
+        # the memory is left out as it is not needed and may be large
+        documents = {
+            item["job_id"]: item
+            async for item in db.jobs.find(
+                {"job_id": {"$in": job_ids}},
+                {"result.memory": 0, "result.memory_packed": 0},
+                session=session,
+            )
+        }
+        project_ids = {v.get("project_id") for v in documents.values()} - {None}
+        projects = {
+            str(item["_id"]): Project.model_validate(item)
+            async for item in db[PROJECT_DB_COLLECTION].find(
+                {"_id": {"$in": [PydanticObjectId(v) for v in project_ids]}},
+                session=session,
+            )
+        }
+
+        conflicting_changes = []
+        for item in updates:
+            job_id = str(item.job_id)
+            document = documents.get(job_id)
+            if document is None:
+                results[job_id].outcome = JobBulkUpdateOutcome.NOT_FOUND
+                continue
+
+            project_id = document.get("project_id")
+            if project_id is not None and project_id not in projects:
+                results[job_id].outcome = JobBulkUpdateOutcome.FAILED
+                results[
+                    job_id
+                ].detail = f"project '{project_id}' for job '{job_id}' not found"
+                continue
+
+            update = await _prepare_job_update(
+                db, job_id=job_id, payload=item.payload, session=session
+            )
+            update["updated_at"] = updated_at
+            result = await db.jobs.update_one(
+                {"job_id": job_id, "updated_at": document.get("updated_at")},
+                {"$set": update},
+                session=session,
+            )
+            if result.matched_count == 0:
+                results[job_id].outcome = JobBulkUpdateOutcome.CONFLICT
+                conflicting_changes.append((document, update))
+                continue
+            changes.append((document, update, item))
+
+        await job_stats.record_many_updated(
+            db,
+            changes=[(document, update) for document, update, *_ in changes],
+            session=session,
+        )
+
+        debits: Dict[str, float] = {}
+        for document, _, item in changes:
+            old_job = Job.model_validate(document)
+            qpu_usage = getattr(item.payload.timestamps, "resource_usage", None)
+            if old_job.duration_in_secs is not None or qpu_usage is None:
+                continue
+
+            if old_job.project_id is not None:
+                debits[old_job.project_id] = (
+                    debits.get(old_job.project_id, 0) + qpu_usage
+                )
+            if save_usage:
+                await puhuri_service.save_qpu_usage(
+                    db,
+                    job_id=old_job.job_id,
+                    project=projects.get(old_job.project_id),
+                    qpu_usage=qpu_usage,
+                    session=session,
+                )
+
+        if len(debits) > 0:
+            await db[PROJECT_DB_COLLECTION].bulk_write(
+                [
+                    UpdateOne(
+                        {"_id": PydanticObjectId(project_id)},
+                        {"$inc": {"qpu_seconds": -qpu_usage}},
+                    )
+                    for project_id, qpu_usage in debits.items()
+                ],
+                ordered=False,
+                session=session,
+            )
+
+    for document, update in conflicting_changes:
+        # the memory saved for the update was never referenced by the job
+        await _delete_new_memory(db, job_id=document["job_id"], update=update)
+
+    for document, update, item in changes:
+        job_cache.invalidate(document["job_id"])
+        await _delete_replaced_memory(db, old_document=document, payload=item.payload)
+        new_status = update.get("status")
+        if new_status is not None and new_status != document.get("status"):
+            job_events.notify(Job.model_validate({**document, **update}))
+
+    return [results[job_id] for job_id in job_ids]
+
+
+async def _update_job_document(
+    db: AsyncIOMotorDatabase,
+    job_id: UUID,
+    payload: JobUpdate,
+    session: Optional[AsyncIOMotorClientSession] = None,
+) -> Tuple[Mapping[str, Any], Dict[str, Any]]:
+    """Updates the job document of the given job_id, storing its result memory as configured
+
+    The cached response of the job, if any, is dropped.
+    Any externally stored memory that the update replaces is left as it is, as the update
+    may yet be rolled back; it is to be deleted with `_delete_replaced_memory` afterwards.
+    See `update_job`
 
     Args:
         db: the mongo database from where to get the job
-        project_db: the ProjectDatabase instance where projects are found
         job_id: the job id of the job
+        payload: the new payload to update in job
+        session: the session in which to update the job document, if any
+
+    Returns:
+        tuple of the job document before it was modified, and the update applied to it
+
+    Raises:
+        NotFoundError: no documents matching {"job_id": job_id} were found
+    """
+    update = await _prepare_job_update(
+        db, job_id=str(job_id), payload=payload, session=session
+    )
+
+    updated_at = get_current_datetime()
+    try:
+        document = await mongodb_utils.update_one(
+            db.jobs,
+            _filter={"job_id": str(job_id)},
+            payload=update,
+            return_document=ReturnDocument.BEFORE,
+            session=session,
+            updated_at=updated_at,
+        )
+    except NotFoundError as exp:
+        await _delete_new_memory(db, job_id=str(job_id), update=update, session=session)
+        raise exp
+
+    job_cache.invalidate(str(job_id))
+    update = {**update, "updated_at": updated_at}
+    await job_stats.record_updated(
+        db, old_document=document, update=update, session=session
+    )
+    return document, update
+
+
+async def _prepare_job_update(
+    db: AsyncIOMotorDatabase,
+    job_id: str,
+    payload: JobUpdate,
+    session: Optional[AsyncIOMotorClientSession] = None,
+) -> Dict[str, Any]:
+    """Converts the payload into the update of the job document, storing its result memory as configured
+
+    The result memory is bit-packed if `pack_result_memory` is set in the config, or else
+    saved in the 'job_results' collection, under a new version, if it is larger than `max_inline_result_bytes`.
+
+    Args:
+        db: the mongo database
+        job_id: the job id of the job
+        payload: the new payload to update in job
+        session: the session in which to save the result memory, if any
+
+    Returns:
+        the update for the job document
+    """
+    update = payload.model_dump()
+    memory = getattr(payload.result, "memory", None)
+    jobs_conf = settings.CONFIG.jobs
+    packed_memory = (
+        PackedMemory.from_memory(memory)
+        if memory and jobs_conf.pack_result_memory
+        else None
+    )
+    is_memory_external = (
+        memory is not None
+        and packed_memory is None
+        and results_store.estimate_memory_size(memory)
+        > jobs_conf.max_inline_result_bytes
+    )
+
+    if packed_memory is not None:
+        update["result"].pop("memory")
+        update["result"]["memory_packed"] = packed_memory.model_dump()
+
+    if is_memory_external:
+        memory_ref = await results_store.save_memory(
+            db,
+            job_id=job_id,
+            memory=memory,
+            chunk_size=jobs_conf.result_chunk_size,
+            session=session,
+        )
+        update["result"].pop("memory")
+        update["result"]["memory_ref"] = memory_ref.model_dump()
+
+    return update
+
+
+async def _delete_replaced_memory(
+    db: AsyncIOMotorDatabase, old_document: Mapping[str, Any], payload: JobUpdate
+):
+    """Deletes the externally stored result memory of a job if the update replaced it
+
+    This is to be called only after the update of the job document is committed,
+    so that the job never references memory that no longer exists.
+
+    Args:
+        db: the mongo database
+        old_document: the job document before it was updated
+        payload: the payload the job was updated with
+    """
+    memory_ref = (old_document.get("result") or {}).get("memory_ref")
+    if memory_ref is not None and payload.result is not None:
+        # the new result replaced the reference to the old externally stored memory
+        await results_store.delete_memory(
+            db, job_id=old_document["job_id"], version=memory_ref.get("version")
+        )
+
+
+async def _delete_new_memory(
+    db: AsyncIOMotorDatabase,
+    job_id: str,
+    update: Mapping[str, Any],
+    session: Optional[AsyncIOMotorClientSession] = None,
+):
+    """Deletes the externally stored result memory saved for an update that was not applied
+
+    Args:
+        db: the mongo database
+        job_id: the job id of the job
+        update: the update for the job document, as got from `_prepare_job_update`
+        session: the session in which the memory was saved, if any
+    """
+    memory_ref = (update.get("result") or {}).get("memory_ref")
+    if memory_ref is not None:
+        await results_store.delete_memory(
+            db, job_id=job_id, version=memory_ref["version"], session=session
+        )
+
+
+async def _debit_qpu_usage(
+    db: AsyncIOMotorDatabase,
+    job: Job,
+    qpu_usage: float,
+    session: Optional[AsyncIOMotorClientSession] = None,
+) -> Optional[Project]:
+    """Deducts the QPU usage of the given job from the QPU seconds of its project
+
+    The projects collection is updated directly so that it can be done in the same
+    session as the job update.
+
+    Args:
+        db: the mongo database where the projects are found
+        job: the job whose QPU usage is to be deducted
         qpu_usage: the resource usage in seconds
+        session: the session in which to update the project, if any
 
     Return:
         the updated project if the job was attached to a project, else None
 
     Raises:
-        utils.exc.NotFoundError: no matches for '{"job_id": job_id}'.
         utils.exc.NotFoundError: project '{project_id}' for job '{job_id}' not found
-        KeyError: 'project_id'
     """
-    job = await get_one(db, job_id=job_id)
     project_id = job.project_id
-    project = await project_db.increment_qpu_seconds(
-        project_id=project_id, qpu_seconds=-qpu_usage
+    if project_id is None:
+        return None
+
+    document = await db[PROJECT_DB_COLLECTION].find_one_and_update(
+        {"_id": PydanticObjectId(project_id)},
+        {"$inc": {"qpu_seconds": -qpu_usage}},
+        return_document=ReturnDocument.AFTER,
+        session=session,
     )
-    if project is None and project_id is not None:
-        raise NotFoundError(f"project '{project_id}' for job '{job_id}' not found")
-    return project
+    if document is None:
+        raise NotFoundError(f"project '{project_id}' for job '{job.job_id}' not found")
+    return Project.model_validate(document)
+
+
+def _get_archive_union(include_archived: bool) -> Tuple[str, ...]:
+    """Gets the names of the collections to query together with the 'jobs' collection
+
+    Args:
+        include_archived: whether the jobs in the archive are to be included
+
+    Returns:
+        the names of the other collections to query
+    """
+    return (job_archive.COLLECTION,) if include_archived else ()
+
+
+def _get_schema(
+    fields: Tuple[str, ...] = (), exclude: Tuple[str, ...] = ()
+) -> Type[Union[Job, JobPartial]]:
+    """Gets the schema to parse the job records into, given the projection
+
+    Projected records may lack required fields of the Job, so they are parsed as partial jobs
+
+    Args:
+        fields: the only fields of the job to return
+        exclude: the fields of the job to leave out
+
+    Returns:
+        the Job schema if there is no projection, else the JobPartial schema
+
+    Raises:
+        utils.exc.InvalidQueryError: unknown field '{path}'
+    """
+    if not fields and not exclude:
+        return Job
+
+    validate_field_paths(Job, paths=(*fields, *exclude))
+    return JobPartial
+
+
+def _with_memory_fields(
+    fields: Tuple[str, ...] = (), exclude: Tuple[str, ...] = ()
+) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+    """Adds the alternative storage fields of the result memory to the given projection
+
+    The memory may be stored as 'result.memory_ref' or 'result.memory_packed'
+    so they are to be fetched or left out together with 'result.memory'
+
+    Args:
+        fields: the only fields of the job to return
+        exclude: the fields of the job to leave out
+
+    Returns:
+        tuple of the updated (fields, exclude)
+    """
+    memory_fields = ("result.memory_ref", "result.memory_packed")
+    if "result.memory" in fields:
+        fields = (*fields, *memory_fields)
+    if "result.memory" in exclude:
+        exclude = (*exclude, *memory_fields)
+    return fields, exclude
 
 
 def _without_special_docker_host_domain(url: str) -> str:
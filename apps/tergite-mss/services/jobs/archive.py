@@ -0,0 +1,175 @@
+# This code is part of Tergite
+#
+# (C) Copyright Chalmers Next Labs 2025
+#
+# This code is licensed under the Apache License, Version 2.0. You may
+# obtain a copy of this license in the LICENSE.txt file in the root directory
+# of this source tree or at http://www.apache.org/licenses/LICENSE-2.0.
+#
+# Any modifications or derivative works of this code must retain this
+# copyright notice, and modified files need to carry a notice indicating
+# that they have been altered from the originals.
+"""Archival of finished jobs into the 'jobs_archive' collection
+
+Jobs that finished (i.e. are successful, failed or cancelled) and have not been updated for
+`archive_after_days` are moved in the background from the 'jobs' collection to the
+'jobs_archive' collection, which is compressed with zstd. This keeps the 'jobs' collection
+and its indexes small enough to stay in memory.
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+import pymongo
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import IndexModel, ReplaceOne
+from pymongo.errors import CollectionInvalid, PyMongoError
+
+from utils.indexes import register_indexes
+
+from .events import TERMINAL_STATUSES
+
+COLLECTION = "jobs_archive"
+
+register_indexes(
+    COLLECTION,
+    [
+        IndexModel("job_id", unique=True),
+        IndexModel([("created_at", pymongo.DESCENDING), ("_id", pymongo.DESCENDING)]),
+    ],
+)
+
+_ARCHIVER: Optional[asyncio.Task] = None
+
+
+async def create_collection(db: AsyncIOMotorDatabase):
+    """Creates the archive collection with zstd block compression if it does not exist yet
+
+    This should be called before any index is created on it, as that would create
+    it with the default compression.
+
+    Args:
+        db: the mongo database
+    """
+    try:
+        await db.create_collection(
+            COLLECTION,
+            storageEngine={"wiredTiger": {"configString": "block_compressor=zstd"}},
+        )
+    except CollectionInvalid:
+        # the collection already exists
+        pass
+
+
+async def archive_jobs(
+    db: AsyncIOMotorDatabase, updated_before: datetime, batch_size: int = 500
+) -> int:
+    """Moves the finished jobs last updated before the given timestamp into the archive
+
+    The jobs are moved in batches; each batch is copied into the archive before it is
+    deleted from the 'jobs' collection so that no job is lost if this is interrupted.
+    Jobs updated in the meantime are left in the 'jobs' collection and removed from the archive.
+
+    Args:
+        db: the mongo database
+        updated_before: the time before which the jobs should have been last updated
+        batch_size: the maximum number of jobs moved at once
+
+    Returns:
+        the number of jobs moved
+    """
+    filters = {
+        "status": {"$in": [status.value for status in TERMINAL_STATUSES]},
+        "updated_at": {"$lt": updated_before},
+    }
+    total = 0
+
+    while True:
+        documents = await db.jobs.find(filters).to_list(length=batch_size)
+        if len(documents) == 0:
+            return total
+
+        await db[COLLECTION].bulk_write(
+            [ReplaceOne({"_id": doc["_id"]}, doc, upsert=True) for doc in documents],
+            ordered=False,
+        )
+        ids = [doc["_id"] for doc in documents]
+        result = await db.jobs.delete_many({"_id": {"$in": ids}, **filters})
+        total += result.deleted_count
+
+        if result.deleted_count < len(documents):
+            # drop the copies of the jobs that were updated in the meantime
+            remaining_ids = await db.jobs.distinct("_id", {"_id": {"$in": ids}})
+            await db[COLLECTION].delete_many({"_id": {"$in": remaining_ids}})
+
+        if result.deleted_count == 0:
+            # all jobs in the batch were updated in the meantime
+            return total
+
+
+async def start_archiver(
+    db: AsyncIOMotorDatabase,
+    archive_after_days: Optional[float],
+    interval_secs: float = 3600,
+    batch_size: int = 500,
+):
+    """Starts archiving the finished jobs periodically in the background
+
+    Nothing is started if `archive_after_days` is None
+
+    Args:
+        db: the mongo database
+        archive_after_days: the number of days since their last update after which finished jobs are archived
+        interval_secs: the number of seconds between archiving runs
+        batch_size: the maximum number of jobs moved at once
+    """
+    global _ARCHIVER
+    await stop_archiver()
+    if archive_after_days is not None:
+        _ARCHIVER = asyncio.create_task(
+            _archive_periodically(
+                db,
+                archive_after_days=archive_after_days,
+                interval_secs=interval_secs,
+                batch_size=batch_size,
+            )
+        )
+
+
+async def stop_archiver():
+    """Stops the background archiving of jobs"""
+    global _ARCHIVER
+    if _ARCHIVER is not None:
+        _ARCHIVER.cancel()
+        try:
+            await _ARCHIVER
+        except asyncio.CancelledError:
+            pass
+
+    _ARCHIVER = None
+
+
+async def _archive_periodically(
+    db: AsyncIOMotorDatabase,
+    archive_after_days: float,
+    interval_secs: float,
+    batch_size: int,
+):
+    """Archives the finished jobs older than `archive_after_days` every `interval_secs` seconds
+
+    Args:
+        db: the mongo database
+        archive_after_days: the number of days since their last update after which finished jobs are archived
+        interval_secs: the number of seconds between archiving runs
+        batch_size: the maximum number of jobs moved at once
+    """
+    while True:
+        cutoff = datetime.now(timezone.utc) - timedelta(days=archive_after_days)
+        try:
+            total = await archive_jobs(db, updated_before=cutoff, batch_size=batch_size)
+            logging.info(f"archived {total} jobs")
+        except PyMongoError as exp:
+            logging.error(f"failed to archive jobs: {exp}")
+
+        await asyncio.sleep(interval_secs)
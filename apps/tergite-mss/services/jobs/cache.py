@@ -0,0 +1,111 @@
+# This code is part of Tergite
+#
+# (C) Copyright Chalmers Next Labs 2025
+#
+# This code is licensed under the Apache License, Version 2.0. You may
+# obtain a copy of this license in the LICENSE.txt file in the root directory
+# of this source tree or at http://www.apache.org/licenses/LICENSE-2.0.
+#
+# Any modifications or derivative works of this code must retain this
+# copyright notice, and modified files need to carry a notice indicating
+# that they have been altered from the originals.
+"""In-process LRU cache of the serialized responses of jobs that have finished
+
+Jobs that are successful, failed or cancelled are not expected to change, so their
+JSON responses are kept, together with their ETags, up to a total of `max_bytes` bytes.
+The least recently used responses are evicted first.
+A job can have many cached responses, one per variant e.g. the histogram of its memory.
+Entries are invalidated when a job is updated through this instance of the app.
+"""
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional, Set, Tuple
+
+
+class CachedResponse(NamedTuple):
+    """The serialized response of a job and its ETag"""
+
+    body: bytes
+    etag: str
+
+
+_ENTRIES: "OrderedDict[Tuple[str, str], CachedResponse]" = OrderedDict()
+# the variants cached for each job, so that all of them are invalidated together
+_VARIANTS: Dict[str, Set[str]] = {}
+_SIZE = 0
+
+
+def get(job_id: str, variant: str = "") -> Optional[CachedResponse]:
+    """Gets the cached response of the given job, marking it as the most recently used
+
+    Args:
+        job_id: the id of the job
+        variant: the variant of the response; default = "" meaning the full job
+
+    Returns:
+        the cached response or None if there is none
+    """
+    key = (job_id, variant)
+    entry = _ENTRIES.get(key)
+    if entry is not None:
+        _ENTRIES.move_to_end(key)
+    return entry
+
+
+def put(job_id: str, entry: CachedResponse, max_bytes: int, variant: str = ""):
+    """Caches the response of the given job, evicting the least recently used ones if need be
+
+    Responses larger than `max_bytes` are not cached.
+
+    Args:
+        job_id: the id of the job
+        entry: the serialized response of the job and its ETag
+        max_bytes: the maximum total size in bytes of the cached responses
+        variant: the variant of the response; default = "" meaning the full job
+    """
+    global _SIZE
+    _remove((job_id, variant))
+    if len(entry.body) > max_bytes:
+        return
+
+    _ENTRIES[(job_id, variant)] = entry
+    _VARIANTS.setdefault(job_id, set()).add(variant)
+    _SIZE += len(entry.body)
+    while _SIZE > max_bytes:
+        _remove(next(iter(_ENTRIES)))
+
+
+def invalidate(job_id: str):
+    """Removes all cached responses of the given job, if any
+
+    Args:
+        job_id: the id of the job
+    """
+    for variant in _VARIANTS.get(job_id, set()).copy():
+        _remove((job_id, variant))
+
+
+def clear():
+    """Removes all cached responses"""
+    global _SIZE
+    _ENTRIES.clear()
+    _VARIANTS.clear()
+    _SIZE = 0
+
+
+def _remove(key: Tuple[str, str]):
+    """Removes the cached response of the given (job_id, variant) key, if any
+
+    Args:
+        key: the (job_id, variant) key of the response
+    """
+    global _SIZE
+    entry = _ENTRIES.pop(key, None)
+    if entry is None:
+        return
+
+    _SIZE -= len(entry.body)
+    job_id, variant = key
+    variants = _VARIANTS.get(job_id, set())
+    variants.discard(variant)
+    if len(variants) == 0:
+        _VARIANTS.pop(job_id, None)
@@ -0,0 +1,113 @@
+# This code is part of Tergite
+#
+# (C) Copyright Chalmers Next Labs 2025
+#
+# This code is licensed under the Apache License, Version 2.0. You may
+# obtain a copy of this license in the LICENSE.txt file in the root directory
+# of this source tree or at http://www.apache.org/licenses/LICENSE-2.0.
+#
+# Any modifications or derivative works of this code must retain this
+# copyright notice, and modified files need to carry a notice indicating
+# that they have been altered from the originals.
+"""Histograms of the measurement memory of job results
+
+The shots are counted as integers with `numpy.unique`, straight from the packed memory
+if the memory is bit-packed, and the counts are keyed by shot strings in the format
+of the original memory i.e. hex like "0x5" or bitstrings like "101".
+"""
+from collections import Counter
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from utils.exc import InvalidQueryError
+
+from . import packing
+from .dtos import JobResult
+
+
+def count_memory(result: JobResult, clbits: Sequence[int] = ()) -> List[Dict[str, int]]:
+    """Counts the shots of each experiment of the given job result
+
+    Args:
+        result: the result of the job, with its memory inlined or bit-packed
+        clbits: the classical bits to marginalize the shots over; default = () meaning all of them
+
+    Returns:
+        the map of shot string to its number of occurrences, for each experiment
+
+    Raises:
+        utils.exc.InvalidQueryError: classical bits cannot be repeated
+        utils.exc.InvalidQueryError: classical bit '{clbit}' is out of range
+        utils.exc.InvalidQueryError: the memory cannot be marginalized
+    """
+    if len(set(clbits)) != len(clbits):
+        raise InvalidQueryError("classical bits cannot be repeated")
+
+    packed = result.memory_packed
+    if packed is not None:
+        experiments = [
+            packing.unpack_bits(data, num_clbits=packed.num_clbits, count=count)
+            for data, count in zip(packed.data, packed.num_shots)
+        ]
+        return _count_experiments(
+            experiments, fmt=packed.format, num_clbits=packed.num_clbits, clbits=clbits
+        )
+
+    shots = [shot for experiment in result.memory for shot in experiment]
+    fmt = packing.detect_format(shots)
+    experiments = None
+    if fmt is not None:
+        try:
+            experiments = [packing.parse_shots(item, fmt) for item in result.memory]
+        except OverflowError:
+            # some values need more than packing.MAX_NUM_CLBITS bits
+            pass
+
+    if experiments is None:
+        # the shots are counted as they are, without parsing them
+        if len(clbits) > 0 and len(shots) > 0:
+            raise InvalidQueryError("the memory cannot be marginalized")
+        return [dict(Counter(experiment)) for experiment in result.memory]
+
+    num_clbits = len(shots[0]) if fmt == "bin" else None
+    return _count_experiments(
+        experiments, fmt=fmt, num_clbits=num_clbits, clbits=clbits
+    )
+
+
+def _count_experiments(
+    experiments: List[np.ndarray],
+    fmt: packing.MemoryFormat,
+    num_clbits: Optional[int],
+    clbits: Sequence[int],
+) -> List[Dict[str, int]]:
+    """Counts the shot values of each experiment, marginalized over the given classical bits
+
+    Args:
+        experiments: the uint64 array of the shot values of each experiment
+        fmt: the format of the original shot strings
+        num_clbits: the number of classical bits per shot, if known; it is required for bitstrings
+        clbits: the classical bits to marginalize the shots over; () means all of them
+
+    Returns:
+        the map of shot string to its number of occurrences, for each experiment
+
+    Raises:
+        utils.exc.InvalidQueryError: classical bit '{clbit}' is out of range
+    """
+    # hex shots drop their leading zeros, so only bitstrings have a known width
+    max_clbits = num_clbits if fmt == "bin" else packing.MAX_NUM_CLBITS
+    for clbit in clbits:
+        if not 0 <= clbit < max_clbits:
+            raise InvalidQueryError(f"classical bit '{clbit}' is out of range")
+
+    width = len(clbits) if len(clbits) > 0 else num_clbits
+    counts = []
+    for values in experiments:
+        if len(clbits) > 0:
+            values = packing.marginalize(values, clbits)
+        unique, occurrences = packing.count_values(values)
+        shots = packing.format_shots(unique, fmt=fmt, num_clbits=width)
+        counts.append(dict(zip(shots, occurrences.tolist())))
+    return counts
@@ -12,16 +12,27 @@
 """Data Transfer Objects for the quantum jobs service"""
 import enum
 from datetime import datetime
-from typing import Any, Callable, List, Literal, Optional, Set, TypedDict
+from typing import Any, Callable, Dict, List, Literal, Optional, Set, TypedDict
+from uuid import UUID
 
 from beanie import PydanticObjectId
 from fastapi import Query
-from pydantic import BaseModel, ConfigDict, Field, computed_field, field_serializer
+from pydantic import (
+    BaseModel,
+    ConfigDict,
+    Field,
+    SerializerFunctionWrapHandler,
+    computed_field,
+    field_serializer,
+    field_validator,
+    model_serializer,
+)
 from pydantic.main import IncEx
 
-from utils.date_time import datetime_to_zulu, get_current_timestamp
+from utils.date_time import ZuluDatetime, datetime_to_zulu, get_current_datetime
 from utils.models import create_partial_model
 
+from . import packing
 from .utils import get_uuid4_str
 
 
@@ -32,6 +43,13 @@ class CreatedJobResponse(TypedDict):
     upload_url: str
 
 
+class FailedJobResponse(TypedDict):
+    """The response for a job that could not be saved when creating many jobs at once"""
+
+    job_id: str
+    error: str
+
+
 class TimestampPair(BaseModel):
     started: Optional[datetime] = None
     finished: Optional[datetime] = None
@@ -93,6 +111,86 @@ class JobCreate(BaseModel):
     calibration_date: str
 
 
+class JobBulkCreate(JobCreate):
+    """The schema used when creating many jobs for the same device at once"""
+
+    # the number of jobs to create
+    count: int = Field(gt=0)
+
+
+class JobResultMemoryRef(BaseModel):
+    """Reference to the measurement memory of a job that is stored outside the job document"""
+
+    # the number of shots in each experiment
+    num_shots: List[int] = []
+    # the estimated size of the memory in bytes
+    size_in_bytes: int = 0
+    # the maximum number of shots in each stored chunk
+    chunk_size: int
+    # the version of the stored chunks, new on every save; None for chunks saved before versions existed
+    version: Optional[str] = None
+
+
+class PackedMemory(BaseModel):
+    """The measurement memory of a job, bit-packed into one binary per experiment"""
+
+    model_config = ConfigDict(ser_json_bytes="base64", val_json_bytes="base64")
+
+    # the format of the original shot strings i.e. hex like "0x5" or bitstrings like "101"
+    format: Literal["hex", "bin"]
+    # the number of classical bits per shot
+    num_clbits: int
+    # the number of shots in each experiment
+    num_shots: List[int] = []
+    # the shots of each experiment, each shot taking up `num_clbits` bits, most significant bit first
+    data: List[bytes] = []
+
+    @classmethod
+    def from_memory(cls, memory: List[List[str]]) -> Optional["PackedMemory"]:
+        """Packs the given measurement memory
+
+        Args:
+            memory: the measurement memory as a list of shots for each experiment
+
+        Returns:
+            the packed memory or None if the memory cannot be packed losslessly
+        """
+        shots = [shot for experiment in memory for shot in experiment]
+        fmt = packing.detect_format(shots)
+        if fmt is None:
+            return None
+
+        try:
+            experiments = [packing.parse_shots(item, fmt) for item in memory]
+        except OverflowError:
+            # some values need more than packing.MAX_NUM_CLBITS bits
+            return None
+
+        if fmt == "bin":
+            num_clbits = len(shots[0])
+        else:
+            max_value = max(int(values.max(initial=0)) for values in experiments)
+            num_clbits = max(max_value.bit_length(), 1)
+
+        return cls(
+            format=fmt,
+            num_clbits=num_clbits,
+            num_shots=[len(values) for values in experiments],
+            data=[packing.pack_bits(values, num_clbits) for values in experiments],
+        )
+
+    def to_memory(self) -> List[List[str]]:
+        """Unpacks the measurement memory into a list of shot strings for each experiment"""
+        return [
+            packing.format_shots(
+                packing.unpack_bits(data, num_clbits=self.num_clbits, count=count),
+                fmt=self.format,
+                num_clbits=self.num_clbits,
+            )
+            for data, count in zip(self.data, self.num_shots)
+        ]
+
+
 class JobResult(BaseModel):
     """The results of the job"""
 
@@ -101,6 +199,18 @@ class JobResult(BaseModel):
     )
 
     memory: List[List[str]] = []
+    # set if the memory is stored in the 'job_results' collection instead of in the job document
+    memory_ref: Optional[JobResultMemoryRef] = None
+    # set if the memory is stored bit-packed instead of as a list of strings
+    memory_packed: Optional[PackedMemory] = None
+
+    @model_serializer(mode="wrap", when_used="json")
+    def serialize_model(self, handler: SerializerFunctionWrapHandler) -> Dict[str, Any]:
+        """Decodes the packed memory, if any, into the usual list of strings when working with JSON"""
+        data = handler(self)
+        if data.pop("memory_packed", None) is not None:
+            data["memory"] = self.memory_packed.to_memory()
+        return data
 
 
 class Job(JobCreate):
@@ -110,7 +220,8 @@ class Job(JobCreate):
         extra="allow",
     )
 
-    id: Optional[PydanticObjectId] = Field(alias="_id", default=None)
+    # never dumped; excluded here too, for the serializers that do not call model_dump
+    id: Optional[PydanticObjectId] = Field(alias="_id", default=None, exclude=True)
     job_id: str = Field(default_factory=get_uuid4_str)
     project_id: Optional[str] = None
     user_id: Optional[str] = None
@@ -120,8 +231,8 @@ class Job(JobCreate):
     timestamps: Optional[JobTimestamps] = None
     download_url: Optional[str] = None
     result: Optional[JobResult] = None
-    created_at: Optional[str] = Field(default_factory=get_current_timestamp)
-    updated_at: Optional[str] = Field(default_factory=get_current_timestamp)
+    created_at: Optional[ZuluDatetime] = Field(default_factory=get_current_datetime)
+    updated_at: Optional[ZuluDatetime] = Field(default_factory=get_current_datetime)
 
     @computed_field
     @property
@@ -184,8 +295,153 @@ class JobStatusResponse(BaseModel):
         return cls(status=job.status)
 
 
+class JobResultCounts(BaseModel):
+    """The number of occurrences of each shot in the result memory of the job, per experiment"""
+
+    job_id: str
+    status: JobStatus
+    # the classical bits the shots are marginalized over; empty means all of them
+    clbits: List[int] = []
+    # the map of shot string to its number of occurrences, for each experiment
+    counts: List[Dict[str, int]] = []
+
+
+class JobResultMemorySlice(BaseModel):
+    """A slice of the shots of one experiment in the result memory of the job"""
+
+    experiment: int
+    offset: int = 0
+    limit: int
+    # the total number of shots of the experiment
+    num_shots: int = 0
+    shots: List[str] = []
+    # the offset of the next slice; None if this slice is the last one
+    next_offset: Optional[int] = None
+
+
+class JobStatusBatchRequest(BaseModel):
+    """The request body when getting the statuses of many jobs at once"""
+
+    job_ids: List[UUID]
+
+
+class JobStatusEvent(BaseModel):
+    """The event sent when the status of a job changes"""
+
+    model_config = ConfigDict(extra="ignore")
+
+    job_id: str
+    status: JobStatus
+    updated_at: Optional[ZuluDatetime] = None
+
+    @classmethod
+    def from_job(cls, job: Job):
+        """Extracts the status change event from the job"""
+        return cls(job_id=job.job_id, status=job.status, updated_at=job.updated_at)
+
+
+class JobStatsInterval(str, enum.Enum):
+    """The length of the time buckets of the job statistics"""
+
+    DAY = "day"
+    MONTH = "month"
+    YEAR = "year"
+
+
+class JobStats(BaseModel):
+    """The number of jobs per status and their total QPU seconds for a given time bucket
+
+    'device' and 'project_id' are None if the statistics are not grouped by them
+    """
+
+    # the start of the time bucket e.g. '2024-05-01' for days, '2024-05' for months, '2024' for years
+    period: Optional[str] = None
+    device: Optional[str] = None
+    project_id: Optional[str] = None
+    # map of status to number of jobs with that status
+    counts: Dict[JobStatus, int] = {}
+    qpu_seconds: float = 0
+
+
+class LatencyPercentiles(BaseModel):
+    """The percentiles, in seconds, of one kind of latency of jobs"""
+
+    # the number of jobs that had the timestamps needed to compute this latency
+    count: int = 0
+    p50: Optional[float] = None
+    p90: Optional[float] = None
+    p99: Optional[float] = None
+
+
+class DeviceLatencyStats(BaseModel):
+    """The latency percentiles of the jobs of a given device"""
+
+    device: str
+    # from the end of registration to the start of execution
+    queue_wait: LatencyPercentiles = LatencyPercentiles()
+    # from the start to the end of execution
+    execution: LatencyPercentiles = LatencyPercentiles()
+    # from the start of registration to the end of the final stage
+    end_to_end: LatencyPercentiles = LatencyPercentiles()
+
+
+# map of field to the operators allowed in operator-style job filters e.g. 'created_at__gte'.
+# Only fields that lead an index on the jobs collection are allowed.
+JOB_QUERY_OPERATORS = {
+    "created_at": ("gt", "gte", "lt", "lte"),
+    "status": ("in", "nin"),
+    "device": ("in",),
+    "project_id": ("in",),
+    "user_id": ("in",),
+}
+
 # Derived models
-JobQuery = create_partial_model("JobQuery", original=Job, default=Query(None))
+JobQuery = create_partial_model(
+    "JobQuery", original=Job, default=Query(None), operators=JOB_QUERY_OPERATORS
+)
 JobUpdate = create_partial_model(
     "JobUpdate", original=Job, exclude=("job_id", "duration_in_secs")
 )
+JobPartial = create_partial_model("JobPartial", original=Job)
+"""The job with only some of its fields, as returned when a projection is requested"""
+
+
+class JobBulkUpdateItem(BaseModel):
+    """The update of one job in a bulk update"""
+
+    job_id: UUID
+    payload: JobUpdate
+
+
+class JobBulkUpdate(BaseModel):
+    """The request body when updating many jobs at once"""
+
+    updates: List[JobBulkUpdateItem]
+
+    @field_validator("updates")
+    @classmethod
+    def validate_unique_job_ids(
+        cls, value: List[JobBulkUpdateItem]
+    ) -> List[JobBulkUpdateItem]:
+        """Ensures that each job is updated at most once"""
+        if len({item.job_id for item in value}) != len(value):
+            raise ValueError("each job_id can only be updated once")
+        return value
+
+
+class JobBulkUpdateOutcome(str, enum.Enum):
+    """The outcome of the update of one job in a bulk update"""
+
+    UPDATED = "updated"
+    NOT_FOUND = "not_found"
+    # the job was changed by another request while the bulk update was running
+    CONFLICT = "conflict"
+    FAILED = "failed"
+
+
+class JobBulkUpdateResult(BaseModel):
+    """The result of the update of one job in a bulk update"""
+
+    job_id: str
+    outcome: JobBulkUpdateOutcome
+    detail: Optional[str] = None
@@ -0,0 +1,241 @@
+# This code is part of Tergite
+#
+# (C) Copyright Chalmers Next Labs 2025
+#
+# This code is licensed under the Apache License, Version 2.0. You may
+# obtain a copy of this license in the LICENSE.txt file in the root directory
+# of this source tree or at http://www.apache.org/licenses/LICENSE-2.0.
+#
+# Any modifications or derivative works of this code must retain this
+# copyright notice, and modified files need to carry a notice indicating
+# that they have been altered from the originals.
+"""Notifications of changes in the status of jobs
+
+Subscribers get the changes via an in-process pub/sub. The pub/sub is fed by a mongodb
+change stream on the jobs collection if the database supports it (i.e. it is a replica set),
+so that changes made by any instance of the app are seen.
+If the change stream fails, it is reopened after a backoff, resuming after the last change seen.
+Otherwise, and while the change stream is down, it is fed directly by the app when it updates a job.
+"""
+import asyncio
+import logging
+from typing import AsyncIterator, Dict, Optional, Set
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import OperationFailure, PyMongoError
+
+from utils.models import try_parse_record
+
+from .dtos import Job, JobStatus, JobStatusEvent
+
+TERMINAL_STATUSES = frozenset(
+    [JobStatus.SUCCESSFUL, JobStatus.FAILED, JobStatus.CANCELLED]
+)
+
+_SUBSCRIBERS: Dict[str, Set[asyncio.Queue]] = {}
+_WATCHER: Optional[asyncio.Task] = None
+_IS_WATCHING = False
+
+# the code of the error raised if change streams are not supported i.e. the database is not a replica set
+_CHANGE_STREAM_NOT_SUPPORTED_CODE = 40573
+# the codes of the errors raised if the change stream cannot be resumed after the last change seen
+# i.e. ChangeStreamFatalError and ChangeStreamHistoryLost
+_CHANGE_STREAM_NOT_RESUMABLE_CODES = (280, 286)
+# the minimum and maximum number of seconds to wait before reopening a failed change stream
+_MIN_RETRY_DELAY_SECS = 0.5
+_MAX_RETRY_DELAY_SECS = 30.0
+
+
+async def start_watcher(db: AsyncIOMotorDatabase):
+    """Starts watching the jobs collection for changes in the background
+
+    Args:
+        db: the mongo database
+    """
+    global _WATCHER
+    await stop_watcher()
+    _WATCHER = asyncio.create_task(_watch_jobs(db))
+
+
+async def stop_watcher():
+    """Stops watching the jobs collection for changes"""
+    global _WATCHER, _IS_WATCHING
+    if _WATCHER is not None:
+        _WATCHER.cancel()
+        try:
+            await _WATCHER
+        except asyncio.CancelledError:
+            pass
+
+    _WATCHER = None
+    _IS_WATCHING = False
+
+
+def notify(job: Job):
+    """Notifies the subscribers of the new status of the job, unless the change stream does so already
+
+    Args:
+        job: the job whose status has changed
+    """
+    if not _IS_WATCHING:
+        _publish(JobStatusEvent.from_job(job))
+
+
+async def stream_status_events(
+    db: AsyncIOMotorDatabase, job_id: str, keepalive_secs: float = 15.0
+) -> AsyncIterator[str]:
+    """Streams the status of the given job as server-sent events until the job finishes
+
+    The current status is sent first, followed by any status changes.
+    A comment is sent after every `keepalive_secs` of inactivity to keep the connection open.
+
+    Args:
+        db: the mongo database
+        job_id: the id of the job
+        keepalive_secs: the maximum number of seconds to wait for an event before sending a comment
+
+    Returns:
+        an async iterator of the server-sent events
+    """
+    # subscribe before reading the current status so that no change is missed in between
+    queue = _subscribe(job_id)
+    try:
+        document = await db.jobs.find_one(
+            {"job_id": job_id}, {"_id": 0, "job_id": 1, "status": 1, "updated_at": 1}
+        )
+        if document is None:
+            return
+
+        event = JobStatusEvent.model_validate(document)
+        yield _to_sse(event)
+
+        while event.status not in TERMINAL_STATUSES:
+            try:
+                new_event = await asyncio.wait_for(queue.get(), timeout=keepalive_secs)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+
+            if new_event.status != event.status:
+                event = new_event
+                yield _to_sse(event)
+    finally:
+        _unsubscribe(job_id, queue)
+
+
+def _subscribe(job_id: str) -> asyncio.Queue:
+    """Subscribes to the status changes of the given job
+
+    Args:
+        job_id: the id of the job
+
+    Returns:
+        the queue on which the status change events are put
+    """
+    queue = asyncio.Queue()
+    _SUBSCRIBERS.setdefault(job_id, set()).add(queue)
+    return queue
+
+
+def _unsubscribe(job_id: str, queue: asyncio.Queue):
+    """Unsubscribes the given queue from the status changes of the given job
+
+    Args:
+        job_id: the id of the job
+        queue: the queue returned when subscribing
+    """
+    queues = _SUBSCRIBERS.get(job_id, set())
+    queues.discard(queue)
+    if len(queues) == 0:
+        _SUBSCRIBERS.pop(job_id, None)
+
+
+def _publish(event: JobStatusEvent):
+    """Sends the given event to all subscribers of its job
+
+    Args:
+        event: the status change event
+    """
+    for queue in _SUBSCRIBERS.get(event.job_id, ()):
+        queue.put_nowait(event)
+
+
+async def _watch_jobs(db: AsyncIOMotorDatabase):
+    """Publishes the status changes of jobs got from the change stream of the jobs collection
+
+    It returns early if change streams are not supported by the database.
+    Any other failure of the change stream is logged, and the stream is reopened after
+    a delay that doubles on each consecutive failure, resuming after the last change seen.
+
+    Args:
+        db: the mongo database
+    """
+    global _IS_WATCHING
+    pipeline = [
+        {
+            "$match": {
+                "$or": [
+                    {"operationType": {"$in": ["insert", "replace"]}},
+                    # only updates of the status need the job to be looked up
+                    {
+                        "operationType": "update",
+                        "updateDescription.updatedFields.status": {"$exists": True},
+                    },
+                ]
+            }
+        },
+        {
+            "$project": {
+                "fullDocument.job_id": 1,
+                "fullDocument.status": 1,
+                "fullDocument.updated_at": 1,
+            }
+        },
+    ]
+
+    resume_token = None
+    delay = _MIN_RETRY_DELAY_SECS
+    try:
+        while True:
+            try:
+                async with db.jobs.watch(
+                    pipeline, full_document="updateLookup", resume_after=resume_token
+                ) as stream:
+                    _IS_WATCHING = True
+                    async for change in stream:
+                        resume_token = stream.resume_token
+                        delay = _MIN_RETRY_DELAY_SECS
+                        event = try_parse_record(
+                            JobStatusEvent, change.get("fullDocument")
+                        )
+                        if event is not None:
+                            _publish(event)
+            except OperationFailure as exp:
+                if exp.code == _CHANGE_STREAM_NOT_SUPPORTED_CODE:
+                    logging.info(
+                        f"job status changes will not be got from a change stream: {exp}"
+                    )
+                    return
+                if exp.code in _CHANGE_STREAM_NOT_RESUMABLE_CODES:
+                    resume_token = None
+                logging.error(f"job status change stream failed: {exp}")
+            except PyMongoError as exp:
+                logging.error(f"job status change stream failed: {exp}")
+
+            _IS_WATCHING = False
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, _MAX_RETRY_DELAY_SECS)
+    finally:
+        _IS_WATCHING = False
+
+
+def _to_sse(event: JobStatusEvent) -> str:
+    """Converts the status change event into a server-sent event message
+
+    Args:
+        event: the status change event
+
+    Returns:
+        the server-sent event message
+    """
+    return f"event: status\ndata: {event.model_dump_json()}\n\n"
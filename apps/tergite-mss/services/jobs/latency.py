@@ -0,0 +1,289 @@
+# This code is part of Tergite
+#
+# (C) Copyright Chalmers Next Labs 2025
+#
+# This code is licensed under the Apache License, Version 2.0. You may
+# obtain a copy of this license in the LICENSE.txt file in the root directory
+# of this source tree or at http://www.apache.org/licenses/LICENSE-2.0.
+#
+# Any modifications or derivative works of this code must retain this
+# copyright notice, and modified files need to carry a notice indicating
+# that they have been altered from the originals.
+"""Percentiles of the queue wait, execution and end-to-end latencies of jobs per device
+
+The percentiles are computed on the database server with `$percentile` if it is supported
+(MongoDB 7.0 and above). Otherwise, the timestamps of the jobs are streamed in batches
+and the percentiles are computed with numpy.
+The archived jobs are included, as they are the finished jobs with complete timestamps.
+The results are cached for `ttl_secs` so that repeated views do not scan the jobs every time.
+Expired results are dropped whenever a result is cached, and at most `_MAX_CACHE_SIZE`
+results are kept, dropping the oldest first, as every (since, until) window is cached apart.
+"""
+import logging
+import time
+from array import array
+from datetime import datetime
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import OperationFailure
+
+from utils import mongodb as mongodb_utils
+
+from . import archive
+from .dtos import DeviceLatencyStats, LatencyPercentiles
+
+PERCENTILES = (50, 90, 99)
+
+# map of latency name to the (start, end) timestamps it is measured between
+_LATENCIES: Dict[str, Tuple[str, str]] = {
+    "queue_wait": ("registration.finished", "execution.started"),
+    "execution": ("execution.started", "execution.finished"),
+    "end_to_end": ("registration.started", "final.finished"),
+}
+
+# map of (database, device, since, until) to the (time cached, result), oldest first
+_CACHE: Dict[Tuple[Any, ...], Tuple[float, List[DeviceLatencyStats]]] = {}
+_MAX_CACHE_SIZE = 128
+
+# the codes of the errors raised by database servers that do not know the `$percentile` operator
+# i.e. InvalidPipelineOperator and "unknown group operator"
+_UNKNOWN_OPERATOR_ERROR_CODES = (168, 15952)
+_IS_PERCENTILE_SUPPORTED = True
+
+
+async def get_latency_stats(
+    db: AsyncIOMotorDatabase,
+    device: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    ttl_secs: float = 60,
+    batch_size: int = 0,
+) -> List[DeviceLatencyStats]:
+    """Gets the latency percentiles of the jobs per device
+
+    Args:
+        db: the mongo database
+        device: the only device to get the latencies for; default = all devices
+        since: the earliest time (inclusive) of creation of the jobs
+        until: the latest time (exclusive) of creation of the jobs
+        ttl_secs: the maximum age in seconds of a cached result that can be returned
+        batch_size: the number of jobs got from the database in one round trip, if the
+            percentiles are computed with numpy; default = 0 meaning the database's default
+
+    Returns:
+        the latency percentiles for each device, sorted by device
+    """
+    global _IS_PERCENTILE_SUPPORTED
+    key = (db.name, device, since, until)
+    cached = _CACHE.get(key)
+    if cached is not None and time.monotonic() - cached[0] < ttl_secs:
+        return cached[1]
+
+    filters = _get_filters(device=device, since=since, until=until)
+    result = None
+    if _IS_PERCENTILE_SUPPORTED:
+        try:
+            result = await _aggregate_percentiles(db, filters=filters)
+        except OperationFailure as exp:
+            if exp.code not in _UNKNOWN_OPERATOR_ERROR_CODES:
+                raise exp
+            logging.info(f"$percentile not supported, falling back to numpy: {exp}")
+            _IS_PERCENTILE_SUPPORTED = False
+
+    if result is None:
+        result = await _compute_percentiles(db, filters=filters, batch_size=batch_size)
+
+    _save_to_cache(key, result=result, ttl_secs=ttl_secs)
+    return result
+
+
+def _save_to_cache(
+    key: Tuple[Any, ...], result: List[DeviceLatencyStats], ttl_secs: float
+):
+    """Caches the given result, dropping the expired results and the oldest beyond `_MAX_CACHE_SIZE`
+
+    Args:
+        key: the (database, device, since, until) the result was computed for
+        result: the latency percentiles for each device
+        ttl_secs: the maximum age in seconds of a cached result
+    """
+    now = time.monotonic()
+    # re-inserting moves the key to the end, keeping the cache in order of time cached
+    _CACHE.pop(key, None)
+    while len(_CACHE) > 0:
+        oldest_key, (cached_at, _) = next(iter(_CACHE.items()))
+        if now - cached_at < ttl_secs and len(_CACHE) < _MAX_CACHE_SIZE:
+            break
+        del _CACHE[oldest_key]
+
+    _CACHE[key] = (now, result)
+
+
+async def _aggregate_percentiles(
+    db: AsyncIOMotorDatabase, filters: Dict[str, Any]
+) -> List[DeviceLatencyStats]:
+    """Computes the latency percentiles per device on the database server
+
+    Args:
+        db: the mongo database
+        filters: the filters the jobs should satisfy
+
+    Returns:
+        the latency percentiles for each device, sorted by device
+
+    Raises:
+        OperationFailure: $percentile is not supported by the database server
+    """
+    latencies = {
+        name: mongodb_utils.seconds_between(
+            f"$timestamps.{start}", f"$timestamps.{end}"
+        )
+        for name, (start, end) in _LATENCIES.items()
+    }
+    group: Dict[str, Any] = {"_id": "$device"}
+    for name in _LATENCIES:
+        group[name] = {
+            "$percentile": {
+                "input": f"${name}",
+                "p": [p / 100 for p in PERCENTILES],
+                "method": "approximate",
+            }
+        }
+        group[f"{name}_count"] = {
+            "$sum": {"$cond": [{"$ne": [f"${name}", None]}, 1, 0]}
+        }
+
+    pipeline = [
+        {"$match": filters},
+        {"$unionWith": {"coll": archive.COLLECTION, "pipeline": [{"$match": filters}]}},
+        {"$project": {"device": 1, **latencies}},
+        {"$group": group},
+        {"$sort": {"_id": 1}},
+    ]
+
+    return [
+        DeviceLatencyStats(
+            device=item["_id"],
+            **{
+                name: _to_percentiles(item[name], count=item[f"{name}_count"])
+                for name in _LATENCIES
+            },
+        )
+        async for item in db.jobs.aggregate(pipeline)
+    ]
+
+
+async def _compute_percentiles(
+    db: AsyncIOMotorDatabase, filters: Dict[str, Any], batch_size: int = 0
+) -> List[DeviceLatencyStats]:
+    """Computes the latency percentiles per device with numpy, streaming the jobs in batches
+
+    Only the latencies, as doubles, are kept in memory, not the jobs.
+    The jobs are read from the 'jobs' collection and then from the archive.
+
+    Args:
+        db: the mongo database
+        filters: the filters the jobs should satisfy
+        batch_size: the number of jobs got from the database in one round trip;
+            default = 0 meaning the database's default
+
+    Returns:
+        the latency percentiles for each device, sorted by device
+    """
+    projection = {"_id": 0, "device": 1, "timestamps": 1}
+    values: Dict[str, Dict[str, array]] = {}
+    for collection in (db.jobs, db[archive.COLLECTION]):
+        db_cursor = collection.find(filters, projection)
+        if batch_size > 0:
+            db_cursor.batch_size(batch_size)
+
+        async for job in db_cursor:
+            device_values = values.setdefault(
+                job.get("device"), {name: array("d") for name in _LATENCIES}
+            )
+            timestamps = job.get("timestamps") or {}
+            for name, (start, end) in _LATENCIES.items():
+                duration = _get_duration(timestamps, start=start, end=end)
+                if duration is not None:
+                    device_values[name].append(duration)
+
+    return [
+        DeviceLatencyStats(
+            device=device,
+            **{
+                name: _to_percentiles(
+                    np.percentile(items, PERCENTILES).tolist() if items else None,
+                    count=len(items),
+                )
+                for name, items in device_values.items()
+            },
+        )
+        for device, device_values in sorted(values.items())
+    ]
+
+
+def _get_filters(
+    device: Optional[str], since: Optional[datetime], until: Optional[datetime]
+) -> Dict[str, Any]:
+    """Gets the mongodb filters for the jobs of the given device created in the given window
+
+    Args:
+        device: the only device to get the jobs for, if any
+        since: the earliest timestamp (inclusive) of creation of the jobs, if any
+        until: the latest timestamp (exclusive) of creation of the jobs, if any
+
+    Returns:
+        the mongodb filters
+    """
+    filters: Dict[str, Any] = {}
+    if device is not None:
+        filters["device"] = device
+
+    created_at = {op: v for op, v in (("$gte", since), ("$lt", until)) if v is not None}
+    if created_at:
+        filters["created_at"] = created_at
+    return filters
+
+
+def _get_duration(
+    timestamps: Mapping[str, Any], start: str, end: str
+) -> Optional[float]:
+    """Gets the seconds between two of the given job timestamps
+
+    Args:
+        timestamps: the timestamps of the job as got from the database
+        start: the dot-notation path to the start timestamp e.g. 'execution.started'
+        end: the dot-notation path to the end timestamp
+
+    Returns:
+        the seconds between them, or None if either is not a datetime
+    """
+    start_stage, start_field = start.split(".")
+    end_stage, end_field = end.split(".")
+    started = (timestamps.get(start_stage) or {}).get(start_field)
+    finished = (timestamps.get(end_stage) or {}).get(end_field)
+    if isinstance(started, datetime) and isinstance(finished, datetime):
+        return (finished - started).total_seconds()
+    return None
+
+
+def _to_percentiles(
+    values: Optional[List[Optional[float]]], count: int
+) -> LatencyPercentiles:
+    """Converts the list of values of the percentiles in `PERCENTILES` into LatencyPercentiles
+
+    Args:
+        values: the values of the percentiles, in the order of `PERCENTILES`, if any
+        count: the number of latencies the percentiles were computed from
+
+    Returns:
+        the latency percentiles
+    """
+    if count == 0 or values is None:
+        return LatencyPercentiles(count=count)
+
+    return LatencyPercentiles(
+        count=count, **{f"p{p}": value for p, value in zip(PERCENTILES, values)}
+    )
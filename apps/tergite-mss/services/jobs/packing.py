@@ -0,0 +1,148 @@
+# This code is part of Tergite
+#
+# (C) Copyright Chalmers Next Labs 2025
+#
+# This code is licensed under the Apache License, Version 2.0. You may
+# obtain a copy of this license in the LICENSE.txt file in the root directory
+# of this source tree or at http://www.apache.org/licenses/LICENSE-2.0.
+#
+# Any modifications or derivative works of this code must retain this
+# copyright notice, and modified files need to carry a notice indicating
+# that they have been altered from the originals.
+"""Utilities for bit-packing the measurement memory of jobs"""
+from typing import List, Literal, Optional, Sequence, Tuple
+
+import numpy as np
+
+# the largest number of classical bits that fit in the uint64 used when packing
+MAX_NUM_CLBITS = 64
+
+MemoryFormat = Literal["hex", "bin"]
+
+
+def detect_format(shots: Sequence[str]) -> Optional[MemoryFormat]:
+    """Detects the format of the given shot strings if they can be packed losslessly
+
+    Args:
+        shots: the shot strings e.g. ["0x1", "0x3"] or ["01", "11"]
+
+    Returns:
+        "hex" if all shots are canonical hex strings like `hex(value)`,
+        "bin" if all shots are bitstrings of the same length,
+        else None
+    """
+    if len(shots) == 0:
+        return None
+
+    try:
+        if all(shot == hex(int(shot, 16)) for shot in shots):
+            return "hex"
+    except ValueError:
+        pass
+
+    width = len(shots[0])
+    if 0 < width <= MAX_NUM_CLBITS and all(
+        len(shot) == width and set(shot) <= {"0", "1"} for shot in shots
+    ):
+        return "bin"
+
+    return None
+
+
+def parse_shots(shots: Sequence[str], fmt: MemoryFormat) -> np.ndarray:
+    """Parses the shot strings into an array of integers
+
+    Args:
+        shots: the shot strings
+        fmt: the format of the shot strings
+
+    Returns:
+        the uint64 array of the shot values
+    """
+    base = 16 if fmt == "hex" else 2
+    return np.fromiter((int(shot, base) for shot in shots), dtype=np.uint64)
+
+
+def pack_bits(values: np.ndarray, num_clbits: int) -> bytes:
+    """Packs the given integers into bytes, each taking up `num_clbits` bits, most significant bit first
+
+    Args:
+        values: the uint64 array of values to pack
+        num_clbits: the number of bits per value
+
+    Returns:
+        the packed bytes
+    """
+    shifts = np.arange(num_clbits - 1, -1, -1, dtype=np.uint64)
+    bits = ((values[:, np.newaxis] >> shifts) & np.uint64(1)).astype(np.uint8)
+    return np.packbits(bits, axis=None).tobytes()
+
+
+def unpack_bits(
+    data: bytes, num_clbits: int, count: int, offset: int = 0
+) -> np.ndarray:
+    """Unpacks the integers packed by `pack_bits`
+
+    Only the bytes holding the requested values are unpacked.
+
+    Args:
+        data: the packed bytes
+        num_clbits: the number of bits per value
+        count: the number of values to unpack
+        offset: the number of values to skip; default = 0
+
+    Returns:
+        the uint64 array of the values
+    """
+    start_bit = offset * num_clbits
+    skipped_bits = start_bit % 8
+    raw = np.frombuffer(data, dtype=np.uint8, offset=start_bit // 8)
+    bits = np.unpackbits(raw, count=skipped_bits + count * num_clbits)
+    bits = bits[skipped_bits:].reshape(count, num_clbits)
+    weights = np.uint64(1) << np.arange(num_clbits - 1, -1, -1, dtype=np.uint64)
+    return bits.astype(np.uint64) @ weights
+
+
+def format_shots(values: np.ndarray, fmt: MemoryFormat, num_clbits: int) -> List[str]:
+    """Formats the given shot values back into strings
+
+    Args:
+        values: the uint64 array of the shot values
+        fmt: the format of the shot strings
+        num_clbits: the number of classical bits, used as the width of bitstrings
+
+    Returns:
+        the shot strings
+    """
+    if fmt == "hex":
+        return [hex(value) for value in values.tolist()]
+    return [format(value, f"0{num_clbits}b") for value in values.tolist()]
+
+
+def marginalize(values: np.ndarray, clbits: Sequence[int]) -> np.ndarray:
+    """Keeps only the given classical bits of each shot value
+
+    Args:
+        values: the uint64 array of the shot values, classical bit 0 being the least significant bit
+        clbits: the classical bits to keep; the i-th of them becomes bit i of the marginal values
+
+    Returns:
+        the uint64 array of the marginal shot values
+    """
+    marginal = np.zeros_like(values, dtype=np.uint64)
+    for position, clbit in enumerate(clbits):
+        bit = (values >> np.uint64(clbit)) & np.uint64(1)
+        marginal |= bit << np.uint64(position)
+    return marginal
+
+
+def count_values(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Counts the occurrences of each distinct shot value
+
+    Args:
+        values: the uint64 array of the shot values
+
+    Returns:
+        the sorted distinct values and the number of times each of them occurs
+    """
+    return np.unique(values, return_counts=True)
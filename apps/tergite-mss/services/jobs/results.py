@@ -0,0 +1,357 @@
+# This code is part of Tergite
+#
+# (C) Copyright Chalmers Next Labs 2025
+#
+# This code is licensed under the Apache License, Version 2.0. You may
+# obtain a copy of this license in the LICENSE.txt file in the root directory
+# of this source tree or at http://www.apache.org/licenses/LICENSE-2.0.
+#
+# Any modifications or derivative works of this code must retain this
+# copyright notice, and modified files need to carry a notice indicating
+# that they have been altered from the originals.
+"""Storage of the measurement memory of large job results outside the job documents
+
+The memory is split into chunks of at most `chunk_size` shots, each stored as a separate
+document in the 'job_results' collection, keyed by (job_id, version, experiment, index).
+Each save of the memory of a job gets a new version, so that the chunks it replaces
+are still there, and still referenced by the job, until the job update commits.
+Slices of the memory of an experiment are read without loading the whole memory,
+whether it is stored in chunks, bit-packed or inline in the job document.
+"""
+import json
+from typing import Any, AsyncIterator, Dict, List, Mapping, Optional, Tuple
+
+import pymongo
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClientSession, AsyncIOMotorDatabase
+from pymongo import IndexModel
+
+from utils.indexes import register_indexes
+
+from . import packing
+from .dtos import Job, JobResultMemoryRef
+
+_COLLECTION = "job_results"
+
+register_indexes(
+    _COLLECTION,
+    [
+        IndexModel(
+            [
+                ("job_id", pymongo.ASCENDING),
+                ("version", pymongo.ASCENDING),
+                ("experiment", pymongo.ASCENDING),
+                ("index", pymongo.ASCENDING),
+            ],
+            unique=True,
+        )
+    ],
+)
+
+
+def estimate_memory_size(memory: List[List[str]]) -> int:
+    """Estimates the size in bytes that the given memory takes up in a BSON document
+
+    Each string in a BSON array takes up its length plus about 8 bytes for the
+    type, key, length prefix and null terminator.
+
+    Args:
+        memory: the measurement memory as a list of shots for each experiment
+
+    Returns:
+        the estimated size in bytes
+    """
+    return sum(len(shot) + 8 for experiment in memory for shot in experiment)
+
+
+async def save_memory(
+    db: AsyncIOMotorDatabase,
+    job_id: str,
+    memory: List[List[str]],
+    chunk_size: int,
+    session: Optional[AsyncIOMotorClientSession] = None,
+) -> JobResultMemoryRef:
+    """Saves the measurement memory of the given job in chunks, under a new version
+
+    The chunks of any earlier version are left as they are; they are to be deleted
+    with `delete_memory` once the job references the new version.
+
+    Args:
+        db: the mongo database
+        job_id: the id of the job
+        memory: the measurement memory as a list of shots for each experiment
+        chunk_size: the maximum number of shots in a chunk
+        session: the session in which to insert the chunks, if any
+
+    Returns:
+        the reference to the stored memory
+    """
+    version = str(ObjectId())
+    chunks = [
+        {
+            "job_id": job_id,
+            "version": version,
+            "experiment": experiment_idx,
+            "index": chunk_idx,
+            "offset": offset,
+            "shots": experiment[offset : offset + chunk_size],
+        }
+        for experiment_idx, experiment in enumerate(memory)
+        for chunk_idx, offset in enumerate(range(0, len(experiment), chunk_size))
+    ]
+
+    if len(chunks) > 0:
+        await db[_COLLECTION].insert_many(chunks, ordered=False, session=session)
+
+    return JobResultMemoryRef(
+        num_shots=[len(experiment) for experiment in memory],
+        size_in_bytes=estimate_memory_size(memory),
+        chunk_size=chunk_size,
+        version=version,
+    )
+
+
+async def delete_memory(
+    db: AsyncIOMotorDatabase,
+    job_id: str,
+    version: Optional[str] = None,
+    session: Optional[AsyncIOMotorClientSession] = None,
+):
+    """Deletes one version of the stored measurement memory of the given job
+
+    Args:
+        db: the mongo database
+        job_id: the id of the job
+        version: the version of the memory, as in its `JobResultMemoryRef`;
+            default = None meaning the chunks saved without a version
+        session: the session in which to delete the chunks, if any
+    """
+    await db[_COLLECTION].delete_many(
+        {"job_id": job_id, "version": version}, session=session
+    )
+
+
+async def iter_memory_chunks(
+    db: AsyncIOMotorDatabase, job_id: str, version: Optional[str] = None
+) -> AsyncIterator[Tuple[int, List[str]]]:
+    """Iterates over the stored chunks of the measurement memory of the given job, in order
+
+    Args:
+        db: the mongo database
+        job_id: the id of the job
+        version: the version of the memory, as in its `JobResultMemoryRef`;
+            default = None meaning the chunks saved without a version
+
+    Returns:
+        an async iterator of (experiment index, shots) tuples
+    """
+    db_cursor = db[_COLLECTION].find(
+        {"job_id": job_id, "version": version},
+        {"_id": 0, "experiment": 1, "shots": 1},
+    )
+    db_cursor.sort([("experiment", pymongo.ASCENDING), ("index", pymongo.ASCENDING)])
+    async for chunk in db_cursor:
+        yield chunk["experiment"], chunk["shots"]
+
+
+async def get_memory(
+    db: AsyncIOMotorDatabase, job_id: str, memory_ref: JobResultMemoryRef
+) -> List[List[str]]:
+    """Gets the full measurement memory of the given job from the chunks stored for it
+
+    Args:
+        db: the mongo database
+        job_id: the id of the job
+        memory_ref: the reference to the stored memory of the job
+
+    Returns:
+        the measurement memory as a list of shots for each experiment
+    """
+    memory: List[List[str]] = [[] for _ in memory_ref.num_shots]
+    async for experiment, shots in iter_memory_chunks(
+        db, job_id=job_id, version=memory_ref.version
+    ):
+        memory[experiment].extend(shots)
+    return memory
+
+
+async def stream_memory_json(
+    db: AsyncIOMotorDatabase, job: Job
+) -> AsyncIterator[bytes]:
+    """Streams the measurement memory of the given job as a JSON list of lists, chunk by chunk
+
+    Args:
+        db: the mongo database
+        job: the job whose memory is to be streamed
+
+    Returns:
+        an async iterator of the bytes of the JSON document
+    """
+    memory_ref = getattr(job.result, "memory_ref", None)
+    memory_packed = getattr(job.result, "memory_packed", None)
+    if memory_packed is not None:
+        yield json.dumps(memory_packed.to_memory()).encode()
+        return
+
+    if memory_ref is None:
+        yield json.dumps(job.result.memory if job.result else []).encode()
+        return
+
+    yield b"["
+    open_experiment = -1
+    is_first_in_experiment = True
+    async for experiment, shots in iter_memory_chunks(
+        db, job_id=job.job_id, version=memory_ref.version
+    ):
+        # open the next experiments, including any that had no shots
+        while open_experiment < experiment:
+            yield b"[" if open_experiment < 0 else b"],["
+            open_experiment += 1
+            is_first_in_experiment = True
+
+        if not is_first_in_experiment:
+            yield b","
+        yield json.dumps(shots)[1:-1].encode()
+        is_first_in_experiment = False
+
+    while open_experiment < len(memory_ref.num_shots) - 1:
+        yield b"[" if open_experiment < 0 else b"],["
+        open_experiment += 1
+
+    yield b"]]" if open_experiment >= 0 else b"]"
+
+
+def get_slice_projection(experiment: int, offset: int, limit: int) -> Dict[str, Any]:
+    """Gets the `$project` stage of a job document that reads only a slice of the shots of an experiment
+
+    The shots are sliced by the database if the memory is inline in the job document.
+    Only the packed bytes of the experiment are read if the memory is bit-packed.
+
+    Args:
+        experiment: the index of the experiment
+        offset: the number of shots to skip
+        limit: the maximum number of shots to return; it must be positive
+
+    Returns:
+        the `$project` stage whose output document is to be passed on to `get_memory_slice`
+    """
+    shots = {"$ifNull": [{"$arrayElemAt": ["$result.memory", experiment]}, []]}
+    return {
+        "_id": 0,
+        "shots": {"$slice": [shots, offset, limit]},
+        "num_shots": {"$size": shots},
+        "memory_ref": "$result.memory_ref",
+        "packed_format": "$result.memory_packed.format",
+        "packed_num_clbits": "$result.memory_packed.num_clbits",
+        "packed_num_shots": {
+            "$arrayElemAt": ["$result.memory_packed.num_shots", experiment]
+        },
+        "packed_data": {"$arrayElemAt": ["$result.memory_packed.data", experiment]},
+    }
+
+
+async def get_memory_slice(
+    db: AsyncIOMotorDatabase,
+    job_id: str,
+    document: Mapping[str, Any],
+    experiment: int,
+    offset: int,
+    limit: int,
+) -> Tuple[List[str], int]:
+    """Gets a slice of the shots of an experiment in the measurement memory of the given job
+
+    Only the chunks that overlap the slice are read if the memory is stored in chunks.
+
+    Args:
+        db: the mongo database
+        job_id: the id of the job
+        document: the job document projected with the stage from `get_slice_projection`
+        experiment: the index of the experiment
+        offset: the number of shots to skip
+        limit: the maximum number of shots to return
+
+    Returns:
+        tuple of the shots in the slice and the total number of shots of the experiment
+    """
+    memory_ref = document.get("memory_ref")
+    if memory_ref is not None:
+        memory_ref = JobResultMemoryRef.model_validate(memory_ref)
+        num_shots = (
+            memory_ref.num_shots[experiment]
+            if experiment < len(memory_ref.num_shots)
+            else 0
+        )
+        shots = await _read_chunked_slice(
+            db,
+            job_id=job_id,
+            version=memory_ref.version,
+            experiment=experiment,
+            chunk_size=memory_ref.chunk_size,
+            start=offset,
+            stop=min(offset + limit, num_shots),
+        )
+        return shots, num_shots
+
+    packed_data = document.get("packed_data")
+    if packed_data is not None:
+        num_shots = document["packed_num_shots"]
+        num_clbits = document["packed_num_clbits"]
+        count = min(limit, num_shots - offset)
+        if count <= 0:
+            return [], num_shots
+
+        values = packing.unpack_bits(
+            packed_data, num_clbits=num_clbits, count=count, offset=offset
+        )
+        shots = packing.format_shots(
+            values, fmt=document["packed_format"], num_clbits=num_clbits
+        )
+        return shots, num_shots
+
+    return document.get("shots", []), document.get("num_shots", 0)
+
+
+async def _read_chunked_slice(
+    db: AsyncIOMotorDatabase,
+    job_id: str,
+    version: Optional[str],
+    experiment: int,
+    chunk_size: int,
+    start: int,
+    stop: int,
+) -> List[str]:
+    """Reads the shots [start, stop) of an experiment from the chunks that overlap them
+
+    Args:
+        db: the mongo database
+        job_id: the id of the job
+        version: the version of the memory, as in its `JobResultMemoryRef`
+        experiment: the index of the experiment
+        chunk_size: the maximum number of shots in a chunk
+        start: the index of the first shot to read
+        stop: the index after the last shot to read
+
+    Returns:
+        the shots read
+    """
+    if stop <= start:
+        return []
+
+    first_chunk = start // chunk_size
+    db_cursor = db[_COLLECTION].find(
+        {
+            "job_id": job_id,
+            "version": version,
+            "experiment": experiment,
+            "index": {"$gte": first_chunk, "$lte": (stop - 1) // chunk_size},
+        },
+        {"_id": 0, "shots": 1},
+    )
+    db_cursor.sort([("index", pymongo.ASCENDING)])
+
+    shots: List[str] = []
+    async for chunk in db_cursor:
+        shots.extend(chunk["shots"])
+
+    skipped = start - first_chunk * chunk_size
+    return shots[skipped : skipped + stop - start]
@@ -0,0 +1,322 @@
+# This code is part of Tergite
+#
+# (C) Copyright Chalmers Next Labs 2025
+#
+# This code is licensed under the Apache License, Version 2.0. You may
+# obtain a copy of this license in the LICENSE.txt file in the root directory
+# of this source tree or at http://www.apache.org/licenses/LICENSE-2.0.
+#
+# Any modifications or derivative works of this code must retain this
+# copyright notice, and modified files need to carry a notice indicating
+# that they have been altered from the originals.
+"""Materialized statistics of jobs, rolled up per day, device and project
+
+Each document in the 'job_stats' collection holds the number of jobs per status and
+their total QPU seconds for one (day, device, project_id) combination, where the day is that
+on which the jobs were created. The documents are updated incrementally as jobs are created and updated,
+so reading the statistics does not depend on the number of jobs.
+They can be recomputed from the 'jobs' and 'jobs_archive' collections with `rebuild`.
+"""
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import pymongo
+from motor.motor_asyncio import AsyncIOMotorClientSession, AsyncIOMotorDatabase
+from pymongo import IndexModel, UpdateOne
+
+from utils import mongodb as mongodb_utils
+from utils.date_time import as_utc
+from utils.indexes import reconcile_indexes, register_indexes
+
+from . import archive
+from .dtos import Job, JobStats, JobStatsInterval, JobStatus, JobTimestamps
+
+_COLLECTION = "job_stats"
+_KEY_FIELDS = ("day", "device", "project_id")
+_GROUP_FIELDS = ("device", "project_id")
+_PERIOD_LENGTHS = {
+    JobStatsInterval.DAY: 10,
+    JobStatsInterval.MONTH: 7,
+    JobStatsInterval.YEAR: 4,
+}
+
+register_indexes(
+    _COLLECTION,
+    [
+        IndexModel(
+            [(field, pymongo.ASCENDING) for field in _KEY_FIELDS],
+            unique=True,
+        )
+    ],
+)
+
+
+async def record_created(
+    db: AsyncIOMotorDatabase,
+    jobs: Sequence[Job],
+    session: Optional[AsyncIOMotorClientSession] = None,
+):
+    """Adds the given newly created jobs to the statistics
+
+    Args:
+        db: the mongo database
+        jobs: the jobs that have been created
+        session: the session in which to update the statistics, if any
+    """
+    counter = Counter(
+        (_get_key(job.model_dump()), JobStatus(job.status).value) for job in jobs
+    )
+    operations = [
+        UpdateOne(
+            dict(zip(_KEY_FIELDS, key)),
+            {"$inc": {f"counts.{status}": count}},
+            upsert=True,
+        )
+        for (key, status), count in counter.items()
+    ]
+    if len(operations) > 0:
+        await db[_COLLECTION].bulk_write(operations, ordered=False, session=session)
+
+
+async def record_updated(
+    db: AsyncIOMotorDatabase,
+    old_document: Mapping[str, Any],
+    update: Mapping[str, Any],
+    session: Optional[AsyncIOMotorClientSession] = None,
+):
+    """Updates the statistics with the change in status and QPU usage of an updated job
+
+    The QPU seconds are only added the first time the QPU usage of the job is reported.
+
+    Args:
+        db: the mongo database
+        old_document: the job document before it was updated
+        update: the update that was applied to the job document
+        session: the session in which to update the statistics, if any
+    """
+    increments = _get_update_increments(old_document, update=update)
+    if len(increments) > 0:
+        await db[_COLLECTION].update_one(
+            dict(zip(_KEY_FIELDS, _get_key(old_document))),
+            {"$inc": increments},
+            upsert=True,
+            session=session,
+        )
+
+
+async def record_many_updated(
+    db: AsyncIOMotorDatabase,
+    changes: Sequence[Tuple[Mapping[str, Any], Mapping[str, Any]]],
+    session: Optional[AsyncIOMotorClientSession] = None,
+):
+    """Updates the statistics with the changes of many updated jobs, in one bulk write
+
+    See `record_updated`
+
+    Args:
+        db: the mongo database
+        changes: the list of (job document before it was updated, update applied to it)
+        session: the session in which to update the statistics, if any
+    """
+    totals: Dict[Tuple[Optional[str], ...], Counter] = {}
+    for old_document, update in changes:
+        increments = _get_update_increments(old_document, update=update)
+        if len(increments) > 0:
+            totals.setdefault(_get_key(old_document), Counter()).update(increments)
+
+    operations = [
+        UpdateOne(dict(zip(_KEY_FIELDS, key)), {"$inc": dict(counter)}, upsert=True)
+        for key, counter in totals.items()
+    ]
+    if len(operations) > 0:
+        await db[_COLLECTION].bulk_write(operations, ordered=False, session=session)
+
+
+async def get_stats(
+    db: AsyncIOMotorDatabase,
+    interval: JobStatsInterval = JobStatsInterval.DAY,
+    group_by: Sequence[str] = _GROUP_FIELDS,
+    filters: Optional[Dict[str, Any]] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+) -> List[JobStats]:
+    """Gets the job statistics per time bucket, optionally grouped by device and project
+
+    Args:
+        db: the mongo database
+        interval: the length of the time buckets
+        group_by: the fields, out of 'device' and 'project_id', by which to group the statistics
+        filters: the values of 'device' and 'project_id' that the statistics should be for
+        since: the earliest day (inclusive) of creation of the jobs e.g. '2024-05-01'
+        until: the latest day (inclusive) of creation of the jobs e.g. '2024-05-31'
+
+    Returns:
+        the statistics sorted by period, then by the grouping fields
+
+    Raises:
+        ValueError: unknown group_by field '{field}'
+    """
+    for field in group_by:
+        if field not in _GROUP_FIELDS:
+            raise ValueError(f"unknown group_by field '{field}'")
+
+    match: Dict[str, Any] = {
+        k: v for k, v in (filters or {}).items() if k in _GROUP_FIELDS and v is not None
+    }
+    day_range = {
+        op: day for op, day in (("$gte", since), ("$lte", until)) if day is not None
+    }
+    if day_range:
+        match["day"] = day_range
+
+    group_id = {
+        "period": {"$substrCP": ["$day", 0, _PERIOD_LENGTHS[interval]]},
+        **{field: f"${field}" for field in group_by},
+    }
+    pipeline = [
+        {"$match": match},
+        {
+            "$group": {
+                "_id": group_id,
+                "qpu_seconds": {"$sum": "$qpu_seconds"},
+                **{
+                    status.value: {"$sum": f"$counts.{status.value}"}
+                    for status in JobStatus
+                },
+            }
+        },
+        {"$sort": {f"_id.{field}": pymongo.ASCENDING for field in group_id}},
+    ]
+
+    return [
+        JobStats(
+            **item["_id"],
+            qpu_seconds=item["qpu_seconds"],
+            counts={status: item[status.value] for status in JobStatus},
+        )
+        async for item in db[_COLLECTION].aggregate(pipeline)
+    ]
+
+
+async def rebuild(db: AsyncIOMotorDatabase) -> int:
+    """Recomputes the statistics from the 'jobs' and 'jobs_archive' collections, replacing the existing ones
+
+    The jobs are aggregated on the database server and the result replaces the 'job_stats'
+    collection in one step. Changes to jobs made while it runs may not be included.
+
+    Args:
+        db: the mongo database
+
+    Returns:
+        the number of statistics documents
+    """
+    qpu_seconds = mongodb_utils.seconds_between(
+        "$timestamps.execution.started", "$timestamps.execution.finished"
+    )
+    # 'created_at' is a string in jobs that have not yet been migrated to BSON dates
+    day = {
+        "$switch": {
+            "branches": [
+                {
+                    "case": {"$eq": [{"$type": "$created_at"}, "date"]},
+                    "then": {
+                        "$dateToString": {"date": "$created_at", "format": "%Y-%m-%d"}
+                    },
+                },
+                {
+                    "case": {"$eq": [{"$type": "$created_at"}, "string"]},
+                    "then": {"$substrCP": ["$created_at", 0, 10]},
+                },
+            ],
+            "default": None,
+        }
+    }
+    pipeline = [
+        {"$unionWith": archive.COLLECTION},
+        {
+            "$group": {
+                "_id": {"day": day, "device": "$device", "project_id": "$project_id"},
+                "qpu_seconds": {"$sum": qpu_seconds},
+                **{
+                    status.value: {
+                        "$sum": {"$cond": [{"$eq": ["$status", status.value]}, 1, 0]}
+                    }
+                    for status in JobStatus
+                },
+            }
+        },
+        {
+            "$project": {
+                "_id": 0,
+                **{field: f"$_id.{field}" for field in _KEY_FIELDS},
+                "qpu_seconds": 1,
+                "counts": {status.value: f"${status.value}" for status in JobStatus},
+            }
+        },
+        {"$out": _COLLECTION},
+    ]
+
+    await db.jobs.aggregate(pipeline).to_list(length=None)
+    # `$out` creates the collection without any index if it did not exist
+    await reconcile_indexes(db, collections=[_COLLECTION])
+    return await db[_COLLECTION].count_documents({})
+
+
+def _get_update_increments(
+    old_document: Mapping[str, Any], update: Mapping[str, Any]
+) -> Dict[str, float]:
+    """Gets the increments of the statistics due to the given update of a job
+
+    Args:
+        old_document: the job document before it was updated
+        update: the update that was applied to the job document
+
+    Returns:
+        map of the field of the statistics to the amount to add to it
+    """
+    increments: Dict[str, float] = {}
+    old_status = JobStatus(old_document.get("status", JobStatus.PENDING)).value
+    new_status = JobStatus(update.get("status") or old_status).value
+    if new_status != old_status:
+        increments[f"counts.{old_status}"] = -1
+        increments[f"counts.{new_status}"] = 1
+
+    old_qpu_usage = _get_qpu_usage(old_document.get("timestamps"))
+    new_qpu_usage = _get_qpu_usage(update.get("timestamps"))
+    if old_qpu_usage is None and new_qpu_usage is not None:
+        increments["qpu_seconds"] = new_qpu_usage
+    return increments
+
+
+def _get_key(job: Mapping[str, Any]) -> Tuple[Optional[str], ...]:
+    """Gets the values of the key fields of the statistics document the given job belongs to
+
+    Args:
+        job: the job as a dict
+
+    Returns:
+        the tuple of day, device and project_id
+    """
+    created_at = job.get("created_at")
+    if isinstance(created_at, datetime):
+        day = as_utc(created_at).strftime("%Y-%m-%d")
+    elif isinstance(created_at, str):
+        day = created_at[:10]
+    else:
+        day = None
+    return day, job.get("device"), job.get("project_id")
+
+
+def _get_qpu_usage(timestamps: Optional[Mapping[str, Any]]) -> Optional[float]:
+    """Gets the QPU usage in seconds from the given job timestamps
+
+    Args:
+        timestamps: the timestamps of a job as a dict
+
+    Returns:
+        the QPU usage in seconds or None if the execution has not both started and finished
+    """
+    if timestamps is None:
+        return None
+    return JobTimestamps.model_validate(timestamps).resource_usage
@@ -11,23 +11,26 @@
 # that they have been altered from the originals.
 """Test utilities for datetime"""
 from datetime import datetime, timedelta, timezone
+from typing import Union
 
 from utils import date_time
 
 
-def is_not_older_than(timestamp_str: str, seconds: int) -> bool:
+def is_not_older_than(timestamp_str: Union[str, datetime], seconds: int) -> bool:
     """Checks that the timestamp string is not older than the given number of seconds
 
     Args:
-        timestamp_str: the timestamp string
+        timestamp_str: the timestamp string, or the datetime as got from mongodb
         seconds: the number of seconds that timestamp should not be older than
 
     Returns:
         True if timestamp str is not older than the given seconds
     """
-    return date_time.parse_datetime_string(timestamp_str) - datetime.now(
-        tz=timezone.utc
-    ) <= timedelta(seconds=seconds)
+    if isinstance(timestamp_str, datetime):
+        timestamp = date_time.as_utc(timestamp_str)
+    else:
+        timestamp = date_time.parse_datetime_string(timestamp_str)
+    return timestamp - datetime.now(tz=timezone.utc) <= timedelta(seconds=seconds)
 
 
 def of_this_month(timestamp_str: str) -> str:
@@ -57,6 +60,19 @@ def get_timestamp_str(timestamp: datetime) -> str:
     return timestamp.isoformat("T", timespec="milliseconds").replace("+00:00", "Z")
 
 
+def to_bson_datetime(timestamp_str: str) -> datetime:
+    """Converts a timestamp string into the datetime got from mongodb for the same BSON date
+
+    Args:
+        timestamp_str: the timestamp string e.g. '2024-01-10T14:32:05.880Z'
+
+    Returns:
+        the naive UTC datetime, as returned by pymongo clients that are not timezone aware
+    """
+    timestamp = date_time.parse_datetime_string(timestamp_str)
+    return date_time.as_utc(timestamp).replace(tzinfo=None)
+
+
 def get_current_timestamp_str() -> str:
     """Gets the current timestamp as a Zulu ISO format string
 
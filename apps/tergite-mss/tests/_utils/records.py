@@ -15,7 +15,8 @@ import copy
 from datetime import datetime, timedelta, timezone
 from typing import Any, Dict, List, Sequence, Tuple
 
-from tests._utils.date_time import get_timestamp_str
+from tests._utils.date_time import get_timestamp_str, to_bson_datetime
+from utils.date_time import as_utc
 
 
 def pop_field(records: List[Dict[str, Any]], field: str) -> List[Any]:
@@ -80,7 +81,8 @@ def order_by_many(
 
     Args:
         data: the list of records to sort
-        fields: the fields to order by, if a field starts with "-" then order is descending
+        fields: the fields to order by, if a field starts with "-" then order is descending.
+            As in mongodb, nulls (or missing fields) come first in ascending order and last in descending order
 
     Returns:
         the ordered list of records
@@ -88,15 +90,72 @@ def order_by_many(
 
     def get_key(item) -> tuple:
         return tuple(
-            item.get(field)
+            (item.get(field) is not None, item.get(field))
             if not field.startswith("-")
-            else _to_hash(item[field[1:]], negated=True)
+            else (
+                item.get(field[1:]) is None,
+                _to_hash(item.get(field[1:]), negated=True),
+            )
             for field in fields
         )
 
     return sorted(data, key=get_key)
 
 
+def with_bson_dates(
+    data: List[Dict[str, Any]], fields: Sequence[str]
+) -> List[Dict[str, Any]]:
+    """Converts the given timestamp string fields of the records into datetimes, as stored in mongodb
+
+    This does not mutate the records
+
+    Args:
+        data: the list of records
+        fields: the fields whose timestamp strings are to be converted
+
+    Returns:
+        new records with the given fields as datetimes
+    """
+    return [
+        {
+            **item,
+            **{
+                field: to_bson_datetime(item[field])
+                for field in fields
+                if isinstance(item.get(field), str)
+            },
+        }
+        for item in data
+    ]
+
+
+def with_timestamp_strs(
+    data: List[Dict[str, Any]], fields: Sequence[str]
+) -> List[Dict[str, Any]]:
+    """Converts the given datetime fields of the records, as got from mongodb, into timestamp strings
+
+    This does not mutate the records
+
+    Args:
+        data: the list of records
+        fields: the fields whose datetimes are to be converted
+
+    Returns:
+        new records with the given fields as Zulu timestamp strings
+    """
+    return [
+        {
+            **item,
+            **{
+                field: get_timestamp_str(as_utc(item[field]))
+                for field in fields
+                if isinstance(item.get(field), datetime)
+            },
+        }
+        for item in data
+    ]
+
+
 def distinct_on(data: List[Dict[str, Any]], field: str) -> List[Dict[str, Any]]:
     """Returns the list of unique records basing on the field passed
 
@@ -10,13 +10,18 @@
 # copyright notice, and modified files need to carry a notice indicating
 # that they have been altered from the originals.
 """Tests for calibrations"""
+import json
 from datetime import datetime, timedelta, timezone
 from typing import Any, Dict, List, Optional
 
 import pytest
 from bson import ObjectId
 
-from tests._utils.date_time import get_current_timestamp_str, get_timestamp_str
+from tests._utils.date_time import (
+    get_current_timestamp_str,
+    get_timestamp_str,
+    to_bson_datetime,
+)
 from tests._utils.fixtures import load_json_fixture
 from tests._utils.mongodb import find_in_collection, insert_in_collection
 from tests._utils.records import (
@@ -24,6 +29,7 @@ from tests._utils.records import (
     filter_by_equality,
     order_by,
     order_by_many,
+    with_bson_dates,
     with_current_timestamps,
     with_incremental_timestamps,
 )
@@ -36,6 +42,7 @@ _LATEST_CALIBRATIONS = distinct_on(
 _DEVICE_NAMES = [item["name"] for item in _LATEST_CALIBRATIONS]
 _COLLECTION = "calibrations"
 _LOGS_COLLECTION = "calibrations_logs"
+_METRICS_COLLECTION = "calibration_metrics"
 _EXCLUDED_FIELDS = ["_id"]
 _SKIP_LIMIT_SORT_PARAMS = [
     (0, 1, ["-version", "last_calibrated"]),
@@ -57,6 +64,18 @@ _PAGINATE_AND_SEARCH_PARAMS = [
     for skip, limit, sort in _SKIP_LIMIT_SORT_PARAMS
     for search in _SEARCH_PARAMS
 ]
+# 'version' has ties, and 'updated_at' has nulls in the records of test_find_calibrations_by_cursor
+_CURSOR_PAGINATE_AND_SEARCH_PARAMS = [
+    (limit, sort, search)
+    for limit, sort in [
+        (1, ["version"]),
+        (2, None),
+        (2, ["-updated_at", "version"]),
+        (4, ["-version", "-updated_at"]),
+        (5, ["updated_at"]),
+    ]
+    for search in _SEARCH_PARAMS
+]
 
 
 @pytest.mark.parametrize("skip, limit, sort, search", _PAGINATE_AND_SEARCH_PARAMS)
@@ -119,6 +138,126 @@ def test_find_calibrations(
         assert got == expected
 
 
+@pytest.mark.parametrize("skip, limit, sort", _SKIP_LIMIT_SORT_PARAMS)
+def test_find_calibrations_as_ndjson(
+    db,
+    client,
+    skip: Optional[int],
+    limit: Optional[int],
+    sort: Optional[List[str]],
+    freezer,
+):
+    """Get to /calibrations/ with 'Accept: application/x-ndjson' streams the calibrations one per line"""
+    raw_calibrations = with_incremental_timestamps(
+        _LATEST_CALIBRATIONS, fields=("last_calibrated", "updated_at")
+    )
+    inserted_ids = insert_in_collection(
+        database=db, collection_name=_COLLECTION, data=raw_calibrations
+    )
+    raw_calibrations = _attach_str_ids(
+        raw_calibrations, ids=inserted_ids, id_field="id"
+    )
+
+    query_string = "?"
+    slice_start = skip or 0
+    slice_end = len(raw_calibrations) if limit is None else slice_start + limit
+    sort_fields = sort or ["-last_calibrated"]
+    if limit is not None:
+        query_string += f"limit={limit}&"
+    if skip is not None:
+        query_string += f"skip={skip}&"
+    for sort_field in sort_fields:
+        query_string += f"sort={sort_field}&"
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        response = client.get(
+            f"/calibrations/{query_string}",
+            headers={"Accept": "application/x-ndjson"},
+        )
+        got = [json.loads(line) for line in response.text.splitlines()]
+        sorted_data = order_by_many(raw_calibrations, fields=sort_fields)
+
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        assert got == sorted_data[slice_start:slice_end]
+
+
+@pytest.mark.parametrize("limit, sort, search", _CURSOR_PAGINATE_AND_SEARCH_PARAMS)
+def test_find_calibrations_by_cursor(
+    db,
+    client,
+    limit: int,
+    sort: Optional[List[str]],
+    search: dict,
+    freezer,
+):
+    """Get to /calibrations/?cursor=...&limit=... pages through the calibrations using the returned next_cursor"""
+    copies = [{**item, "name": f"{item['name']}-copy"} for item in _LATEST_CALIBRATIONS]
+    raw_calibrations = with_incremental_timestamps(
+        [*_LATEST_CALIBRATIONS, *copies], fields=("last_calibrated", "updated_at")
+    )
+    raw_calibrations = [
+        {**item, "updated_at": None} if idx % 2 else item
+        for idx, item in enumerate(raw_calibrations)
+    ]
+    inserted_ids = insert_in_collection(
+        database=db, collection_name=_COLLECTION, data=raw_calibrations
+    )
+    raw_calibrations = _attach_str_ids(
+        raw_calibrations, ids=inserted_ids, id_field="id"
+    )
+
+    query_string = f"?limit={limit}&"
+    sort_fields = sort or ["-last_calibrated"]
+    for sort_field in sort_fields:
+        query_string += f"sort={sort_field}&"
+
+    for key, value in search.items():
+        query_string += f"{key}={value}&"
+
+    # ties are broken by the id, in the direction of the last sort field
+    tie_breaker = "-id" if sort_fields[-1].startswith("-") else "id"
+    filtered_data = filter_by_equality(raw_calibrations, filters=search)
+    expected = order_by_many(filtered_data, fields=[*sort_fields, tie_breaker])
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        got = []
+        cursor = ""
+        pages = 0
+        while cursor is not None:
+            response = client.get(
+                f"/calibrations/{query_string}", params={"cursor": cursor}
+            )
+            assert response.status_code == 200
+
+            page = response.json()
+            assert page["cursor"] == cursor
+            assert page["limit"] == limit
+            assert len(page["data"]) <= limit
+
+            got.extend(page["data"])
+            cursor = page["next_cursor"]
+            pages += 1
+
+        assert got == expected
+        assert pages == len(expected) // limit + 1
+
+
+def test_find_calibrations_invalid_cursor(db, client):
+    """Get to /calibrations/?cursor=... with an invalid cursor returns a 400 error"""
+    insert_in_collection(
+        database=db, collection_name=_COLLECTION, data=_LATEST_CALIBRATIONS
+    )
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        response = client.get("/calibrations/?cursor=not-a-cursor&limit=2")
+
+        assert response.status_code == 400
+
+
 @pytest.mark.parametrize("name", _DEVICE_NAMES)
 def test_read_calibration(name: str, db, client, freezer):
     """Get `/calibrations/{name}` reads the latest calibration of the given device"""
@@ -142,6 +281,78 @@ def test_read_calibration(name: str, db, client, freezer):
         assert got == expected
 
 
+@pytest.mark.parametrize("name", _DEVICE_NAMES)
+def test_read_calibration_as_msgpack(name: str, db, client, freezer):
+    """Get `/calibrations/{name}` and `/calibrations/` with 'Accept: application/msgpack' return MessagePack"""
+    msgpack = pytest.importorskip("msgpack")
+    raw_calibrations = with_current_timestamps(
+        _LATEST_CALIBRATIONS, fields=("last_calibrated", "updated_at")
+    )
+    insert_in_collection(
+        database=db, collection_name=_COLLECTION, data=raw_calibrations
+    )
+    headers = {"Accept": "application/msgpack"}
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        json_response = client.get(f"/calibrations/{name}")
+        response = client.get(f"/calibrations/{name}", headers=headers)
+        json_list_response = client.get("/calibrations/")
+        list_response = client.get("/calibrations/", headers=headers)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/msgpack"
+    assert msgpack.unpackb(response.content) == json_response.json()
+    assert list_response.status_code == 200
+    assert list_response.headers["content-type"] == "application/msgpack"
+    assert msgpack.unpackb(list_response.content) == json_list_response.json()
+
+
+@pytest.mark.parametrize("name", _DEVICE_NAMES)
+def test_read_calibration_not_modified(
+    name: str, db, client, system_app_token_header, freezer
+):
+    """Get `/calibrations/{name}` returns 304 without a body until a new calibration of the device is posted"""
+    raw_calibrations = with_current_timestamps(
+        _LATEST_CALIBRATIONS, fields=("last_calibrated", "updated_at")
+    )
+    insert_in_collection(
+        database=db, collection_name=_COLLECTION, data=raw_calibrations
+    )
+    payload = filter_by_equality(_LATEST_CALIBRATIONS, {"name": name})[0]
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        response = client.get(f"/calibrations/{name}")
+        etag = response.headers["etag"]
+        not_modified_response = client.get(
+            f"/calibrations/{name}", headers={"If-None-Match": etag}
+        )
+        list_response = client.get("/calibrations/")
+        list_etag = list_response.headers["etag"]
+        not_modified_list_response = client.get(
+            "/calibrations/", headers={"If-None-Match": list_etag}
+        )
+
+        client.post("/calibrations/", json=payload, headers=system_app_token_header)
+        modified_response = client.get(
+            f"/calibrations/{name}", headers={"If-None-Match": etag}
+        )
+        modified_list_response = client.get(
+            "/calibrations/", headers={"If-None-Match": list_etag}
+        )
+
+    assert response.status_code == 200
+    assert not_modified_response.status_code == 304
+    assert not_modified_response.content == b""
+    assert not_modified_response.headers["etag"] == etag
+    assert not_modified_list_response.status_code == 304
+    assert modified_response.status_code == 200
+    assert modified_response.headers["etag"] != etag
+    assert modified_list_response.status_code == 200
+    assert modified_list_response.headers["etag"] != list_etag
+
+
 @pytest.mark.parametrize("payload", _CALIBRATIONS_LIST)
 def test_create(db, client, system_app_token_header, payload, freezer):
     """POST new calibration to `/calibrations` creates it in calibrations and returns it"""
@@ -195,8 +406,10 @@ def test_upsert(db, client, system_app_token_header, raw_payload, freezer):
 
         new_calibration_in_db = {
             **payload,
-            "updated_at": now,
+            "last_calibrated": to_bson_datetime(future_timestamp),
+            "updated_at": to_bson_datetime(now),
             "_id": ObjectId(got["id"]),
+            "revision": 1,
         }
         final_db_data = find_in_collection(db, collection_name=_COLLECTION)
         assert final_db_data == [new_calibration_in_db]
@@ -229,7 +442,10 @@ def test_create_log(db, client, system_app_token_header, raw_payload, freezer):
         got = find_in_collection(
             db, collection_name=_LOGS_COLLECTION, fields_to_exclude=("_id",)
         )
-        expected = [*original_logs_in_db, payload]
+        expected = [
+            *original_logs_in_db,
+            *with_bson_dates([payload], fields=("last_calibrated",)),
+        ]
 
         assert response.status_code == 200
         assert order_by(got, "name") == order_by(expected, "name")
@@ -275,3 +491,310 @@ def _attach_str_ids(
         the list of records with ids attached to them
     """
     return [{**item, id_field: str(ids[idx])} for idx, item in enumerate(data)]
+
+
+@pytest.mark.parametrize("is_ndjson", [False, True])
+@pytest.mark.parametrize(
+    "params, expected_indexes",
+    [
+        ({}, list(range(6))),
+        ({"from": "2024-05-01T18:00:00Z"}, [1, 2, 3, 4, 5]),
+        ({"from": "2024-05-01T18:00:00Z", "to": "2024-05-02T18:00:00Z"}, [1, 2, 3, 4]),
+        ({"every": 2}, [0, 2, 4]),
+        ({"every": 4, "from": "2024-05-01T18:00:00Z"}, [1, 5]),
+    ],
+)
+def test_read_calibration_history(
+    db, client, params: Dict[str, Any], expected_indexes: List[int], is_ndjson: bool
+):
+    """Get to /calibrations/{name}/history streams the snapshots between 'from' and 'to', oldest first"""
+    snapshots = _get_history_snapshots(name="Loke", size=6)
+    insert_in_collection(
+        database=db,
+        collection_name=_LOGS_COLLECTION,
+        data=with_bson_dates(snapshots, fields=("last_calibrated",)),
+    )
+    insert_in_collection(
+        database=db,
+        collection_name=_LOGS_COLLECTION,
+        data=with_bson_dates(
+            _get_history_snapshots(name="Thor", size=3), fields=("last_calibrated",)
+        ),
+    )
+    headers = {"Accept": "application/x-ndjson"} if is_ndjson else {}
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        response = client.get(
+            "/calibrations/Loke/history", params=params, headers=headers
+        )
+        if is_ndjson:
+            got = [json.loads(line) for line in response.text.splitlines()]
+        else:
+            got = response.json()
+
+        assert response.status_code == 200
+        assert got == [snapshots[idx] for idx in expected_indexes]
+
+
+def test_read_calibration_history_of_some_qubits_and_fields(db, client):
+    """Get to /calibrations/{name}/history?qubits=...&fields=... returns only the given qubits and fields"""
+    snapshots = _get_history_snapshots(name="Loke", size=3)
+    insert_in_collection(
+        database=db,
+        collection_name=_LOGS_COLLECTION,
+        data=with_bson_dates(snapshots, fields=("last_calibrated",)),
+    )
+    expected = [
+        {
+            "name": item["name"],
+            "last_calibrated": item["last_calibrated"],
+            "qubits": [
+                {"t1_decoherence": qubit["t1_decoherence"]}
+                for qubit in item["qubits"]
+                if qubit["id"] in (0, 2)
+            ],
+        }
+        for item in snapshots
+    ]
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        response = client.get(
+            "/calibrations/Loke/history",
+            params={"qubits": [0, 2], "fields": ["qubits.t1_decoherence"]},
+        )
+
+        assert response.status_code == 200
+        assert response.json() == expected
+
+
+@pytest.mark.parametrize(
+    "interval, aggregate, expected",
+    [
+        (
+            "day",
+            "min",
+            [("2024-05-01T00:00:00.000Z", 0), ("2024-05-02T00:00:00.000Z", 2)],
+        ),
+        (
+            "day",
+            "max",
+            [("2024-05-01T00:00:00.000Z", 1), ("2024-05-02T00:00:00.000Z", 4)],
+        ),
+        (
+            "day",
+            "mean",
+            [("2024-05-01T00:00:00.000Z", 0.5), ("2024-05-02T00:00:00.000Z", 3)],
+        ),
+        ("week", "mean", [("2024-04-29T00:00:00.000Z", 2)]),
+        ("month", "max", [("2024-05-01T00:00:00.000Z", 4)]),
+    ],
+)
+def test_read_downsampled_calibration_history(
+    db, client, interval: str, aggregate: str, expected: List[tuple]
+):
+    """Get to /calibrations/{name}/history?interval=...&aggregate=... combines the snapshots per time bucket"""
+    snapshots = _get_history_snapshots(name="Loke", size=5)
+    insert_in_collection(
+        database=db,
+        collection_name=_LOGS_COLLECTION,
+        data=with_bson_dates(snapshots, fields=("last_calibrated",)),
+    )
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        response = client.get(
+            "/calibrations/Loke/history",
+            params={"interval": interval, "aggregate": aggregate},
+        )
+        got = [
+            (item["last_calibrated"], item["qubits"][0]["t1_decoherence"]["value"])
+            for item in response.json()
+        ]
+
+        assert response.status_code == 200
+        assert got == expected
+
+
+def test_read_calibration_history_unknown_field(db, client):
+    """Get to /calibrations/{name}/history with an unknown field returns 400"""
+    insert_in_collection(
+        database=db,
+        collection_name=_LOGS_COLLECTION,
+        data=with_bson_dates(
+            _get_history_snapshots(name="Loke", size=2), fields=("last_calibrated",)
+        ),
+    )
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        response = client.get("/calibrations/Loke/history", params={"fields": ["foo"]})
+
+        assert response.status_code == 400
+
+
+def test_create_metric_points(db, client, system_app_token_header):
+    """POST calibrations to `/calibrations/` saves each calibration value once as a point of the metric time series"""
+    snapshots = _get_history_snapshots(name="Loke", size=3)
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        for payload in [*snapshots, snapshots[-1]]:
+            response = client.post(
+                "/calibrations/", json=payload, headers=system_app_token_header
+            )
+            assert response.status_code == 200
+
+        got = find_in_collection(
+            db, collection_name=_METRICS_COLLECTION, fields_to_exclude=("_id",)
+        )
+        expected = [
+            {
+                "meta": {
+                    "device": "Loke",
+                    "component": "qubits",
+                    "index": qubit["id"],
+                    "metric": "t1_decoherence",
+                },
+                "value": qubit["t1_decoherence"]["value"],
+                "unit": "us",
+                "ts": to_bson_datetime(item["last_calibrated"]),
+            }
+            for item in snapshots
+            for qubit in item["qubits"]
+        ]
+
+        assert sorted(got, key=_get_point_key) == sorted(expected, key=_get_point_key)
+
+
+@pytest.mark.parametrize(
+    "params, expected",
+    [
+        ({}, [(idx, idx) for idx in range(5)]),
+        (
+            {"from": "2024-05-01T18:00:00Z", "to": "2024-05-02T10:00:00Z"},
+            [(1, 1), (2, 2), (3, 3)],
+        ),
+    ],
+)
+def test_read_metric_series(
+    db, client, system_app_token_header, params: Dict[str, Any], expected: List[tuple]
+):
+    """Get to /calibrations/{name}/metrics/{metric} returns the points of the given metric between 'from' and 'to'"""
+    snapshots = _get_history_snapshots(name="Loke", size=5)
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        for payload in [*snapshots, *_get_history_snapshots(name="Thor", size=2)]:
+            client.post("/calibrations/", json=payload, headers=system_app_token_header)
+
+        response = client.get(
+            "/calibrations/Loke/metrics/t1_decoherence",
+            params={"index": [0], **params},
+        )
+
+        assert response.status_code == 200
+        assert response.json()["data"] == [
+            {
+                "device": "Loke",
+                "component": "qubits",
+                "index": 0,
+                "metric": "t1_decoherence",
+                "value": value,
+                "unit": "us",
+                "ts": snapshots[idx]["last_calibrated"],
+            }
+            for idx, value in expected
+        ]
+
+
+@pytest.mark.parametrize(
+    "interval, aggregate, expected",
+    [
+        (
+            "day",
+            "min",
+            [("2024-05-01T00:00:00.000Z", 0, 2), ("2024-05-02T00:00:00.000Z", 2, 3)],
+        ),
+        (
+            "day",
+            "max",
+            [("2024-05-01T00:00:00.000Z", 1, 2), ("2024-05-02T00:00:00.000Z", 4, 3)],
+        ),
+        (
+            "day",
+            "mean",
+            [("2024-05-01T00:00:00.000Z", 0.5, 2), ("2024-05-02T00:00:00.000Z", 3, 3)],
+        ),
+        ("week", "mean", [("2024-04-29T00:00:00.000Z", 2, 5)]),
+        ("month", "max", [("2024-05-01T00:00:00.000Z", 4, 5)]),
+    ],
+)
+def test_read_aggregated_metric_series(
+    db,
+    client,
+    system_app_token_header,
+    interval: str,
+    aggregate: str,
+    expected: List[tuple],
+):
+    """Get to /calibrations/{name}/metrics/{metric}?interval=...&aggregate=... aggregates the points per time bucket"""
+    snapshots = _get_history_snapshots(name="Loke", size=5)
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        for payload in snapshots:
+            client.post("/calibrations/", json=payload, headers=system_app_token_header)
+
+        response = client.get(
+            "/calibrations/Loke/metrics/t1_decoherence",
+            params={"interval": interval, "aggregate": aggregate},
+        )
+        got = [
+            (item["index"], item["ts"], item["value"], item["count"])
+            for item in response.json()["data"]
+        ]
+
+        assert response.status_code == 200
+        assert got == [
+            (qubit, ts, value + qubit * 100, count)
+            for qubit in range(3)
+            for ts, value, count in expected
+        ]
+
+
+def _get_point_key(point: Dict[str, Any]) -> tuple:
+    """Gets the key to sort the points of the metric time series by"""
+    return point["meta"]["metric"], point["meta"]["index"], point["ts"]
+
+
+def _get_history_snapshots(name: str, size: int) -> List[Dict[str, Any]]:
+    """Generates calibration snapshots of the given device, 8 hours apart from 2024-05-01T10:00Z
+
+    The T1 of qubit 0 in the i-th snapshot is i.
+
+    Args:
+        name: the name of the device
+        size: the number of snapshots
+
+    Returns:
+        the snapshots, oldest first
+    """
+    start = datetime(2024, 5, 1, 10, tzinfo=timezone.utc)
+    return [
+        {
+            "name": name,
+            "version": "2024.04.1",
+            "last_calibrated": get_timestamp_str(start + timedelta(hours=8 * idx)),
+            "qubits": [
+                {
+                    "id": qubit,
+                    "t1_decoherence": {"unit": "us", "value": idx + qubit * 100},
+                    "pulse_type": {"unit": "", "value": "Gaussian"},
+                }
+                for qubit in range(3)
+            ],
+        }
+        for idx in range(size)
+    ]
@@ -10,6 +10,9 @@
 # copyright notice, and modified files need to carry a notice indicating
 # that they have been altered from the originals.
 """Integration tests for the devices router"""
+import json
+from datetime import datetime
+from email.utils import format_datetime
 from typing import Any, Dict, List, Optional
 
 import pytest
@@ -24,11 +27,13 @@ from tests._utils.records import (
     order_by_many,
     pop_field,
     with_incremental_timestamps,
+    with_timestamp_strs,
 )
 from tests.api.rest.test_calibrations import _attach_str_ids
 
 _DEVICES_COLLECTION = "devices"
 _EXCLUDED_FIELDS = ["_id"]
+_TIMESTAMPS = ("created_at", "updated_at")
 
 _DEVICE_LIST = load_json_fixture("device_list.json")
 _SKIP_LIMIT_SORT_PARAMS = [
@@ -51,6 +56,17 @@ _PAGINATE_AND_SEARCH_PARAMS = [
     for skip, limit, sort in _SKIP_LIMIT_SORT_PARAMS
     for search in _SEARCH_PARAMS
 ]
+# 'version' and 'number_of_qubits' have ties, and 'last_online' has nulls
+_CURSOR_PAGINATE_AND_SEARCH_PARAMS = [
+    (limit, sort, search)
+    for limit, sort in [
+        (1, ["-version"]),
+        (2, None),
+        (2, ["last_online", "-number_of_qubits"]),
+        (4, ["-last_online", "number_of_qubits"]),
+    ]
+    for search in _SEARCH_PARAMS
+]
 
 
 @pytest.mark.parametrize("skip, limit, sort, search", _PAGINATE_AND_SEARCH_PARAMS)
@@ -111,6 +127,114 @@ def test_find_devices(
         assert got == expected
 
 
+@pytest.mark.parametrize("skip, limit, sort", _SKIP_LIMIT_SORT_PARAMS)
+def test_find_devices_as_ndjson(
+    db,
+    client,
+    skip: Optional[int],
+    limit: Optional[int],
+    sort: Optional[List[str]],
+    freezer,
+):
+    """Get to /devices/ with 'Accept: application/x-ndjson' streams the devices one per line"""
+    raw_devices = with_incremental_timestamps(
+        _DEVICE_LIST, fields=("created_at", "updated_at")
+    )
+    inserted_ids = insert_in_collection(
+        database=db, collection_name=_DEVICES_COLLECTION, data=raw_devices
+    )
+    raw_devices = _attach_str_ids(raw_devices, ids=inserted_ids, id_field="id")
+
+    query_string = "?"
+    slice_start = skip or 0
+    slice_end = len(raw_devices) if limit is None else slice_start + limit
+    sort_fields = sort or ["-created_at"]
+    if limit is not None:
+        query_string += f"limit={limit}&"
+    if skip is not None:
+        query_string += f"skip={skip}&"
+    for sort_field in sort_fields:
+        query_string += f"sort={sort_field}&"
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        response = client.get(
+            f"/devices/{query_string}", headers={"Accept": "application/x-ndjson"}
+        )
+        got = [json.loads(line) for line in response.text.splitlines()]
+        sorted_data = order_by_many(raw_devices, fields=sort_fields)
+
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        assert got == sorted_data[slice_start:slice_end]
+
+
+@pytest.mark.parametrize("limit, sort, search", _CURSOR_PAGINATE_AND_SEARCH_PARAMS)
+def test_find_devices_by_cursor(
+    db,
+    client,
+    limit: int,
+    sort: Optional[List[str]],
+    search: dict,
+    freezer,
+):
+    """Get to /devices/?cursor=...&limit=... pages through the devices using the returned next_cursor"""
+    raw_devices = with_incremental_timestamps(
+        _DEVICE_LIST, fields=("created_at", "updated_at")
+    )
+    inserted_ids = insert_in_collection(
+        database=db, collection_name=_DEVICES_COLLECTION, data=raw_devices
+    )
+    raw_devices = _attach_str_ids(raw_devices, ids=inserted_ids, id_field="id")
+
+    query_string = f"?limit={limit}&"
+    sort_fields = sort or ["-created_at"]
+    for sort_field in sort_fields:
+        query_string += f"sort={sort_field}&"
+
+    for key, value in search.items():
+        query_string += f"{key}={value}&"
+
+    # ties are broken by the id, in the direction of the last sort field
+    tie_breaker = "-id" if sort_fields[-1].startswith("-") else "id"
+    filtered_data = filter_by_equality(raw_devices, filters=search)
+    expected = order_by_many(filtered_data, fields=[*sort_fields, tie_breaker])
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        got = []
+        cursor = ""
+        pages = 0
+        while cursor is not None:
+            response = client.get(f"/devices/{query_string}", params={"cursor": cursor})
+            assert response.status_code == 200
+
+            page = response.json()
+            assert page["cursor"] == cursor
+            assert page["limit"] == limit
+            assert len(page["data"]) <= limit
+
+            got.extend(page["data"])
+            cursor = page["next_cursor"]
+            pages += 1
+
+        assert got == expected
+        assert pages == len(expected) // limit + 1
+
+
+def test_find_devices_invalid_cursor(db, client):
+    """Get to /devices/?cursor=... with an invalid cursor returns a 400 error"""
+    insert_in_collection(
+        database=db, collection_name=_DEVICES_COLLECTION, data=_DEVICE_LIST
+    )
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        response = client.get("/devices/?cursor=not-a-cursor&limit=2")
+
+        assert response.status_code == 400
+
+
 @pytest.mark.parametrize("name", [v["name"] for v in _DEVICE_LIST])
 def test_read_one_device(db, client, name: str, user_jwt_cookie):
     """GET to /devices/{name} returns the device of the given name"""
@@ -129,6 +253,93 @@ def test_read_one_device(db, client, name: str, user_jwt_cookie):
         assert expected == got
 
 
+@pytest.mark.parametrize("name", [v["name"] for v in _DEVICE_LIST])
+def test_read_one_device_not_modified(
+    db, client, name: str, user_jwt_cookie, system_app_token_header
+):
+    """GET to /devices/{name} returns 304 without a body until the device changes"""
+    devices = with_incremental_timestamps(_DEVICE_LIST, fields=_TIMESTAMPS)
+    insert_in_collection(database=db, collection_name=_DEVICES_COLLECTION, data=devices)
+    expected_last_modified = format_datetime(
+        datetime.fromisoformat(
+            get_record(devices, _filter={"name": name})["updated_at"]
+        ),
+        usegmt=True,
+    )
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        response = client.get(f"/devices/{name}", cookies=user_jwt_cookie)
+        etag = response.headers["etag"]
+        last_modified = response.headers["last-modified"]
+        not_modified_responses = [
+            client.get(f"/devices/{name}", cookies=user_jwt_cookie, headers=headers)
+            for headers in (
+                {"If-None-Match": etag},
+                {"If-Modified-Since": last_modified},
+            )
+        ]
+
+        client.put(
+            f"/devices/{name}", json={"foo": "bar"}, headers=system_app_token_header
+        )
+        modified_response = client.get(
+            f"/devices/{name}",
+            cookies=user_jwt_cookie,
+            headers={"If-None-Match": etag},
+        )
+
+    assert response.status_code == 200
+    assert last_modified == expected_last_modified
+    assert [v.status_code for v in not_modified_responses] == [304, 304]
+    assert [v.content for v in not_modified_responses] == [b"", b""]
+    assert [v.headers["etag"] for v in not_modified_responses] == [etag, etag]
+    assert modified_response.status_code == 200
+    assert modified_response.json()["foo"] == "bar"
+    assert modified_response.headers["etag"] != etag
+
+
+def test_find_devices_not_modified(
+    db, client, user_jwt_cookie, system_app_token_header
+):
+    """GET to /devices/ returns 304 without a body until any of the devices changes"""
+    insert_in_collection(
+        database=db, collection_name=_DEVICES_COLLECTION, data=_DEVICE_LIST
+    )
+    url = "/devices/?limit=3&sort=name"
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        response = client.get(url, cookies=user_jwt_cookie)
+        etag = response.headers["etag"]
+        not_modified_response = client.get(
+            url, cookies=user_jwt_cookie, headers={"If-None-Match": etag}
+        )
+
+        # 'Thor' is not among the first 3 devices by name
+        client.put(
+            "/devices/Thor", json={"foo": "bar"}, headers=system_app_token_header
+        )
+        unaffected_response = client.get(
+            url, cookies=user_jwt_cookie, headers={"If-None-Match": etag}
+        )
+
+        client.put(
+            "/devices/Likee", json={"foo": "bar"}, headers=system_app_token_header
+        )
+        modified_response = client.get(
+            url, cookies=user_jwt_cookie, headers={"If-None-Match": etag}
+        )
+
+    assert response.status_code == 200
+    assert not_modified_response.status_code == 304
+    assert not_modified_response.content == b""
+    assert unaffected_response.status_code == 304
+    assert modified_response.status_code == 200
+    assert modified_response.json()["data"][0]["foo"] == "bar"
+    assert modified_response.headers["etag"] != etag
+
+
 @pytest.mark.parametrize("payload", _DEVICE_LIST)
 def test_create_device(db, client, payload: Dict[str, Any], system_app_token_header):
     """PUT to /devices/ creates a new device if it does not exist already"""
@@ -146,11 +357,13 @@ def test_create_device(db, client, payload: Dict[str, Any], system_app_token_hea
         final_data_in_db = find_in_collection(
             db, collection_name=_DEVICES_COLLECTION, fields_to_exclude=_EXCLUDED_FIELDS
         )
+        revisions = pop_field(final_data_in_db, "revision")
         json_response: dict = response.json()
         json_response.pop("id")
 
         assert response.status_code == 200
-        assert json_response == final_data_in_db[0]
+        assert json_response == with_timestamp_strs(final_data_in_db, _TIMESTAMPS)[0]
+        assert revisions == [1]
 
         created_at_timestamps = pop_field(final_data_in_db, "created_at")
         updated_at_timestamps = pop_field(final_data_in_db, "updated_at")
@@ -208,11 +421,13 @@ def test_create_pre_existing_device(
         final_data_in_db = find_in_collection(
             db, collection_name=_DEVICES_COLLECTION, fields_to_exclude=_EXCLUDED_FIELDS
         )
+        revisions = pop_field(final_data_in_db, "revision")
         json_response: dict = response.json()
         json_response.pop("id")
 
         assert response.status_code == 200
-        assert json_response == final_data_in_db[0]
+        assert json_response == with_timestamp_strs(final_data_in_db, _TIMESTAMPS)[0]
+        assert revisions == [1]
 
         updated_at_timestamps = pop_field(final_data_in_db, "updated_at")
 
@@ -243,11 +458,13 @@ def test_update_device(
         final_data_in_db = find_in_collection(
             db, collection_name=_DEVICES_COLLECTION, fields_to_exclude=_EXCLUDED_FIELDS
         )
+        revisions = pop_field(final_data_in_db, "revision")
         json_response: dict = response.json()
         json_response.pop("id")
 
         assert response.status_code == 200
-        assert json_response == final_data_in_db[0]
+        assert json_response == with_timestamp_strs(final_data_in_db, _TIMESTAMPS)[0]
+        assert revisions == [1]
 
         updated_at_timestamps = pop_field(final_data_in_db, "updated_at")
         expected = {
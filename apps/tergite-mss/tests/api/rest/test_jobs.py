@@ -10,26 +10,38 @@
 # copyright notice, and modified files need to carry a notice indicating
 # that they have been altered from the originals.
 """Integration tests for the jobs router"""
+import copy
+import json
+import threading
+import time
 import uuid
-from datetime import datetime
-from typing import Dict, List, Optional
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
 
+import numpy as np
 import pytest
 from beanie import PydanticObjectId
 from pytest_lazyfixture import lazy_fixture
 
+import settings
+from api.scripts import rebuild_job_stats
 from services.auth import Project
+from services.auth.utils import MAX_LIST_QUERY_LEN
+from services.jobs import latency as job_latency
+from services.jobs import stats as job_stats
+from services.jobs import utils as job_utils
 from tests._utils.auth import TEST_PROJECT_EXT_ID, get_db_record
-from tests._utils.date_time import (
-    get_current_timestamp_str,
-)
+from tests._utils.date_time import get_current_timestamp_str, to_bson_datetime
 from tests._utils.env import TEST_BACKENDS_MAP
 from tests._utils.fixtures import load_json_fixture
 from tests._utils.mongodb import find_in_collection, insert_in_collection
 from tests._utils.records import (
     filter_by_equality,
+    order_by,
     order_by_many,
     prune,
+    with_bson_dates,
     with_current_timestamps,
     with_incremental_timestamps,
 )
@@ -51,6 +63,9 @@ _CREATE_JOB_PAYLOADS = [
     for idx, device in enumerate(_DEVICES)
 ]
 _COLLECTION = "jobs"
+_ARCHIVE_COLLECTION = "jobs_archive"
+_PROJECTS_COLLECTION = "auth_projects"
+_USAGES_COLLECTION = "internal_resource_usages"
 _EXCLUDED_FIELDS = ["_id"]
 _UNAVAILABLE_BCC_FIXTURE = [
     ({"device": device, "calibration_date": "2024-05-23T09:12:00.733Z"}, client)
@@ -76,6 +91,21 @@ _SEARCH_PARAMS = [
     {"status": "pending"},
     {},
 ]
+_PROJECTION_PARAMS = [
+    ("fields=status", ["status"], []),
+    (
+        "fields=status&fields=job_id&fields=created_at",
+        ["status", "job_id", "created_at"],
+        [],
+    ),
+    ("exclude=result.memory", None, ["result.memory"]),
+    ("exclude=result&exclude=download_url", None, ["result", "download_url"]),
+]
+_CURSOR_PAGINATE_AND_SEARCH_PARAMS = [
+    (limit, sort, search)
+    for limit, sort in [(1, ["-job_id"]), (4, None), (5, ["device", "-created_at"])]
+    for search in _SEARCH_PARAMS
+]
 _PAGINATE_AND_SEARCH_PARAMS = [
     (skip, limit, sort, search)
     for skip, limit, sort in _SKIP_LIMIT_SORT_PARAMS
@@ -101,6 +131,219 @@ def test_read_job(db, client, job_id: str, no_qpu_app_token_header, freezer):
         assert got == expected
 
 
+@pytest.mark.parametrize("job_id", _JOB_IDS)
+def test_read_job_with_trusted_reads(
+    db, client, job_id: str, no_qpu_app_token_header, monkeypatch, freezer
+):
+    """Get to /jobs/{job_id} and /jobs/ return the same jobs when the records are trusted"""
+    monkeypatch.setattr(settings.CONFIG.database, "trusted_reads", True)
+    all_jobs = with_current_timestamps(
+        _JOBS_LIST, fields=("created_at", "updated_at", "calibration_date")
+    )
+    large_memory = [[hex(idx % 8) for idx in range(1000)]]
+    all_jobs = [{**item, "result": {"memory": large_memory}} for item in all_jobs]
+    insert_in_collection(database=db, collection_name=_COLLECTION, data=all_jobs)
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        response = client.get(f"/jobs/{job_id}", headers=no_qpu_app_token_header)
+        list_response = client.get("/jobs/", headers=no_qpu_app_token_header)
+        expected = list(filter(lambda x: x["job_id"] == job_id, all_jobs))[0]
+
+        assert response.status_code == 200
+        assert response.json() == expected
+        assert list_response.status_code == 200
+        assert order_by(list_response.json()["data"], "job_id") == order_by(
+            all_jobs, "job_id"
+        )
+
+
+def test_read_drifted_job_with_trusted_reads(
+    db, client, no_qpu_app_token_header, monkeypatch, caplog
+):
+    """Get to /jobs/{job_id} logs a warning if a sampled trusted record does not match the schema"""
+    monkeypatch.setattr(settings.CONFIG.database, "trusted_reads", True)
+    monkeypatch.setattr(settings.CONFIG.database, "trusted_reads_sample_rate", 1)
+    job = {**_JOBS_LIST[0], "result": {"memory": [list(range(1000))]}}
+    insert_in_collection(database=db, collection_name=_COLLECTION, data=[job])
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        response = client.get(f"/jobs/{job['job_id']}", headers=no_qpu_app_token_header)
+        # the sampled record is validated in a worker thread, after the response
+        for _ in range(50):
+            if "read without validation" in caplog.text:
+                break
+            time.sleep(0.1)
+
+    assert response.status_code == 200
+    assert "read without validation does not match Job" in caplog.text
+
+
+@pytest.mark.parametrize("job_id", _JOB_IDS)
+def test_read_archived_job(db, client, job_id: str, no_qpu_app_token_header, freezer):
+    """Get to /jobs/{job_id} returns the job for the given job_id even if it was archived"""
+    all_jobs = with_current_timestamps(
+        _JOBS_LIST, fields=("created_at", "updated_at", "calibration_date")
+    )
+    insert_in_collection(
+        database=db, collection_name=_ARCHIVE_COLLECTION, data=all_jobs
+    )
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        response = client.get(f"/jobs/{job_id}", headers=no_qpu_app_token_header)
+        got = response.json()
+        expected = list(filter(lambda x: x["job_id"] == job_id, all_jobs))[0]
+
+        assert response.status_code == 200
+        assert got == expected
+
+
+@pytest.mark.parametrize("job_id", _JOB_IDS)
+def test_read_job_not_modified(db, client, job_id: str, no_qpu_app_token_header):
+    """Get to /jobs/{job_id} returns 304 without a body if 'If-None-Match' matches the ETag of the job"""
+    insert_in_collection(database=db, collection_name=_COLLECTION, data=_JOBS_LIST)
+    # uncompressed responses keep their strong ETags
+    headers = {**no_qpu_app_token_header, "Accept-Encoding": "identity"}
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        response = client.get(f"/jobs/{job_id}", headers=headers)
+        etag = response.headers["etag"]
+        responses = [
+            client.get(f"/jobs/{job_id}", headers={**headers, "If-None-Match": value})
+            for value in (etag, f'"foo", W/{etag}', "*", '"foo"')
+        ]
+
+    assert response.status_code == 200
+    assert etag.startswith('"') and etag.endswith('"')
+    assert [item.status_code for item in responses] == [304, 304, 304, 200]
+    assert [item.headers["etag"] for item in responses] == [etag] * 4
+    assert [item.content for item in responses[:3]] == [b""] * 3
+    assert responses[3].json() == response.json()
+
+
+def test_read_finished_job_from_cache(db, client, app_token_header):
+    """Get to /jobs/{job_id} for finished jobs is served from memory until the job is updated"""
+    insert_in_collection(database=db, collection_name=_COLLECTION, data=_JOBS_LIST)
+    finished_job_id = "5b11de5b-34d2-4618-bbc2-a25112981b44"
+    pending_job_id = "951bcab8-4d88-4a27-9f1c-23197d92148a"
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        first_response = client.get(
+            f"/jobs/{finished_job_id}", headers=app_token_header
+        )
+        client.get(f"/jobs/{pending_job_id}", headers=app_token_header)
+
+        ops_before_read = _get_op_count(db, collection=_COLLECTION)
+        cached_response = client.get(
+            f"/jobs/{finished_job_id}", headers=app_token_header
+        )
+        ops_after_cached_read = _get_op_count(db, collection=_COLLECTION)
+        client.get(f"/jobs/{pending_job_id}", headers=app_token_header)
+        ops_after_uncached_read = _get_op_count(db, collection=_COLLECTION)
+
+        client.put(
+            f"/jobs/{finished_job_id}",
+            json={"failure_reason": "foo"},
+            headers=app_token_header,
+        )
+        updated_response = client.get(
+            f"/jobs/{finished_job_id}", headers=app_token_header
+        )
+
+    assert cached_response.status_code == 200
+    assert cached_response.content == first_response.content
+    assert cached_response.headers["etag"] == first_response.headers["etag"]
+    assert ops_after_cached_read == ops_before_read
+    assert ops_after_uncached_read > ops_after_cached_read
+    assert updated_response.json()["failure_reason"] == "foo"
+    assert updated_response.headers["etag"] != first_response.headers["etag"]
+
+
+@pytest.mark.parametrize("job_id", _JOB_IDS)
+@pytest.mark.parametrize("query, included, excluded", _PROJECTION_PARAMS)
+def test_read_job_with_projection(
+    db,
+    client,
+    job_id: str,
+    query: str,
+    included: Optional[List[str]],
+    excluded: List[str],
+    no_qpu_app_token_header,
+    freezer,
+):
+    """Get to /jobs/{job_id}?fields=...&exclude=... returns only the requested fields of the job"""
+    all_jobs = with_current_timestamps(
+        _JOBS_LIST, fields=("created_at", "updated_at", "calibration_date")
+    )
+    insert_in_collection(database=db, collection_name=_COLLECTION, data=all_jobs)
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        response = client.get(
+            f"/jobs/{job_id}?{query}", headers=no_qpu_app_token_header
+        )
+        got = response.json()
+        job = list(filter(lambda x: x["job_id"] == job_id, all_jobs))[0]
+        expected = _project(job, included=included, excluded=excluded)
+
+        assert response.status_code == 200
+        assert got == expected
+
+
+@pytest.mark.parametrize("query, included, excluded", _PROJECTION_PARAMS)
+def test_find_jobs_with_projection(
+    db,
+    client,
+    query: str,
+    included: Optional[List[str]],
+    excluded: List[str],
+    no_qpu_app_token_header,
+    freezer,
+):
+    """Get to /jobs/?fields=...&exclude=... returns only the requested fields of the jobs"""
+    raw_jobs = with_incremental_timestamps(
+        _JOBS_LIST, fields=("created_at", "updated_at", "calibration_date")
+    )
+    insert_in_collection(database=db, collection_name=_COLLECTION, data=raw_jobs)
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        response = client.get(f"/jobs/?{query}", headers=no_qpu_app_token_header)
+        got = response.json()
+        sorted_data = order_by_many(raw_jobs, fields=["-created_at"])
+        expected = {
+            "skip": 0,
+            "limit": None,
+            "data": [
+                _project(item, included=included, excluded=excluded)
+                for item in sorted_data
+            ],
+        }
+
+        assert response.status_code == 200
+        assert got == expected
+
+
+@pytest.mark.parametrize(
+    "query", ["fields=status&exclude=device", "fields=$where", "exclude=unknown"]
+)
+def test_find_jobs_with_invalid_projection(
+    db, client, query: str, no_qpu_app_token_header
+):
+    """Get to /jobs/?fields=...&exclude=... with invalid fields returns 400"""
+    insert_in_collection(database=db, collection_name=_COLLECTION, data=_JOBS_LIST)
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        response = client.get(f"/jobs/?{query}", headers=no_qpu_app_token_header)
+
+        assert response.status_code == 400
+
+
 @pytest.mark.parametrize("payload", _CREATE_JOB_PAYLOADS)
 def test_create_job(
     mock_bcc,
@@ -120,7 +363,7 @@ def test_create_job(
         collection_name=_COLLECTION,
         fields_to_exclude=_EXCLUDED_FIELDS,
     )
-    timestamp = get_current_timestamp_str()
+    timestamp = to_bson_datetime(get_current_timestamp_str())
 
     # using context manager to ensure on_startup runs
     with client as client:
@@ -153,6 +396,141 @@ def test_create_job(
         assert jobs_after_creation == [expected_job]
 
 
+@pytest.mark.parametrize("payload", _CREATE_JOB_PAYLOADS)
+def test_create_many_jobs(
+    mock_bcc,
+    db,
+    client,
+    payload,
+    project_id: PydanticObjectId,
+    app_token_header,
+    current_user_id,
+    freezer,
+):
+    """Post to /jobs:bulk creates 'count' jobs in the given backend"""
+    device = payload["device"]
+    count = 5
+    expected_bcc_base_url = TEST_BACKENDS_MAP[device]["url"]
+    timestamp = to_bson_datetime(get_current_timestamp_str())
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        response = client.post(
+            f"/jobs:bulk", json={**payload, "count": count}, headers=app_token_header
+        )
+        got = response.json()
+        new_job_ids = [item["job_id"] for item in got]
+        expected_jobs = [
+            {
+                "project_id": str(project_id),
+                "job_id": job_id,
+                "user_id": str(current_user_id),
+                "device": device,
+                "status": "pending",
+                "calibration_date": payload["calibration_date"],
+                "updated_at": timestamp,
+                "created_at": timestamp,
+            }
+            for job_id in new_job_ids
+        ]
+        jobs_after_creation = find_in_collection(
+            db,
+            collection_name=_COLLECTION,
+            fields_to_exclude=_EXCLUDED_FIELDS,
+        )
+        bcc_calls = [
+            json.loads(call.request.content)
+            for call in mock_bcc.calls
+            if call.request.url == f"{expected_bcc_base_url}/auth"
+        ]
+
+        assert response.status_code == 200
+        assert got == [
+            {"job_id": job_id, "upload_url": f"{expected_bcc_base_url}/jobs"}
+            for job_id in new_job_ids
+        ]
+        assert len(set(new_job_ids)) == count
+        assert order_by(jobs_after_creation, "job_id") == order_by(
+            expected_jobs, "job_id"
+        )
+        assert sorted(item["job_id"] for item in bcc_calls) == sorted(new_job_ids)
+
+
+def test_create_many_jobs_partially(
+    mock_bcc, db, client, project_id, app_token_header, monkeypatch, freezer
+):
+    """Post to /jobs:bulk saves the jobs it can, returning the error of each job it could not save"""
+    insert_in_collection(database=db, collection_name=_COLLECTION, data=_JOBS_LIST)
+    payload = _CREATE_JOB_PAYLOADS[0]
+    device = payload["device"]
+    existing_job_id = _JOB_IDS[0]
+    new_job_ids = [f"{uuid.uuid4()}", existing_job_id, f"{uuid.uuid4()}"]
+    generated_job_ids = iter(new_job_ids)
+    monkeypatch.setattr(job_utils, "uuid4", lambda: next(generated_job_ids))
+    expected_bcc_base_url = TEST_BACKENDS_MAP[device]["url"]
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        response = client.post(
+            f"/jobs:bulk", json={**payload, "count": 3}, headers=app_token_header
+        )
+        got = response.json()
+
+    saved_job_ids = [
+        item["job_id"]
+        for item in find_in_collection(db, collection_name=_COLLECTION)
+        if item["job_id"] in new_job_ids
+    ]
+    stats = find_in_collection(
+        db,
+        collection_name="job_stats",
+        _filter={"device": device, "project_id": str(project_id)},
+    )
+
+    assert response.status_code == 200
+    assert got == [
+        {"job_id": new_job_ids[0], "upload_url": f"{expected_bcc_base_url}/jobs"},
+        {
+            "job_id": existing_job_id,
+            "error": f"job id '{existing_job_id}' already exists",
+        },
+        {"job_id": new_job_ids[2], "upload_url": f"{expected_bcc_base_url}/jobs"},
+    ]
+    assert sorted(saved_job_ids) == sorted(new_job_ids)
+    assert [item["counts"]["pending"] for item in stats] == [2]
+
+
+@pytest.mark.parametrize("payload, bcc", _UNAVAILABLE_BCC_FIXTURE)
+def test_create_many_jobs_without_bcc(db, client, payload, app_token_header, bcc):
+    """Post to /jobs:bulk errors out, creating no jobs, if BCC is not available"""
+    # using context manager to ensure on_startup runs
+    with client as client:
+        response = client.post(
+            f"/jobs:bulk", json={**payload, "count": 3}, headers=app_token_header
+        )
+        jobs_after_creation = find_in_collection(
+            db,
+            collection_name=_COLLECTION,
+            fields_to_exclude=_EXCLUDED_FIELDS,
+        )
+
+        assert response.status_code == 503
+        assert response.json() == {"detail": "device is currently unavailable"}
+        assert jobs_after_creation == []
+
+
+def test_create_too_many_jobs(mock_bcc, db, client, app_token_header, monkeypatch):
+    """Post to /jobs:bulk with a count above 'max_bulk_size' returns 400"""
+    monkeypatch.setattr(settings.CONFIG.jobs, "max_bulk_size", 2)
+    payload = {**_CREATE_JOB_PAYLOADS[0], "count": 3}
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        response = client.post(f"/jobs:bulk", json=payload, headers=app_token_header)
+
+        assert response.status_code == 400
+
+
 @pytest.mark.parametrize("payload, bcc", _UNAVAILABLE_BCC_FIXTURE)
 def test_create_job_without_bcc(db, client, payload, app_token_header, bcc):
     """Post to /jobs/ error out if BCC is not available"""
@@ -181,7 +559,7 @@ def test_create_job_with_auth_disabled(mock_bcc, db, no_auth_client, payload, fr
         collection_name=_COLLECTION,
         fields_to_exclude=_EXCLUDED_FIELDS,
     )
-    timestamp = get_current_timestamp_str()
+    timestamp = to_bson_datetime(get_current_timestamp_str())
 
     # using context manager to ensure on_startup runs
     with no_auth_client as client:
@@ -272,75 +650,900 @@ def test_find_jobs(
         assert got == expected
 
 
-@pytest.mark.parametrize("raw_payload", _JOB_UPDATES)
-def test_update_job(db, client, raw_payload: dict, app_token_header, freezer):
-    """PUT to /jobs/{job_id} updates the job with the given object, it ignores job_id"""
+@pytest.mark.parametrize(
+    "statuses, devices",
+    [(["successful"], []), (["pending", "successful"], ["loke"])],
+)
+def test_find_jobs_with_operators(
+    db, client, statuses: List[str], devices: List[str], no_qpu_app_token_header
+):
+    """Get to /jobs/?created_at__gte=...&created_at__lt=...&status__in=...&device__in=...
+    returns the jobs in the given range of creation times whose fields are any of the given values
+    """
     raw_jobs = with_incremental_timestamps(
-        _JOBS_LIST, fields=["created_at", "calibration_date"]
+        _JOBS_LIST, fields=("created_at", "updated_at", "calibration_date")
     )
-    raw_jobs = with_current_timestamps(raw_jobs, fields=["updated_at"])
-    insert_in_collection(database=db, collection_name=_COLLECTION, data=raw_jobs)
+    insert_in_collection(
+        database=db,
+        collection_name=_COLLECTION,
+        data=with_bson_dates(raw_jobs, fields=("created_at", "updated_at")),
+    )
+    since = raw_jobs[2]["created_at"]
+    until = raw_jobs[-2]["created_at"]
 
-    ignored_fields = ["unexpected_field", "random_field", "job_id"]
-    payload = {**raw_payload, "job_id": f"{uuid.uuid4()}"}
-    job_id = raw_payload["job_id"]
+    query_string = f"?created_at__gte={since}&created_at__lt={until}&"
+    query_string += "".join(f"status__in={item}&" for item in statuses)
+    query_string += "".join(f"device__in={item}&" for item in devices)
 
     # using context manager to ensure on_startup runs
     with client as client:
-        response = client.put(
-            f"/jobs/{job_id}",
-            json={**payload},
-            headers=app_token_header,
-        )
-        got = response.json()
-        expected_job = list(filter(lambda x: x["job_id"] == job_id, raw_jobs))[0]
-        actual_update, _ = prune(raw_payload, ignored_fields)
-        expected_job.update(
-            actual_update,
-        )
+        response = client.get(f"/jobs/{query_string}", headers=no_qpu_app_token_header)
 
-        job_after_update = find_in_collection(
-            db,
-            collection_name=_COLLECTION,
-            fields_to_exclude=_EXCLUDED_FIELDS,
-            _filter={"job_id": job_id},
-        )[0]
+    expected = [
+        item
+        for item in order_by_many(raw_jobs, fields=["-created_at"])
+        if since <= item["created_at"] < until
+        and item["status"] in statuses
+        and (not devices or item["device"] in devices)
+    ]
 
-        assert response.status_code == 200
-        assert got == expected_job
-        assert job_after_update == expected_job
+    assert response.status_code == 200
+    assert response.json()["data"] == expected
 
 
-@pytest.mark.parametrize("raw_payload", _JOB_TIMESTAMPED_UPDATES)
-def test_update_job_resource_usage(
-    db, client, project_id, raw_payload: dict, app_token_header, freezer
+def test_find_jobs_with_too_many_operator_values(db, client, no_qpu_app_token_header):
+    """Get to /jobs/?status__in=... with more than MAX_LIST_QUERY_LEN values returns 400"""
+    insert_in_collection(database=db, collection_name=_COLLECTION, data=_JOBS_LIST)
+    query_string = "&".join(["device__in=loke"] * (MAX_LIST_QUERY_LEN + 1))
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        response = client.get(f"/jobs/?{query_string}", headers=no_qpu_app_token_header)
+
+    assert response.status_code == 400
+    assert response.json() == {
+        "detail": f"too many items passed to query device__in; "
+        f"expected {MAX_LIST_QUERY_LEN}, got {MAX_LIST_QUERY_LEN + 1}"
+    }
+
+
+@pytest.mark.parametrize("skip, limit, sort", _SKIP_LIMIT_SORT_PARAMS)
+def test_find_jobs_including_archived(
+    db,
+    client,
+    skip: Optional[int],
+    limit: Optional[int],
+    sort: Optional[List[str]],
+    no_qpu_app_token_header,
+    freezer,
 ):
-    """PUT to /jobs/{job_id} updates the job's resource usage if passed a payload with "timestamps" property"""
+    """Get to /jobs/?include_archived=true returns both the jobs in the archive and those that are not"""
     raw_jobs = with_incremental_timestamps(
-        _JOBS_LIST, fields=["created_at", "calibration_date"]
+        _JOBS_LIST, fields=("created_at", "updated_at", "calibration_date")
     )
-    raw_jobs = with_current_timestamps(raw_jobs, fields=["updated_at"])
-    job_list = [{**item, "project_id": str(project_id)} for item in raw_jobs]
-    job_id = raw_payload["job_id"]
-
-    insert_in_collection(database=db, collection_name=_COLLECTION, data=job_list)
-
-    project_before_update = get_db_record(
-        db, schema=Project, _filter={"ext_id": TEST_PROJECT_EXT_ID}
+    archived_jobs = raw_jobs[::2]
+    hot_jobs = raw_jobs[1::2]
+    insert_in_collection(database=db, collection_name=_COLLECTION, data=hot_jobs)
+    insert_in_collection(
+        database=db, collection_name=_ARCHIVE_COLLECTION, data=archived_jobs
     )
 
+    query_string = "?"
+    slice_start = skip or 0
+    slice_end = len(raw_jobs) if limit is None else slice_start + limit
+    sort_fields = sort or ["-created_at"]
+    if limit is not None:
+        query_string += f"limit={limit}&"
+    if skip is not None:
+        query_string += f"skip={skip}&"
+    for sort_field in sort_fields:
+        query_string += f"sort={sort_field}&"
+
     # using context manager to ensure on_startup runs
     with client as client:
-        # check for idempotence
-        for _ in range(3):
-            response = client.put(
-                f"/jobs/{job_id}",
-                json=raw_payload,
-                headers=app_token_header,
-            )
-            assert response.status_code == 200
+        response = client.get(
+            f"/jobs/{query_string}include_archived=true",
+            headers=no_qpu_app_token_header,
+        )
+        hot_response = client.get(
+            f"/jobs/{query_string}", headers=no_qpu_app_token_header
+        )
 
-    project_after_update = get_db_record(
+    expected = order_by_many(raw_jobs, fields=sort_fields)[slice_start:slice_end]
+    expected_hot = order_by_many(hot_jobs, fields=sort_fields)[slice_start:slice_end]
+
+    assert response.status_code == 200
+    assert response.json()["data"] == expected
+    assert hot_response.json()["data"] == expected_hot
+
+
+def test_archive_jobs(db, client, monkeypatch, no_qpu_app_token_header, freezer):
+    """Finished jobs older than 'archive_after_days' are moved to the archive in the background"""
+    monkeypatch.setattr(settings.CONFIG.jobs, "archive_after_days", 1)
+    raw_jobs = with_current_timestamps(
+        _JOBS_LIST, fields=("created_at", "calibration_date")
+    )
+    raw_jobs = [
+        {
+            **item,
+            "updated_at": (
+                "2020-01-01T00:00:00.000Z" if idx % 2 == 0 else item["created_at"]
+            ),
+        }
+        for idx, item in enumerate(raw_jobs)
+    ]
+    insert_in_collection(
+        database=db,
+        collection_name=_COLLECTION,
+        data=with_bson_dates(raw_jobs, fields=("created_at", "updated_at")),
+    )
+    expected_archived_ids = sorted(
+        item["job_id"]
+        for idx, item in enumerate(raw_jobs)
+        if idx % 2 == 0 and item["status"] != "pending"
+    )
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        archived_ids = []
+        for _ in range(50):
+            archived_ids = sorted(
+                item["job_id"]
+                for item in find_in_collection(db, collection_name=_ARCHIVE_COLLECTION)
+            )
+            if archived_ids == expected_archived_ids:
+                break
+            time.sleep(0.1)
+
+        hot_ids = sorted(
+            item["job_id"]
+            for item in find_in_collection(db, collection_name=_COLLECTION)
+        )
+        archived_job_id = expected_archived_ids[0]
+        response = client.get(
+            f"/jobs/{archived_job_id}", headers=no_qpu_app_token_header
+        )
+
+    expected_hot_ids = sorted(
+        item["job_id"]
+        for item in raw_jobs
+        if item["job_id"] not in expected_archived_ids
+    )
+
+    assert archived_ids == expected_archived_ids
+    assert hot_ids == expected_hot_ids
+    assert response.status_code == 200
+    assert response.json()["job_id"] == archived_job_id
+
+
+@pytest.mark.parametrize("skip, limit, sort", _SKIP_LIMIT_SORT_PARAMS)
+def test_find_jobs_as_ndjson(
+    db,
+    client,
+    skip: Optional[int],
+    limit: Optional[int],
+    sort: Optional[List[str]],
+    no_qpu_app_token_header,
+    freezer,
+):
+    """Get to /jobs/ with 'Accept: application/x-ndjson' streams the jobs one per line"""
+    raw_jobs = with_incremental_timestamps(
+        _JOBS_LIST, fields=("created_at", "updated_at", "calibration_date")
+    )
+    insert_in_collection(database=db, collection_name=_COLLECTION, data=raw_jobs)
+    headers = {**no_qpu_app_token_header, "Accept": "application/x-ndjson"}
+
+    query_string = "?"
+    slice_start = skip or 0
+    slice_end = len(raw_jobs) if limit is None else slice_start + limit
+    sort_fields = sort or ["-created_at"]
+    if limit is not None:
+        query_string += f"limit={limit}&"
+    if skip is not None:
+        query_string += f"skip={skip}&"
+    for sort_field in sort_fields:
+        query_string += f"sort={sort_field}&"
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        response = client.get(f"/jobs/{query_string}", headers=headers)
+        got = [json.loads(line) for line in response.text.splitlines()]
+        expected = order_by_many(raw_jobs, fields=sort_fields)[slice_start:slice_end]
+
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        assert got == expected
+
+
+def test_find_jobs_as_ndjson_with_invalid_projection(
+    db, client, no_qpu_app_token_header
+):
+    """Get to /jobs/ with 'Accept: application/x-ndjson' and an invalid projection returns 400"""
+    insert_in_collection(database=db, collection_name=_COLLECTION, data=_JOBS_LIST)
+    headers = {**no_qpu_app_token_header, "Accept": "application/x-ndjson"}
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        response = client.get("/jobs/?fields=unknown", headers=headers)
+
+        assert response.status_code == 400
+
+
+def test_find_jobs_compressed(db, client, no_qpu_app_token_header, freezer):
+    """Get to /jobs/ compresses large responses with the content coding accepted by the client"""
+    raw_jobs = with_incremental_timestamps(
+        _JOBS_LIST, fields=("created_at", "updated_at", "calibration_date")
+    )
+    insert_in_collection(database=db, collection_name=_COLLECTION, data=raw_jobs)
+    headers = {**no_qpu_app_token_header, "Accept-Encoding": "gzip"}
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        response = client.get("/jobs/", headers=headers)
+        small_response = client.get("/jobs/?limit=1&fields=status", headers=headers)
+        identity_response = client.get(
+            "/jobs/", headers={**headers, "Accept-Encoding": "identity"}
+        )
+
+    expected = {
+        "skip": 0,
+        "limit": None,
+        "data": order_by_many(raw_jobs, fields=["-created_at"]),
+    }
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept, Accept-Encoding"
+    assert response.json() == expected
+    assert small_response.status_code == 200
+    assert "content-encoding" not in small_response.headers
+    assert identity_response.status_code == 200
+    assert "content-encoding" not in identity_response.headers
+    assert identity_response.json() == expected
+
+
+@pytest.mark.parametrize("job_id", _JOB_IDS)
+def test_read_job_as_msgpack(db, client, job_id: str, no_qpu_app_token_header):
+    """Get to /jobs/{job_id} with 'Accept: application/msgpack' returns the job as MessagePack"""
+    msgpack = pytest.importorskip("msgpack")
+    insert_in_collection(database=db, collection_name=_COLLECTION, data=_JOBS_LIST)
+    headers = {**no_qpu_app_token_header, "Accept-Encoding": "identity"}
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        json_response = client.get(f"/jobs/{job_id}", headers=headers)
+        response = client.get(
+            f"/jobs/{job_id}", headers={**headers, "Accept": "application/msgpack"}
+        )
+        not_modified_response = client.get(
+            f"/jobs/{job_id}",
+            headers={
+                **headers,
+                "Accept": "application/msgpack",
+                "If-None-Match": response.headers["etag"],
+            },
+        )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/msgpack"
+    assert msgpack.unpackb(response.content) == json_response.json()
+    assert response.headers["etag"] != json_response.headers["etag"]
+    assert not_modified_response.status_code == 304
+
+
+@pytest.mark.parametrize("limit, sort, search", _CURSOR_PAGINATE_AND_SEARCH_PARAMS)
+def test_find_jobs_by_cursor(
+    db,
+    client,
+    limit: int,
+    sort: Optional[List[str]],
+    search: dict,
+    no_qpu_app_token_header,
+    freezer,
+):
+    """Get to /job/?cursor=...&limit=... pages through the jobs using the returned next_cursor"""
+    raw_jobs = with_incremental_timestamps(
+        _JOBS_LIST,
+        fields=(
+            "created_at",
+            "updated_at",
+            "calibration_date",
+        ),
+    )
+    insert_in_collection(database=db, collection_name=_COLLECTION, data=raw_jobs)
+
+    query_string = f"?limit={limit}&"
+    sort_fields = ["-created_at"]
+    if sort is not None:
+        sort_fields = sort
+        for sort_field in sort_fields:
+            query_string += f"sort={sort_field}&"
+
+    for key, value in search.items():
+        query_string += f"{key}={value}&"
+
+    filtered_data = filter_by_equality(raw_jobs, filters=search)
+    expected = order_by_many(filtered_data, fields=sort_fields)
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        got = []
+        cursor = ""
+        pages = 0
+        while cursor is not None:
+            response = client.get(
+                f"/jobs/{query_string}",
+                params={"cursor": cursor},
+                headers=no_qpu_app_token_header,
+            )
+            assert response.status_code == 200
+
+            page = response.json()
+            assert page["cursor"] == cursor
+            assert page["limit"] == limit
+            assert len(page["data"]) <= limit
+
+            got.extend(page["data"])
+            cursor = page["next_cursor"]
+            pages += 1
+
+        assert got == expected
+        assert pages == len(expected) // limit + 1
+
+
+def test_find_jobs_invalid_cursor(db, client, no_qpu_app_token_header):
+    """Get to /job/?cursor=... with an invalid cursor returns a 400 error"""
+    insert_in_collection(database=db, collection_name=_COLLECTION, data=_JOBS_LIST)
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        response = client.get(
+            "/jobs/?cursor=not-a-cursor&limit=2", headers=no_qpu_app_token_header
+        )
+
+        assert response.status_code == 400
+
+
+@pytest.mark.parametrize("raw_payload", _JOB_UPDATES)
+def test_update_job(db, client, raw_payload: dict, app_token_header, freezer):
+    """PUT to /jobs/{job_id} updates the job with the given object, it ignores job_id"""
+    raw_jobs = with_incremental_timestamps(
+        _JOBS_LIST, fields=["created_at", "calibration_date"]
+    )
+    raw_jobs = with_current_timestamps(raw_jobs, fields=["updated_at"])
+    insert_in_collection(database=db, collection_name=_COLLECTION, data=raw_jobs)
+
+    ignored_fields = ["unexpected_field", "random_field", "job_id"]
+    payload = {**raw_payload, "job_id": f"{uuid.uuid4()}"}
+    job_id = raw_payload["job_id"]
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        response = client.put(
+            f"/jobs/{job_id}",
+            json={**payload},
+            headers=app_token_header,
+        )
+        got = response.json()
+        expected_job = list(filter(lambda x: x["job_id"] == job_id, raw_jobs))[0]
+        actual_update, _ = prune(raw_payload, ignored_fields)
+        expected_job.update(
+            actual_update,
+        )
+
+        job_after_update = find_in_collection(
+            db,
+            collection_name=_COLLECTION,
+            fields_to_exclude=_EXCLUDED_FIELDS,
+            _filter={"job_id": job_id},
+        )[0]
+
+        assert response.status_code == 200
+        assert got == expected_job
+        assert job_after_update == {
+            **expected_job,
+            "updated_at": to_bson_datetime(expected_job["updated_at"]),
+        }
+
+
+@pytest.mark.parametrize("job_id", _JOB_IDS)
+def test_update_job_with_large_result(
+    db, client, job_id: str, app_token_header, monkeypatch, freezer
+):
+    """PUT to /jobs/{job_id} with a large result memory stores the memory outside the job document"""
+    monkeypatch.setattr(settings.CONFIG.jobs, "max_inline_result_bytes", 100)
+    monkeypatch.setattr(settings.CONFIG.jobs, "result_chunk_size", 4)
+    insert_in_collection(database=db, collection_name=_COLLECTION, data=_JOBS_LIST)
+    memory = [[hex(idx) for idx in range(10)], [], [hex(idx) for idx in range(5)]]
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        response = client.put(
+            f"/jobs/{job_id}",
+            json={"result": {"memory": memory}},
+            headers=app_token_header,
+        )
+        got = response.json()
+        memory_response = client.get(
+            f"/jobs/{job_id}/result/memory", headers=app_token_header
+        )
+        job_in_db = find_in_collection(
+            db,
+            collection_name=_COLLECTION,
+            fields_to_exclude=_EXCLUDED_FIELDS,
+            _filter={"job_id": job_id},
+        )[0]
+        chunks = find_in_collection(
+            db,
+            collection_name="job_results",
+            fields_to_exclude=_EXCLUDED_FIELDS,
+            _filter={"job_id": job_id},
+        )
+
+        assert response.status_code == 200
+        assert got["result"]["memory"] == memory
+        assert memory_response.status_code == 200
+        assert memory_response.json() == memory
+        assert "memory" not in job_in_db["result"]
+        assert job_in_db["result"]["memory_ref"]["num_shots"] == [10, 0, 5]
+        assert sorted(
+            (item["experiment"], item["index"], len(item["shots"])) for item in chunks
+        ) == [(0, 0, 4), (0, 1, 4), (0, 2, 2), (2, 0, 4), (2, 1, 1)]
+
+
+@pytest.mark.parametrize("job_id", _JOB_IDS)
+def test_update_job_with_large_result_again(
+    db, client, job_id: str, app_token_header, monkeypatch, freezer
+):
+    """PUT to /jobs/{job_id} with a new large result memory replaces the chunks of the old one"""
+    monkeypatch.setattr(settings.CONFIG.jobs, "max_inline_result_bytes", 100)
+    monkeypatch.setattr(settings.CONFIG.jobs, "result_chunk_size", 4)
+    insert_in_collection(database=db, collection_name=_COLLECTION, data=_JOBS_LIST)
+    old_memory = [[hex(idx) for idx in range(20)]]
+    memory = [[hex(idx) for idx in range(10)], [hex(idx) for idx in range(5)]]
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        for item in (old_memory, memory):
+            response = client.put(
+                f"/jobs/{job_id}",
+                json={"result": {"memory": item}},
+                headers=app_token_header,
+            )
+            assert response.status_code == 200
+
+        memory_response = client.get(
+            f"/jobs/{job_id}/result/memory", headers=app_token_header
+        )
+        job_in_db = find_in_collection(
+            db,
+            collection_name=_COLLECTION,
+            fields_to_exclude=_EXCLUDED_FIELDS,
+            _filter={"job_id": job_id},
+        )[0]
+        chunks = find_in_collection(
+            db,
+            collection_name="job_results",
+            fields_to_exclude=_EXCLUDED_FIELDS,
+            _filter={"job_id": job_id},
+        )
+
+        assert memory_response.json() == memory
+        assert {item["version"] for item in chunks} == {
+            job_in_db["result"]["memory_ref"]["version"]
+        }
+        assert sorted(
+            (item["experiment"], item["index"], len(item["shots"])) for item in chunks
+        ) == [(0, 0, 4), (0, 1, 4), (0, 2, 2), (1, 0, 4), (1, 1, 1)]
+
+
+@pytest.mark.parametrize("job_id", _JOB_IDS)
+def test_update_job_with_packed_result(
+    db, client, job_id: str, app_token_header, monkeypatch, freezer
+):
+    """PUT to /jobs/{job_id} stores the result memory bit-packed if 'pack_result_memory' is set"""
+    monkeypatch.setattr(settings.CONFIG.jobs, "pack_result_memory", True)
+    insert_in_collection(database=db, collection_name=_COLLECTION, data=_JOBS_LIST)
+    memory = [[hex(idx % 32) for idx in range(100)], [], ["0x1f", "0x0"]]
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        response = client.put(
+            f"/jobs/{job_id}",
+            json={"result": {"memory": memory}},
+            headers=app_token_header,
+        )
+        got = response.json()
+        list_response = client.get(
+            f"/jobs/?job_id={job_id}&fields=result", headers=app_token_header
+        )
+        job_in_db = find_in_collection(
+            db,
+            collection_name=_COLLECTION,
+            fields_to_exclude=_EXCLUDED_FIELDS,
+            _filter={"job_id": job_id},
+        )[0]
+
+        assert response.status_code == 200
+        assert got["result"] == {"memory": memory}
+        assert list_response.json()["data"] == [{"result": {"memory": memory}}]
+        assert "memory" not in job_in_db["result"]
+        assert job_in_db["result"]["memory_packed"]["format"] == "hex"
+        assert job_in_db["result"]["memory_packed"]["num_clbits"] == 5
+        assert job_in_db["result"]["memory_packed"]["num_shots"] == [100, 0, 2]
+
+
+@pytest.mark.parametrize("size", [1, 5, len(_JOB_IDS)])
+def test_read_many_job_statuses(db, client, size: int, app_token_header):
+    """POST to /jobs/status:batch returns the statuses of the given jobs, leaving out unknown ones"""
+    insert_in_collection(database=db, collection_name=_COLLECTION, data=_JOBS_LIST)
+    job_ids = _JOB_IDS[:size]
+    unknown_job_id = f"{uuid.uuid4()}"
+    expected = {
+        item["job_id"]: item["status"]
+        for item in _JOBS_LIST
+        if item["job_id"] in job_ids
+    }
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        response = client.post(
+            "/jobs/status:batch",
+            json={"job_ids": [*job_ids, unknown_job_id]},
+            headers=app_token_header,
+        )
+
+        assert response.status_code == 200
+        assert response.json() == expected
+
+
+def test_read_many_archived_job_statuses(db, client, app_token_header):
+    """POST to /jobs/status:batch returns the statuses of the given jobs even if they were archived"""
+    archived_jobs = _JOBS_LIST[::2]
+    insert_in_collection(
+        database=db, collection_name=_COLLECTION, data=_JOBS_LIST[1::2]
+    )
+    insert_in_collection(
+        database=db, collection_name=_ARCHIVE_COLLECTION, data=archived_jobs
+    )
+    expected = {item["job_id"]: item["status"] for item in _JOBS_LIST}
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        response = client.post(
+            "/jobs/status:batch",
+            json={"job_ids": _JOB_IDS},
+            headers=app_token_header,
+        )
+
+        assert response.status_code == 200
+        assert response.json() == expected
+
+
+def test_read_too_many_job_statuses(db, client, app_token_header, monkeypatch):
+    """POST to /jobs/status:batch with more job ids than 'max_status_batch_size' returns 400"""
+    monkeypatch.setattr(settings.CONFIG.jobs, "max_status_batch_size", 2)
+    insert_in_collection(database=db, collection_name=_COLLECTION, data=_JOBS_LIST)
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        response = client.post(
+            "/jobs/status:batch",
+            json={"job_ids": _JOB_IDS[:3]},
+            headers=app_token_header,
+        )
+
+        assert response.status_code == 400
+
+
+@pytest.mark.parametrize("job_id", _JOB_IDS)
+def test_read_job_events(db, client, job_id: str, app_token_header):
+    """Get to /jobs/{job_id}/events streams the status of the job until it finishes"""
+    insert_in_collection(database=db, collection_name=_COLLECTION, data=_JOBS_LIST)
+    job = list(filter(lambda x: x["job_id"] == job_id, _JOBS_LIST))[0]
+    statuses = [job["status"]]
+    if job["status"] not in ("successful", "failed", "cancelled"):
+        statuses += ["executing", "successful"]
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+
+        def update_status():
+            for status in statuses[1:]:
+                time.sleep(0.2)
+                client.put(
+                    f"/jobs/{job_id}", json={"status": status}, headers=app_token_header
+                )
+
+        updater = threading.Thread(target=update_status)
+        with client.stream(
+            "GET", f"/jobs/{job_id}/events", headers=app_token_header
+        ) as response:
+            updater.start()
+            got = [
+                json.loads(line.removeprefix("data: "))["status"]
+                for line in response.iter_lines()
+                if line.startswith("data: ")
+            ]
+        updater.join()
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        assert got == statuses
+
+
+def test_read_events_of_unknown_job(db, client, app_token_header):
+    """Get to /jobs/{job_id}/events for a job that does not exist returns 404"""
+    insert_in_collection(database=db, collection_name=_COLLECTION, data=_JOBS_LIST)
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        response = client.get(f"/jobs/{uuid.uuid4()}/events", headers=app_token_header)
+
+        assert response.status_code == 404
+
+
+@pytest.mark.parametrize("job_id", _JOB_IDS)
+def test_read_job_result_memory(db, client, job_id: str, no_qpu_app_token_header):
+    """Get to /jobs/{job_id}/result/memory returns the memory stored in the job document"""
+    insert_in_collection(database=db, collection_name=_COLLECTION, data=_JOBS_LIST)
+    job = list(filter(lambda x: x["job_id"] == job_id, _JOBS_LIST))[0]
+    expected = job.get("result", {}).get("memory", [])
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        response = client.get(
+            f"/jobs/{job_id}/result/memory", headers=no_qpu_app_token_header
+        )
+
+        assert response.status_code == 200
+        assert response.json() == expected
+
+
+@pytest.mark.parametrize("job_id", _JOB_IDS)
+def test_read_archived_job_result_memory(
+    db, client, job_id: str, no_qpu_app_token_header
+):
+    """Get to /jobs/{job_id}/result/memory returns the memory of the job even if it was archived"""
+    insert_in_collection(
+        database=db, collection_name=_ARCHIVE_COLLECTION, data=_JOBS_LIST
+    )
+    job = list(filter(lambda x: x["job_id"] == job_id, _JOBS_LIST))[0]
+    expected = job.get("result", {}).get("memory", [])
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        response = client.get(
+            f"/jobs/{job_id}/result/memory", headers=no_qpu_app_token_header
+        )
+
+        assert response.status_code == 200
+        assert response.json() == expected
+
+
+@pytest.mark.parametrize(
+    "jobs_config",
+    [
+        {},
+        {"max_inline_result_bytes": 100, "result_chunk_size": 4},
+        {"pack_result_memory": True},
+    ],
+)
+@pytest.mark.parametrize(
+    "experiment, offset, limit",
+    [(0, 0, 3), (0, 3, 4), (0, 8, 4), (0, 10, 2), (1, 0, 5), (2, 1, 10), (3, 0, 1)],
+)
+def test_read_job_result_memory_slice(
+    db,
+    client,
+    jobs_config: Dict[str, Any],
+    experiment: int,
+    offset: int,
+    limit: int,
+    app_token_header,
+    monkeypatch,
+):
+    """Get to /jobs/{job_id}/result/memory?experiment=...&offset=...&limit=... returns a slice of the shots"""
+    for key, value in jobs_config.items():
+        monkeypatch.setattr(settings.CONFIG.jobs, key, value)
+    insert_in_collection(database=db, collection_name=_COLLECTION, data=_JOBS_LIST)
+    job_id = _JOB_IDS[0]
+    memory = [[hex(idx) for idx in range(10)], [], [hex(idx) for idx in range(5)]]
+    experiment_memory = memory[experiment] if experiment < len(memory) else []
+    next_offset = offset + limit
+    expected = {
+        "experiment": experiment,
+        "offset": offset,
+        "limit": limit,
+        "num_shots": len(experiment_memory),
+        "shots": experiment_memory[offset : offset + limit],
+        "next_offset": next_offset if next_offset < len(experiment_memory) else None,
+    }
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        client.put(
+            f"/jobs/{job_id}",
+            json={"result": {"memory": memory}},
+            headers=app_token_header,
+        )
+        response = client.get(
+            f"/jobs/{job_id}/result/memory",
+            params={"experiment": experiment, "offset": offset, "limit": limit},
+            headers=app_token_header,
+        )
+
+        assert response.status_code == 200
+        assert response.json() == expected
+
+
+def test_read_job_result_memory_too_large_slice(
+    db, client, no_qpu_app_token_header, monkeypatch
+):
+    """Get to /jobs/{job_id}/result/memory with a limit above 'max_result_slice_size' returns 400"""
+    monkeypatch.setattr(settings.CONFIG.jobs, "max_result_slice_size", 10)
+    insert_in_collection(database=db, collection_name=_COLLECTION, data=_JOBS_LIST)
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        response = client.get(
+            f"/jobs/{_JOB_IDS[0]}/result/memory",
+            params={"experiment": 0, "limit": 11},
+            headers=no_qpu_app_token_header,
+        )
+
+        assert response.status_code == 400
+
+
+@pytest.mark.parametrize("job_id", _JOB_IDS)
+def test_read_job_result_counts(db, client, job_id: str, no_qpu_app_token_header):
+    """Get to /jobs/{job_id}/result/counts returns the counts of the shots of each experiment"""
+    insert_in_collection(database=db, collection_name=_COLLECTION, data=_JOBS_LIST)
+    job = list(filter(lambda x: x["job_id"] == job_id, _JOBS_LIST))[0]
+    memory = job.get("result", {}).get("memory", [])
+    expected = {
+        "job_id": job_id,
+        "status": job["status"],
+        "clbits": [],
+        "counts": [dict(Counter(experiment)) for experiment in memory],
+    }
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        response = client.get(
+            f"/jobs/{job_id}/result/counts", headers=no_qpu_app_token_header
+        )
+        not_modified_response = client.get(
+            f"/jobs/{job_id}/result/counts",
+            headers={
+                **no_qpu_app_token_header,
+                "If-None-Match": response.headers["etag"],
+            },
+        )
+
+        assert response.status_code == 200
+        assert response.json() == expected
+        assert not_modified_response.status_code == 304
+
+
+@pytest.mark.parametrize("pack_result_memory", [True, False])
+@pytest.mark.parametrize("clbits", [[], [0], [4, 0], [1, 2, 3]])
+def test_read_marginal_job_result_counts(
+    db,
+    client,
+    pack_result_memory: bool,
+    clbits: List[int],
+    app_token_header,
+    monkeypatch,
+):
+    """Get to /jobs/{job_id}/result/counts?clbits=... counts the shots marginalized over the given bits"""
+    monkeypatch.setattr(settings.CONFIG.jobs, "pack_result_memory", pack_result_memory)
+    insert_in_collection(database=db, collection_name=_COLLECTION, data=_JOBS_LIST)
+    job_id = _JOB_IDS[0]
+    memory = [[hex(idx % 32) for idx in range(100)], [], ["0x1f", "0x0"]]
+
+    def _marginal(shot: str) -> str:
+        if len(clbits) == 0:
+            return shot
+        value = int(shot, 16)
+        return hex(sum(((value >> bit) & 1) << idx for idx, bit in enumerate(clbits)))
+
+    expected = [Counter(_marginal(shot) for shot in item) for item in memory]
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        client.put(
+            f"/jobs/{job_id}",
+            json={"status": "successful", "result": {"memory": memory}},
+            headers=app_token_header,
+        )
+        response = client.get(
+            f"/jobs/{job_id}/result/counts",
+            params={"clbits": clbits},
+            headers=app_token_header,
+        )
+
+        assert response.status_code == 200
+        assert response.json()["clbits"] == clbits
+        assert response.json()["counts"] == expected
+
+
+def test_read_job_result_counts_after_update(db, client, app_token_header):
+    """Get to /jobs/{job_id}/result/counts does not return cached counts after the job is updated"""
+    insert_in_collection(database=db, collection_name=_COLLECTION, data=_JOBS_LIST)
+    job_id = _JOB_IDS[0]
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        client.put(
+            f"/jobs/{job_id}",
+            json={"status": "successful", "result": {"memory": [["0x1", "0x1"]]}},
+            headers=app_token_header,
+        )
+        first_response = client.get(
+            f"/jobs/{job_id}/result/counts", headers=app_token_header
+        )
+        client.put(
+            f"/jobs/{job_id}",
+            json={"result": {"memory": [["0x1", "0x0"]]}},
+            headers=app_token_header,
+        )
+        second_response = client.get(
+            f"/jobs/{job_id}/result/counts", headers=app_token_header
+        )
+
+        assert first_response.json()["counts"] == [{"0x1": 2}]
+        assert second_response.json()["counts"] == [{"0x0": 1, "0x1": 1}]
+
+
+@pytest.mark.parametrize("clbits", [[0, 0], [-1], [64]])
+def test_read_job_result_counts_invalid_clbits(
+    db, client, clbits: List[int], no_qpu_app_token_header
+):
+    """Get to /jobs/{job_id}/result/counts with repeated or out-of-range clbits returns 400"""
+    insert_in_collection(database=db, collection_name=_COLLECTION, data=_JOBS_LIST)
+    job_id = [item for item in _JOBS_LIST if "result" in item][0]["job_id"]
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        response = client.get(
+            f"/jobs/{job_id}/result/counts",
+            params={"clbits": clbits},
+            headers=no_qpu_app_token_header,
+        )
+
+        assert response.status_code == 400
+
+
+@pytest.mark.parametrize("raw_payload", _JOB_TIMESTAMPED_UPDATES)
+def test_update_job_resource_usage(
+    db, client, project_id, raw_payload: dict, app_token_header, freezer
+):
+    """PUT to /jobs/{job_id} updates the job's resource usage if passed a payload with "timestamps" property"""
+    raw_jobs = with_incremental_timestamps(
+        _JOBS_LIST, fields=["created_at", "calibration_date"]
+    )
+    raw_jobs = with_current_timestamps(raw_jobs, fields=["updated_at"])
+    job_list = [{**item, "project_id": str(project_id)} for item in raw_jobs]
+    job_id = raw_payload["job_id"]
+
+    insert_in_collection(database=db, collection_name=_COLLECTION, data=job_list)
+
+    project_before_update = get_db_record(
+        db, schema=Project, _filter={"ext_id": TEST_PROJECT_EXT_ID}
+    )
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        # check for idempotence
+        for _ in range(3):
+            response = client.put(
+                f"/jobs/{job_id}",
+                json=raw_payload,
+                headers=app_token_header,
+            )
+            assert response.status_code == 200
+
+    project_after_update = get_db_record(
         db, schema=Project, _filter={"ext_id": TEST_PROJECT_EXT_ID}
     )
     expected_resource_usage = _get_resource_usage(raw_payload["timestamps"])
@@ -390,6 +1593,449 @@ def test_update_job_resource_usage_advanced(
     assert actual_resource_usage == expected_resource_usage
 
 
+def test_update_many_jobs(db, client, project_id, app_token_header, freezer):
+    """PUT to /jobs:bulk updates each job with its payload, and charges the project once per job"""
+    raw_jobs = with_current_timestamps(_JOBS_LIST, fields=["created_at", "updated_at"])
+    job_list = [{**item, "project_id": str(project_id)} for item in raw_jobs]
+    insert_in_collection(database=db, collection_name=_COLLECTION, data=job_list)
+    unknown_job_id = f"{uuid.uuid4()}"
+    updates = [
+        {"job_id": item["job_id"], "payload": prune(item, ["job_id"])[0]}
+        for item in _JOB_TIMESTAMPED_UPDATES
+    ]
+    payload = {"updates": [*updates, {"job_id": unknown_job_id, "payload": {}}]}
+
+    project_before_update = get_db_record(
+        db, schema=Project, _filter={"ext_id": TEST_PROJECT_EXT_ID}
+    )
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        # check for idempotence
+        responses = [
+            client.put("/jobs:bulk", json=payload, headers=app_token_header)
+            for _ in range(2)
+        ]
+        jobs_after_update = [
+            client.get(f"/jobs/{item['job_id']}", headers=app_token_header).json()
+            for item in updates
+        ]
+
+    project_after_update = get_db_record(
+        db, schema=Project, _filter={"ext_id": TEST_PROJECT_EXT_ID}
+    )
+    expected_resource_usage = round(
+        sum(_get_resource_usage(item["timestamps"]) for item in updates), 1
+    )
+    actual_resource_usage = round(
+        project_before_update["qpu_seconds"] - project_after_update["qpu_seconds"], 1
+    )
+    expected_outcomes = [
+        *({"job_id": item["job_id"], "outcome": "updated"} for item in updates),
+        {"job_id": unknown_job_id, "outcome": "not_found"},
+    ]
+
+    assert [v.status_code for v in responses] == [200, 200]
+    assert [v.json() for v in responses] == [expected_outcomes, expected_outcomes]
+    assert [v["status"] for v in jobs_after_update] == [
+        item["status"] for item in _JOB_TIMESTAMPED_UPDATES
+    ]
+    assert [v["result"] for v in jobs_after_update] == [
+        item["result"] for item in _JOB_TIMESTAMPED_UPDATES
+    ]
+    assert actual_resource_usage == expected_resource_usage
+
+
+def test_update_many_jobs_updated_again_after_write(
+    db, client, project_id, app_token_header, monkeypatch, freezer
+):
+    """PUT to /jobs:bulk reports a job as updated, and charges it, even if another request updates it right after"""
+    monkeypatch.setattr(settings.CONFIG.jobs, "max_inline_result_bytes", 100)
+    monkeypatch.setattr(settings.CONFIG.jobs, "result_chunk_size", 4)
+    raw_jobs = with_current_timestamps(_JOBS_LIST, fields=["created_at", "updated_at"])
+    job_list = [{**item, "project_id": str(project_id)} for item in raw_jobs]
+    insert_in_collection(database=db, collection_name=_COLLECTION, data=job_list)
+    update = _JOB_TIMESTAMPED_UPDATES[0]
+    job_id = update["job_id"]
+    memory = [[hex(idx) for idx in range(10)]]
+    payload = {
+        "updates": [
+            {
+                "job_id": job_id,
+                "payload": {
+                    **prune(update, ["job_id"])[0],
+                    "result": {"memory": memory},
+                },
+            }
+        ]
+    }
+    project_before_update = get_db_record(
+        db, schema=Project, _filter={"ext_id": TEST_PROJECT_EXT_ID}
+    )
+
+    record_many_updated = job_stats.record_many_updated
+
+    async def record_many_updated_after_other_update(*args, **kwargs):
+        # another request updates the job between the write of the bulk update and the rest of it
+        db[_COLLECTION].update_one(
+            {"job_id": job_id},
+            {
+                "$set": {
+                    "failure_reason": "foo",
+                    "updated_at": datetime.now(timezone.utc),
+                }
+            },
+        )
+        return await record_many_updated(*args, **kwargs)
+
+    monkeypatch.setattr(
+        job_stats, "record_many_updated", record_many_updated_after_other_update
+    )
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        response = client.put("/jobs:bulk", json=payload, headers=app_token_header)
+        memory_response = client.get(
+            f"/jobs/{job_id}/result/memory", headers=app_token_header
+        )
+
+    project_after_update = get_db_record(
+        db, schema=Project, _filter={"ext_id": TEST_PROJECT_EXT_ID}
+    )
+    actual_resource_usage = round(
+        project_before_update["qpu_seconds"] - project_after_update["qpu_seconds"], 1
+    )
+
+    assert response.status_code == 200
+    assert response.json() == [{"job_id": job_id, "outcome": "updated"}]
+    assert actual_resource_usage == _get_resource_usage(update["timestamps"])
+    assert memory_response.json() == memory
+
+
+def test_update_too_many_jobs(db, client, app_token_header, monkeypatch):
+    """PUT to /jobs:bulk with more updates than 'max_bulk_size' returns 400"""
+    monkeypatch.setattr(settings.CONFIG.jobs, "max_bulk_size", 2)
+    payload = {"updates": [{"job_id": v, "payload": {}} for v in _JOB_IDS[:3]]}
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        response = client.put("/jobs:bulk", json=payload, headers=app_token_header)
+
+        assert response.status_code == 400
+
+
+def test_update_many_jobs_with_repeated_job_ids(db, client, app_token_header):
+    """PUT to /jobs:bulk with more than one update for the same job returns 422"""
+    job_id = _JOB_IDS[0]
+    payload = {"updates": [{"job_id": job_id, "payload": {}}] * 2}
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        response = client.put("/jobs:bulk", json=payload, headers=app_token_header)
+
+        assert response.status_code == 422
+
+
+@pytest.mark.parametrize("payload", _JOB_TIMESTAMPED_UPDATES)
+def test_update_job_in_one_round_trip(
+    db, client, project_id, payload: dict, app_token_header, freezer
+):
+    """PUT to /jobs/{job_id} updates the job in one round trip to the jobs collection, and charges the project once
+
+    The project is debited in one round trip and the resource usage is saved in one round trip.
+    The projects are also read to authenticate the request, so the round trips to them
+    are compared to those of a repeated update, which is only authenticated and not charged.
+    """
+    raw_jobs = with_current_timestamps(_JOBS_LIST, fields=["created_at", "updated_at"])
+    job_list = [{**item, "project_id": str(project_id)} for item in raw_jobs]
+    insert_in_collection(database=db, collection_name=_COLLECTION, data=job_list)
+    job_id = payload["job_id"]
+
+    project_before_update = get_db_record(
+        db, schema=Project, _filter={"ext_id": TEST_PROJECT_EXT_ID}
+    )
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        ops_before_update = _get_op_counts(db)
+        response = client.put(
+            f"/jobs/{job_id}",
+            json=payload,
+            headers=app_token_header,
+        )
+        ops_after_update = _get_op_counts(db)
+        client.put(f"/jobs/{job_id}", json=payload, headers=app_token_header)
+        ops_after_repeated_update = _get_op_counts(db)
+        got = response.json()
+
+    update_ops = _subtract_op_counts(ops_after_update, ops_before_update)
+    repeated_update_ops = _subtract_op_counts(
+        ops_after_repeated_update, ops_after_update
+    )
+    usages = find_in_collection(
+        db, collection_name=_USAGES_COLLECTION, _filter={"job_id": job_id}
+    )
+
+    project_after_update = get_db_record(
+        db, schema=Project, _filter={"ext_id": TEST_PROJECT_EXT_ID}
+    )
+    expected_resource_usage = _get_resource_usage(payload["timestamps"])
+    actual_resource_usage = round(
+        project_before_update["qpu_seconds"] - project_after_update["qpu_seconds"], 1
+    )
+    # the project is charged and the usage saved only if the QPU usage is reported
+    expected_charges = 1 if expected_resource_usage else 0
+
+    assert response.status_code == 200
+    assert got["job_id"] == job_id
+    assert got["status"] == payload["status"]
+    assert got["result"] == payload["result"]
+    assert round(got["duration_in_secs"], 1) == expected_resource_usage
+    assert update_ops.get(_COLLECTION) == 1
+    assert (
+        update_ops.get(_PROJECTS_COLLECTION, 0)
+        - repeated_update_ops.get(_PROJECTS_COLLECTION, 0)
+        == expected_charges
+    )
+    assert update_ops.get(_USAGES_COLLECTION, 0) == expected_charges
+    assert repeated_update_ops.get(_USAGES_COLLECTION, 0) == 0
+    assert [round(item["qpu_seconds"], 1) for item in usages] == [
+        expected_resource_usage
+    ] * expected_charges
+    assert actual_resource_usage == expected_resource_usage
+
+
+def test_read_job_stats(mock_bcc, db, client, project_id, app_token_header, freezer):
+    """GET to /jobs/stats returns the number of jobs per status for each device, including newly created jobs"""
+    raw_jobs = with_current_timestamps(_JOBS_LIST, fields=["created_at", "updated_at"])
+    job_list = [{**item, "project_id": str(project_id)} for item in raw_jobs]
+    insert_in_collection(database=db, collection_name=_COLLECTION, data=job_list)
+    rebuild_job_stats.main([])
+    today = get_current_timestamp_str()[:10]
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        client.post(
+            "/jobs/",
+            json={"device": "loki", "calibration_date": "2024-05-23T09:12:00Z"},
+            headers=app_token_header,
+        )
+        response = client.get("/jobs/stats?group_by=device", headers=app_token_header)
+        got = response.json()
+
+    expected_devices = sorted({item["device"] for item in job_list} | {"loki"})
+    expected = [
+        {
+            "period": today,
+            "device": device,
+            "counts": {
+                "pending": len(
+                    filter_by_equality(
+                        job_list, {"device": device, "status": "pending"}
+                    )
+                )
+                + (1 if device == "loki" else 0),
+                "successful": len(
+                    filter_by_equality(
+                        job_list, {"device": device, "status": "successful"}
+                    )
+                ),
+                "failed": 0,
+                "executing": 0,
+                "cancelled": 0,
+            },
+            "qpu_seconds": 0,
+        }
+        for device in expected_devices
+    ]
+
+    assert response.status_code == 200
+    assert got["data"] == expected
+
+
+def test_job_stats_match_rebuild(db, client, project_id, app_token_header, freezer):
+    """The job statistics updated on PUT to /jobs/{job_id} are those recomputed from the jobs"""
+    raw_jobs = with_current_timestamps(_JOBS_LIST, fields=["created_at", "updated_at"])
+    job_list = [{**item, "project_id": str(project_id)} for item in raw_jobs]
+    insert_in_collection(database=db, collection_name=_COLLECTION, data=job_list)
+    rebuild_job_stats.main([])
+    expected_qpu_seconds = sum(
+        _get_resource_usage(item["timestamps"]) for item in _JOB_TIMESTAMPED_UPDATES
+    )
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        for payload in _JOB_TIMESTAMPED_UPDATES:
+            client.put(
+                f"/jobs/{payload['job_id']}", json=payload, headers=app_token_header
+            )
+        incremental_response = client.get(
+            "/jobs/stats?interval=month", headers=app_token_header
+        )
+        rebuild_job_stats.main([])
+        rebuilt_response = client.get(
+            "/jobs/stats?interval=month", headers=app_token_header
+        )
+
+    incremental = incremental_response.json()["data"]
+    rebuilt = rebuilt_response.json()["data"]
+    incremental_qpu_seconds = sum(item.pop("qpu_seconds") for item in incremental)
+    rebuilt_qpu_seconds = sum(item.pop("qpu_seconds") for item in rebuilt)
+
+    assert incremental_response.status_code == 200
+    assert incremental == rebuilt
+    assert incremental_qpu_seconds == pytest.approx(rebuilt_qpu_seconds, abs=0.1)
+    assert incremental_qpu_seconds == pytest.approx(expected_qpu_seconds, abs=0.1)
+
+
+def test_read_latency_stats(db, client, monkeypatch, no_qpu_app_token_header):
+    """GET to /jobs/stats/latency returns the latency percentiles of the jobs per device, including archived jobs"""
+    monkeypatch.setattr(job_latency, "_CACHE", {})
+    durations = {"loke": (3, 7), "pingu": (10, 2)}
+    jobs = [
+        _with_latencies(
+            item,
+            queue_wait=durations[item["device"]][0],
+            execution=durations[item["device"]][1],
+        )
+        for item in _JOBS_LIST
+    ]
+    insert_in_collection(database=db, collection_name=_COLLECTION, data=jobs[::2])
+    insert_in_collection(
+        database=db, collection_name=_ARCHIVE_COLLECTION, data=jobs[1::2]
+    )
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        response = client.get("/jobs/stats/latency", headers=no_qpu_app_token_header)
+        got = response.json()
+
+    expected = []
+    for device, (queue_wait, execution) in sorted(durations.items()):
+        count = len(filter_by_equality(jobs, {"device": device}))
+        expected.append(
+            {
+                "device": device,
+                "queue_wait": _get_percentiles([queue_wait] * count),
+                "execution": _get_percentiles([execution] * count),
+                "end_to_end": _get_percentiles([queue_wait + execution + 2] * count),
+            }
+        )
+
+    assert response.status_code == 200
+    assert got["data"] == expected
+
+
+def test_read_latency_stats_with_numpy(
+    db, client, monkeypatch, no_qpu_app_token_header
+):
+    """GET to /jobs/stats/latency computes the percentiles with numpy, including archived jobs, if $percentile is not supported"""
+    monkeypatch.setattr(job_latency, "_CACHE", {})
+    monkeypatch.setattr(job_latency, "_IS_PERCENTILE_SUPPORTED", False)
+    jobs = [
+        _with_latencies(item, queue_wait=idx, execution=2 * idx + 1)
+        for idx, item in enumerate(_JOBS_LIST)
+    ]
+    insert_in_collection(database=db, collection_name=_COLLECTION, data=jobs[::2])
+    insert_in_collection(
+        database=db, collection_name=_ARCHIVE_COLLECTION, data=jobs[1::2]
+    )
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        response = client.get(
+            "/jobs/stats/latency?device=pingu", headers=no_qpu_app_token_header
+        )
+        got = response.json()
+
+    queue_waits = [idx for idx, item in enumerate(jobs) if item["device"] == "pingu"]
+    expected = [
+        {
+            "device": "pingu",
+            "queue_wait": _get_percentiles(queue_waits),
+            "execution": _get_percentiles([2 * v + 1 for v in queue_waits]),
+            "end_to_end": _get_percentiles([3 * v + 3 for v in queue_waits]),
+        }
+    ]
+
+    assert response.status_code == 200
+    assert got["data"] == expected
+
+
+def test_latency_stats_are_cached(db, client, monkeypatch, no_qpu_app_token_header):
+    """GET to /jobs/stats/latency returns the cached percentiles until they are older than the TTL"""
+    monkeypatch.setattr(job_latency, "_CACHE", {})
+    monkeypatch.setattr(settings.CONFIG.jobs, "latency_cache_ttl_secs", 3600)
+    jobs = [_with_latencies(item, queue_wait=1, execution=1) for item in _JOBS_LIST]
+    insert_in_collection(database=db, collection_name=_COLLECTION, data=jobs[:3])
+    url = "/jobs/stats/latency?device=pingu"
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        first_response = client.get(url, headers=no_qpu_app_token_header)
+        insert_in_collection(database=db, collection_name=_COLLECTION, data=jobs[3:])
+        cached_response = client.get(url, headers=no_qpu_app_token_header)
+        monkeypatch.setattr(settings.CONFIG.jobs, "latency_cache_ttl_secs", 0)
+        fresh_response = client.get(url, headers=no_qpu_app_token_header)
+
+    expected_first_count = len(filter_by_equality(jobs[:3], {"device": "pingu"}))
+    expected_fresh_count = len(filter_by_equality(jobs, {"device": "pingu"}))
+
+    assert cached_response.json() == first_response.json()
+    assert (
+        first_response.json()["data"][0]["execution"]["count"] == expected_first_count
+    )
+    assert (
+        fresh_response.json()["data"][0]["execution"]["count"] == expected_fresh_count
+    )
+
+
+def test_latency_stats_cache_is_bounded(
+    db, client, monkeypatch, no_qpu_app_token_header
+):
+    """GET to /jobs/stats/latency keeps at most '_MAX_CACHE_SIZE' results, dropping the oldest"""
+    monkeypatch.setattr(job_latency, "_CACHE", {})
+    monkeypatch.setattr(job_latency, "_MAX_CACHE_SIZE", 2)
+    monkeypatch.setattr(settings.CONFIG.jobs, "latency_cache_ttl_secs", 3600)
+    jobs = [_with_latencies(item, queue_wait=1, execution=1) for item in _JOBS_LIST]
+    insert_in_collection(database=db, collection_name=_COLLECTION, data=jobs)
+    windows = ["2024-05-01T00:00:00Z", "2024-05-02T00:00:00Z", "2024-05-03T00:00:00Z"]
+
+    # using context manager to ensure on_startup runs
+    with client as client:
+        responses = [
+            client.get(
+                f"/jobs/stats/latency?since={since}", headers=no_qpu_app_token_header
+            )
+            for since in windows
+        ]
+
+    cached_windows = [key[2] for key in job_latency._CACHE]
+
+    assert all(response.status_code == 200 for response in responses)
+    assert [v.date().isoformat() for v in cached_windows] == [
+        "2024-05-02",
+        "2024-05-03",
+    ]
+
+
+def _project(
+    job: Dict[str, Any], included: Optional[List[str]], excluded: List[str]
+) -> Dict[str, Any]:
+    """Applies the projection to the given job, the way mongodb would"""
+    if included is not None:
+        return {k: v for k, v in job.items() if k in included}
+
+    result = copy.deepcopy(job)
+    for path in excluded:
+        *parents, leaf = path.split(".")
+        parent = result
+        for part in parents:
+            parent = parent.get(part, {})
+        parent.pop(leaf, None)
+    return result
+
+
 def _get_resource_usage(timestamps: Dict[str, Dict[str, str]]) -> Optional[float]:
     """Retrieves the resource usage in seconds"""
     try:
@@ -401,3 +2047,55 @@ def _get_resource_usage(timestamps: Dict[str, Dict[str, str]]) -> Optional[float
         return round((finished_timestamp - started_timestamp).total_seconds(), 1)
     except AttributeError:
         return 0
+
+
+def _get_op_count(db, collection: str) -> int:
+    """Gets the number of operations the database server has run on the given collection"""
+    return _get_op_counts(db).get(collection, 0)
+
+
+def _get_op_counts(db) -> Dict[str, int]:
+    """Gets the number of operations the database server has run on each collection of the database"""
+    totals = db.client.admin.command("top")["totals"]
+    prefix = f"{db.name}."
+    return {
+        name[len(prefix) :]: value.get("total", {}).get("count", 0)
+        for name, value in totals.items()
+        if name.startswith(prefix)
+    }
+
+
+def _subtract_op_counts(
+    after: Dict[str, int], before: Dict[str, int]
+) -> Dict[str, int]:
+    """Gets the number of operations run on each collection between the two given op counts"""
+    return {k: v - before.get(k, 0) for k, v in after.items() if v != before.get(k, 0)}
+
+
+def _with_latencies(
+    job: Dict[str, Any], queue_wait: float, execution: float
+) -> Dict[str, Any]:
+    """Adds timestamps to the job with the given queue wait and execution seconds
+
+    Registration and the final stage each take a second
+    """
+    registered = datetime(2024, 5, 1, tzinfo=timezone.utc)
+    started = registered + timedelta(seconds=1 + queue_wait)
+    finished = started + timedelta(seconds=execution)
+    return {
+        **job,
+        "timestamps": {
+            "registration": {
+                "started": registered,
+                "finished": registered + timedelta(seconds=1),
+            },
+            "execution": {"started": started, "finished": finished},
+            "final": {"started": finished, "finished": finished + timedelta(seconds=1)},
+        },
+    }
+
+
+def _get_percentiles(values: List[float]) -> Dict[str, Any]:
+    """Gets the p50, p90 and p99 of the values, the way numpy computes them"""
+    p50, p90, p99 = np.percentile(values, [50, 90, 99]).tolist()
+    return {"count": len(values), "p50": p50, "p90": p90, "p99": p99}
@@ -0,0 +1,59 @@
+# This code is part of Tergite
+#
+# (C) Copyright Chalmers Next Labs 2025
+#
+# This code is licensed under the Apache License, Version 2.0. You may
+# obtain a copy of this license in the LICENSE.txt file in the root directory
+# of this source tree or at http://www.apache.org/licenses/LICENSE-2.0.
+#
+# Any modifications or derivative works of this code must retain this
+# copyright notice, and modified files need to carry a notice indicating
+# that they have been altered from the originals.
+"""Integration tests for the database indexes script"""
+from api.scripts import db_indexes
+from utils.indexes import get_registered_indexes
+
+_JOBS_COLLECTION = "jobs"
+
+
+def test_report_missing_indexes(db):
+    """Running the script on an empty database reports all registered indexes as missing"""
+    report = db_indexes.main([])
+    expected = sorted(
+        (collection, index.document["name"])
+        for collection, indexes in get_registered_indexes().items()
+        for index in indexes
+    )
+    got = sorted((item.collection, item.name) for item in report.missing)
+
+    assert got == expected
+
+
+def test_create_missing_indexes(db):
+    """Running the script with --create-missing creates the registered indexes"""
+    report = db_indexes.main(["--create-missing"])
+    job_indexes = db[_JOBS_COLLECTION].index_information()
+
+    assert report.missing == []
+    assert job_indexes["job_id_1"]["unique"] is True
+    assert "user_id_1_created_at_-1" in job_indexes
+    assert {item.name for item in report.unused} >= {"user_id_1_created_at_-1"}
+
+
+def test_report_redundant_indexes(db):
+    """Running the script reports indexes that are prefixes of other indexes as redundant"""
+    db[_JOBS_COLLECTION].create_index("device")
+    report = db_indexes.main(["--create-missing"])
+    got = [(item.collection, item.name) for item in report.redundant]
+
+    assert got == [(_JOBS_COLLECTION, "device_1")]
+
+
+def test_startup_creates_indexes(db, client):
+    """The app creates the registered indexes on startup"""
+    # using context manager to ensure on_startup runs
+    with client:
+        job_indexes = db[_JOBS_COLLECTION].index_information()
+
+    assert "job_id_1" in job_indexes
+    assert "device_1_created_at_-1" in job_indexes
@@ -0,0 +1,60 @@
+# This code is part of Tergite
+#
+# (C) Copyright Chalmers Next Labs 2025
+#
+# This code is licensed under the Apache License, Version 2.0. You may
+# obtain a copy of this license in the LICENSE.txt file in the root directory
+# of this source tree or at http://www.apache.org/licenses/LICENSE-2.0.
+#
+# Any modifications or derivative works of this code must retain this
+# copyright notice, and modified files need to carry a notice indicating
+# that they have been altered from the originals.
+"""Integration tests for the timestamp migration script"""
+import pytest
+
+from api.scripts import migrate_timestamps
+from tests._utils.fixtures import load_json_fixture
+from tests._utils.mongodb import find_in_collection, insert_in_collection
+from tests._utils.records import (
+    order_by,
+    with_bson_dates,
+    with_incremental_timestamps,
+)
+
+_JOBS_LIST = load_json_fixture("job_list.json")
+_DEVICE_LIST = load_json_fixture("device_list.json")
+_JOBS_COLLECTION = "jobs"
+_DEVICES_COLLECTION = "devices"
+_TIMESTAMPS = ("created_at", "updated_at")
+
+
+@pytest.mark.parametrize("batch_size", [1, 5, 500])
+def test_migrate_timestamps(db, batch_size: int):
+    """Running the script converts the string timestamps into BSON dates, and running it again changes nothing"""
+    raw_jobs = with_incremental_timestamps(_JOBS_LIST, fields=_TIMESTAMPS)
+    devices = [
+        {**item, "created_at": "2024-05-01T09:12:00.733Z", "updated_at": "bad value"}
+        for item in _DEVICE_LIST
+    ]
+    insert_in_collection(database=db, collection_name=_JOBS_COLLECTION, data=raw_jobs)
+    insert_in_collection(database=db, collection_name=_DEVICES_COLLECTION, data=devices)
+
+    args = ["--batch-size", f"{batch_size}", "-c", "jobs", "-c", "devices"]
+    result = migrate_timestamps.main(args)
+    second_result = migrate_timestamps.main(args)
+    jobs = find_in_collection(
+        db, collection_name=_JOBS_COLLECTION, fields_to_exclude=["_id"]
+    )
+    got_devices = find_in_collection(
+        db, collection_name=_DEVICES_COLLECTION, fields_to_exclude=["_id"]
+    )
+
+    assert result == {"jobs": len(raw_jobs), "devices": len(devices)}
+    assert second_result == {"jobs": 0, "devices": 0}
+    assert order_by(jobs, "job_id") == order_by(
+        with_bson_dates(raw_jobs, fields=_TIMESTAMPS), "job_id"
+    )
+    # the values that are not timestamps are left as they are
+    assert order_by(got_devices, "name") == order_by(
+        with_bson_dates(devices, fields=("created_at",)), "name"
+    )
@@ -0,0 +1,73 @@
+# This code is part of Tergite
+#
+# (C) Copyright Chalmers Next Labs 2025
+#
+# This code is licensed under the Apache License, Version 2.0. You may
+# obtain a copy of this license in the LICENSE.txt file in the root directory
+# of this source tree or at http://www.apache.org/licenses/LICENSE-2.0.
+#
+# Any modifications or derivative works of this code must retain this
+# copyright notice, and modified files need to carry a notice indicating
+# that they have been altered from the originals.
+"""Integration tests for the calibration metrics rebuild script"""
+from api.scripts import rebuild_calibration_metrics
+from tests._utils.fixtures import load_json_fixture
+from tests._utils.mongodb import find_in_collection, insert_in_collection
+from tests._utils.records import with_bson_dates
+
+_CALIBRATIONS_LIST = load_json_fixture("calibrations.json")
+_LOGS_COLLECTION = "calibrations_logs"
+_METRICS_COLLECTION = "calibration_metrics"
+_COMPONENTS = ("qubits", "resonators", "couplers")
+
+
+def test_rebuild_calibration_metrics(db):
+    """Running the script replaces the metric points with those of the calibration snapshots"""
+    insert_in_collection(
+        database=db,
+        collection_name=_LOGS_COLLECTION,
+        data=with_bson_dates(_CALIBRATIONS_LIST, fields=("last_calibrated",)),
+    )
+    insert_in_collection(
+        database=db,
+        collection_name=_METRICS_COLLECTION,
+        data=[{"meta": {"device": "stale"}, "value": 1.0}],
+    )
+
+    total = rebuild_calibration_metrics.main([])
+    got = find_in_collection(
+        db, collection_name=_METRICS_COLLECTION, fields_to_exclude=["_id"]
+    )
+
+    expected_keys = sorted(
+        (item["name"], component, element["id"], metric)
+        for item in _CALIBRATIONS_LIST
+        for component in _COMPONENTS
+        for element in item.get(component) or []
+        for metric, value in element.items()
+        if isinstance(value, dict) and isinstance(value.get("value"), (int, float))
+    )
+    got_keys = sorted(
+        (
+            item["meta"]["device"],
+            item["meta"]["component"],
+            item["meta"]["index"],
+            item["meta"]["metric"],
+        )
+        for item in got
+    )
+
+    assert total == len(expected_keys)
+    assert got_keys == expected_keys
+
+
+def test_rebuild_calibration_metrics_indexes(db):
+    """Running the script recreates the registered indexes of the metric points"""
+    rebuild_calibration_metrics.main([])
+    got = db[_METRICS_COLLECTION].index_information()
+
+    assert any(
+        [field for field, _ in item["key"]]
+        == ["meta.device", "meta.metric", "meta.component", "meta.index", "ts"]
+        for item in got.values()
+    )
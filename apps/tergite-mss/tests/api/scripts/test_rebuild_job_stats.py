@@ -0,0 +1,83 @@
+# This code is part of Tergite
+#
+# (C) Copyright Chalmers Next Labs 2025
+#
+# This code is licensed under the Apache License, Version 2.0. You may
+# obtain a copy of this license in the LICENSE.txt file in the root directory
+# of this source tree or at http://www.apache.org/licenses/LICENSE-2.0.
+#
+# Any modifications or derivative works of this code must retain this
+# copyright notice, and modified files need to carry a notice indicating
+# that they have been altered from the originals.
+"""Integration tests for the job statistics rebuild script"""
+from api.scripts import rebuild_job_stats
+from tests._utils.fixtures import load_json_fixture
+from tests._utils.mongodb import find_in_collection, insert_in_collection
+from tests._utils.records import filter_by_equality
+
+_JOBS_LIST = load_json_fixture("job_list.json")
+_JOBS_COLLECTION = "jobs"
+_STATS_COLLECTION = "job_stats"
+
+
+def test_rebuild_job_stats(db):
+    """Running the script replaces the job statistics with those computed from the jobs"""
+    jobs = [
+        {**item, "created_at": f"2024-05-0{idx % 2 + 1}T09:12:00.733Z"}
+        for idx, item in enumerate(_JOBS_LIST)
+    ]
+    insert_in_collection(database=db, collection_name=_JOBS_COLLECTION, data=jobs)
+    insert_in_collection(
+        database=db,
+        collection_name=_STATS_COLLECTION,
+        data=[{"day": "2020-01-01", "device": "stale", "counts": {"pending": 9}}],
+    )
+
+    total = rebuild_job_stats.main([])
+    got = find_in_collection(
+        db, collection_name=_STATS_COLLECTION, fields_to_exclude=["_id"]
+    )
+
+    expected_keys = sorted({(item["created_at"][:10], item["device"]) for item in jobs})
+    expected = [
+        {
+            "day": day,
+            "device": device,
+            "qpu_seconds": 0,
+            "counts": {
+                status: len(
+                    [
+                        item
+                        for item in filter_by_equality(jobs, {"device": device})
+                        if item["created_at"].startswith(day)
+                        and item["status"] == status
+                    ]
+                )
+                for status in (
+                    "pending",
+                    "successful",
+                    "failed",
+                    "executing",
+                    "cancelled",
+                )
+            },
+        }
+        for day, device in expected_keys
+    ]
+
+    assert total == len(expected)
+    assert sorted(got, key=lambda x: (x["day"], x["device"])) == expected
+
+
+def test_rebuild_job_stats_indexes(db):
+    """Running the script creates the registered unique index of the job statistics"""
+    insert_in_collection(database=db, collection_name=_JOBS_COLLECTION, data=_JOBS_LIST)
+
+    rebuild_job_stats.main([])
+    got = db[_STATS_COLLECTION].index_information()
+
+    assert any(
+        [field for field, _ in item["key"]] == ["day", "device", "project_id"]
+        and item.get("unique")
+        for item in got.values()
+    )
@@ -36,6 +36,7 @@ from httpx_oauth.clients import github, microsoft
 import settings
 from services.auth.projects.dtos import ProjectSource
 from services.external import puhuri
+from services.jobs import cache as job_cache
 from tests._utils.auth import (
     INVALID_CHALMERS_PROFILE,
     INVALID_GITHUB_PROFILE,
@@ -131,6 +132,7 @@ def db(mock_puhuri) -> pymongo.database.Database:
     yield database
     # clean up
     mongo_client.drop_database(TEST_DB_NAME)
+    job_cache.clear()
 
 
 @pytest.fixture
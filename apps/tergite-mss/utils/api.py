@@ -10,15 +10,24 @@
 # copyright notice, and modified files need to carry a notice indicating
 # that they have been altered from the originals.
 """Utility functions for API related code"""
+import functools
+import hashlib
+import json
 import logging
+from email.utils import format_datetime, parsedate_to_datetime
 from typing import (
     Any,
+    AsyncIterator,
     Awaitable,
     Callable,
+    Dict,
     Generic,
     List,
     Literal,
+    Mapping,
     Optional,
+    Sequence,
+    Type,
     TypeVar,
     Union,
 )
@@ -26,10 +35,19 @@ from typing import (
 from fastapi import HTTPException, Response, status
 from fastapi.exception_handlers import http_exception_handler
 from fastapi.requests import Request
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field, TypeAdapter
 from pydantic.main import IncEx
 
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
 ITEM = TypeVar("ITEM", bound=BaseModel)
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+_MSGPACK_MEDIA_TYPES = (MSGPACK_MEDIA_TYPE, "application/x-msgpack")
 
 
 class PaginatedListResponse(BaseModel, Generic[ITEM]):
@@ -38,6 +56,9 @@ class PaginatedListResponse(BaseModel, Generic[ITEM]):
     skip: int = 0
     limit: Optional[int] = None
     data: List[ITEM] = []
+    # for cursor-based pagination; these are only dumped when cursor is not None
+    cursor: Optional[str] = Field(default=None, exclude=True)
+    next_cursor: Optional[str] = Field(default=None, exclude=True)
 
     def model_dump(
         self,
@@ -56,7 +77,7 @@ class PaginatedListResponse(BaseModel, Generic[ITEM]):
         serialize_as_any: bool = False,
         **kwargs,
     ) -> dict[str, Any]:
-        return {
+        result = {
             "skip": self.skip,
             "limit": self.limit,
             "data": [
@@ -78,6 +99,360 @@ class PaginatedListResponse(BaseModel, Generic[ITEM]):
             ],
         }
 
+        if self.cursor is not None:
+            result["cursor"] = self.cursor
+            result["next_cursor"] = self.next_cursor
+
+        return result
+
+    def dump_json_bytes(
+        self, exclude_unset: bool = False, exclude_data_none_fields: bool = True
+    ) -> bytes:
+        """Serializes the page into JSON bytes, without dumping each item into a dict first
+
+        The items are serialized in one call by a cached TypeAdapter of a list of their type.
+        The result is the JSON of `model_dump(mode="json", ...)` but any overrides of `model_dump`
+        on the items are not called, so fields to always leave out must have `Field(exclude=True)`.
+
+        Args:
+            exclude_unset: whether fields that were not set are to be left out of each item
+            exclude_data_none_fields: whether fields that are None are to be left out of each item
+
+        Returns:
+            the JSON of the page as bytes
+        """
+        item_types = {type(item) for item in self.data}
+        if len(item_types) > 1:
+            content = self.model_dump(
+                mode="json",
+                exclude_unset=exclude_unset,
+                exclude_data_none_fields=exclude_data_none_fields,
+            )
+            return json.dumps(content, separators=(",", ":")).encode()
+
+        data = b"[]"
+        if len(item_types) == 1:
+            data = _get_list_adapter(item_types.pop()).dump_json(
+                self.data,
+                exclude_unset=exclude_unset,
+                exclude_none=exclude_data_none_fields,
+            )
+
+        envelope = {"skip": self.skip, "limit": self.limit, "data": None}
+        if self.cursor is not None:
+            envelope["cursor"] = self.cursor
+            envelope["next_cursor"] = self.next_cursor
+        head, _, tail = json.dumps(envelope, separators=(",", ":")).partition(
+            '"data":null'
+        )
+        return b"".join((head.encode(), b'"data":', data, tail.encode()))
+
+
+@functools.lru_cache(maxsize=None)
+def _get_list_adapter(item_type: Type[BaseModel]) -> TypeAdapter:
+    """Gets the TypeAdapter for lists of the given model, creating it only once per model"""
+    return TypeAdapter(List[item_type])
+
+
+class MsgpackResponse(Response):
+    """The response whose content is serialized as MessagePack
+
+    The content is expected to be JSON-compatible e.g. the output of `model_dump(mode="json")`
+    """
+
+    media_type = MSGPACK_MEDIA_TYPE
+
+    def render(self, content: Any) -> bytes:
+        return msgpack.packb(content)
+
+
+def _get_accepted_media_types(request: Request) -> List[str]:
+    """Gets the media types in the 'Accept' header of the request, without their parameters"""
+    accepted = request.headers.get("accept", "")
+    return [item.split(";")[0].strip().lower() for item in accepted.split(",")]
+
+
+def is_ndjson_requested(request: Request) -> bool:
+    """Checks whether the client asked for newline-delimited JSON via the 'Accept' header
+
+    Args:
+        request: the request object from FastAPI
+
+    Returns:
+        True if 'application/x-ndjson' is among the accepted media types
+    """
+    return NDJSON_MEDIA_TYPE in _get_accepted_media_types(request)
+
+
+def is_msgpack_requested(request: Request) -> bool:
+    """Checks whether the client asked for MessagePack via the 'Accept' header
+
+    MessagePack is only available if the `msgpack` package is installed.
+
+    Args:
+        request: the request object from FastAPI
+
+    Returns:
+        True if 'application/msgpack' or 'application/x-msgpack' is among the accepted
+        media types and msgpack is installed
+    """
+    if msgpack is None:
+        return False
+    accepted = _get_accepted_media_types(request)
+    return any(media_type in accepted for media_type in _MSGPACK_MEDIA_TYPES)
+
+
+def to_negotiated_response(
+    request: Request,
+    content: Any,
+    headers: Optional[Dict[str, str]] = None,
+) -> Response:
+    """Creates the JSON or MessagePack response of the given content, depending on the 'Accept' header
+
+    Args:
+        request: the request object from FastAPI
+        content: the JSON-compatible content of the response
+        headers: any other headers to send with the response
+
+    Returns:
+        the MessagePack response if the client asked for it, else the JSON response
+    """
+    headers = {**(headers or {}), "Vary": "Accept"}
+    if is_msgpack_requested(request):
+        return MsgpackResponse(content, headers=headers)
+    return JSONResponse(content, headers=headers)
+
+
+def to_page_response(
+    request: Request,
+    page: PaginatedListResponse,
+    exclude_unset: bool = False,
+    exclude_data_none_fields: bool = True,
+    headers: Optional[Dict[str, str]] = None,
+) -> Response:
+    """Creates the JSON or MessagePack response of the given page, depending on the 'Accept' header
+
+    The JSON is written straight to bytes by `PaginatedListResponse.dump_json_bytes`.
+
+    Args:
+        request: the request object from FastAPI
+        page: the page of items to send
+        exclude_unset: whether fields that were not set are to be left out of each item
+        exclude_data_none_fields: whether fields that are None are to be left out of each item
+        headers: any other headers to send with the response
+
+    Returns:
+        the MessagePack response if the client asked for it, else the JSON response
+    """
+    if is_msgpack_requested(request):
+        content = page.model_dump(
+            mode="json",
+            exclude_unset=exclude_unset,
+            exclude_data_none_fields=exclude_data_none_fields,
+        )
+        return to_negotiated_response(request, content, headers=headers)
+
+    body = page.dump_json_bytes(
+        exclude_unset=exclude_unset, exclude_data_none_fields=exclude_data_none_fields
+    )
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers={**(headers or {}), "Vary": "Accept"},
+    )
+
+
+def to_ndjson_response(
+    items: AsyncIterator[BaseModel],
+    exclude_unset: bool = False,
+    exclude_data_none_fields: bool = True,
+) -> StreamingResponse:
+    """Streams the given items as newline-delimited JSON, serializing each as it arrives
+
+    Args:
+        items: the async iterator of the items to send
+        exclude_unset: whether fields that were not set are to be left out of each item
+        exclude_data_none_fields: whether fields that are None are to be left out of each item
+
+    Returns:
+        the streaming response with one JSON object per line
+    """
+
+    async def _stream() -> AsyncIterator[bytes]:
+        async for item in items:
+            data = item.model_dump(
+                mode="json",
+                exclude_unset=exclude_unset,
+                exclude_none=exclude_data_none_fields,
+            )
+            yield f"{json.dumps(data)}\n".encode()
+
+    return StreamingResponse(_stream(), media_type=NDJSON_MEDIA_TYPE)
+
+
+def to_json_list_response(
+    items: AsyncIterator[BaseModel],
+    exclude_unset: bool = False,
+    exclude_data_none_fields: bool = True,
+) -> StreamingResponse:
+    """Streams the given items as a JSON list, serializing each as it arrives
+
+    Args:
+        items: the async iterator of the items to send
+        exclude_unset: whether fields that were not set are to be left out of each item
+        exclude_data_none_fields: whether fields that are None are to be left out of each item
+
+    Returns:
+        the streaming response with the JSON list of the items
+    """
+
+    async def _stream() -> AsyncIterator[bytes]:
+        separator = b"["
+        async for item in items:
+            data = item.model_dump(
+                mode="json",
+                exclude_unset=exclude_unset,
+                exclude_none=exclude_data_none_fields,
+            )
+            yield separator + json.dumps(data).encode()
+            separator = b","
+        yield b"]" if separator == b"," else b"[]"
+
+    return StreamingResponse(_stream(), media_type="application/json")
+
+
+def compute_etag(body: bytes) -> str:
+    """Computes the strong ETag of the given response body
+
+    Args:
+        body: the serialized body of the response
+
+    Returns:
+        the quoted hex digest of the sha256 hash of the body
+    """
+    return f'"{hashlib.sha256(body).hexdigest()}"'
+
+
+def is_etag_matched(request: Request, etag: str) -> bool:
+    """Checks whether the given ETag is among those in the 'If-None-Match' header of the request
+
+    Weak ETags i.e. 'W/"..."' are compared by their opaque value, as the header requires.
+
+    Args:
+        request: the request object from FastAPI
+        etag: the current ETag of the resource
+
+    Returns:
+        True if the 'If-None-Match' header is '*' or contains the given ETag
+    """
+    header = request.headers.get("if-none-match")
+    if header is None:
+        return False
+
+    values = {item.strip().removeprefix("W/") for item in header.split(",")}
+    return "*" in values or etag.removeprefix("W/") in values
+
+
+def is_conditional_request(request: Request) -> bool:
+    """Checks whether the request has an 'If-None-Match' or an 'If-Modified-Since' header
+
+    Args:
+        request: the request object from FastAPI
+
+    Returns:
+        True if the request is a conditional GET
+    """
+    return "if-none-match" in request.headers or "if-modified-since" in request.headers
+
+
+def is_not_modified(request: Request, headers: Mapping[str, str]) -> bool:
+    """Checks whether the client already has the current version of the resource
+
+    'If-Modified-Since' is only considered if there is no 'If-None-Match' header,
+    as HTTP requires.
+
+    Args:
+        request: the request object from FastAPI
+        headers: the response headers with the current 'ETag' and, optionally, 'Last-Modified'
+
+    Returns:
+        True if a '304 Not Modified' response is to be sent
+    """
+    if "if-none-match" in request.headers:
+        return is_etag_matched(request, headers["ETag"])
+
+    modified_since = request.headers.get("if-modified-since")
+    last_modified = headers.get("Last-Modified")
+    if modified_since is None or last_modified is None:
+        return False
+
+    try:
+        return parsedate_to_datetime(last_modified) <= parsedate_to_datetime(
+            modified_since
+        )
+    except (TypeError, ValueError):
+        # the date is invalid or has no timezone
+        return False
+
+
+def get_revision_headers(records: Sequence[Any]) -> Dict[str, str]:
+    """Gets the 'ETag' and 'Last-Modified' headers of a response with the given versioned records
+
+    The ETag is derived from the ids and revisions of the records,
+    so it changes every time any of them is written or they are replaced.
+
+    Args:
+        records: the records, each with 'id', 'revision' and 'updated_at' attributes
+
+    Returns:
+        the 'ETag' header and, if any record has an 'updated_at', the 'Last-Modified' header
+    """
+    tag = ",".join(f"{item.id}.{item.revision or 0}" for item in records)
+    headers = {"ETag": compute_etag(tag.encode())}
+
+    timestamps = [item.updated_at for item in records if item.updated_at is not None]
+    if timestamps:
+        headers["Last-Modified"] = format_datetime(max(timestamps), usegmt=True)
+    return headers
+
+
+def to_not_modified_response(headers: Mapping[str, str]) -> Response:
+    """Creates the '304 Not Modified' response without a body
+
+    Args:
+        headers: the headers to send with the response e.g. 'ETag'
+
+    Returns:
+        the empty response with the status 304
+    """
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=dict(headers))
+
+
+def to_etag_response(
+    request: Request,
+    body: bytes,
+    etag: str,
+    media_type: str = "application/json",
+    headers: Optional[Dict[str, str]] = None,
+) -> Response:
+    """Creates the response with the given body and ETag, or a '304 Not Modified' one if the client has it already
+
+    Args:
+        request: the request object from FastAPI
+        body: the serialized body of the response
+        etag: the ETag of the body
+        media_type: the media type of the body
+        headers: any other headers to send with the response
+
+    Returns:
+        the response with the body, or an empty 304 response if the conditional
+        headers of the request match
+    """
+    headers = {**(headers or {}), "ETag": etag}
+    if is_not_modified(request, headers):
+        return to_not_modified_response(headers)
+    return Response(content=body, media_type=media_type, headers=headers)
+
 
 def get_bearer_token(request: Request, raise_if_error: bool = True) -> Optional[str]:
     """Extracts the bearer token from the request or throws a 401 exception if not exist and `raise_if_error` is True
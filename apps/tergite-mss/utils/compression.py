@@ -0,0 +1,106 @@
+# This code is part of Tergite
+#
+# (C) Copyright Chalmers Next Labs 2025
+#
+# This code is licensed under the Apache License, Version 2.0. You may
+# obtain a copy of this license in the LICENSE.txt file in the root directory
+# of this source tree or at http://www.apache.org/licenses/LICENSE-2.0.
+#
+# Any modifications or derivative works of this code must retain this
+# copyright notice, and modified files need to carry a notice indicating
+# that they have been altered from the originals.
+"""Utilities for compressing response bodies with the content codings negotiated with the client
+
+gzip is always available. 'br' needs the `brotli` package and 'zstd' needs python 3.14
+or the `backports.zstd` package; they are left out if these are not installed.
+"""
+import gzip
+import logging
+from typing import Callable, Dict, Optional, Sequence
+
+# the compression levels trade a little of the ratio for much less CPU than the maxima
+_GZIP_LEVEL = 6
+_BROTLI_QUALITY = 4
+_ZSTD_LEVEL = 3
+
+COMPRESSORS: Dict[str, Callable[[bytes], bytes]] = {
+    "gzip": lambda data: gzip.compress(data, compresslevel=_GZIP_LEVEL, mtime=0),
+}
+
+try:
+    import brotli
+
+    COMPRESSORS["br"] = lambda data: brotli.compress(data, quality=_BROTLI_QUALITY)
+except ImportError:
+    logging.debug("brotli is not installed; 'br' content coding is disabled")
+
+try:
+    from compression import zstd
+except ImportError:
+    try:
+        from backports import zstd
+    except ImportError:
+        zstd = None
+
+if zstd is not None:
+    COMPRESSORS["zstd"] = lambda data: zstd.compress(data, level=_ZSTD_LEVEL)
+else:
+    logging.debug("zstd is not installed; 'zstd' content coding is disabled")
+
+
+def select_encoding(
+    accept_encoding: Optional[str], preferred: Sequence[str]
+) -> Optional[str]:
+    """Selects the content coding to compress a response with, given the 'Accept-Encoding' header
+
+    Among the codings that the client accepts with the highest quality value,
+    the one that comes first in `preferred` is selected.
+
+    Args:
+        accept_encoding: the value of the 'Accept-Encoding' header of the request, if any
+        preferred: the content codings the server is willing to use, most preferred first
+
+    Returns:
+        the content coding e.g. 'gzip', or None if the response is not to be compressed
+    """
+    if not accept_encoding:
+        return None
+
+    qualities: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, *params = item.strip().split(";")
+        quality = 1.0
+        for param in params:
+            key, _, value = param.strip().partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[name.strip().lower()] = quality
+
+    candidates = [
+        (qualities.get(name, qualities.get("*", 0.0)), -idx, name)
+        for idx, name in enumerate(preferred)
+        if name in COMPRESSORS
+    ]
+    candidates = [item for item in candidates if item[0] > 0]
+    if len(candidates) == 0:
+        return None
+    return max(candidates)[2]
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    """Compresses the given data with the given content coding
+
+    Args:
+        data: the data to compress
+        encoding: the content coding e.g. 'gzip', 'br', 'zstd'
+
+    Returns:
+        the compressed data
+
+    Raises:
+        KeyError: the content coding is not available
+    """
+    return COMPRESSORS[encoding](data)
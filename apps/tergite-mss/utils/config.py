@@ -26,6 +26,20 @@ class DatabaseConfig(BaseModel):
 
     name: str
     url: MongoDsn
+    # the maximum number of records fetched per round trip when streaming lists; default = 100
+    stream_batch_size: int = 100
+    # whether the job records read from the database are trusted to be valid,
+    # as they were validated when written, so that their large lists e.g. the measurement memory
+    # of jobs are not validated again; default = false
+    trusted_reads: bool = False
+    # the fraction of the trusted records that are fully validated in the background,
+    # logging a warning for those that no longer match the schema; default = 0.01
+    trusted_reads_sample_rate: float = 0.01
+
+    @property
+    def trusted_sample_rate(self) -> Optional[float]:
+        """The fraction of the trusted records to validate in the background, or None if reads are not trusted"""
+        return self.trusted_reads_sample_rate if self.trusted_reads else None
 
 
 class BccConfig(BaseModel):
@@ -61,6 +75,62 @@ class PuhuriConfig(BaseModel):
     poll_interval: int = 900
 
 
+class JobsConfig(BaseModel):
+    """Configuration for the storage and handling of jobs"""
+
+    # the maximum estimated size in bytes of the measurement memory of a job's result that is
+    # stored inside the job document. Larger memories are stored in chunks in the 'job_results' collection.
+    # default = 1000000 (1MB)
+    max_inline_result_bytes: int = 1_000_000
+
+    # the maximum number of shots stored in a single chunk in the 'job_results' collection; default = 10000
+    result_chunk_size: int = 10_000
+
+    # the maximum number of shots returned in one slice of the result memory of a job; default = 100000
+    max_result_slice_size: int = 100_000
+
+    # whether to store the measurement memory of a job's result as a bit-packed binary
+    # instead of a list of strings, if it can be packed losslessly; default = False
+    pack_result_memory: bool = False
+
+    # the maximum number of seconds between messages on the job events stream; default = 15
+    events_keepalive_secs: float = 15.0
+
+    # the maximum number of job ids whose statuses can be got in one request; default = 1000
+    max_status_batch_size: int = 1000
+
+    # the maximum number of jobs that can be created or updated in one request; default = 500
+    max_bulk_size: int = 500
+
+    # the number of days since their last update after which finished jobs are moved
+    # to the 'jobs_archive' collection; default = None meaning jobs are never archived
+    archive_after_days: Optional[float] = None
+
+    # the number of seconds between runs of the background job archiver; default = 3600
+    archive_interval_secs: float = 3600
+
+    # the maximum number of jobs moved to the archive at once; default = 500
+    archive_batch_size: int = 500
+
+    # the number of seconds for which the computed job latency percentiles are reused; default = 60
+    latency_cache_ttl_secs: float = 60
+
+    # the maximum total size in bytes of the cached responses of finished jobs; 0 disables it; default = 67108864 (64 MiB)
+    response_cache_max_bytes: int = 67_108_864
+
+
+class ResponsesConfig(BaseModel):
+    """Configuration for the encoding of the HTTP responses"""
+
+    # the content codings that responses can be compressed with, most preferred first,
+    # out of 'zstd', 'br' and 'gzip'. Those whose libraries are not installed are ignored.
+    # default = ["zstd", "br", "gzip"]; an empty list disables compression
+    compression_encodings: List[str] = ["zstd", "br", "gzip"]
+
+    # the minimum size in bytes of a response body for it to be compressed; default = 1024
+    compression_min_bytes: int = 1024
+
+
 class UserRole(str, enum.Enum):
     """The possible roles a user can have"""
 
@@ -189,6 +259,12 @@ class AppConfig(BaseModel, extra="allow"):
     # configration for puhuri
     puhuri: PuhuriConfig
 
+    # configuration for jobs
+    jobs: JobsConfig = JobsConfig()
+
+    # configuration for the encoding of the responses
+    responses: ResponsesConfig = ResponsesConfig()
+
     # cache for the backends dict
     _backends_dict: Dict[str, BccConfig] = None
 
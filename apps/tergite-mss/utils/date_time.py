@@ -13,9 +13,10 @@
 
 
 from datetime import datetime, timezone
-from typing import Optional, Tuple
+from typing import Annotated, Optional, Tuple
 
 from fastapi import HTTPException
+from pydantic import AfterValidator, PlainSerializer
 
 import settings
 
@@ -88,5 +89,29 @@ def get_current_timestamp():
     return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
 
 
+def get_current_datetime() -> datetime:
+    """Returns the current time in UTC, truncated to the milliseconds that mongodb stores"""
+    now = datetime.now(timezone.utc)
+    return now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+
+def as_utc(d: datetime) -> datetime:
+    """
+    Returns the given datetime object in UTC, assuming it is in UTC if it has no timezone.
+    """
+    if d.tzinfo is None:
+        return d.replace(tzinfo=timezone.utc)
+    return d.astimezone(timezone.utc)
+
+
+# A datetime that is stored as a BSON date in mongodb and returned as a Zulu string in JSON.
+# ISO strings e.g. '2024-01-10T14:32:05.880Z' are also accepted as input.
+ZuluDatetime = Annotated[
+    datetime,
+    AfterValidator(as_utc),
+    PlainSerializer(datetime_to_zulu, return_type=str, when_used="json"),
+]
+
+
 DEFAULT_FROM_DATETIME_STR = datetime(2000, 1, 1, 0, 0, tzinfo=timezone.utc).isoformat()
 DEFAULT_TO_DATETIME_STR = datetime.now(timezone.utc).isoformat()
@@ -44,3 +44,11 @@ class DbValidationError(BaseMssException):
 
 class NotFoundError(BaseMssException):
     """Exception when a record is not found"""
+
+
+class InvalidCursorError(BaseMssException):
+    """Exception when a pagination cursor cannot be decoded"""
+
+
+class InvalidQueryError(BaseMssException):
+    """Exception when the query parameters passed are not valid"""
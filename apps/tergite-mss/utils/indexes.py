@@ -0,0 +1,191 @@
+# This code is part of Tergite
+#
+# (C) Copyright Chalmers Next Labs 2025
+#
+# This code is licensed under the Apache License, Version 2.0. You may
+# obtain a copy of this license in the LICENSE.txt file in the root directory
+# of this source tree or at http://www.apache.org/licenses/LICENSE-2.0.
+#
+# Any modifications or derivative works of this code must retain this
+# copyright notice, and modified files need to carry a notice indicating
+# that they have been altered from the originals.
+"""Declarative registry of the indexes expected on each mongodb collection
+
+Services register the indexes their queries rely on at import time and the
+app reconciles them with the database on startup.
+"""
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Type
+
+from beanie import Document
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pydantic import BaseModel
+from pymongo import IndexModel
+from pymongo.errors import OperationFailure
+
+_INDEX_REGISTRY: Dict[str, Dict[str, IndexModel]] = {}
+
+
+class IndexInfo(BaseModel):
+    """Summary of a single index on a collection"""
+
+    collection: str
+    name: str
+    key: List[Tuple[str, Any]]
+    ops: int = 0
+
+
+class IndexReport(BaseModel):
+    """A report comparing the registered indexes to those in the database"""
+
+    missing: List[IndexInfo] = []
+    redundant: List[IndexInfo] = []
+    unused: List[IndexInfo] = []
+
+
+def register_indexes(collection: str, indexes: Sequence[IndexModel]):
+    """Registers the indexes expected on the given collection
+
+    Registering the same index (by name) more than once is a no-op
+
+    Args:
+        collection: the name of the mongodb collection
+        indexes: the index specs for that collection
+    """
+    collection_indexes = _INDEX_REGISTRY.setdefault(collection, {})
+    for index in indexes:
+        collection_indexes[index.document["name"]] = index
+
+
+def register_document_indexes(*document_models: Type[Document]):
+    """Registers the indexes declared in the `Settings` of the given beanie documents
+
+    Args:
+        document_models: the beanie document classes whose indexes are to be registered
+    """
+    for model in document_models:
+        settings = getattr(model, "Settings", None)
+        name = getattr(settings, "name", None) or model.__name__
+        indexes = [
+            item if isinstance(item, IndexModel) else IndexModel(item)
+            for item in getattr(settings, "indexes", [])
+        ]
+        register_indexes(name, indexes)
+
+
+def get_registered_indexes() -> Dict[str, List[IndexModel]]:
+    """Gets a map of collection name to the indexes registered for it"""
+    return {k: list(v.values()) for k, v in _INDEX_REGISTRY.items()}
+
+
+async def reconcile_indexes(
+    db: AsyncIOMotorDatabase, collections: Optional[Sequence[str]] = None
+):
+    """Creates any registered indexes that do not yet exist in the database
+
+    Failures are logged rather than raised so that a conflicting index
+    on one collection does not prevent the app from starting.
+
+    Args:
+        db: the mongo database to reconcile
+        collections: the only collections to reconcile; default = None meaning all of them
+    """
+    for collection, indexes in get_registered_indexes().items():
+        if len(indexes) == 0:
+            continue
+        if collections is not None and collection not in collections:
+            continue
+
+        try:
+            await db[collection].create_indexes(indexes)
+        except OperationFailure as exp:
+            logging.error(f"failed to create indexes on '{collection}': {exp}")
+
+
+async def get_index_report(db: AsyncIOMotorDatabase) -> IndexReport:
+    """Compares the registered indexes to those in the database
+
+    - missing: registered but not found in the database
+    - redundant: existing indexes whose key is a prefix of another index on the same collection
+    - unused: existing indexes that have never been accessed, according to `$indexStats`
+
+    Args:
+        db: the mongo database to inspect
+
+    Returns:
+        the report of missing, redundant and unused indexes
+    """
+    report = IndexReport()
+    registered = get_registered_indexes()
+    collections = set(registered.keys()) | set(await db.list_collection_names())
+
+    for collection in sorted(collections):
+        existing = await _get_existing_indexes(db, collection)
+        existing_keys = {_as_key_tuple(v["key"]) for v in existing.values()}
+
+        for index in registered.get(collection, []):
+            key = _as_key_tuple(index.document["key"])
+            if key not in existing_keys:
+                report.missing.append(
+                    IndexInfo(
+                        collection=collection, name=index.document["name"], key=key
+                    )
+                )
+
+        for name, info in existing.items():
+            key = _as_key_tuple(info["key"])
+            index_info = IndexInfo(
+                collection=collection, name=name, key=key, ops=info["ops"]
+            )
+
+            if name == "_id_" or info.get("unique"):
+                continue
+
+            if any(
+                len(other) > len(key) and other[: len(key)] == key
+                for other in existing_keys
+            ):
+                report.redundant.append(index_info)
+
+            if info["ops"] == 0:
+                report.unused.append(index_info)
+
+    return report
+
+
+async def _get_existing_indexes(
+    db: AsyncIOMotorDatabase, collection: str
+) -> Dict[str, Dict[str, Any]]:
+    """Gets the indexes that exist on the given collection, together with their usage stats
+
+    Args:
+        db: the mongo database
+        collection: the name of the collection
+
+    Returns:
+        a map of index name to a dict with 'key', 'unique' and 'ops' fields
+    """
+    indexes: Dict[str, Dict[str, Any]] = {}
+    async for stat in db[collection].aggregate([{"$indexStats": {}}]):
+        indexes[stat["name"]] = {
+            "key": stat["key"],
+            "unique": stat.get("spec", {}).get("unique", False),
+            "ops": int(stat.get("accesses", {}).get("ops", 0)),
+        }
+    return indexes
+
+
+def _as_key_tuple(key: Any) -> Tuple[Tuple[str, Any], ...]:
+    """Converts an index key document into a hashable tuple of (field, direction) pairs
+
+    Args:
+        key: the key of the index as a mapping or a list of pairs
+
+    Returns:
+        tuple of (field, direction) pairs
+    """
+    items = key.items() if hasattr(key, "items") else key
+    return tuple(
+        (field, direction if isinstance(direction, str) else int(direction))
+        for field, direction in items
+    )
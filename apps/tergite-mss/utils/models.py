@@ -13,27 +13,42 @@
 #
 # Refactored by Martin Ahindura 2023-11-08
 """Utilities specific to models"""
+import copy
+import functools
+import inspect
 import sys
 from typing import (
+    Annotated,
     Any,
     Callable,
+    Dict,
+    List,
     Literal,
     Mapping,
     Optional,
     Sequence,
+    Tuple,
     Type,
     TypeVar,
+    Union,
     get_args,
+    get_origin,
 )
 
 from pydantic import BaseModel, ConfigDict, ValidationError, create_model
 from pydantic.main import IncEx
 
-from utils.exc import DbValidationError
+from utils.exc import DbValidationError, InvalidQueryError
 
 ModelOrDict = TypeVar("ModelOrDict", dict, BaseModel)
 Model = TypeVar("Model", bound=BaseModel)
 
+# the operators whose values are lists
+_LIST_OPERATORS = ("in", "nin")
+_SCALAR_TYPES = (str, int, float, bool, bytes)
+# lists of scalars shorter than this are validated, as it costs less than setting them apart
+_MIN_TRUSTED_ITEMS = 256
+
 
 class PartialMeta(BaseModel):
     """The base model for partial models that have all fields as optional"""
@@ -111,8 +126,43 @@ def try_parse_record(
         return None
 
 
+def parse_trusted_record(
+    type__: Type[ModelOrDict], record: Mapping[str, Any]
+) -> ModelOrDict:
+    """Converts a record that is trusted to be valid to the given type, skipping the costly validation
+
+    This is for records that were validated when they were written to the database.
+    Validating small nested models in pydantic-core is cheaper than building them in python
+    e.g. via `model_construct`, so the record is still validated, except for its lists of scalars
+    e.g. the measurement memory of a job, whose every item would otherwise be checked.
+    These are set on the validated model, and its nested models, as they are.
+
+    Args:
+        type__: the type to convert to
+        record: the item to convert
+
+    Returns:
+        the record converted to the given type
+
+    Raises:
+        ValidationError: the rest of the record has some pydantic validation errors
+    """
+    plan = _get_trusted_fields(type__)
+    if not plan:
+        return parse_record(type__, record)
+
+    validated_part, trusted_part = _split_trusted(record, plan=plan)
+    result = parse_record(type__, validated_part)
+    _set_trusted(result, trusted_part)
+    return result
+
+
 def create_partial_model(
-    name: str, original: type[Model], exclude: Sequence[str] = (), default: Any = None
+    name: str,
+    original: type[Model],
+    exclude: Sequence[str] = (),
+    default: Any = None,
+    operators: Mapping[str, Sequence[str]] = {},
 ) -> type[Model]:
     """Creates a model that has all its fields as optional based on the original
 
@@ -121,6 +171,9 @@ def create_partial_model(
         original: the original model whose fields are to be passed in as query params
         exclude: the fields of the original to exclude
         default: the default value of the fields
+        operators: map of field to the operators e.g. 'gte', 'in' for which an extra
+            '<field>__<op>' field is added e.g. 'created_at__gte'.
+            The 'in' and 'nin' fields are lists of the type of the original field.
 
     Returns:
         the model to be used in the router
@@ -132,15 +185,59 @@ def create_partial_model(
         if name not in exclude
     }
 
-    return create_model(
+    operator_fields = {}
+    for field_name, ops in operators.items():
+        type__ = _as_required(original.model_fields[field_name].annotation)
+        for op in ops:
+            op_type = List[type__] if op in _LIST_OPERATORS else type__
+            operator_fields[f"{field_name}__{op}"] = (Optional[op_type], default)
+
+    model = create_model(
         name,
         # module of the calling function
         __module__=sys._getframe(1).f_globals["__name__"],
         __doc__=f"{PartialMeta.__doc__}\n\nOriginal:\n{original.__doc__}",
         __base__=(PartialMeta,),
         **fields,
+        **operator_fields,
     )
 
+    if operator_fields:
+        # pydantic puts the plain default values in the signature, yet FastAPI needs the
+        # original default e.g. Query(None) in order to read list fields from the query params
+        signature = inspect.signature(model)
+        model.__signature__ = signature.replace(
+            parameters=[
+                (
+                    param.replace(default=copy.copy(default))
+                    if param.name in operator_fields
+                    else param
+                )
+                for param in signature.parameters.values()
+            ]
+        )
+    return model
+
+
+def validate_field_paths(model: Type[BaseModel], paths: Sequence[str]):
+    """Checks that the given dot-notation field paths start with a field of the given model
+
+    This is useful for field paths got from the user e.g. in projections
+
+    Args:
+        model: the model whose fields are to be checked against
+        paths: the field paths in dot-notation e.g. "result.memory"
+
+    Raises:
+        InvalidQueryError: unknown field '{path}'
+    """
+    for path in paths:
+        parts = path.split(".")
+        if parts[0] not in model.model_fields or not all(
+            part and not part.startswith("$") for part in parts
+        ):
+            raise InvalidQueryError(f"unknown field '{path}'")
+
 
 def _as_optional(type__) -> type:
     """Converts the type into an optional type if it was not one already
@@ -154,3 +251,136 @@ def _as_optional(type__) -> type:
     if type(None) in get_args(type__):
         return type__
     return Optional[type__]
+
+
+def _as_required(type__) -> type:
+    """Converts the optional type into the type it wraps
+
+    Args:
+        type__: the type to convert
+
+    Returns:
+        The type without None, or the type itself if it was not optional
+    """
+    args = tuple(arg for arg in get_args(type__) if arg is not type(None))
+    if len(args) == len(get_args(type__)):
+        return type__
+    return Union[args]
+
+
+def _is_model(type__: Any) -> bool:
+    """Checks whether the given type is a pydantic model"""
+    return inspect.isclass(type__) and issubclass(type__, BaseModel)
+
+
+@functools.lru_cache(maxsize=None)
+def _get_trusted_fields(model: Type[ModelOrDict]) -> Dict[str, Tuple[str, Any]]:
+    """Gets the fields of the given model, or of its nested models, that are lists of scalars
+
+    Args:
+        model: the model whose fields are to be checked
+
+    Returns:
+        map of key in the record i.e. alias or name, to a tuple of the name of the field and
+        None if it is a list of scalars, or the same map for the nested model.
+        It is empty if the given type is not a pydantic model.
+    """
+    result = {}
+    if not _is_model(model):
+        return result
+
+    for name, field in model.model_fields.items():
+        annotation = _as_required(_strip_annotated(field.annotation))
+        if _is_scalar_list(annotation):
+            plan = None
+        elif _is_model(annotation) and annotation is not model:
+            plan = _get_trusted_fields(annotation)
+            if not plan:
+                continue
+        else:
+            continue
+
+        result[field.alias or name] = (name, plan)
+    return result
+
+
+def _split_trusted(
+    record: Mapping[str, Any], plan: Dict[str, Tuple[str, Any]]
+) -> Tuple[Mapping[str, Any], Dict[str, Tuple[str, Any]]]:
+    """Splits the record into the part to validate and the trusted lists of scalars
+
+    Lists with fewer than `_MIN_TRUSTED_ITEMS` items are left to be validated,
+    as it is cheaper than setting them separately.
+
+    Args:
+        record: the record to split
+        plan: the map of the trusted fields as got from `_get_trusted_fields`
+
+    Returns:
+        a tuple of the record without the trusted lists, and the map of key in the record
+        to the tuple of field name and the trusted list or the same map for the nested model
+    """
+    validated_part = record
+    trusted_part = {}
+    for key, (name, sub_plan) in plan.items():
+        value = record.get(key)
+        if sub_plan is None and isinstance(value, list):
+            if _count_items(value) < _MIN_TRUSTED_ITEMS:
+                continue
+            trusted_value = value
+        elif sub_plan is not None and isinstance(value, Mapping):
+            nested_validated, trusted_value = _split_trusted(value, plan=sub_plan)
+            if not trusted_value:
+                continue
+        else:
+            continue
+
+        if validated_part is record:
+            validated_part = dict(record)
+        if sub_plan is None:
+            del validated_part[key]
+        else:
+            validated_part[key] = nested_validated
+        trusted_part[key] = (name, trusted_value)
+
+    return validated_part, trusted_part
+
+
+def _count_items(value: List[Any]) -> int:
+    """Counts the items of the list, and those of the lists directly in it"""
+    return len(value) + sum(len(item) for item in value if isinstance(item, list))
+
+
+def _set_trusted(instance: BaseModel, trusted_part: Dict[str, Tuple[str, Any]]):
+    """Sets the trusted lists of scalars on the validated model and its nested models
+
+    Args:
+        instance: the validated model
+        trusted_part: the trusted part of the record as got from `_split_trusted`
+    """
+    for name, value in trusted_part.values():
+        if isinstance(value, list):
+            instance.__dict__[name] = value
+            instance.__pydantic_fields_set__.add(name)
+        else:
+            nested = getattr(instance, name, None)
+            if isinstance(nested, BaseModel):
+                _set_trusted(nested, value)
+
+
+def _strip_annotated(type__: Any) -> Any:
+    """Gets the type wrapped by `Annotated`, or the type itself if it is not annotated"""
+    if get_origin(type__) is Annotated:
+        return get_args(type__)[0]
+    return type__
+
+
+def _is_scalar_list(type__: Any) -> bool:
+    """Checks whether the type is a list of str, int, float, bool or bytes, or of such lists"""
+    if get_origin(type__) is not list:
+        return False
+    args = get_args(type__)
+    if len(args) != 1:
+        return False
+    item_type = _strip_annotated(args[0])
+    return item_type in _SCALAR_TYPES or _is_scalar_list(item_type)
@@ -9,24 +9,73 @@
 # Any modifications or derivative works of this code must retain this
 # copyright notice, and modified files need to carry a notice indicating
 # that they have been altered from the originals.
+import asyncio
+import base64
+import binascii
 import logging
+import random
+from contextlib import asynccontextmanager
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Mapping, Optional, Tuple, Type
+from typing import (
+    Any,
+    AsyncIterator,
+    Dict,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+    Union,
+)
 
 import pymongo
+from beanie import PydanticObjectId
+from bson import json_util
+from bson.errors import BSONError
 from motor.motor_asyncio import (
     AsyncIOMotorClient,
+    AsyncIOMotorClientSession,
     AsyncIOMotorCollection,
+    AsyncIOMotorCommandCursor,
+    AsyncIOMotorCursor,
     AsyncIOMotorDatabase,
 )
-from pydantic import ValidationError
+from pydantic import BaseModel, Field, ValidationError
 from pymongo import ReturnDocument
-
-from .date_time import get_current_timestamp
-from .exc import NotFoundError
-from .models import ModelOrDict, parse_record
+from pymongo.errors import BulkWriteError
+
+from .date_time import ZuluDatetime, get_current_datetime
+from .exc import (
+    DbValidationError,
+    InvalidCursorError,
+    InvalidQueryError,
+    NotFoundError,
+)
+from .models import ModelOrDict, parse_record, parse_trusted_record
 
 _CONNECTIONS = {}
+_TRANSACTIONAL_TOPOLOGIES = ("ReplicaSetWithPrimary", "Sharded")
+# the field of the counter that is incremented every time a versioned document is written
+REVISION_FIELD = "revision"
+
+# map of the suffix of an operator-style filter key e.g. 'created_at__gte' to its mongodb operator
+FILTER_OPERATORS = {
+    "gt": "$gt",
+    "gte": "$gte",
+    "lt": "$lt",
+    "lte": "$lte",
+    "in": "$in",
+    "nin": "$nin",
+}
+
+
+class Revision(BaseModel):
+    """The version of a document, as used for conditional requests"""
+
+    id: PydanticObjectId = Field(alias="_id")
+    revision: Optional[int] = None
+    updated_at: Optional[ZuluDatetime] = None
 
 
 def get_mongodb(url: str, name: str) -> AsyncIOMotorDatabase:
@@ -65,6 +114,8 @@ async def find_one(
     dropped_fields: Tuple[str, ...] = (),
     sorted_by: Optional[List[Tuple[str, int]]] = None,
     schema: Type[ModelOrDict] = dict,
+    included_fields: Tuple[str, ...] = (),
+    trusted_sample_rate: Optional[float] = None,
 ) -> ModelOrDict:
     """Finds first record in the given collection that matches the given _filter
 
@@ -74,6 +125,12 @@ async def find_one(
         dropped_fields: fields to be dropped from the returned record
         sorted_by: List of (field, sort-direction) tuples to use in sorting
         schema: the type the record should conform to
+        included_fields: the only fields to be returned; "_id" is returned unless it is dropped.
+            It cannot be used together with other dropped fields
+        trusted_sample_rate: if set, the records are trusted to have been validated when written,
+            so their large lists e.g. the measurement memory of jobs are not validated, and only
+            this fraction of them is fully validated, in the background, to catch any schema drift;
+            default = None i.e. all records are fully validated
 
     Returns:
         a dict representing the given record
@@ -81,8 +138,9 @@ async def find_one(
     Raises:
         NotFoundError: no matches for '{_filter}'
         ValidationError: the document does not satisfy the schema passed
+        InvalidQueryError: fields cannot be both included and excluded
     """
-    projection = {k: False for k in dropped_fields}
+    projection = get_projection(include=included_fields, exclude=dropped_fields)
     kwargs = dict(projection=projection, filter=_filter)
 
     if sorted_by:
@@ -92,7 +150,7 @@ async def find_one(
     if document is None:
         raise NotFoundError(f"no matches for '{_filter}'")
 
-    return parse_record(schema, document)
+    return _parse(schema, document, trusted_sample_rate=trusted_sample_rate)
 
 
 async def find(
@@ -104,6 +162,10 @@ async def find(
     sort: Optional[List[str]] = None,
     schema: Type[ModelOrDict] = dict,
     skip_validation: bool = False,
+    include: Tuple[str] = (),
+    union_with: Tuple[str, ...] = (),
+    operators: Mapping[str, Sequence[str]] = {},
+    trusted_sample_rate: Optional[float] = None,
 ) -> List[ModelOrDict]:
     """Retrieves all records in the collection up to limit records, given the sort order
 
@@ -120,36 +182,271 @@ async def find(
         sort: List of fields to use in sorting, where fields starting with "-" are descending
         schema: the schema the records should conform to; default = Dict[str, Any]
         skip_validation: whether validation errors should be silently ignored; default = False
+        include: the only fields to return; it cannot be used together with 'exclude'
+        union_with: the names of other collections in the same database whose records
+            are to be returned together with those of `collection`
+        operators: map of field to the operators e.g. 'gte', 'in' that are allowed in
+            operator-style filters like 'created_at__gte' on that field; default = none allowed
+        trusted_sample_rate: if set, the records are trusted to have been validated when written,
+            so their large lists e.g. the measurement memory of jobs are not validated, and only
+            this fraction of them is fully validated, in the background, to catch any schema drift;
+            default = None i.e. all records are fully validated
 
     Returns:
         a list of documents that were found
 
     Raises:
         ValidationError: the document does not satisfy the schema passed
+        InvalidQueryError: fields cannot be both included and excluded
+        InvalidQueryError: operator '{op}' is not allowed on field '{field}'
     """
-    projection = {field: 0 for field in exclude}
+    records = iter_many(
+        collection,
+        filters=filters,
+        exclude=exclude,
+        limit=limit,
+        skip=skip,
+        sort=sort,
+        schema=schema,
+        skip_validation=skip_validation,
+        include=include,
+        union_with=union_with,
+        operators=operators,
+        trusted_sample_rate=trusted_sample_rate,
+    )
+    return [item async for item in records]
 
-    if filters is None:
-        filters = {}
 
-    db_cursor = collection.find(filters, projection).skip(skip)
-    if sort:
-        sort_config = _extract_sort_config(sort)
-        db_cursor.sort(sort_config)
+def iter_many(
+    collection: AsyncIOMotorCollection,
+    filters: Optional[dict] = None,
+    exclude: Tuple[str] = (),
+    limit: Optional[int] = None,
+    skip: int = 0,
+    sort: Optional[List[str]] = None,
+    schema: Type[ModelOrDict] = dict,
+    skip_validation: bool = False,
+    include: Tuple[str] = (),
+    batch_size: int = 0,
+    union_with: Tuple[str, ...] = (),
+    operators: Mapping[str, Sequence[str]] = {},
+    trusted_sample_rate: Optional[float] = None,
+) -> AsyncIterator[ModelOrDict]:
+    """Iterates over the records in the collection up to limit records, given the sort order
+
+    Unlike `find`, the records are parsed one at a time as they are got from the database
+    so that they never all have to be in memory at once.
+    The query is checked when this is called, before any record is fetched.
 
-    if limit and limit >= 0:
-        db_cursor.limit(limit)
+    Args:
+        collection: the mongo db collection to query from
+        filters: the mongodb like filters which all returned records should satisfy
+        exclude: the fields to exclude
+        limit: the maximum number of records to return: If limit is negative, all results are returned
+        skip: the number of records to skip
+        sort: List of fields to use in sorting, where fields starting with "-" are descending
+        schema: the schema the records should conform to; default = Dict[str, Any]
+        skip_validation: whether validation errors should be silently ignored; default = False
+        include: the only fields to return; it cannot be used together with 'exclude'
+        batch_size: the maximum number of records got from the database in one round trip;
+            default = 0 meaning the database's default
+        union_with: the names of other collections in the same database whose records
+            are to be returned together with those of `collection`
+        operators: map of field to the operators e.g. 'gte', 'in' that are allowed in
+            operator-style filters like 'created_at__gte' on that field; default = none allowed
+        trusted_sample_rate: if set, the records are trusted to have been validated when written,
+            so their large lists e.g. the measurement memory of jobs are not validated, and only
+            this fraction of them is fully validated, in the background, to catch any schema drift;
+            default = None i.e. all records are fully validated
+
+    Returns:
+        an async iterator of the documents that were found
+
+    Raises:
+        ValidationError: the document does not satisfy the schema passed
+        InvalidQueryError: fields cannot be both included and excluded
+        InvalidQueryError: operator '{op}' is not allowed on field '{field}'
+    """
+    projection = get_projection(include=include, exclude=exclude)
+    filters = expand_filter_operators(filters or {}, operators=operators)
+
+    db_cursor = _query(
+        collection,
+        filters=filters,
+        projection=projection,
+        sort_config=_extract_sort_config(sort) if sort else None,
+        skip=skip,
+        limit=limit,
+        batch_size=batch_size,
+        union_with=union_with,
+    )
+    return _iter_parsed(
+        db_cursor,
+        schema=schema,
+        skip_validation=skip_validation,
+        trusted_sample_rate=trusted_sample_rate,
+    )
+
+
+async def find_page(
+    collection: AsyncIOMotorCollection,
+    cursor: str = "",
+    filters: Optional[dict] = None,
+    exclude: Tuple[str] = (),
+    limit: Optional[int] = None,
+    sort: Optional[List[str]] = None,
+    schema: Type[ModelOrDict] = dict,
+    skip_validation: bool = False,
+    include: Tuple[str] = (),
+    union_with: Tuple[str, ...] = (),
+    operators: Mapping[str, Sequence[str]] = {},
+    trusted_sample_rate: Optional[float] = None,
+) -> Tuple[List[ModelOrDict], Optional[str]]:
+    """Retrieves a page of records that come after the given cursor, given the sort order
+
+    Unlike :meth:`find`, this uses keyset pagination i.e. it filters on the values of the sort
+    fields (plus "_id" as a tie-breaker) of the last record of the previous page instead of
+    skipping records, so deep pages are as fast as the first one.
+
+    Args:
+        collection: the mongo db collection to query from
+        cursor: the opaque cursor returned with the previous page; an empty string means the first page
+        filters: the mongodb like filters which all returned records should satisfy
+        exclude: the fields to exclude
+        limit: the maximum number of records to return: If limit is None or negative, all results are returned
+        sort: List of fields to use in sorting, where fields starting with "-" are descending
+        schema: the schema the records should conform to; default = Dict[str, Any]
+        skip_validation: whether validation errors should be silently ignored; default = False
+        include: the only fields to return; it cannot be used together with 'exclude'.
+            The sort fields are always returned as they are needed to build the next cursor.
+        union_with: the names of other collections in the same database whose records
+            are to be returned together with those of `collection`
+        operators: map of field to the operators e.g. 'gte', 'in' that are allowed in
+            operator-style filters like 'created_at__gte' on that field; default = none allowed
+        trusted_sample_rate: if set, the records are trusted to have been validated when written,
+            so their large lists e.g. the measurement memory of jobs are not validated, and only
+            this fraction of them is fully validated, in the background, to catch any schema drift;
+            default = None i.e. all records are fully validated
+
+    Returns:
+        a tuple of the list of documents that were found and the cursor for the next page
+        or None if there are no more pages
+
+    Raises:
+        ValidationError: the document does not satisfy the schema passed
+        InvalidCursorError: invalid cursor '{cursor}'
+        InvalidQueryError: fields cannot be both included and excluded
+        InvalidQueryError: operator '{op}' is not allowed on field '{field}'
+    """
+    sort_config = _with_tie_breaker(_extract_sort_config(sort or []))
+    sort_fields = [field for field, _ in sort_config]
+    projection = get_projection(
+        include=(*include, *sort_fields) if include else (),
+        exclude=tuple(field for field in exclude if field not in sort_fields),
+    )
+
+    filters = expand_filter_operators(filters or {}, operators=operators)
+
+    if cursor:
+        values = decode_cursor(cursor, size=len(sort_config))
+        filters = {"$and": [filters, _get_keyset_filter(sort_config, values)]}
+
+    db_cursor = _query(
+        collection,
+        filters=filters,
+        projection=projection,
+        sort_config=sort_config,
+        limit=limit,
+        union_with=union_with,
+    )
 
     response = []
+    count = 0
+    last_item = None
     async for item in db_cursor:
+        count += 1
+        last_item = item
         try:
-            parsed_item = parse_record(schema, item)
+            parsed_item = _parse(schema, item, trusted_sample_rate=trusted_sample_rate)
             response.append(parsed_item)
         except ValidationError as exp:
             if not skip_validation:
                 raise exp
 
-    return response
+    next_cursor = None
+    if limit and limit >= 0 and count == limit:
+        next_cursor = encode_cursor(last_item, sort_config=sort_config)
+
+    return response, next_cursor
+
+
+def encode_cursor(
+    document: Mapping[str, Any], sort_config: List[Tuple[str, int]]
+) -> str:
+    """Encodes the values of the sort fields of the given document into an opaque cursor
+
+    Args:
+        document: the raw mongodb document
+        sort_config: the list of (field, direction) tuples used in sorting
+
+    Returns:
+        the url-safe cursor string
+    """
+    values = [_get_field_value(document, field) for field, _ in sort_config]
+    raw = json_util.dumps(values, json_options=json_util.RELAXED_JSON_OPTIONS)
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    """Decodes an opaque cursor into the values of the sort fields it was created from
+
+    Args:
+        cursor: the cursor string got from :meth:`encode_cursor`
+        size: the expected number of values in the cursor
+
+    Returns:
+        the list of values of the sort fields
+
+    Raises:
+        InvalidCursorError: invalid cursor '{cursor}'
+    """
+    try:
+        values = json_util.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, ValueError, BSONError) as exp:
+        raise InvalidCursorError(f"invalid cursor '{cursor}'") from exp
+
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursorError(f"invalid cursor '{cursor}'")
+    return values
+
+
+def get_projection(
+    include: Tuple[str, ...] = (), exclude: Tuple[str, ...] = ()
+) -> Dict[str, int]:
+    """Gets the mongodb projection for the given included or excluded fields
+
+    Mongodb only allows "_id" to be excluded when other fields are included.
+
+    Args:
+        include: the only fields to return
+        exclude: the fields to leave out
+
+    Returns:
+        the mongodb projection
+
+    Raises:
+        InvalidQueryError: fields cannot be both included and excluded
+    """
+    if not include:
+        return {field: 0 for field in exclude}
+
+    if any(field != "_id" for field in exclude):
+        raise InvalidQueryError("fields cannot be both included and excluded")
+
+    projection = {field: 1 for field in include}
+    if "_id" in exclude:
+        projection["_id"] = 0
+    return projection
 
 
 async def insert_one(collection: AsyncIOMotorCollection, document: Dict[str, Any]):
@@ -173,6 +470,39 @@ async def insert_one(collection: AsyncIOMotorCollection, document: Dict[str, Any
     raise ValueError("server failed to insert document")
 
 
+async def insert_many(
+    collection: AsyncIOMotorCollection,
+    documents: List[Dict[str, Any]],
+    ordered: bool = True,
+) -> List[Dict[str, Any]]:
+    """Inserts many documents into the given collection in one request
+
+    Args:
+        collection: the mongo AsyncIOMotorCollection to insert the documents into
+        documents: the dictionaries to insert into the collection
+        ordered: whether to stop at the first failed insert; if False, the server
+            may insert the documents in any order and attempts all of them
+
+    Returns:
+        the inserted documents
+
+    Raises:
+        ValueError: server failed to insert documents
+    """
+    try:
+        result = await collection.insert_many(documents, ordered=ordered)
+    except BulkWriteError as exp:
+        num_errors = len(exp.details.get("writeErrors", []))
+        raise ValueError(f"server failed to insert {num_errors} documents")
+
+    if result.acknowledged:
+        for document, inserted_id in zip(documents, result.inserted_ids):
+            document["_id"] = str(inserted_id)
+        return documents
+
+    raise ValueError("server failed to insert documents")
+
+
 async def insert_one_if_not_exists(
     collection: AsyncIOMotorCollection,
     document: Dict[str, Any],
@@ -217,7 +547,7 @@ async def update_many(
         ValueError: server failed updating documents
         NotFoundError: no matches for {filter}
     """
-    update = {"$set": {**payload, "updated_at": get_current_timestamp()}}
+    update = {"$set": {**payload, "updated_at": get_current_datetime()}}
     result = await collection.update_many(filter=_filter, update=update)
 
     if not result.acknowledged:
@@ -235,6 +565,9 @@ async def update_one(
     payload: Dict[str, Any],
     return_document: bool = ReturnDocument.BEFORE,
     upsert: bool = False,
+    session: Optional[AsyncIOMotorClientSession] = None,
+    updated_at: Optional[datetime] = None,
+    increments: Optional[Dict[str, int]] = None,
 ) -> Mapping[str, Any]:
     """Updates one document in the given collection for the given filter
 
@@ -245,6 +578,9 @@ async def update_one(
         return_document:  If ReturnDocument.BEFORE (the default), returns the original document before it was updated.
             If ReturnDocument.AFTER, returns the updated or inserted document.
         upsert: whether we should insert the document if it does not exist
+        session: the session in which to run the update, if any e.g. in a transaction
+        updated_at: the datetime to set as 'updated_at'; default is the current time
+        increments: map of field to the number to add to it e.g. {REVISION_FIELD: 1}; default = None
 
     Returns:
         either the modified document or the original document
@@ -252,12 +588,15 @@ async def update_one(
     Raises:
         NotFoundError: no matches for {filter}
     """
-    update = {"$set": {**payload, "updated_at": get_current_timestamp()}}
+    update = {"$set": {**payload, "updated_at": updated_at or get_current_datetime()}}
+    if increments:
+        update["$inc"] = increments
     result = await collection.find_one_and_update(
         filter=_filter,
         update=update,
         return_document=return_document,
         upsert=upsert,
+        session=session,
     )
 
     if result is None:
@@ -266,6 +605,242 @@ async def update_one(
     return result
 
 
+@asynccontextmanager
+async def transaction(
+    db: AsyncIOMotorDatabase,
+) -> AsyncIterator[Optional[AsyncIOMotorClientSession]]:
+    """Runs the operations in the block in a single transaction if the database supports it
+
+    Transactions are only supported by replica sets and sharded clusters.
+    On a standalone server, no session is started and the operations are run one after the other.
+
+    Args:
+        db: the mongo database
+
+    Returns:
+        an async context manager yielding the session to pass to the operations,
+        or None if transactions are not supported
+    """
+    topology_type = db.client.topology_description.topology_type_name
+    if topology_type not in _TRANSACTIONAL_TOPOLOGIES:
+        yield None
+        return
+
+    async with await db.client.start_session() as session:
+        async with session.start_transaction():
+            yield session
+
+
+def expand_filter_operators(
+    filters: Mapping[str, Any], operators: Mapping[str, Sequence[str]]
+) -> Dict[str, Any]:
+    """Converts the operator-style filters e.g. {'created_at__gte': x} into mongodb filters
+
+    Many operators on the same field are combined e.g.
+    {'created_at__gte': x, 'created_at__lt': y} becomes {'created_at': {'$gte': x, '$lt': y}}.
+    Filters without an operator suffix are left as they are.
+
+    Args:
+        filters: the filters, some of whose keys may be '<field>__<op>' where 'op' is
+            one of the keys of `FILTER_OPERATORS`
+        operators: map of field to the operators that are allowed on it.
+            Only indexed fields should be allowed so that the queries do not scan the collection.
+
+    Returns:
+        the mongodb filters
+
+    Raises:
+        InvalidQueryError: operator '{op}' is not allowed on field '{field}'
+    """
+    result: Dict[str, Any] = {}
+    operator_filters: Dict[str, Dict[str, Any]] = {}
+    for key, value in filters.items():
+        field, sep, op = key.rpartition("__")
+        if not sep or op not in FILTER_OPERATORS:
+            result[key] = value
+            continue
+
+        if op not in operators.get(field, ()):
+            raise InvalidQueryError(
+                f"operator '{op}' is not allowed on field '{field}'"
+            )
+        operator_filters.setdefault(field, {})[FILTER_OPERATORS[op]] = value
+
+    for field, conditions in operator_filters.items():
+        if field in result:
+            conditions = {"$eq": result[field], **conditions}
+        result[field] = conditions
+
+    return result
+
+
+def seconds_between(start: str, end: str) -> Dict[str, Any]:
+    """Gets the aggregation expression for the number of seconds between two date fields
+
+    Args:
+        start: the path to the start date field e.g. '$timestamps.execution.started'
+        end: the path to the end date field
+
+    Returns:
+        the expression that evaluates to the seconds, or null if either field is not a date
+    """
+    return {
+        "$cond": [
+            {
+                "$and": [
+                    {"$eq": [{"$type": start}, "date"]},
+                    {"$eq": [{"$type": end}, "date"]},
+                ]
+            },
+            {"$divide": [{"$subtract": [end, start]}, 1000]},
+            None,
+        ]
+    }
+
+
+def _query(
+    collection: AsyncIOMotorCollection,
+    filters: Dict[str, Any],
+    projection: Dict[str, int],
+    sort_config: Optional[List[Tuple[str, int]]] = None,
+    skip: int = 0,
+    limit: Optional[int] = None,
+    batch_size: int = 0,
+    union_with: Tuple[str, ...] = (),
+) -> Union[AsyncIOMotorCursor, AsyncIOMotorCommandCursor]:
+    """Opens a cursor over the documents in the collection that match the filters
+
+    If `union_with` is empty, this is a plain `find`. Otherwise, it is an aggregation
+    that adds the matching documents of the other collections before sorting and paginating.
+
+    Args:
+        collection: the mongo db collection to query from
+        filters: the mongodb like filters which all returned records should satisfy
+        projection: the mongodb projection
+        sort_config: the list of (field, direction) tuples to sort by
+        skip: the number of records to skip
+        limit: the maximum number of records to return: If limit is None or negative, all results are returned
+        batch_size: the maximum number of records got from the database in one round trip;
+            default = 0 meaning the database's default
+        union_with: the names of other collections in the same database whose records
+            are to be returned together with those of `collection`
+
+    Returns:
+        the cursor over the matching documents
+    """
+    if not union_with:
+        db_cursor = collection.find(filters, projection).skip(skip)
+        if sort_config:
+            db_cursor.sort(sort_config)
+        if limit and limit >= 0:
+            db_cursor.limit(limit)
+        if batch_size > 0:
+            db_cursor.batch_size(batch_size)
+        return db_cursor
+
+    pipeline: List[Dict[str, Any]] = [
+        {"$match": filters},
+        *(
+            {"$unionWith": {"coll": name, "pipeline": [{"$match": filters}]}}
+            for name in union_with
+        ),
+    ]
+    if sort_config:
+        pipeline.append({"$sort": dict(sort_config)})
+    if skip > 0:
+        pipeline.append({"$skip": skip})
+    if limit and limit >= 0:
+        pipeline.append({"$limit": limit})
+    if projection:
+        pipeline.append({"$project": projection})
+
+    kwargs = {"batchSize": batch_size} if batch_size > 0 else {}
+    return collection.aggregate(pipeline, **kwargs)
+
+
+async def _iter_parsed(
+    db_cursor: Union[AsyncIOMotorCursor, AsyncIOMotorCommandCursor],
+    schema: Type[ModelOrDict] = dict,
+    skip_validation: bool = False,
+    trusted_sample_rate: Optional[float] = None,
+) -> AsyncIterator[ModelOrDict]:
+    """Iterates over the records of the given cursor, parsing each into the given schema
+
+    Args:
+        db_cursor: the mongo db cursor to iterate over
+        schema: the schema the records should conform to; default = Dict[str, Any]
+        skip_validation: whether validation errors should be silently ignored; default = False
+        trusted_sample_rate: if set, the records are trusted to have been validated when written,
+            so their large lists e.g. the measurement memory of jobs are not validated, and only
+            this fraction of them is fully validated, in the background, to catch any schema drift;
+            default = None i.e. all records are fully validated
+
+    Returns:
+        an async iterator of the parsed records
+
+    Raises:
+        ValidationError: the document does not satisfy the schema passed
+    """
+    async for item in db_cursor:
+        try:
+            yield _parse(schema, item, trusted_sample_rate=trusted_sample_rate)
+        except ValidationError as exp:
+            if not skip_validation:
+                raise exp
+
+
+def _parse(
+    schema: Type[ModelOrDict],
+    record: Mapping[str, Any],
+    trusted_sample_rate: Optional[float] = None,
+) -> ModelOrDict:
+    """Parses the record into the given schema, trusting it if `trusted_sample_rate` is set
+
+    Args:
+        schema: the schema the record should conform to
+        record: the raw record from the database
+        trusted_sample_rate: if set, the record is parsed without validating its large lists,
+            and, with this probability, it is fully validated in a worker thread of the event loop's
+            default executor, so that the event loop is not blocked
+
+    Returns:
+        the parsed record
+
+    Raises:
+        ValidationError: the document does not satisfy the schema passed
+    """
+    if trusted_sample_rate is None:
+        return parse_record(schema, record)
+
+    if random.random() < trusted_sample_rate:
+        asyncio.get_running_loop().run_in_executor(
+            None, _validate_sample, schema, record
+        )
+    return parse_trusted_record(schema, record)
+
+
+def _validate_sample(schema: Type[ModelOrDict], record: Mapping[str, Any]):
+    """Fully validates a record that was trusted, logging a warning if it does not satisfy the schema
+
+    Any other error raised while validating is logged too, as it is run in a worker thread
+    whose result is never awaited.
+
+    Args:
+        schema: the schema the record should conform to
+        record: the raw record from the database
+    """
+    try:
+        parse_record(schema, record)
+    except DbValidationError as exp:
+        logging.warning(
+            f"record '{record.get('_id')}' read without validation does not match {schema.__name__}: {exp}"
+        )
+    except Exception as exp:
+        logging.exception(
+            f"record '{record.get('_id')}' read without validation could not be validated against {schema.__name__}: {exp}"
+        )
+
+
 def _extract_filter_obj(document: Dict[str, Any], unique_fields: Tuple[str, ...]):
     """Extracts a filter object from a document, given a set of unique fields
 
@@ -306,3 +881,90 @@ def _extract_sort_config(sort_fields: List[str]) -> List[Tuple[str, int]]:
             sort_config.append((sort_field, pymongo.ASCENDING))
 
     return sort_config
+
+
+def _with_tie_breaker(sort_config: List[Tuple[str, int]]) -> List[Tuple[str, int]]:
+    """Appends "_id" to the sort config if it is not there so that the sort order is total
+
+    Args:
+        sort_config: the list of (field, direction) tuples used in sorting
+
+    Returns:
+        the sort config with "_id" as the last field
+    """
+    if any(field == "_id" for field, _ in sort_config):
+        return sort_config
+
+    direction = sort_config[-1][1] if sort_config else pymongo.ASCENDING
+    return [*sort_config, ("_id", direction)]
+
+
+def _get_keyset_filter(
+    sort_config: List[Tuple[str, int]], values: List[Any]
+) -> Dict[str, Any]:
+    """Gets the filter for the records that come after the record with the given sort values
+
+    For sort fields (a, b, _id), this is (a > va) OR (a == va AND b > vb) OR (a == va AND b == vb AND _id > v_id)
+    with ">" replaced by "<" for descending fields.
+
+    Args:
+        sort_config: the list of (field, direction) tuples used in sorting
+        values: the values of the sort fields of the last record of the previous page
+
+    Returns:
+        the mongodb filter
+    """
+    branches = []
+    for idx, (field, direction) in enumerate(sort_config):
+        after = _get_after_value_filter(field, direction, values[idx])
+        if after is None:
+            continue
+
+        equalities = {f: v for (f, _), v in zip(sort_config[:idx], values[:idx])}
+        branches.append({**equalities, **after})
+
+    return {"$or": branches} if branches else {"_id": {"$exists": False}}
+
+
+def _get_after_value_filter(
+    field: str, direction: int, value: Any
+) -> Optional[Dict[str, Any]]:
+    """Gets the filter for values of the given field that come after the given value in the sort order
+
+    Nulls (or missing fields) come first in ascending order and last in descending order.
+
+    Args:
+        field: the name of the field
+        direction: the sort direction i.e. pymongo.ASCENDING or pymongo.DESCENDING
+        value: the value of the field on the last record of the previous page
+
+    Returns:
+        the mongodb filter or None if no value can come after the given value
+    """
+    if direction == pymongo.ASCENDING:
+        if value is None:
+            return {field: {"$ne": None}}
+        return {field: {"$gt": value}}
+
+    if value is None:
+        return None
+    return {"$or": [{field: {"$lt": value}}, {field: None}]}
+
+
+def _get_field_value(document: Mapping[str, Any], field: str) -> Any:
+    """Gets the value of a possibly nested field, given in dot notation, from the document
+
+    Args:
+        document: the raw mongodb document
+        field: the name of the field e.g. "timestamps.final.finished"
+
+    Returns:
+        the value of the field or None if it does not exist
+    """
+    value: Any = document
+    for part in field.split("."):
+        try:
+            value = value[part]
+        except (KeyError, TypeError):
+            return None
+    return value